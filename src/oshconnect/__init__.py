@@ -7,6 +7,13 @@
 
 # Core resources
 from .oshconnectapi import OSHConnect
+from .registry import ResourceRegistry
+from .polling import PollScheduler
+from .consumergroup import ConsumerGroup
+from .decodepool import DecodePool
+from .ringbuffer import RingBufferReader, RingBufferWriter, ring_name
+from .spatial import SpatialIndex
+from .spool import OutboundSpool, SpoolFullError
 from .streamableresource import Node, System, Datastream, ControlStream, StreamableModes, Status
 
 # Time management
@@ -36,11 +43,19 @@ from .swe_components import (
 from .schema_datamodels import SWEDatastreamRecordSchema, JSONDatastreamRecordSchema, JSONCommandSchema
 
 # Event system
-from .events import EventHandler, IEventListener, CallbackListener, DefaultEventTypes, AtomicEventTypes, Event, EventBuilder
+from .events import EventHandler, IEventListener, CallbackListener, ConflatingListener, DefaultEventTypes, AtomicEventTypes, Event, EventBuilder
 
 # DataStore
-from .datastore import DataStore
-from .datastores import SQLiteDataStore
+from .datastore import Checkpoint, DataStore, ObservationStore, RetentionPolicy
+from .checkpoints import CheckpointManager
+from .latestvalues import LatestValue, LatestValueCache
+from .datastores import (
+    BackgroundDataStore,
+    JSONFileDataStore,
+    SQLiteDataStore,
+    SQLiteObservationStore,
+    TinyDBDataStore,
+)
 
 # CS API constants
 from .csapi4py.constants import ObservationFormat, APIResourceTypes, ContentTypes
@@ -48,6 +63,16 @@ from .csapi4py.constants import ObservationFormat, APIResourceTypes, ContentType
 __all__ = [
     # Core resources
     "OSHConnect",
+    "ResourceRegistry",
+    "SpatialIndex",
+    "PollScheduler",
+    "ConsumerGroup",
+    "DecodePool",
+    "RingBufferReader",
+    "RingBufferWriter",
+    "ring_name",
+    "OutboundSpool",
+    "SpoolFullError",
     "Node",
     "System",
     "Datastream",
@@ -82,6 +107,7 @@ __all__ = [
     "EventHandler",
     "IEventListener",
     "CallbackListener",
+    "ConflatingListener",
     "DefaultEventTypes",
     "AtomicEventTypes",
     "Event",
@@ -93,4 +119,14 @@ __all__ = [
     # DataStore
     "DataStore",
     "SQLiteDataStore",
+    "BackgroundDataStore",
+    "JSONFileDataStore",
+    "TinyDBDataStore",
+    "ObservationStore",
+    "SQLiteObservationStore",
+    "RetentionPolicy",
+    "Checkpoint",
+    "CheckpointManager",
+    "LatestValue",
+    "LatestValueCache",
 ]
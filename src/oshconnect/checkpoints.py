@@ -0,0 +1,178 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   Date:  2024/5/28
+#   Author:  Ian Patterson
+#   Contact Email:  ian@botts-inc.com
+#   ==============================================================================
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import replace
+from typing import Iterable, Optional
+
+from .datastore import Checkpoint, DataStore
+from .streamableresource import Datastream, Node
+
+
+class CheckpointManager:
+    """Records how far a consumer has processed each Datastream and commits it to a DataStore.
+
+    ``record()`` only updates an in-memory checkpoint, so it is cheap enough
+    to call for every observation, also from the MQTT network thread. Changed
+    checkpoints are written together through ``DataStore.save_checkpoints``
+    once *max_pending* of them accumulated or *commit_interval* seconds have
+    passed, by the calling thread or, after ``start()``, by a background
+    thread that also commits streams that went quiet. Wrap the DataStore in a
+    ``BackgroundDataStore`` to keep the writes off the calling thread entirely.
+
+    Checkpoints are keyed by the Datastream's server resource id, which,
+    unlike its internal id, is the same for the Datastream discovered again
+    after a restart; a Datastream without one cannot be checkpointed.
+
+    After a restart, ``resume()`` loads the checkpoints of all given streams
+    in one read and fetches what each one missed from the server's archive
+    before its live messages, see ``Datastream.fill_gap()``. Observations
+    recorded since the last commit are delivered again, never lost.
+    """
+
+    def __init__(self, datastore: DataStore, commit_interval: float = 5.0, max_pending: int = 1000):
+        """
+        :param datastore: the store checkpoints are committed to
+        :param commit_interval: seconds after which changed checkpoints are committed
+        :param max_pending: number of changed checkpoints that triggers an immediate commit
+        """
+        self._datastore = datastore
+        self.commit_interval = commit_interval
+        self.max_pending = max_pending
+        self._checkpoints: dict[str, Checkpoint] = {}
+        self._pending: set[str] = set()
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self._last_commit = time.monotonic()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _key(datastream: Datastream | str) -> str:
+        if isinstance(datastream, str):
+            return datastream
+        if datastream._resource_id is None:
+            raise ValueError(f"Datastream {datastream.get_internal_id()} has no server resource id to checkpoint")
+        return datastream._resource_id
+
+    def record(self, datastream: Datastream, result_time: str = None, count: int = 1):
+        """
+        Marks observations of *datastream* as processed.
+        :param result_time: resultTime of the last processed observation, defaults to the last one the datastream
+            received
+        :param count: number of observations processed since the previous call
+        """
+        key = self._key(datastream)
+        if result_time is None:
+            result_time = datastream._last_result_time
+        with self._lock:
+            checkpoint = self._checkpoints.get(key)
+            if checkpoint is None:
+                checkpoint = self._checkpoints[key] = Checkpoint(key)
+            checkpoint.result_time = result_time
+            checkpoint.count += count
+            self._pending.add(key)
+            due = len(self._pending) >= self.max_pending or (
+                self._thread is None and time.monotonic() - self._last_commit >= self.commit_interval)
+        if due:
+            self.commit()
+
+    def get(self, datastream: Datastream | str) -> Optional[Checkpoint]:
+        """The current checkpoint of *datastream*, committed or not, loading it from the store if necessary."""
+        key = self._key(datastream)
+        with self._lock:
+            checkpoint = self._checkpoints.get(key)
+        if checkpoint is None:
+            checkpoint = self.load([key]).get(key)
+        return replace(checkpoint) if checkpoint is not None else None
+
+    def load(self, datastreams: Iterable[Datastream | str]) -> dict[str, Checkpoint]:
+        """
+        Reads the stored checkpoints of *datastreams* in one batch. Checkpoints recorded in this process are kept.
+        :return: resource id -> Checkpoint, for the streams that have one
+        """
+        stored = self._datastore.load_checkpoints([self._key(ds) for ds in datastreams])
+        with self._lock:
+            for key, checkpoint in stored.items():
+                stored[key] = self._checkpoints.setdefault(key, checkpoint)
+        return stored
+
+    def get_pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def commit(self) -> int:
+        """
+        Writes the checkpoints changed since the last commit in one batch.
+        :return: the number of checkpoints written
+        """
+        with self._commit_lock:
+            with self._lock:
+                batch = [replace(self._checkpoints[key]) for key in self._pending]
+                self._pending.clear()
+                self._last_commit = time.monotonic()
+            if not batch:
+                return 0
+            try:
+                self._datastore.save_checkpoints(batch)
+            except Exception:
+                with self._lock:
+                    # Retried by the next commit, unless recorded again meanwhile
+                    self._pending.update(cp.stream_id for cp in batch)
+                raise
+            return len(batch)
+
+    def start(self):
+        """Commits changed checkpoints every ``commit_interval`` seconds on a background thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="checkpoint-committer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.commit_interval):
+            try:
+                self.commit()
+            except Exception as e:
+                logging.error("Committing consumer checkpoints failed: %s", e)
+
+    def close(self):
+        """Stops the background thread and commits what is pending."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.commit()
+
+    def resume(self, datastreams: Iterable[Datastream], start: bool = True) -> list:
+        """
+        Resumes *datastreams* from their checkpoints. Each datastream with a checkpoint continues after the
+        checkpoint's resultTime: live messages are held back while the observations archived since then are fetched,
+        then both are delivered in order (``Node.fill_gaps()``). Datastreams without a checkpoint just start.
+        :param start: also start the datastreams, which must be initialized
+        :return: the asyncio Tasks or concurrent.futures.Futures of the archive catch-ups, one per Node
+        """
+        datastreams = list(datastreams)
+        checkpoints = self.load(datastreams)
+        catch_up: dict[int, tuple[Node, list[Datastream]]] = {}
+        for ds in datastreams:
+            checkpoint = checkpoints.get(self._key(ds))
+            if checkpoint is not None and checkpoint.result_time is not None:
+                ds._last_result_time = checkpoint.result_time
+                ds._last_result_keys = frozenset()
+                ds._last_live_payloads = None
+                if ds._begin_gap_fill(skip_since=True):
+                    node = ds.get_parent_node()
+                    catch_up.setdefault(id(node), (node, []))[1].append(ds)
+            if start:
+                ds.start()
+        return [node.get_session().run_stream(node.fill_gaps(streams)) for node, streams in catch_up.values()]
@@ -0,0 +1,56 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   Date:  2024/5/28
+#   Author:  Ian Patterson
+#   Contact Email:  ian@botts-inc.com
+#   ==============================================================================
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ConsumerGroup:
+    """Membership of this process in a group of workers sharing the consumption of a Node's datastreams.
+
+    Without *affinity*, subscriptions made with the group become MQTT v5
+    shared subscriptions, ``$share/{name}/{topic}``: the broker hands each
+    message to one member of the group, balancing the load but giving no
+    guarantee that the messages of one datastream reach the same member, so
+    their order across members is lost.
+
+    With *affinity*, every datastream is owned by exactly one of the
+    *member_count* members, chosen by rendezvous hashing of its resource id.
+    A member only subscribes to the datastreams it owns, with plain
+    subscriptions, so each datastream's messages arrive at one process in
+    order. Every member computes the same assignment without coordinating,
+    and when the group grows or shrinks only the datastreams of the members
+    added or removed change hands.
+    """
+    name: str
+    member_index: int = 0
+    member_count: int = 1
+    affinity: bool = False
+
+    def __post_init__(self):
+        if '/' in self.name or '+' in self.name or '#' in self.name:
+            raise ValueError(f"Invalid consumer group name {self.name!r}: must not contain '/', '+' or '#'")
+        if not 0 <= self.member_index < self.member_count:
+            raise ValueError(f"member_index {self.member_index} out of range for {self.member_count} members")
+
+    def shared_topic(self, topic: str) -> str:
+        """The shared subscription filter distributing *topic* over the group."""
+        return f'$share/{self.name}/{topic}'
+
+    def owner_of(self, key: str) -> int:
+        """Index of the member that owns the datastream with resource id *key*."""
+        return max(range(self.member_count), key=lambda member: self._weight(key, member))
+
+    def owns(self, key: str) -> bool:
+        return self.owner_of(key) == self.member_index
+
+    def _weight(self, key: str, member: int) -> bytes:
+        # Stable across processes, unlike hash()
+        return hashlib.blake2b(f'{self.name}\x00{key}\x00{member}'.encode('utf-8'), digest_size=8).digest()
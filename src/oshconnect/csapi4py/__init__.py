@@ -4,6 +4,7 @@ from .constants import APIResourceTypes, ObservationFormat, ContentTypes, APITer
 from .con_sys_api import ConnectedSystemsRequestBuilder, ConnectedSystemAPIRequest
 from .mqtt import MQTTCommClient
 from .default_api_helpers import APIHelper
+from .querymodel import QueryModel
 
 __all__ = [
     # Constants / enums
@@ -19,4 +20,6 @@ __all__ = [
     "MQTTCommClient",
     # API helper
     "APIHelper",
+    # Query parameters
+    "QueryModel",
 ]
@@ -129,11 +129,13 @@ class APIHelper(ABC):
 
     def retrieve_resource(self, res_type: APIResourceTypes, res_id: str = None, parent_res_id: str = None,
                           from_collection: bool = False,
-                          collection_id: str = None, url_endpoint: str = None, req_headers: dict = None):
+                          collection_id: str = None, url_endpoint: str = None, req_headers: dict = None,
+                          params: dict = None):
         """
         Retrieves a resource or list of resources if no res_id is provided, will attempt to retrieve a sub-resource if
         parent_res_id is provided.
         :param req_headers:
+        :param params: Optional query parameters (e.g. resultTime, limit) to add to the request
         :param res_type:
         :param res_id:
         :param parent_res_id:
@@ -142,17 +144,38 @@ class APIHelper(ABC):
         :param url_endpoint: If given, will override the default URL construction. Should contain the endpoint past the API root.
         :return:
         """
+        if req_headers is None:
+            req_headers = {}
+        if params is None:
+            params = {}
         if url_endpoint is None:
             url = self.resource_url_resolver(res_type, res_id, parent_res_id, from_collection)
         else:
             url = f'{self.server_url}/{self.api_root}/{url_endpoint}'
         api_request = ConnectedSystemAPIRequest(url=url, request_method='GET', auth=self.get_helper_auth(),
-                                                headers=req_headers)
+                                                headers=req_headers, params=params)
+        return api_request.make_request()
+
+    def retrieve_url(self, url: str, params: dict = None, req_headers: dict = None):
+        """
+        Retrieves an absolute URL using this helper's credentials. Used to follow paging links (rel="next") returned
+        by the server.
+        :param url: Fully qualified URL
+        :param params: Optional query parameters
+        :param req_headers:
+        :return:
+        """
+        if req_headers is None:
+            req_headers = {}
+        if params is None:
+            params = {}
+        api_request = ConnectedSystemAPIRequest(url=url, request_method='GET', auth=self.get_helper_auth(),
+                                                headers=req_headers, params=params)
         return api_request.make_request()
 
     def get_resource(self, resource_type: APIResourceTypes, resource_id: str = None,
                      subresource_type: APIResourceTypes = None,
-                     req_headers: dict = None):
+                     req_headers: dict = None, params: dict = None):
 
         """
         Helper to get resources by type, specifically by id, and optionally a sub-resource collection of a specified resource.
@@ -160,17 +183,20 @@ class APIHelper(ABC):
         :param resource_id:
         :param subresource_type:
         :param req_headers:
+        :param params: Optional query parameters, e.g. from QueryModel.to_params()
         :return:
         """
         if req_headers is None:
             req_headers = {}
+        if params is None:
+            params = {}
         base_api_url = self.get_api_root_url()
         resource_type_str = resource_type_to_endpoint(resource_type)
         res_id_str = f'/{resource_id}' if resource_id else ""
         sub_res_type_str = f'/{resource_type_to_endpoint(subresource_type)}' if subresource_type else ""
         complete_url = f'{base_api_url}/{resource_type_str}{res_id_str}{sub_res_type_str}'
         api_request = ConnectedSystemAPIRequest(url=complete_url, request_method='GET', auth=self.get_helper_auth(),
-                                                headers=req_headers)
+                                                headers=req_headers, params=params)
         return api_request.make_request()
 
     def update_resource(self, res_type: APIResourceTypes, res_id: str, json_data: any, parent_res_id: str = None,
@@ -1,12 +1,18 @@
 import logging
+import threading
+import time
+
 import paho.mqtt.client as mqtt
 
+from ..spool import SpoolFullError
+
 logger = logging.getLogger(__name__)
 
 
 class MQTTCommClient:
     def __init__(self, url, port=1883, username=None, password=None, path='mqtt', client_id_suffix="",
-                 transport='tcp', use_tls=False, reconnect_delay=5):
+                 transport='tcp', use_tls=False, reconnect_delay=5, spool=None, spool_rate=100.0,
+                 use_v5=False):
         """
     Wraps a paho mqtt client to provide a simple interface for interacting with the mqtt server that is customized
     for this library.
@@ -20,6 +26,9 @@ class MQTTCommClient:
     :param transport: 'tcp' (default) or 'websockets'
     :param use_tls: explicitly enable TLS; when False (default), credentials are sent without TLS
     :param reconnect_delay: seconds between automatic reconnect attempts on disconnect (0 disables)
+    :param spool: optional OutboundSpool that keeps messages published while disconnected, see ``set_spool``
+    :param spool_rate: messages per second at which the spool is drained after (re)connecting
+    :param use_v5: speak MQTT v5 instead of v3.1.1, required by most brokers for shared subscriptions
     """
         self.__url = url
         self.__port = port
@@ -27,11 +36,13 @@ class MQTTCommClient:
         self.__client_id = f'oscapy_mqtt-{client_id_suffix}'
         self.__transport = transport
         self.__reconnect_delay = reconnect_delay
+        self.__protocol = mqtt.MQTTv5 if use_v5 else mqtt.MQTTv311
 
         self.__client = mqtt.Client(
             mqtt.CallbackAPIVersion.VERSION2,
             client_id=self.__client_id,
             transport=self.__transport,
+            protocol=self.__protocol,
         )
 
         if self.__transport == 'websockets':
@@ -51,15 +62,54 @@ class MQTTCommClient:
         self.__client.on_disconnect = self._on_disconnect
 
         self.__is_connected = False
+        self.__has_connected = False
+        # Topic -> qos of the active subscriptions, renewed after a reconnect since the broker forgets them
+        self.__subscriptions = {}
+        self.__reconnect_listeners = []
+        self.__spool = None
+        self.__spool_rate = spool_rate
+        # Guards the decision to spool a message against the drain thread finishing
+        self.__spool_lock = threading.Lock()
+        self.__draining = False
+        if spool is not None:
+            self.set_spool(spool, spool_rate)
 
     def _on_connect(self, client, userdata, flags, rc, properties):
         if rc == mqtt.MQTT_ERR_SUCCESS:
             self.__is_connected = True
             logger.info('MQTT connected to %s:%s (rc=%s)', self.__url, self.__port, rc)
+            if self.__has_connected:
+                self._on_reconnect()
+            self.__has_connected = True
+            self._start_drain()
         else:
             self.__is_connected = False
             logger.error('MQTT connection failed: rc=%s (%s)', rc, mqtt.error_string(rc))
 
+    def _on_reconnect(self):
+        for topic, qos in list(self.__subscriptions.items()):
+            self.__client.subscribe(topic, qos)
+        for listener in list(self.__reconnect_listeners):
+            try:
+                listener()
+            except Exception as exc:
+                logger.error('MQTT reconnect listener failed: %s', exc)
+
+    def add_reconnect_listener(self, listener):
+        """
+        Registers a callable invoked without arguments, on the network thread, each time the client reconnects after
+        losing its connection. Subscriptions are renewed before the listeners run; messages published while the client
+        was offline are not replayed.
+
+        :param listener: callable()
+        :return:
+        """
+        self.__reconnect_listeners.append(listener)
+
+    def remove_reconnect_listener(self, listener):
+        if listener in self.__reconnect_listeners:
+            self.__reconnect_listeners.remove(listener)
+
     def _on_subscribe(self, client, userdata, mid, granted_qos, properties):
         logger.debug('MQTT subscribed: mid=%s granted_qos=%s', mid, granted_qos)
 
@@ -90,7 +140,7 @@ class MQTTCommClient:
             logger.error('MQTT connect failed: %s', exc)
             raise
 
-    def subscribe(self, topic, qos=0, msg_callback=None):
+    def subscribe(self, topic, qos=0, msg_callback=None, share_group=None):
         """
         Subscribe to a topic, and optionally set a callback for when a message is received on that topic. To actually
         retrieve any information you must set a callback.
@@ -98,24 +148,119 @@ class MQTTCommClient:
         :param topic: MQTT topic to subscribe to (example/topic)
         :param qos: quality of service, 0, 1, or 2
         :param msg_callback: callback with the form: callback(client, userdata, msg)
+        :param share_group: if given, subscribe with the shared subscription $share/{share_group}/{topic}, so that the
+        broker delivers each message to only one of the clients subscribed with the same group
         :return:
         """
         if not self.__is_connected:
             logger.warning('MQTT subscribe called on %s while not connected — message will be queued by paho', topic)
-        self.__client.subscribe(topic, qos)
+        sub_topic = self.shared_topic(topic, share_group)
+        if share_group is not None and self.__protocol != mqtt.MQTTv5:
+            logger.warning('MQTT shared subscription %s on a v3.1.1 connection, the broker may not support it',
+                           sub_topic)
+        self.__client.subscribe(sub_topic, qos)
+        self.__subscriptions[sub_topic] = qos
         if msg_callback is not None:
             self.__client.message_callback_add(topic, msg_callback)
         logger.debug('MQTT subscribed to topic: %s (qos=%s)', topic, qos)
 
     def publish(self, topic, payload=None, qos=0, retain=False):
-        if not self.__is_connected:
+        if self.__spool is not None:
+            with self.__spool_lock:
+                # Anything still in the spool goes first, so messages keep their order
+                if not self.__is_connected or self.__draining or len(self.__spool):
+                    self._spool_message(topic, payload, qos, retain)
+                    return
+        elif not self.__is_connected:
             logger.warning('MQTT publish called on %s while not connected — message may be lost', topic)
         result = self.__client.publish(topic, payload, qos, retain=retain)
-        if result.rc != mqtt.MQTT_ERR_SUCCESS:
+        if result.rc == mqtt.MQTT_ERR_NO_CONN and self.__spool is not None:
+            with self.__spool_lock:
+                self._spool_message(topic, payload, qos, retain)
+        elif result.rc != mqtt.MQTT_ERR_SUCCESS:
             logger.error('MQTT publish error on %s: rc=%s (%s)', topic, result.rc, mqtt.error_string(result.rc))
 
-    def unsubscribe(self, topic):
+    def set_spool(self, spool, rate=100.0):
+        """
+        Enables store-and-forward publishing: while the client is not connected, published messages are appended to
+        *spool* instead of being dropped, and after the next (re)connect they are sent from a background thread at no
+        more than *rate* messages per second. Messages published while the spool is not empty are queued behind it,
+        so per-topic order is preserved. Pass None to disable.
+
+        :param spool: OutboundSpool, or None
+        :param rate: messages per second when draining (0 for no limit)
+        :return:
+        """
+        with self.__spool_lock:
+            self.__spool = spool
+            self.__spool_rate = rate
+        if self.__is_connected:
+            self._start_drain()
+
+    def get_spool(self):
+        return self.__spool
+
+    def _spool_message(self, topic, payload, qos, retain):
+        try:
+            self.__spool.append(topic, payload if payload is not None else b'', qos=qos, retain=retain)
+        except SpoolFullError as exc:
+            logger.error('MQTT message on %s lost: %s', topic, exc)
+
+    def _start_drain(self):
+        with self.__spool_lock:
+            if self.__spool is None or self.__draining or not len(self.__spool):
+                return
+            self.__draining = True
+        threading.Thread(target=self._drain_spool, args=(self.__spool,), name='mqtt-spool-drain', daemon=True).start()
+
+    def _drain_spool(self, spool):
+        interval = 1.0 / self.__spool_rate if self.__spool_rate else 0.0
+        next_send = time.monotonic()
+        sent = 0
+        try:
+            while self.__is_connected:
+                batch = spool.peek(100)
+                if not batch:
+                    with self.__spool_lock:
+                        # publish() spools under the same lock, so nothing can slip in behind this check
+                        if not len(spool):
+                            self.__draining = False
+                            logger.info('MQTT outbound spool drained: %s messages sent', sent)
+                            return
+                    continue
+                for message, position in batch:
+                    time.sleep(max(0.0, next_send - time.monotonic()))
+                    if not self.__is_connected:
+                        break
+                    result = self.__client.publish(message.topic, message.payload, message.qos, retain=message.retain)
+                    if result.rc != mqtt.MQTT_ERR_SUCCESS:
+                        logger.warning('MQTT spool drain paused on %s: rc=%s (%s)', message.topic, result.rc,
+                                       mqtt.error_string(result.rc))
+                        time.sleep(1.0)
+                        break
+                    spool.ack(position)
+                    sent += 1
+                    next_send = max(next_send, time.monotonic()) + interval
+        except Exception as exc:
+            logger.error('MQTT outbound spool drain failed: %s', exc)
+            with self.__spool_lock:
+                self.__draining = False
+            return
+        with self.__spool_lock:
+            self.__draining = False
+        # Reconnected while this thread was winding down: _on_connect could not start another one
+        if self.__is_connected:
+            self._start_drain()
+
+    @staticmethod
+    def shared_topic(topic, share_group=None):
+        # Messages arrive on the plain topic, so callbacks are always registered for that
+        return topic if share_group is None else f'$share/{share_group}/{topic}'
+
+    def unsubscribe(self, topic, share_group=None):
+        topic = self.shared_topic(topic, share_group)
         self.__client.unsubscribe(topic)
+        self.__subscriptions.pop(topic, None)
         logger.debug('MQTT unsubscribed from topic: %s', topic)
 
     def disconnect(self):
@@ -213,5 +358,8 @@ class MQTTCommClient:
     def is_connected(self):
         return self.__is_connected
 
+    def is_v5(self):
+        return self.__protocol == mqtt.MQTTv5
+
     def tls_set(self):
         self.__client.tls_set()
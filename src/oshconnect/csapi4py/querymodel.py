@@ -1,25 +1,84 @@
 from datetime import datetime
-from typing import Union, Optional, List
+from typing import Any, Iterable, Union, Optional, List
 
-from pydantic import BaseModel, StrictStr, Field, field_validator
+from pydantic import BaseModel, ConfigDict, StrictStr, Field, field_validator
+from shapely.geometry import shape
 
 
 class QueryModel(BaseModel):
+    """
+    Query parameters of a CS API resource listing (systems, datastreams, control streams, observations, ...).
+    Only the fields that were explicitly set are sent to the server, see ``to_params()``.
+    """
+    model_config = ConfigDict(populate_by_name=True)
+
     id: list = None
     bbox: list = None
     date_time: Union[StrictStr, datetime] = Field(None, alias='datetime')
-    geom: dict = None
-    q: list = Optional[List[str]]
+    geom: Any = None
+    location: Any = None
+    q: Optional[List[str]] = None
     parent: list = None
     procedure: list = None
     foi: list = None
     observed_property: list = Field(None, serialization_alias='observedProperty')
     controlled_property: list = Field(None, serialization_alias='controlledProperty')
+    valid_time: Any = Field(None, alias='validTime')
+    phenomenon_time: Any = Field(None, alias='phenomenonTime')
+    result_time: Any = Field(None, alias='resultTime')
     recursive: bool = False
+    select: Optional[List[str]] = None
+    format: str = None
     limit: int = Field(10, ge=1, le=10000)
+    offset: str = None
 
-    @field_validator('q')
+    @field_validator('q', 'select', mode='before')
     def validate_q(cls, v):
-        if v is not None:
+        if isinstance(v, str):
             return v.split(',')
         return v
+
+    @staticmethod
+    def _format(name: str, value) -> str:
+        if name in ('geom', 'location') and not isinstance(value, str):
+            # shapely geometries have a WKT form, GeoJSON dicts and Geometry models are converted first
+            if hasattr(value, 'model_dump'):
+                value = value.model_dump(mode='json', exclude_none=True)
+            return (shape(value) if isinstance(value, dict) else value).wkt
+        if isinstance(value, bool):
+            return str(value).lower()
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if hasattr(value, 'start') and hasattr(value, 'end'):
+            # TimePeriod
+            return f'{value.start}/{value.end}'
+        if isinstance(value, (list, tuple)):
+            return ','.join(str(v) for v in value)
+        return str(value)
+
+    def to_params(self, keep_fields: Iterable[str] = ()) -> dict:
+        """
+        Translates the query into request parameters.
+
+        :param keep_fields: properties the caller needs in every result. They are added to an inclusive ``select``
+            and removed from the exclusions (``!name``) of an exclusive one, so a projection cannot strip them.
+        :return: dict of query parameter names to string values
+        """
+        params = {}
+        for name, field in type(self).model_fields.items():
+            value = getattr(self, name)
+            if name not in self.model_fields_set or value is None:
+                continue
+            if name == 'select':
+                value = self._projection(value, keep_fields)
+                if not value:
+                    continue
+            params[field.serialization_alias or field.alias or name] = self._format(name, value)
+        return params
+
+    @staticmethod
+    def _projection(select: list[str], keep_fields: Iterable[str]) -> list[str]:
+        keep = list(keep_fields)
+        if all(prop.startswith('!') for prop in select):
+            return [prop for prop in select if prop[1:] not in keep]
+        return select + [prop for prop in keep if prop not in select]
@@ -7,18 +7,95 @@
 
 from __future__ import annotations
 
+import gc
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Optional
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Optional
 
 if TYPE_CHECKING:
     from .streamableresource import Node, System, Datastream, ControlStream, SessionManager
 
 
+@contextmanager
+def paused_gc() -> Iterator[None]:
+    """Suspend the cyclic garbage collector while a large resource graph is deserialized.
+
+    Bulk loads allocate tens of thousands of long-lived objects, each of which
+    counts towards the collector's thresholds and triggers repeated full
+    traversals of everything already loaded. Nothing allocated here is garbage,
+    so deferring collection to the end of the block only saves that work.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def loaded_resources(resources) -> Iterable:
+    """The in-memory items of a resource list; entries a LazyResourceList has not materialized yet are skipped."""
+    loaded_items = getattr(resources, "loaded_items", None)
+    return loaded_items() if callable(loaded_items) else resources or ()
+
+
+def iter_graph(resources: Iterable) -> Iterator:
+    """Yield every Node, System, Datastream and ControlStream in *resources* along with its in-memory descendants."""
+    for resource in resources:
+        yield resource
+        systems = getattr(resource, "systems", None)
+        if callable(systems):
+            yield from iter_graph(loaded_resources(systems()))
+        elif hasattr(resource, "control_channels"):
+            yield from loaded_resources(resource.datastreams)
+            yield from loaded_resources(resource.control_channels)
+
+
+def mark_loaded(resources: Iterable) -> None:
+    """Mark freshly loaded resources and their descendants as matching what is stored."""
+    for resource in iter_graph(resources):
+        resource.mark_clean()
+
+
+def graph_versions(resources: Iterable) -> list[tuple[Any, int]]:
+    """``(resource, version)`` for everything ``iter_graph`` yields, taken before serializing it for a save."""
+    return [(resource, resource.get_version()) for resource in iter_graph(resources)]
+
+
+def mark_saved(versions: Iterable[tuple[Any, int]]) -> None:
+    """Mark resources clean at the versions captured by ``graph_versions`` before they were written."""
+    for resource, version in versions:
+        resource.mark_clean(version)
+
+
+@dataclass
+class Checkpoint:
+    """How far a consumer has processed a Datastream, see ``CheckpointManager``.
+
+    *stream_id* is the Datastream's server resource id, the id it is stored
+    under; *result_time* the resultTime of the last processed observation and
+    *count* the number of observations processed so far.
+    """
+    stream_id: str
+    result_time: Optional[str] = None
+    count: int = 0
+
+    def to_dict(self) -> dict:
+        return {"result_time": self.result_time, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, stream_id: str, data: dict) -> Checkpoint:
+        return cls(stream_id, data.get("result_time"), data.get("count", 0))
+
+
 class DataStore(ABC):
     """Abstract interface for persisting OSHConnect resource graphs.
 
     Implementations must provide CRUD operations for Node, System, Datastream,
-    and ControlStream objects. Observations are out of scope.
+    and ControlStream objects. Observations are out of scope here; they are
+    kept in an ``ObservationStore``.
 
     The ``load_all`` / ``load_node`` / ``load_all_nodes`` methods accept an
     optional *session_manager* so that deserialized Nodes can register a client
@@ -126,11 +203,111 @@ class DataStore(ABC):
     # Bulk operations
     # ------------------------------------------------------------------
 
+    def save_nodes(self, nodes: list[Node]) -> None:
+        """Persist several Nodes. Backends should override this to write them in one batch."""
+        for node in nodes:
+            self.save_node(node)
+
+    def save_systems(self, systems: list[System], node: Node) -> None:
+        """Persist several Systems under *node*. Backends should override this to write them in one batch."""
+        for system in systems:
+            self.save_system(system, node)
+
+    def save_datastreams(self, datastreams: list[Datastream], node: Node, system: System = None) -> None:
+        """
+        Persist several Datastreams. Backends should override this to write them in one batch.
+        :param system: the System all of them belong to, if known, to spare the backend from looking it up
+        """
+        for datastream in datastreams:
+            self.save_datastream(datastream, node)
+
+    def save_controlstreams(self, controlstreams: list[ControlStream], node: Node, system: System = None) -> None:
+        """
+        Persist several ControlStreams. Backends should override this to write them in one batch.
+        :param system: the System all of them belong to, if known, to spare the backend from looking it up
+        """
+        for controlstream in controlstreams:
+            self.save_controlstream(controlstream, node)
+
     @abstractmethod
     def save_all(self, nodes: list[Node]) -> None:
         """Persist an entire Node graph (nodes + their systems + streams)."""
         ...
 
+    @property
+    def embeds_children(self) -> bool:
+        """True if stored Nodes and Systems contain their children, so a changed child also rewrites its parents."""
+        return False
+
+    def save_changes(self, nodes: list[Node]) -> int:
+        """
+        Persist only the resources that changed since they were last saved or loaded (see ``ChangeTracked``), in
+        one transaction when the backend provides ``transaction()``. Resources a LazyResourceList has not
+        materialized cannot have changed and are skipped without loading them. Systems removed with
+        ``Node.remove_system()`` are deleted, along with their streams.
+        :return: the number of resources written
+        """
+        embeds = self.embeds_children
+        written = []
+        deletes = {"system": self.delete_system, "datastream": self.delete_datastream,
+                   "controlstream": self.delete_controlstream}
+        removed = [(node, dict(node._removed_resources)) for node in nodes]
+        transaction = getattr(self, "transaction", None)
+        with transaction() if callable(transaction) else nullcontext():
+            for node, kinds in removed:
+                for resource_id, kind in kinds.items():
+                    deletes[kind](resource_id)
+            for node in nodes:
+                changed_systems = []
+                for system in loaded_resources(node.systems()):
+                    datastreams = [(ds, ds.get_version()) for ds in loaded_resources(system.datastreams)
+                                   if ds.is_dirty()]
+                    controlstreams = [(cs, cs.get_version()) for cs in loaded_resources(system.control_channels)
+                                      if cs.is_dirty()]
+                    if datastreams:
+                        self.save_datastreams([ds for ds, _ in datastreams], node, system)
+                    if controlstreams:
+                        self.save_controlstreams([cs for cs, _ in controlstreams], node, system)
+                    written.extend(datastreams + controlstreams)
+                    if system.is_dirty() or (embeds and (datastreams or controlstreams)):
+                        changed_systems.append((system, system.get_version()))
+                if changed_systems:
+                    self.save_systems([system for system, _ in changed_systems], node)
+                    written.extend(changed_systems)
+                if node.is_dirty() or (embeds and changed_systems):
+                    written.append((node, node.get_version()))
+                    self.save_node(node)
+        for node, kinds in removed:
+            for resource_id in kinds:
+                node._removed_resources.pop(resource_id, None)
+        self._mark_saved(written)
+        return len(written)
+
+    def _mark_saved(self, versions: list[tuple[Any, int]]) -> None:
+        """
+        Mark the resources ``save_changes()`` wrote clean. Stores that write asynchronously override this to do so
+        once the writes are committed.
+        """
+        mark_saved(versions)
+
+    # ------------------------------------------------------------------
+    # Consumer checkpoints
+    # ------------------------------------------------------------------
+
+    def save_checkpoints(self, checkpoints: Iterable[Checkpoint]) -> None:
+        """Persist several consumer checkpoints (upsert) in one batch."""
+        raise NotImplementedError(f"{type(self).__name__} does not store consumer checkpoints")
+
+    def load_checkpoints(self, stream_ids: Iterable[str] = None) -> dict[str, Checkpoint]:
+        """
+        Load the checkpoints of the given datastreams, or all of them.
+        :return: stream id -> Checkpoint, for the streams that have one
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not store consumer checkpoints")
+
+    def delete_checkpoints(self, stream_ids: Iterable[str]) -> None:
+        raise NotImplementedError(f"{type(self).__name__} does not store consumer checkpoints")
+
     @abstractmethod
     def load_all(self, session_manager: SessionManager = None) -> list[Node]:
         """Reconstruct the full graph from storage, returning top-level Nodes.
@@ -144,3 +321,78 @@ class DataStore(ABC):
     def close(self) -> None:
         """Release any held resources (file handles, connections)."""
         ...
+
+
+@dataclass
+class RetentionPolicy:
+    """Limits applied to a datastream's stored observations by ``ObservationStore.apply_retention``.
+
+    :param max_age: delete observations older than this many seconds
+    :param max_count: keep at most this many of the newest observations
+    :param downsample_after: observations older than this many seconds are downsampled
+    :param downsample_interval: when downsampling, keep only the first observation of each bucket of this many seconds
+    """
+    max_age: Optional[float] = None
+    max_count: Optional[int] = None
+    downsample_after: Optional[float] = None
+    downsample_interval: Optional[float] = None
+
+
+class ObservationStore(ABC):
+    """Abstract interface for a local time-series store of observations.
+
+    Observations are keyed by datastream id and result time (epoch seconds).
+    Implementations may buffer writes: anything appended is guaranteed to be
+    visible to ``query`` only after ``flush()``.
+    """
+
+    @abstractmethod
+    def append(self, datastream_id: str, epoch: float, observation: Any) -> None:
+        """Queue one observation (a JSON-serializable dict, or raw JSON str/bytes) for writing."""
+        ...
+
+    def append_many(self, rows: Iterable[tuple[str, float, Any]]) -> None:
+        """Queue several ``(datastream_id, epoch, observation)`` rows for writing."""
+        for datastream_id, epoch, observation in rows:
+            self.append(datastream_id, epoch, observation)
+
+    @abstractmethod
+    def query(self, datastream_id: str, start: float = None, end: float = None, limit: int = None,
+              descending: bool = False) -> list[tuple[float, dict]]:
+        """Return ``(epoch, observation)`` pairs with ``start <= epoch <= end`` in time order."""
+        ...
+
+    @abstractmethod
+    def latest(self, datastream_id: str) -> Optional[tuple[float, dict]]:
+        """Return the newest stored ``(epoch, observation)`` pair, or None."""
+        ...
+
+    @abstractmethod
+    def count(self, datastream_id: str = None) -> int:
+        """Number of stored observations, for one datastream or in total."""
+        ...
+
+    @abstractmethod
+    def delete_range(self, datastream_id: str, start: float = None, end: float = None) -> int:
+        """Delete observations with ``start <= epoch <= end``. Returns the number deleted."""
+        ...
+
+    @abstractmethod
+    def set_retention(self, policy: Optional[RetentionPolicy], datastream_id: str = None) -> None:
+        """Set the retention policy for one datastream, or the default for all when *datastream_id* is None."""
+        ...
+
+    @abstractmethod
+    def apply_retention(self, now: float = None) -> int:
+        """Apply retention policies. Returns the number of observations deleted."""
+        ...
+
+    @abstractmethod
+    def flush(self) -> None:
+        """Block until every queued observation has been written."""
+        ...
+
+    @abstractmethod
+    def close(self) -> None:
+        """Flush and release any held resources."""
+        ...
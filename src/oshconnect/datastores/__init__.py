@@ -2,6 +2,18 @@
 #   Copyright (c) 2024 Botts Innovative Research, Inc.
 #   ==============================================================================
 
+from .background_store import BackgroundDataStore
+from .file_store import JSONFileDataStore
+from .lazy import LazyResourceList
+from .sqlite_observation_store import SQLiteObservationStore
 from .sqlite_store import SQLiteDataStore
+from .tinydb_store import TinyDBDataStore
 
-__all__ = ["SQLiteDataStore"]
+__all__ = [
+    "BackgroundDataStore",
+    "JSONFileDataStore",
+    "LazyResourceList",
+    "SQLiteDataStore",
+    "SQLiteObservationStore",
+    "TinyDBDataStore",
+]
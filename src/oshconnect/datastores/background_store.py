@@ -0,0 +1,404 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   Date:  2024/5/28
+#   Author:  Ian Patterson
+#   Contact Email:  ian@botts-inc.com
+#   ==============================================================================
+
+from __future__ import annotations
+
+import dataclasses
+import itertools
+import logging
+import threading
+import time
+from contextlib import nullcontext
+from typing import Optional
+
+from ..datastore import Checkpoint, DataStore, graph_versions, mark_saved
+from ..streamableresource import (
+    ControlStream,
+    Datastream,
+    Node,
+    SessionManager,
+    System,
+)
+
+_DELETE = object()
+
+
+class _Snapshot:
+    """A resource as it was when its save was requested.
+
+    ``serialize()`` returns the data captured on the requesting thread, so the
+    writer never reads a resource that other threads keep changing; ids and
+    everything else are read from the resource itself.
+    """
+    __slots__ = ("resource", "_kwargs", "_data")
+
+    def __init__(self, resource, **kwargs):
+        self.resource = resource
+        self._kwargs = kwargs
+        self._data = resource.serialize(**kwargs)
+
+    def serialize(self, **kwargs) -> dict:
+        if kwargs != self._kwargs:
+            # A layout other than the wrapped store's: nothing captured for it
+            return self.resource.serialize(**kwargs)
+        return self._data
+
+    def __getattr__(self, name):
+        return getattr(self.resource, name)
+
+
+def _owning_system(stream: Datastream | ControlStream, node: Node) -> Optional[System]:
+    for system in node.systems():
+        if any(s is stream for s in system.datastreams) or any(s is stream for s in system.control_channels):
+            return system
+    return None
+
+
+class BackgroundDataStore(DataStore):
+    """Wraps any DataStore so that writes happen on a dedicated writer thread.
+
+    ``save_*`` and ``delete_*`` return immediately, which makes them safe to
+    call from event callbacks running on the MQTT network thread. Pending
+    writes are keyed by resource kind and id, so saving the same resource
+    repeatedly before the writer runs costs a single write of its latest
+    state, and a delete supersedes any pending save.
+
+    The writer waits up to *flush_interval* seconds after the first pending
+    write to coalesce more, then writes the batch through the wrapped store's
+    bulk ``save_nodes`` / ``save_systems`` / ``save_datastreams`` /
+    ``save_controlstreams`` methods, inside its ``transaction()`` when it
+    provides one. Resources are serialized when their save is requested, on
+    the calling thread; the writer only writes that snapshot.
+
+    A batch that fails is queued again, ahead of the writes requested since,
+    and given up after *max_retries* further attempts. ``save_all()`` and
+    ``save_changes()`` mark the resources clean on the writer thread once
+    their batch is committed; the resources of a batch given up on are
+    marked dirty again, so the next ``save_changes()`` writes them.
+
+    ``flush()`` blocks until every write requested before the call has been
+    attempted and re-raises the first error the writer hit. Loads flush first,
+    so reads always see earlier writes. ``close()`` flushes, stops the writer
+    and closes the wrapped store.
+    """
+
+    def __init__(self, store: DataStore, flush_interval: float = 0.5, max_pending: int = 1000,
+                 max_retries: int = 3) -> None:
+        """
+        :param store: the DataStore that performs the actual I/O
+        :param flush_interval: seconds the writer waits to coalesce further writes into a batch
+        :param max_pending: number of pending resources that triggers an immediate batch
+        :param max_retries: number of times a failed batch is written again before its writes are dropped
+        """
+        self._store = store
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._max_retries = max_retries
+        # (kind, resource id) -> (snapshot or _DELETE, node, owning system if known, failed attempts)
+        self._pending: dict[tuple[str, str], tuple] = {}
+        self._cond = threading.Condition()
+        self._io_lock = threading.RLock()
+        self._requested = 0
+        self._written = 0
+        self._flush_waiters = 0
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._marks = itertools.count()
+        self._writer = threading.Thread(target=self._run_writer, name="datastore-writer", daemon=True)
+        self._writer.start()
+
+    def get_store(self) -> DataStore:
+        return self._store
+
+    def get_pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    # ------------------------------------------------------------------
+    # Queueing
+    # ------------------------------------------------------------------
+
+    def _enqueue(self, kind: str, resource_id: str, value, node: Optional[Node], system: Optional[System] = None) -> None:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BackgroundDataStore is closed")
+            # Re-insert so the entry moves to the end and batches keep the latest request order
+            self._pending.pop((kind, resource_id), None)
+            self._pending[(kind, resource_id)] = (value, node, system, 0)
+            self._requested += 1
+            self._cond.notify_all()
+
+    def flush(self) -> None:
+        """Block until all writes requested so far are applied to the wrapped store."""
+        with self._cond:
+            target = self._requested
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                while self._written < target and self._writer.is_alive():
+                    self._cond.wait()
+            finally:
+                self._flush_waiters -= 1
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        with self._io_lock:
+            self._store.close()
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+
+    def _run_writer(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                deadline = time.monotonic() + self._flush_interval
+                while not self._closed and len(self._pending) < self._max_pending:
+                    remaining = deadline - time.monotonic()
+                    # A waiting flush() ends the coalescing window early
+                    if remaining <= 0 or self._flush_waiters:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, {}
+                target = self._requested
+                stop = self._closed
+            try:
+                if batch:
+                    self._write_batch(batch)
+            except Exception as e:
+                logging.error("Background DataStore write of %d resources failed: %s", len(batch), e)
+                self._retry(batch)
+                with self._cond:
+                    if self._error is None:
+                        self._error = e
+            with self._cond:
+                self._written = target
+                self._cond.notify_all()
+                if stop and not self._pending:
+                    return
+
+    def _write_batch(self, batch: dict[tuple[str, str], tuple]) -> None:
+        nodes: list[Node] = []
+        grouped: dict[str, dict[tuple, tuple[Node, Optional[System], list]]] = {
+            "system": {}, "datastream": {}, "controlstream": {}}
+        deletes: list[tuple[str, str]] = []
+        checkpoints: list[Checkpoint] = []
+        deleted_checkpoints: list[str] = []
+        versions: list[tuple] = []
+        for (kind, resource_id), (value, node, system, _) in batch.items():
+            if kind == "mark":
+                versions.extend(value)
+            elif kind == "checkpoint":
+                if value is _DELETE:
+                    deleted_checkpoints.append(resource_id)
+                else:
+                    checkpoints.append(value)
+            elif value is _DELETE:
+                deletes.append((kind, resource_id))
+            elif kind == "node":
+                nodes.append(value)
+            else:
+                key = (node.get_id(), id(system) if system is not None else None)
+                grouped[kind].setdefault(key, (node, system, []))[2].append(value)
+
+        transaction = getattr(self._store, "transaction", None)
+        with self._io_lock, (transaction() if callable(transaction) else nullcontext()):
+            if nodes:
+                self._store.save_nodes(nodes)
+            for node, _, systems in grouped["system"].values():
+                self._store.save_systems(systems, node)
+            for node, system, datastreams in grouped["datastream"].values():
+                self._store.save_datastreams(datastreams, node, system)
+            for node, system, controlstreams in grouped["controlstream"].values():
+                self._store.save_controlstreams(controlstreams, node, system)
+            for kind, resource_id in deletes:
+                getattr(self._store, f"delete_{kind}")(resource_id)
+            if checkpoints:
+                self._store.save_checkpoints(checkpoints)
+            if deleted_checkpoints:
+                self._store.delete_checkpoints(deleted_checkpoints)
+        # Committed: the resources now match what is stored, unless they changed after the save was requested
+        mark_saved(versions)
+
+    def _retry(self, batch: dict[tuple[str, str], tuple]) -> None:
+        given_up = {key: entry for key, entry in batch.items() if entry[3] >= self._max_retries}
+        with self._cond:
+            # Ahead of the writes requested since, which supersede the retry of the same resource
+            retried = {key: (value, node, system, attempts + 1)
+                       for key, (value, node, system, attempts) in batch.items()
+                       if key not in given_up and key not in self._pending}
+            self._pending = {**retried, **self._pending}
+            if retried:
+                # A flush() called from now on waits for the retry
+                self._requested += 1
+        if given_up:
+            logging.error("Background DataStore gave up writing %d resources after %d attempts",
+                          len(given_up), self._max_retries + 1)
+        # Moves their version past any mark taken before, so that the next save_changes() writes them
+        for (kind, _), (value, _, _, _) in given_up.items():
+            if kind not in ("mark", "checkpoint") and value is not _DELETE:
+                value.resource.mark_dirty()
+
+    def _mark_saved(self, versions: list[tuple]) -> None:
+        # Queued behind the writes, so that it is applied by the batch that commits them or a later one
+        if versions:
+            self._enqueue("mark", str(next(self._marks)), versions, None)
+
+    # ------------------------------------------------------------------
+    # Node
+    # ------------------------------------------------------------------
+
+    def save_node(self, node: Node) -> None:
+        self._enqueue("node", node.get_id(), _Snapshot(node, include_systems=self.embeds_children), None)
+
+    def save_nodes(self, nodes: list[Node]) -> None:
+        for node in nodes:
+            self.save_node(node)
+
+    def load_node(self, node_id: str, session_manager: SessionManager = None) -> Optional[Node]:
+        self.flush()
+        with self._io_lock:
+            return self._store.load_node(node_id, session_manager=session_manager)
+
+    def load_all_nodes(self, session_manager: SessionManager = None) -> list[Node]:
+        self.flush()
+        with self._io_lock:
+            return self._store.load_all_nodes(session_manager=session_manager)
+
+    def delete_node(self, node_id: str) -> None:
+        self._enqueue("node", node_id, _DELETE, None)
+
+    # ------------------------------------------------------------------
+    # System
+    # ------------------------------------------------------------------
+
+    def save_system(self, system: System, node: Node) -> None:
+        self._enqueue("system", str(system.get_internal_id()), _Snapshot(system, include_streams=self.embeds_children),
+                      node)
+
+    def save_systems(self, systems: list[System], node: Node) -> None:
+        for system in systems:
+            self.save_system(system, node)
+
+    def load_system(self, system_id: str, node: Node) -> Optional[System]:
+        self.flush()
+        with self._io_lock:
+            return self._store.load_system(system_id, node)
+
+    def load_systems_for_node(self, node_id: str, node: Node) -> list[System]:
+        self.flush()
+        with self._io_lock:
+            return self._store.load_systems_for_node(node_id, node)
+
+    def delete_system(self, system_id: str) -> None:
+        self._enqueue("system", system_id, _DELETE, None)
+
+    # ------------------------------------------------------------------
+    # Datastream
+    # ------------------------------------------------------------------
+
+    def save_datastream(self, datastream: Datastream, node: Node) -> None:
+        self.save_datastreams([datastream], node)
+
+    def save_datastreams(self, datastreams: list[Datastream], node: Node, system: System = None) -> None:
+        for datastream in datastreams:
+            # The wrapped store cannot find the owner of a snapshot in the graph by identity
+            owner = system if system is not None else _owning_system(datastream, node)
+            self._enqueue("datastream", str(datastream.get_internal_id()), _Snapshot(datastream), node, owner)
+
+    def load_datastream(self, datastream_id: str, node: Node) -> Optional[Datastream]:
+        self.flush()
+        with self._io_lock:
+            return self._store.load_datastream(datastream_id, node)
+
+    def load_datastreams_for_system(self, system_id: str, node: Node) -> list[Datastream]:
+        self.flush()
+        with self._io_lock:
+            return self._store.load_datastreams_for_system(system_id, node)
+
+    def delete_datastream(self, datastream_id: str) -> None:
+        self._enqueue("datastream", datastream_id, _DELETE, None)
+
+    # ------------------------------------------------------------------
+    # ControlStream
+    # ------------------------------------------------------------------
+
+    def save_controlstream(self, controlstream: ControlStream, node: Node) -> None:
+        self.save_controlstreams([controlstream], node)
+
+    def save_controlstreams(self, controlstreams: list[ControlStream], node: Node, system: System = None) -> None:
+        for controlstream in controlstreams:
+            owner = system if system is not None else _owning_system(controlstream, node)
+            self._enqueue("controlstream", str(controlstream.get_internal_id()), _Snapshot(controlstream), node, owner)
+
+    def load_controlstream(self, controlstream_id: str, node: Node) -> Optional[ControlStream]:
+        self.flush()
+        with self._io_lock:
+            return self._store.load_controlstream(controlstream_id, node)
+
+    def load_controlstreams_for_system(self, system_id: str, node: Node) -> list[ControlStream]:
+        self.flush()
+        with self._io_lock:
+            return self._store.load_controlstreams_for_system(system_id, node)
+
+    def delete_controlstream(self, controlstream_id: str) -> None:
+        self._enqueue("controlstream", controlstream_id, _DELETE, None)
+
+    # ------------------------------------------------------------------
+    # Consumer checkpoints
+    # ------------------------------------------------------------------
+
+    def save_checkpoints(self, checkpoints) -> None:
+        """Queue checkpoints; only the latest one per stream is written by the next batch."""
+        for cp in checkpoints:
+            self._enqueue("checkpoint", cp.stream_id, dataclasses.replace(cp), None)
+
+    def load_checkpoints(self, stream_ids=None) -> dict[str, Checkpoint]:
+        self.flush()
+        with self._io_lock:
+            return self._store.load_checkpoints(stream_ids)
+
+    def delete_checkpoints(self, stream_ids) -> None:
+        for stream_id in stream_ids:
+            self._enqueue("checkpoint", stream_id, _DELETE, None)
+
+    # ------------------------------------------------------------------
+    # Bulk operations
+    # ------------------------------------------------------------------
+
+    def save_all(self, nodes: list[Node]) -> None:
+        """Queue every resource of the graph; they are written together in the next batch."""
+        versions = graph_versions(nodes)
+        for node in nodes:
+            self.save_node(node)
+            for system in node.systems():
+                self.save_system(system, node)
+                self.save_datastreams(system.datastreams, node, system)
+                self.save_controlstreams(system.control_channels, node, system)
+        self._mark_saved(versions)
+
+    @property
+    def embeds_children(self) -> bool:
+        return self._store.embeds_children
+
+    def load_all(self, session_manager: SessionManager = None) -> list[Node]:
+        self.flush()
+        with self._io_lock:
+            return self._store.load_all(session_manager=session_manager)
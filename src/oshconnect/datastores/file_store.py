@@ -0,0 +1,504 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   Date:  2024/5/28
+#   Author:  Ian Patterson
+#   Contact Email:  ian@botts-inc.com
+#   ==============================================================================
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from abc import abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from ..datastore import Checkpoint, DataStore, graph_versions, mark_loaded, mark_saved, paused_gc
+from ..streamableresource import (
+    ControlStream,
+    Datastream,
+    Node,
+    SessionManager,
+    System,
+)
+
+TABLES = ("nodes", "systems", "datastreams", "controlstreams", "checkpoints")
+
+
+class ChangeJournal:
+    """Append-only change journal with atomic snapshot compaction.
+
+    State lives in two files inside *directory*:
+
+    * ``snapshot.json`` holds every table as of the last compaction. It is only
+      ever replaced atomically (write to a temp file, fsync, ``os.replace``),
+      so it is always either the old or the new snapshot.
+    * ``journal.jsonl`` holds one JSON line per committed batch of changes
+      (``["put", table, id, row]`` / ``["del", table, id]``). A batch is a
+      single line, so a crash mid-write leaves at most one torn final line,
+      which ``load()`` discards.
+
+    Replaying puts and deletes is idempotent, so a crash between replacing the
+    snapshot and truncating the journal only replays changes that are already
+    in the snapshot.
+    """
+
+    def __init__(self, directory: str | Path, fsync: bool = True):
+        self._dir = Path(directory)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._snapshot_path = self._dir / "snapshot.json"
+        self._journal_path = self._dir / "journal.jsonl"
+        self._fsync = fsync
+        self._journal = None
+        self._entries = 0
+
+    @property
+    def entries(self) -> int:
+        """Number of changes appended since the last compaction."""
+        return self._entries
+
+    def load(self) -> dict[str, dict[str, dict]]:
+        """Read the snapshot and replay the journal, returning ``{table: {id: row}}``."""
+        self.close()
+        tables: dict[str, dict[str, dict]] = {table: {} for table in TABLES}
+        if self._snapshot_path.exists():
+            with open(self._snapshot_path, "r", encoding="utf-8") as f:
+                for table, rows in json.load(f).items():
+                    tables.setdefault(table, {}).update(rows)
+
+        good_offset = 0
+        self._entries = 0
+        if self._journal_path.exists():
+            with open(self._journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        ops = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash; everything after it is discarded
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    self.apply(tables, ops)
+                    self._entries += len(ops)
+                    good_offset += len(line)
+            if good_offset != self._journal_path.stat().st_size:
+                os.truncate(self._journal_path, good_offset)
+
+        self._journal = open(self._journal_path, "ab")
+        return tables
+
+    @staticmethod
+    def apply(tables: dict[str, dict[str, dict]], ops: list) -> None:
+        for op in ops:
+            if op[0] == "put":
+                tables[op[1]][op[2]] = op[3]
+            else:
+                tables[op[1]].pop(op[2], None)
+
+    def append(self, ops: list) -> None:
+        """Durably append one batch of changes as a single journal line."""
+        if not ops:
+            return
+        self._journal.write(json.dumps(ops, separators=(",", ":")).encode("utf-8") + b"\n")
+        self._journal.flush()
+        if self._fsync:
+            os.fsync(self._journal.fileno())
+        self._entries += len(ops)
+
+    def compact(self, tables: dict[str, dict[str, dict]]) -> None:
+        """Atomically replace the snapshot with *tables* and empty the journal."""
+        tmp_path = self._snapshot_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(tables, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._snapshot_path)
+        self._fsync_dir()
+        self._journal.truncate(0)
+        self._journal.flush()
+        if self._fsync:
+            os.fsync(self._journal.fileno())
+        self._entries = 0
+
+    def _fsync_dir(self) -> None:
+        if os.name != "posix":
+            return
+        fd = os.open(self._dir, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+class JournaledDataStore(DataStore):
+    """Base for file-backed DataStores that journal every change.
+
+    Resources are stored normalized, one row per resource: node rows hold only
+    node fields, system rows only system fields, and each datastream/control
+    stream row records its owning node and System, so a save writes just the
+    changed resource. Every ``save_*`` / ``delete_*`` call appends its delta to
+    a ``ChangeJournal``; ``save_all`` and ``transaction()`` blocks append a
+    single line, which makes them atomic. Once *compact_every* changes have
+    accumulated (and on ``close()``) the journal is folded into a fresh
+    snapshot.
+
+    Subclasses provide the table primitives ``_get``, ``_put``, ``_remove``,
+    ``_rows`` and ``_load_tables`` / ``_dump_tables``.
+    """
+
+    def __init__(self, directory: str | Path, compact_every: int = 1000, fsync: bool = True) -> None:
+        """
+        :param directory: directory holding the snapshot and journal files
+        :param compact_every: number of journaled changes that triggers compaction
+        :param fsync: fsync the journal after every batch
+        """
+        self._journal = ChangeJournal(directory, fsync=fsync)
+        self._compact_every = compact_every
+        self._lock = threading.RLock()
+        self._batch: Optional[list] = None
+        self._load_tables(self._journal.load())
+
+    # ------------------------------------------------------------------
+    # Table primitives
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def _load_tables(self, tables: dict[str, dict[str, dict]]) -> None:
+        ...
+
+    @abstractmethod
+    def _dump_tables(self) -> dict[str, dict[str, dict]]:
+        ...
+
+    @abstractmethod
+    def _get(self, table: str, resource_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def _put(self, table: str, resource_id: str, row: dict) -> None:
+        ...
+
+    @abstractmethod
+    def _remove(self, table: str, resource_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def _rows(self, table: str, **equals) -> list[dict]:
+        """Rows (in insertion order) whose fields equal the given values."""
+        ...
+
+    # ------------------------------------------------------------------
+    # Journaling
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def transaction(self) -> Iterator[JournaledDataStore]:
+        """Journal every change made in the block as one atomic batch."""
+        with self._lock:
+            if self._batch is not None:
+                yield self
+                return
+            self._batch = []
+            try:
+                yield self
+                ops = self._batch
+            except BaseException:
+                # Undo by reloading the last durable state
+                self._batch = None
+                self._load_tables(self._journal.load())
+                raise
+            self._batch = None
+            self._commit(ops)
+
+    def _record(self, op: list) -> None:
+        with self._lock:
+            if op[0] == "put":
+                self._put(op[1], op[2], op[3])
+            else:
+                self._remove(op[1], op[2])
+            if self._batch is not None:
+                self._batch.append(op)
+            else:
+                self._commit([op])
+
+    def _commit(self, ops: list) -> None:
+        self._journal.append(ops)
+        if self._journal.entries >= self._compact_every:
+            self.compact()
+
+    def compact(self) -> None:
+        """Fold the journal into a new snapshot."""
+        with self._lock:
+            self._journal.compact(self._dump_tables())
+
+    def get_journal_size(self) -> int:
+        return self._journal.entries
+
+    # ------------------------------------------------------------------
+    # Rows
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _owning_system(stream: Datastream | ControlStream, node: Node) -> Optional[System]:
+        for system in node.systems():
+            if any(s is stream for s in system.datastreams) or any(s is stream for s in system.control_channels):
+                return system
+        return None
+
+    def _put_stream(self, table: str, stream: Datastream | ControlStream, node: Node, system: System = None):
+        if system is None:
+            system = self._owning_system(stream, node)
+        self._record(["put", table, str(stream.get_internal_id()), {
+            "system_id": stream.get_parent_resource_id(),
+            "system_uid": str(system.get_internal_id()) if system is not None else None,
+            "node_id": node.get_id(),
+            "data": stream.serialize(),
+        }])
+
+    def _deserialize_system(self, row: dict, node: Node) -> System:
+        data = dict(row["data"], datastreams=None, control_channels=None)
+        return System.deserialize(data, node, trusted=True)
+
+    def _attach_streams(self, systems: list[System], node: Node) -> None:
+        by_uid = {str(system.get_internal_id()): system for system in systems}
+        by_resource_id = {system._resource_id: system for system in systems if system._resource_id is not None}
+        for table, cls, attr in (
+            ("datastreams", Datastream, "datastreams"),
+            ("controlstreams", ControlStream, "control_channels"),
+        ):
+            for row in self._rows(table, node_id=node.get_id()):
+                system = by_uid.get(row["system_uid"]) if row["system_uid"] else by_resource_id.get(row["system_id"])
+                if system is not None:
+                    getattr(system, attr).append(cls.deserialize(row["data"], node, trusted=True))
+
+    def _assemble_node(self, row: dict, session_manager: Optional[SessionManager]) -> Node:
+        node = Node.deserialize(dict(row["data"], _systems=None), session_manager=session_manager, trusted=True)
+        node._systems = self.load_systems_for_node(node.get_id(), node)
+        return node
+
+    # ------------------------------------------------------------------
+    # Node
+    # ------------------------------------------------------------------
+
+    def save_node(self, node: Node) -> None:
+        self._record(["put", "nodes", node.get_id(), {"data": node.serialize(include_systems=False)}])
+
+    def save_nodes(self, nodes: list[Node]) -> None:
+        with self.transaction():
+            for node in nodes:
+                self.save_node(node)
+
+    def load_node(self, node_id: str, session_manager: SessionManager = None) -> Optional[Node]:
+        with self._lock:
+            row = self._get("nodes", node_id)
+            if row is None:
+                return None
+            node = self._assemble_node(row, session_manager)
+            mark_loaded([node])
+            return node
+
+    def load_all_nodes(self, session_manager: SessionManager = None) -> list[Node]:
+        with self._lock, paused_gc():
+            nodes = [self._assemble_node(row, session_manager) for row in self._rows("nodes")]
+            mark_loaded(nodes)
+            return nodes
+
+    def delete_node(self, node_id: str) -> None:
+        self._record(["del", "nodes", node_id])
+
+    # ------------------------------------------------------------------
+    # System
+    # ------------------------------------------------------------------
+
+    def save_system(self, system: System, node: Node) -> None:
+        self._record(["put", "systems", str(system.get_internal_id()), {
+            "node_id": node.get_id(),
+            "data": system.serialize(include_streams=False),
+        }])
+
+    def save_systems(self, systems: list[System], node: Node) -> None:
+        with self.transaction():
+            for system in systems:
+                self.save_system(system, node)
+
+    def load_system(self, system_id: str, node: Node) -> Optional[System]:
+        with self._lock:
+            row = self._get("systems", system_id)
+            if row is None:
+                return None
+            system = self._deserialize_system(row, node)
+            self._attach_streams([system], node)
+            mark_loaded([system])
+            return system
+
+    def load_systems_for_node(self, node_id: str, node: Node) -> list[System]:
+        with self._lock, paused_gc():
+            systems = [self._deserialize_system(row, node) for row in self._rows("systems", node_id=node_id)]
+            self._attach_streams(systems, node)
+            mark_loaded(systems)
+            return systems
+
+    def delete_system(self, system_id: str) -> None:
+        self._record(["del", "systems", system_id])
+
+    # ------------------------------------------------------------------
+    # Datastream
+    # ------------------------------------------------------------------
+
+    def save_datastream(self, datastream: Datastream, node: Node) -> None:
+        self._put_stream("datastreams", datastream, node)
+
+    def save_datastreams(self, datastreams: list[Datastream], node: Node, system: System = None) -> None:
+        with self.transaction():
+            for datastream in datastreams:
+                self._put_stream("datastreams", datastream, node, system)
+
+    def load_datastream(self, datastream_id: str, node: Node) -> Optional[Datastream]:
+        with self._lock:
+            row = self._get("datastreams", datastream_id)
+            if row is None:
+                return None
+            datastream = Datastream.deserialize(row["data"], node, trusted=True)
+            mark_loaded([datastream])
+            return datastream
+
+    def load_datastreams_for_system(self, system_id: str, node: Node) -> list[Datastream]:
+        with self._lock:
+            datastreams = [Datastream.deserialize(row["data"], node, trusted=True)
+                           for row in self._rows("datastreams", system_id=system_id)]
+            mark_loaded(datastreams)
+            return datastreams
+
+    def delete_datastream(self, datastream_id: str) -> None:
+        self._record(["del", "datastreams", datastream_id])
+
+    # ------------------------------------------------------------------
+    # ControlStream
+    # ------------------------------------------------------------------
+
+    def save_controlstream(self, controlstream: ControlStream, node: Node) -> None:
+        self._put_stream("controlstreams", controlstream, node)
+
+    def save_controlstreams(self, controlstreams: list[ControlStream], node: Node, system: System = None) -> None:
+        with self.transaction():
+            for controlstream in controlstreams:
+                self._put_stream("controlstreams", controlstream, node, system)
+
+    def load_controlstream(self, controlstream_id: str, node: Node) -> Optional[ControlStream]:
+        with self._lock:
+            row = self._get("controlstreams", controlstream_id)
+            if row is None:
+                return None
+            controlstream = ControlStream.deserialize(row["data"], node, trusted=True)
+            mark_loaded([controlstream])
+            return controlstream
+
+    def load_controlstreams_for_system(self, system_id: str, node: Node) -> list[ControlStream]:
+        with self._lock:
+            controlstreams = [ControlStream.deserialize(row["data"], node, trusted=True)
+                              for row in self._rows("controlstreams", system_id=system_id)]
+            mark_loaded(controlstreams)
+            return controlstreams
+
+    def delete_controlstream(self, controlstream_id: str) -> None:
+        self._record(["del", "controlstreams", controlstream_id])
+
+    # ------------------------------------------------------------------
+    # Consumer checkpoints
+    # ------------------------------------------------------------------
+
+    def save_checkpoints(self, checkpoints) -> None:
+        """Persist several checkpoints as a single journal entry."""
+        with self.transaction():
+            for cp in checkpoints:
+                self._record(["put", "checkpoints", cp.stream_id, cp.to_dict()])
+
+    def load_checkpoints(self, stream_ids=None) -> dict[str, Checkpoint]:
+        with self._lock:
+            if stream_ids is None:
+                rows = self._dump_tables()["checkpoints"].items()
+            else:
+                rows = ((stream_id, self._get("checkpoints", stream_id)) for stream_id in stream_ids)
+            return {stream_id: Checkpoint.from_dict(stream_id, row) for stream_id, row in rows if row is not None}
+
+    def delete_checkpoints(self, stream_ids) -> None:
+        with self.transaction():
+            for stream_id in stream_ids:
+                self._record(["del", "checkpoints", stream_id])
+
+    # ------------------------------------------------------------------
+    # Bulk operations
+    # ------------------------------------------------------------------
+
+    def save_all(self, nodes: list[Node]) -> None:
+        """Persist every resource of the graph as a single atomic journal entry."""
+        versions = graph_versions(nodes)
+        with self.transaction():
+            for node in nodes:
+                self.save_node(node)
+                for system in node.systems():
+                    self.save_system(system, node)
+                    for ds in system.datastreams:
+                        self._put_stream("datastreams", ds, node, system)
+                    for cs in system.control_channels:
+                        self._put_stream("controlstreams", cs, node, system)
+        mark_saved(versions)
+
+    def load_all(self, session_manager: SessionManager = None) -> list[Node]:
+        """Reassemble the full graph from the per-resource rows."""
+        return self.load_all_nodes(session_manager=session_manager)
+
+    def clear(self) -> None:
+        """Delete all persisted resources."""
+        with self.transaction():
+            for table in TABLES:
+                for row_id in list(self._dump_tables()[table]):
+                    self._record(["del", table, row_id])
+
+    def close(self) -> None:
+        with self._lock:
+            if self._journal.entries:
+                self.compact()
+            self._journal.close()
+
+
+class JSONFileDataStore(JournaledDataStore):
+    """DataStore backed by plain JSON files, using only the standard library.
+
+    All rows are held in memory as ``{table: {id: row}}`` dicts; the files in
+    *directory* are only appended to (journal) or atomically replaced
+    (snapshot). See ``JournaledDataStore`` and ``ChangeJournal``.
+    """
+
+    def __init__(self, directory: str | Path, compact_every: int = 1000, fsync: bool = True) -> None:
+        self._tables: dict[str, dict[str, dict]] = {}
+        super().__init__(directory, compact_every=compact_every, fsync=fsync)
+
+    def _load_tables(self, tables: dict[str, dict[str, dict]]) -> None:
+        self._tables = tables
+
+    def _dump_tables(self) -> dict[str, dict[str, dict]]:
+        return self._tables
+
+    def _get(self, table: str, resource_id: str) -> Optional[dict]:
+        return self._tables[table].get(resource_id)
+
+    def _put(self, table: str, resource_id: str, row: dict) -> None:
+        self._tables[table][resource_id] = row
+
+    def _remove(self, table: str, resource_id: str) -> None:
+        self._tables[table].pop(resource_id, None)
+
+    def _rows(self, table: str, **equals) -> list[dict]:
+        rows = self._tables[table].values()
+        if not equals:
+            return list(rows)
+        items = tuple(equals.items())
+        return [row for row in rows if all(row.get(k) == v for k, v in items)]
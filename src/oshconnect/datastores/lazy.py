@@ -0,0 +1,131 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   Date:  2024/5/28
+#   Author:  Ian Patterson
+#   Contact Email:  ian@botts-inc.com
+#   ==============================================================================
+
+from __future__ import annotations
+
+import threading
+from collections.abc import MutableSequence
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+
+class LazySlot:
+    """A stored resource that has not been deserialized yet.
+
+    ``get()`` runs the loader once and caches the result, so a slot shared by
+    several lists (e.g. a Node's systems and OSHConnect's flat system list)
+    always materializes to the same object.
+    """
+    __slots__ = ('resource_id', '_loader', '_value', '_loaded', '_lock')
+
+    def __init__(self, resource_id: str, loader: Callable[[str], Any]):
+        self.resource_id = resource_id
+        self._loader = loader
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> Any:
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._value = self._loader(self.resource_id)
+                    self._loaded = True
+                    self._loader = None
+        return self._value
+
+
+class LazyResourceList(MutableSequence):
+    """A list of resources that are deserialized on first access.
+
+    Behaves like the plain lists used for ``Node._systems``,
+    ``System.datastreams`` and ``System.control_channels``: ``len()`` and
+    ``get_by_id()`` never deserialize anything besides the requested
+    resource, indexing materializes one element and iteration materializes
+    elements one at a time as it reaches them. Extending one LazyResourceList
+    with another shares the pending slots rather than loading them.
+    """
+
+    def __init__(self, items: Iterable[Any] = ()):
+        self._items: list = list(items)
+
+    @classmethod
+    def from_ids(cls, resource_ids: Iterable[str], loader: Callable[[str], Any]) -> LazyResourceList:
+        """Build a list of pending slots; *loader* receives a resource id and returns the deserialized resource."""
+        return cls(LazySlot(resource_id, loader) for resource_id in resource_ids)
+
+    def _materialize(self, index: int) -> Any:
+        item = self._items[index]
+        if isinstance(item, LazySlot):
+            item = item.get()
+            self._items[index] = item
+        return item
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._materialize(i) for i in range(*index.indices(len(self._items)))]
+        return self._materialize(index)
+
+    def __setitem__(self, index, value):
+        self._items[index] = value
+
+    def __delitem__(self, index):
+        del self._items[index]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Any]:
+        for i in range(len(self._items)):
+            yield self._materialize(i)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, LazyResourceList)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"LazyResourceList({len(self._items)} items, {self.loaded_count()} loaded)"
+
+    def insert(self, index: int, value: Any) -> None:
+        self._items.insert(index, value)
+
+    def extend(self, values: Iterable[Any]) -> None:
+        if isinstance(values, LazyResourceList):
+            self._items.extend(values._items)
+        else:
+            self._items.extend(values)
+
+    def get_by_id(self, internal_id: str) -> Optional[Any]:
+        """Return the resource whose internal id matches, materializing only that resource."""
+        internal_id = str(internal_id)
+        for i, item in enumerate(self._items):
+            if isinstance(item, LazySlot):
+                if item.resource_id == internal_id:
+                    return self._materialize(i)
+            elif str(item.get_internal_id()) == internal_id:
+                return item
+        return None
+
+    def entries(self) -> list:
+        """The elements as stored: resources, and LazySlots for the ones not loaded yet. Loads nothing."""
+        return list(self._items)
+
+    def loaded_items(self) -> Iterator[Any]:
+        """Iterate over the elements that are already materialized, without loading any others."""
+        for item in self._items:
+            if not isinstance(item, LazySlot):
+                yield item
+            elif item.loaded:
+                yield item.get()
+
+    def loaded_count(self) -> int:
+        return sum(1 for item in self._items
+                   if not isinstance(item, LazySlot) or item.loaded)
@@ -0,0 +1,327 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   Date:  2024/5/28
+#   Author:  Ian Patterson
+#   Contact Email:  ian@botts-inc.com
+#   ==============================================================================
+
+from __future__ import annotations
+
+import itertools
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from ..csapi4py.constants import APIResourceTypes
+from ..datastore import ObservationStore, RetentionPolicy
+from ..events import CallbackListener, DefaultEventTypes, EventHandler
+from ..streamableresource import Datastream
+from ..timemanagement import observation_epoch
+
+_INSERT_OBSERVATION = (
+    "INSERT OR REPLACE INTO observations (datastream_id, result_time, seq, data) VALUES (?, ?, ?, ?)"
+)
+
+
+class SQLiteObservationStore(ObservationStore):
+    """SQLite-backed ObservationStore.
+
+    Schema notes
+    ------------
+    Observations live in a single ``WITHOUT ROWID`` table whose primary key is
+    ``(datastream_id, result_time, seq)``. The table *is* the covering index,
+    so a time-range query for one datastream is a single ordered range scan.
+    ``seq`` only disambiguates observations sharing a timestamp. The
+    observation itself is stored as JSON text.
+
+    Writes
+    ------
+    ``append`` only enqueues. A dedicated writer thread drains the queue and
+    writes batches of up to *batch_size* rows with ``executemany`` in one
+    transaction, waiting at most *flush_interval* seconds to fill a batch.
+    ``flush()`` blocks until everything appended before it is committed.
+
+    ``attach(datastream)`` feeds a Datastream's inbound ``NEW_OBSERVATION``
+    events into the store. Retention policies are applied by the writer thread
+    every *retention_interval* seconds, or on demand with ``apply_retention``.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path = "observations.db",
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+        retention_interval: float = 60.0,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+    ) -> None:
+        """
+        :param db_path: path of the database file, or ``":memory:"``
+        :param batch_size: maximum number of observations written per transaction
+        :param flush_interval: maximum seconds an appended observation waits before being written
+        :param retention_interval: seconds between automatic ``apply_retention`` runs
+        :param journal_mode: SQLite journal mode
+        :param synchronous: SQLite ``synchronous`` pragma
+        """
+        self._db_path = Path(db_path) if db_path != ":memory:" else db_path
+        self._conn: sqlite3.Connection = sqlite3.connect(str(self._db_path), check_same_thread=False)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS observations (
+                datastream_id TEXT    NOT NULL,
+                result_time   REAL    NOT NULL,
+                seq           INTEGER NOT NULL,
+                data          TEXT    NOT NULL,
+                PRIMARY KEY (datastream_id, result_time, seq)
+            ) WITHOUT ROWID;
+        """)
+        self._conn.commit()
+        self._lock = threading.Lock()
+        max_seq = self._conn.execute("SELECT MAX(seq) FROM observations").fetchone()[0]
+        self._seq = itertools.count((max_seq or 0) + 1)
+
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._retention_interval = retention_interval
+        self._policies: dict[Optional[str], RetentionPolicy] = {}
+        self._last_retention = time.monotonic()
+        self._listeners: dict[str, CallbackListener] = {}
+        self._closed = False
+        # Items are observation rows, threading.Event flush requests, or None to stop the writer
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._run_writer, name="observation-store-writer", daemon=True)
+        self._writer.start()
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def append(self, datastream_id: str, epoch: float, observation: Any) -> None:
+        if self._closed:
+            raise RuntimeError("ObservationStore is closed")
+        if isinstance(observation, (bytes, bytearray)):
+            data = observation.decode("utf-8")
+        elif isinstance(observation, str):
+            data = observation
+        else:
+            data = json.dumps(observation)
+        self._queue.put((datastream_id, float(epoch), next(self._seq), data))
+
+    def attach(self, datastream: Datastream, timestamp_fn: Callable[[Any], float] = None) -> None:
+        """
+        Store every observation the Datastream receives over MQTT.
+        :param datastream: Datastream to record, keyed by its resource id
+        :param timestamp_fn: extracts the epoch result time from a raw payload, defaults to the payload's resultTime
+        """
+        datastream_id = datastream.get_id()
+        if datastream_id in self._listeners:
+            return
+        extract = timestamp_fn or observation_epoch
+
+        def on_observation(evt):
+            try:
+                self.append(datastream_id, extract(evt.data), evt.data)
+            except Exception as e:
+                logging.error("Could not store observation from %s: %s", evt.topic, e)
+
+        topic = getattr(datastream, "_topic", None) or datastream.get_mqtt_topic(
+            subresource=APIResourceTypes.OBSERVATION)
+        self._listeners[datastream_id] = EventHandler().subscribe(
+            on_observation, types=[DefaultEventTypes.NEW_OBSERVATION], topics=[topic])
+
+    def detach(self, datastream: Datastream) -> None:
+        listener = self._listeners.pop(datastream.get_id(), None)
+        if listener is not None:
+            EventHandler().unregister_listener(listener)
+
+    def flush(self) -> None:
+        if not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        for listener in self._listeners.values():
+            EventHandler().unregister_listener(listener)
+        self._listeners.clear()
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def query(self, datastream_id: str, start: float = None, end: float = None, limit: int = None,
+              descending: bool = False) -> list[tuple[float, dict]]:
+        sql = "SELECT result_time, data FROM observations WHERE datastream_id = ?"
+        params: list = [datastream_id]
+        if start is not None:
+            sql += " AND result_time >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND result_time <= ?"
+            params.append(end)
+        sql += " ORDER BY result_time DESC, seq DESC" if descending else " ORDER BY result_time, seq"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [(result_time, json.loads(data)) for result_time, data in rows]
+
+    def latest(self, datastream_id: str) -> Optional[tuple[float, dict]]:
+        rows = self.query(datastream_id, limit=1, descending=True)
+        return rows[0] if rows else None
+
+    def count(self, datastream_id: str = None) -> int:
+        with self._lock:
+            if datastream_id is None:
+                return self._conn.execute("SELECT COUNT(*) FROM observations").fetchone()[0]
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM observations WHERE datastream_id = ?", (datastream_id,)
+            ).fetchone()[0]
+
+    def get_datastream_ids(self) -> list[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT DISTINCT datastream_id FROM observations")]
+
+    # ------------------------------------------------------------------
+    # Deletion and retention
+    # ------------------------------------------------------------------
+
+    def delete_range(self, datastream_id: str, start: float = None, end: float = None) -> int:
+        sql = "DELETE FROM observations WHERE datastream_id = ?"
+        params: list = [datastream_id]
+        if start is not None:
+            sql += " AND result_time >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND result_time <= ?"
+            params.append(end)
+        with self._lock:
+            deleted = self._conn.execute(sql, params).rowcount
+            self._conn.commit()
+        return deleted
+
+    def set_retention(self, policy: Optional[RetentionPolicy], datastream_id: str = None) -> None:
+        with self._lock:
+            if policy is None:
+                self._policies.pop(datastream_id, None)
+            else:
+                self._policies[datastream_id] = policy
+
+    def apply_retention(self, now: float = None) -> int:
+        # A copy: set_retention() may be called meanwhile from another thread than the writer's
+        with self._lock:
+            policies = dict(self._policies)
+        if not policies:
+            return 0
+        now = time.time() if now is None else now
+        default = policies.get(None)
+        if default is not None:
+            targets = {ds_id: policies.get(ds_id, default) for ds_id in self.get_datastream_ids()}
+        else:
+            targets = {ds_id: policy for ds_id, policy in policies.items() if ds_id is not None}
+        deleted = 0
+        with self._lock:
+            for ds_id, policy in targets.items():
+                deleted += self._apply_policy(ds_id, policy, now)
+            self._conn.commit()
+        return deleted
+
+    def _apply_policy(self, datastream_id: str, policy: RetentionPolicy, now: float) -> int:
+        deleted = 0
+        if policy.max_age is not None:
+            deleted += self._conn.execute(
+                "DELETE FROM observations WHERE datastream_id = ? AND result_time < ?",
+                (datastream_id, now - policy.max_age),
+            ).rowcount
+        if policy.downsample_after is not None and policy.downsample_interval:
+            cutoff = now - policy.downsample_after
+            # Keep the first observation of each downsample_interval bucket older than the cutoff
+            deleted += self._conn.execute("""
+                DELETE FROM observations
+                WHERE datastream_id = ? AND result_time < ? AND (result_time, seq) IN (
+                    SELECT result_time, seq FROM (
+                        SELECT result_time, seq, ROW_NUMBER() OVER (
+                            PARTITION BY CAST(result_time / ? AS INTEGER) ORDER BY result_time, seq
+                        ) AS rn
+                        FROM observations WHERE datastream_id = ? AND result_time < ?
+                    ) WHERE rn > 1
+                )
+            """, (datastream_id, cutoff, policy.downsample_interval, datastream_id, cutoff)).rowcount
+        if policy.max_count is not None:
+            deleted += self._conn.execute("""
+                DELETE FROM observations
+                WHERE datastream_id = ? AND (result_time, seq) < (
+                    SELECT result_time, seq FROM observations WHERE datastream_id = ?
+                    ORDER BY result_time DESC, seq DESC LIMIT 1 OFFSET ?
+                )
+            """, (datastream_id, datastream_id, max(policy.max_count - 1, 0))).rowcount
+        return deleted
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+
+    def _run_writer(self) -> None:
+        while True:
+            try:
+                # Wakes up for the next retention run even when nothing is appended
+                item = self._queue.get(timeout=max(self._last_retention + self._retention_interval - time.monotonic(), 0.0))
+            except queue.Empty:
+                self._apply_retention_if_due()
+                continue
+            batch, waiters, stop = [], [], False
+            deadline = time.monotonic() + self._flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stop or waiters or len(batch) >= self._batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.0))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+            self._apply_retention_if_due()
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _apply_retention_if_due(self) -> None:
+        if time.monotonic() - self._last_retention < self._retention_interval:
+            return
+        self._last_retention = time.monotonic()
+        if self._policies:
+            try:
+                self.apply_retention()
+            except sqlite3.Error as e:
+                logging.error("Observation retention failed: %s", e)
+
+    def _write_batch(self, batch: list[tuple]) -> None:
+        with self._lock:
+            try:
+                self._conn.executemany(_INSERT_OBSERVATION, batch)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                logging.error("Failed to write %d observations: %s", len(batch), e)
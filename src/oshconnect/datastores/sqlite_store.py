@@ -9,10 +9,12 @@ from __future__ import annotations
 
 import json
 import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
-from ..datastore import DataStore
+from ..datastore import Checkpoint, DataStore, graph_versions, mark_loaded, mark_saved, paused_gc
+from .lazy import LazyResourceList
 from ..streamableresource import (
     ControlStream,
     Datastream,
@@ -21,6 +23,26 @@ from ..streamableresource import (
     System,
 )
 
+# Rows are only ever read back by this store, so skip the whitespace json.dumps adds by default
+_COMPACT_SEPARATORS = (",", ":")
+
+# Upserts rather than INSERT OR REPLACE, which deletes and re-inserts: a rewritten row keeps its rowid, and with it
+# its place in the ORDER BY rowid reads that rebuild the graph
+_INSERT_NODE = "INSERT INTO nodes (id, data) VALUES (?, ?) ON CONFLICT (id) DO UPDATE SET data = excluded.data"
+_INSERT_SYSTEM = (
+    "INSERT INTO systems (id, node_id, data) VALUES (?, ?, ?) "
+    "ON CONFLICT (id) DO UPDATE SET node_id = excluded.node_id, data = excluded.data"
+)
+_STREAM_UPSERT = (
+    " (id, system_id, system_uid, node_id, data) VALUES (?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+    "system_id = excluded.system_id, system_uid = excluded.system_uid, node_id = excluded.node_id, data = excluded.data"
+)
+_INSERT_DATASTREAM = "INSERT INTO datastreams" + _STREAM_UPSERT
+_INSERT_CONTROLSTREAM = "INSERT INTO controlstreams" + _STREAM_UPSERT
+_INSERT_CHECKPOINT = "INSERT OR REPLACE INTO checkpoints (stream_id, result_time, count) VALUES (?, ?, ?)"
+# Stay well below SQLITE_MAX_VARIABLE_NUMBER in IN (...) lookups
+_MAX_IN_PARAMS = 500
+
 
 class SQLiteDataStore(DataStore):
     """SQLite-backed DataStore implementation using Python's stdlib ``sqlite3``.
@@ -39,14 +61,83 @@ class SQLiteDataStore(DataStore):
     ``load_all`` reconstructs the full hierarchy from the *nodes* table only
     (``Node.deserialize`` handles the embedded systems/streams), avoiding
     duplication.
+
+    Everything read back was written by this store, so resources are
+    deserialized with ``trusted=True``: their underlying pydantic models are
+    only validated when first accessed, and saving an untouched resource
+    again reuses the stored dump instead of calling ``model_dump``.
+
+    With ``normalized=True`` nothing is stored twice: node rows hold only node
+    fields, system rows only system fields, and every datastream/control
+    stream lives solely in its own table. Stream rows carry the owning
+    System's internal id (``system_uid``) and all foreign-key columns are
+    indexed; the ``load_*`` methods reassemble the hierarchy from the child
+    tables. Saving one changed datastream then rewrites one small row instead
+    of the whole node blob. A normalized store can read databases written in
+    the default layout, since ``save_all`` always wrote the child rows.
+
+    With ``lazy=True`` the ``load_*`` methods also read the hierarchy from the
+    child tables, but only fetch ids up front: ``Node._systems``,
+    ``System.datastreams`` and ``System.control_channels`` are
+    ``LazyResourceList``s whose elements are deserialized (and registered with
+    the Node's session) the first time they are indexed, iterated over or
+    looked up with ``get_by_id()``.
+
+    Writes
+    ------
+    Single-resource ``save_*`` / ``delete_*`` calls commit immediately unless
+    they run inside ``transaction()``, in which case the whole block commits
+    once (or rolls back on error). ``save_all`` and the bulk ``save_nodes`` /
+    ``save_systems`` / ``save_datastreams`` / ``save_controlstreams`` methods
+    use ``executemany`` inside a single transaction, so persisting a large
+    graph costs one commit rather than one per resource.
+
+    ``save_changes`` writes only the resources modified since they were
+    last saved or loaded. In the default layout a change also rewrites the
+    rows of the System and Node above it, since those embed their children;
+    a normalized store writes just the changed rows.
+
+    The database is opened in WAL journal mode by default and the
+    ``synchronous`` pragma is configurable; ``"NORMAL"`` is durable across
+    application crashes in WAL mode, use ``"FULL"`` to also survive power loss.
     """
 
-    def __init__(self, db_path: str | Path = "oshconnect.db") -> None:
+    SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+    def __init__(
+        self,
+        db_path: str | Path = "oshconnect.db",
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        normalized: bool = False,
+        lazy: bool = False,
+    ) -> None:
+        """
+        :param db_path: path of the database file, or ``":memory:"``
+        :param journal_mode: SQLite journal mode (``WAL``, ``DELETE``, ``TRUNCATE``, ...);
+            in-memory databases always use ``MEMORY``
+        :param synchronous: SQLite ``synchronous`` pragma, one of ``OFF``, ``NORMAL``, ``FULL``, ``EXTRA``
+        :param normalized: store each resource once and reassemble the graph from the child tables
+        :param lazy: load Systems, Datastreams and ControlStreams on first access; rows are written as in the
+            normalized layout
+        """
+        synchronous = synchronous.upper()
+        if synchronous not in self.SYNCHRONOUS_LEVELS:
+            raise ValueError(
+                f"synchronous must be one of {', '.join(self.SYNCHRONOUS_LEVELS)}, got {synchronous!r}"
+            )
         self._db_path = Path(db_path) if db_path != ":memory:" else db_path
         self._conn: sqlite3.Connection = sqlite3.connect(
             str(self._db_path), check_same_thread=False
         )
         self._conn.row_factory = sqlite3.Row
+        self._transaction_depth = 0
+        self._normalized = normalized
+        self._lazy = lazy
+        # Both modes rebuild the hierarchy from the child tables instead of the embedded blobs
+        self._from_child_tables = normalized or lazy
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
         self._create_tables()
 
     # ------------------------------------------------------------------
@@ -65,34 +156,170 @@ class SQLiteDataStore(DataStore):
                 data    TEXT NOT NULL
             );
             CREATE TABLE IF NOT EXISTS datastreams (
-                id        TEXT PRIMARY KEY,
-                system_id TEXT,
-                node_id   TEXT NOT NULL,
-                data      TEXT NOT NULL
+                id         TEXT PRIMARY KEY,
+                system_id  TEXT,
+                system_uid TEXT,
+                node_id    TEXT NOT NULL,
+                data       TEXT NOT NULL
             );
             CREATE TABLE IF NOT EXISTS controlstreams (
-                id        TEXT PRIMARY KEY,
-                system_id TEXT,
-                node_id   TEXT NOT NULL,
-                data      TEXT NOT NULL
+                id         TEXT PRIMARY KEY,
+                system_id  TEXT,
+                system_uid TEXT,
+                node_id    TEXT NOT NULL,
+                data       TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                stream_id   TEXT PRIMARY KEY,
+                result_time TEXT,
+                count       INTEGER NOT NULL
             );
         """)
+        # Databases created before system_uid existed
+        for table in ("datastreams", "controlstreams"):
+            columns = {row["name"] for row in self._execute(f"PRAGMA table_info({table})")}
+            if "system_uid" not in columns:
+                self._execute(f"ALTER TABLE {table} ADD COLUMN system_uid TEXT")
+        self._conn.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_systems_node_id ON systems (node_id);
+            CREATE INDEX IF NOT EXISTS idx_datastreams_node_id ON datastreams (node_id);
+            CREATE INDEX IF NOT EXISTS idx_datastreams_system_id ON datastreams (system_id);
+            CREATE INDEX IF NOT EXISTS idx_datastreams_system_uid ON datastreams (system_uid);
+            CREATE INDEX IF NOT EXISTS idx_controlstreams_node_id ON controlstreams (node_id);
+            CREATE INDEX IF NOT EXISTS idx_controlstreams_system_id ON controlstreams (system_id);
+            CREATE INDEX IF NOT EXISTS idx_controlstreams_system_uid ON controlstreams (system_uid);
+        """)
         self._conn.commit()
 
     def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
         return self._conn.execute(sql, params)
 
+    def _commit(self) -> None:
+        """Commit unless inside ``transaction()``, which commits once on exit."""
+        if self._transaction_depth == 0:
+            self._conn.commit()
+
+    @contextmanager
+    def transaction(self) -> Iterator[SQLiteDataStore]:
+        """Group writes into a single atomic commit.
+
+        Nested blocks join the outermost transaction. Any exception rolls back
+        every write made inside the outermost block.
+        """
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self._conn.rollback()
+            raise
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0:
+            self._conn.commit()
+
+    def get_pragma(self, name: str):
+        """Return the current value of a SQLite pragma (e.g. ``journal_mode``)."""
+        return self._execute(f"PRAGMA {name}").fetchone()[0]
+
+    def _node_row(self, node: Node) -> tuple:
+        return node.get_id(), json.dumps(node.serialize(include_systems=not self._from_child_tables), separators=_COMPACT_SEPARATORS)
+
+    def _system_row(self, system: System, node: Node) -> tuple:
+        data = system.serialize(include_streams=not self._from_child_tables)
+        return str(system.get_internal_id()), node.get_id(), json.dumps(data, separators=_COMPACT_SEPARATORS)
+
+    @staticmethod
+    def _stream_row(stream: Datastream | ControlStream, node: Node, system: System = None) -> tuple:
+        if system is None:
+            system = SQLiteDataStore._owning_system(stream, node)
+        return (
+            str(stream.get_internal_id()),
+            stream.get_parent_resource_id(),
+            str(system.get_internal_id()) if system is not None else None,
+            node.get_id(),
+            json.dumps(stream.serialize(), separators=_COMPACT_SEPARATORS),
+        )
+
+    @staticmethod
+    def _owning_system(stream: Datastream | ControlStream, node: Node) -> Optional[System]:
+        for system in node.systems():
+            if any(s is stream for s in system.datastreams) or any(s is stream for s in system.control_channels):
+                return system
+        return None
+
+    # -- Normalized / lazy reassembly ------------------------------------
+
+    def _deserialize_node(self, data: dict, session_manager: Optional[SessionManager]) -> Node:
+        if self._from_child_tables:
+            data["_systems"] = None
+        return Node.deserialize(data, session_manager=session_manager, trusted=True)
+
+    def _deserialize_system(self, data: dict, node: Node) -> System:
+        if self._from_child_tables:
+            data["datastreams"] = None
+            data["control_channels"] = None
+        return System.deserialize(data, node, trusted=True)
+
+    def _assemble_nodes(self, rows: list[sqlite3.Row], session_manager: Optional[SessionManager]) -> list[Node]:
+        nodes = [self._deserialize_node(json.loads(r["data"]), session_manager) for r in rows]
+        if self._lazy:
+            for node in nodes:
+                ids = [r["id"] for r in self._execute(
+                    "SELECT id FROM systems WHERE node_id = ? ORDER BY rowid", (node.get_id(),))]
+                node._systems = LazyResourceList.from_ids(
+                    ids, lambda system_id, node=node: self.load_system(system_id, node))
+        elif self._normalized:
+            for node in nodes:
+                node._systems = self.load_systems_for_node(node.get_id(), node)
+        mark_loaded(nodes)
+        return nodes
+
+    def _attach_streams(self, systems: list[System], node: Node) -> None:
+        """Populate each System's streams from the child tables (normalized and lazy modes only)."""
+        if not self._from_child_tables or not systems:
+            return
+        by_uid = {str(system.get_internal_id()): system for system in systems}
+        by_resource_id = {system._resource_id: system for system in systems if system._resource_id is not None}
+        if len(systems) == 1:
+            # A single system, e.g. materialized by a LazyResourceList: read only its rows, through the system indexes
+            system = systems[0]
+            where = "system_uid = ? OR (system_uid IS NULL AND system_id = ? AND node_id = ?)"
+            params = (str(system.get_internal_id()), system._resource_id, node.get_id())
+        else:
+            where, params = "node_id = ?", (node.get_id(),)
+        for table, cls, attr, load in (
+            ("datastreams", Datastream, "datastreams", self.load_datastream),
+            ("controlstreams", ControlStream, "control_channels", self.load_controlstream),
+        ):
+            columns = "id, system_id, system_uid" if self._lazy else "id, system_id, system_uid, data"
+            rows = self._execute(f"SELECT {columns} FROM {table} WHERE {where} ORDER BY rowid", params).fetchall()
+            owned: dict[int, list] = {}
+            for r in rows:
+                # Rows written before system_uid existed fall back to the system's server resource id
+                system = by_uid.get(r["system_uid"]) if r["system_uid"] else by_resource_id.get(r["system_id"])
+                if system is not None:
+                    owned.setdefault(id(system), []).append(r)
+            for system in systems:
+                system_rows = owned.get(id(system), [])
+                if self._lazy:
+                    setattr(system, attr, LazyResourceList.from_ids(
+                        [r["id"] for r in system_rows], lambda stream_id, load=load: load(stream_id, node)))
+                else:
+                    getattr(system, attr).extend(cls.deserialize(json.loads(r["data"]), node, trusted=True) for r in system_rows)
+
     # ------------------------------------------------------------------
     # Node
     # ------------------------------------------------------------------
 
     def save_node(self, node: Node) -> None:
-        data = json.dumps(node.serialize())
-        self._execute(
-            "INSERT OR REPLACE INTO nodes (id, data) VALUES (?, ?)",
-            (node.get_id(), data),
-        )
-        self._conn.commit()
+        self._execute(_INSERT_NODE, self._node_row(node))
+        self._commit()
+
+    def save_nodes(self, nodes: list[Node]) -> None:
+        """Persist several Nodes (without their children) in one transaction."""
+        with self.transaction():
+            self._conn.executemany(_INSERT_NODE, [self._node_row(node) for node in nodes])
 
     def load_node(
         self, node_id: str, session_manager: Optional[SessionManager] = None
@@ -102,33 +329,31 @@ class SQLiteDataStore(DataStore):
         ).fetchone()
         if row is None:
             return None
-        return Node.deserialize(json.loads(row["data"]), session_manager=session_manager)
+        return self._assemble_nodes([row], session_manager)[0]
 
     def load_all_nodes(
         self, session_manager: Optional[SessionManager] = None
     ) -> list[Node]:
-        rows = self._execute("SELECT data FROM nodes").fetchall()
-        return [
-            Node.deserialize(json.loads(r["data"]), session_manager=session_manager)
-            for r in rows
-        ]
+        rows = self._execute("SELECT data FROM nodes ORDER BY rowid").fetchall()
+        with paused_gc():
+            return self._assemble_nodes(rows, session_manager)
 
     def delete_node(self, node_id: str) -> None:
         self._execute("DELETE FROM nodes WHERE id = ?", (node_id,))
-        self._conn.commit()
+        self._commit()
 
     # ------------------------------------------------------------------
     # System
     # ------------------------------------------------------------------
 
     def save_system(self, system: System, node: Node) -> None:
-        system_id = str(system.get_internal_id())
-        data = json.dumps(system.serialize())
-        self._execute(
-            "INSERT OR REPLACE INTO systems (id, node_id, data) VALUES (?, ?, ?)",
-            (system_id, node.get_id(), data),
-        )
-        self._conn.commit()
+        self._execute(_INSERT_SYSTEM, self._system_row(system, node))
+        self._commit()
+
+    def save_systems(self, systems: list[System], node: Node) -> None:
+        """Persist several Systems under *node* in one transaction."""
+        with self.transaction():
+            self._conn.executemany(_INSERT_SYSTEM, [self._system_row(system, node) for system in systems])
 
     def load_system(self, system_id: str, node: Node) -> Optional[System]:
         row = self._execute(
@@ -136,31 +361,37 @@ class SQLiteDataStore(DataStore):
         ).fetchone()
         if row is None:
             return None
-        return System.deserialize(json.loads(row["data"]), node)
+        system = self._deserialize_system(json.loads(row["data"]), node)
+        self._attach_streams([system], node)
+        mark_loaded([system])
+        return system
 
     def load_systems_for_node(self, node_id: str, node: Node) -> list[System]:
         rows = self._execute(
-            "SELECT data FROM systems WHERE node_id = ?", (node_id,)
+            "SELECT data FROM systems WHERE node_id = ? ORDER BY rowid", (node_id,)
         ).fetchall()
-        return [System.deserialize(json.loads(r["data"]), node) for r in rows]
+        with paused_gc():
+            systems = [self._deserialize_system(json.loads(r["data"]), node) for r in rows]
+            self._attach_streams(systems, node)
+        mark_loaded(systems)
+        return systems
 
     def delete_system(self, system_id: str) -> None:
         self._execute("DELETE FROM systems WHERE id = ?", (system_id,))
-        self._conn.commit()
+        self._commit()
 
     # ------------------------------------------------------------------
     # Datastream
     # ------------------------------------------------------------------
 
     def save_datastream(self, datastream: Datastream, node: Node) -> None:
-        ds_id = str(datastream.get_internal_id())
-        system_id = datastream.get_parent_resource_id()
-        data = json.dumps(datastream.serialize())
-        self._execute(
-            "INSERT OR REPLACE INTO datastreams (id, system_id, node_id, data) VALUES (?, ?, ?, ?)",
-            (ds_id, system_id, node.get_id(), data),
-        )
-        self._conn.commit()
+        self._execute(_INSERT_DATASTREAM, self._stream_row(datastream, node))
+        self._commit()
+
+    def save_datastreams(self, datastreams: list[Datastream], node: Node, system: System = None) -> None:
+        """Persist several Datastreams in one transaction."""
+        with self.transaction():
+            self._conn.executemany(_INSERT_DATASTREAM, [self._stream_row(ds, node, system) for ds in datastreams])
 
     def load_datastream(self, datastream_id: str, node: Node) -> Optional[Datastream]:
         row = self._execute(
@@ -168,31 +399,34 @@ class SQLiteDataStore(DataStore):
         ).fetchone()
         if row is None:
             return None
-        return Datastream.deserialize(json.loads(row["data"]), node)
+        datastream = Datastream.deserialize(json.loads(row["data"]), node, trusted=True)
+        mark_loaded([datastream])
+        return datastream
 
     def load_datastreams_for_system(self, system_id: str, node: Node) -> list[Datastream]:
         rows = self._execute(
             "SELECT data FROM datastreams WHERE system_id = ?", (system_id,)
         ).fetchall()
-        return [Datastream.deserialize(json.loads(r["data"]), node) for r in rows]
+        datastreams = [Datastream.deserialize(json.loads(r["data"]), node, trusted=True) for r in rows]
+        mark_loaded(datastreams)
+        return datastreams
 
     def delete_datastream(self, datastream_id: str) -> None:
         self._execute("DELETE FROM datastreams WHERE id = ?", (datastream_id,))
-        self._conn.commit()
+        self._commit()
 
     # ------------------------------------------------------------------
     # ControlStream
     # ------------------------------------------------------------------
 
     def save_controlstream(self, controlstream: ControlStream, node: Node) -> None:
-        cs_id = str(controlstream.get_internal_id())
-        system_id = controlstream.get_parent_resource_id()
-        data = json.dumps(controlstream.serialize())
-        self._execute(
-            "INSERT OR REPLACE INTO controlstreams (id, system_id, node_id, data) VALUES (?, ?, ?, ?)",
-            (cs_id, system_id, node.get_id(), data),
-        )
-        self._conn.commit()
+        self._execute(_INSERT_CONTROLSTREAM, self._stream_row(controlstream, node))
+        self._commit()
+
+    def save_controlstreams(self, controlstreams: list[ControlStream], node: Node, system: System = None) -> None:
+        """Persist several ControlStreams in one transaction."""
+        with self.transaction():
+            self._conn.executemany(_INSERT_CONTROLSTREAM, [self._stream_row(cs, node, system) for cs in controlstreams])
 
     def load_controlstream(self, controlstream_id: str, node: Node) -> Optional[ControlStream]:
         row = self._execute(
@@ -200,49 +434,109 @@ class SQLiteDataStore(DataStore):
         ).fetchone()
         if row is None:
             return None
-        return ControlStream.deserialize(json.loads(row["data"]), node)
+        controlstream = ControlStream.deserialize(json.loads(row["data"]), node, trusted=True)
+        mark_loaded([controlstream])
+        return controlstream
 
     def load_controlstreams_for_system(self, system_id: str, node: Node) -> list[ControlStream]:
         rows = self._execute(
             "SELECT data FROM controlstreams WHERE system_id = ?", (system_id,)
         ).fetchall()
-        return [ControlStream.deserialize(json.loads(r["data"]), node) for r in rows]
+        controlstreams = [ControlStream.deserialize(json.loads(r["data"]), node, trusted=True) for r in rows]
+        mark_loaded(controlstreams)
+        return controlstreams
 
     def delete_controlstream(self, controlstream_id: str) -> None:
         self._execute("DELETE FROM controlstreams WHERE id = ?", (controlstream_id,))
-        self._conn.commit()
+        self._commit()
 
     # ------------------------------------------------------------------
     # Bulk operations
     # ------------------------------------------------------------------
 
     def save_all(self, nodes: list[Node]) -> None:
-        """Walk the full Node graph and persist every resource individually."""
+        """Walk the full Node graph and persist every resource in a single transaction.
+
+        Rows are collected per table and written with ``executemany``; either
+        the whole graph is committed or, on error, none of it is. Rows of
+        systems and streams of the saved nodes that are no longer in the graph
+        are deleted.
+        """
+        versions = graph_versions(nodes)
+        node_rows, system_rows, ds_rows, cs_rows = [], [], [], []
         for node in nodes:
-            self.save_node(node)
+            node_rows.append(self._node_row(node))
             for system in node.systems():
-                self.save_system(system, node)
-                for ds in system.datastreams:
-                    self.save_datastream(ds, node)
-                for cs in system.control_channels:
-                    self.save_controlstream(cs, node)
+                system_rows.append(self._system_row(system, node))
+                ds_rows.extend(self._stream_row(ds, node, system) for ds in system.datastreams)
+                cs_rows.extend(self._stream_row(cs, node, system) for cs in system.control_channels)
+        with self.transaction():
+            for table, rows in (("systems", system_rows), ("datastreams", ds_rows), ("controlstreams", cs_rows)):
+                self._delete_stale_rows(table, [row[0] for row in node_rows], {row[0] for row in rows})
+            self._conn.executemany(_INSERT_NODE, node_rows)
+            self._conn.executemany(_INSERT_SYSTEM, system_rows)
+            self._conn.executemany(_INSERT_DATASTREAM, ds_rows)
+            self._conn.executemany(_INSERT_CONTROLSTREAM, cs_rows)
+        for node in nodes:
+            node._removed_resources.clear()
+        mark_saved(versions)
+
+    def _delete_stale_rows(self, table: str, node_ids: list[str], kept: set[str]) -> None:
+        """Deletes the rows of *table* that belong to the given nodes and whose id is not in *kept*."""
+        for node_id in node_ids:
+            stale = [(r["id"],) for r in self._execute(f"SELECT id FROM {table} WHERE node_id = ?", (node_id,))
+                     if r["id"] not in kept]
+            self._conn.executemany(f"DELETE FROM {table} WHERE id = ?", stale)
+
+    # ------------------------------------------------------------------
+    # Consumer checkpoints
+    # ------------------------------------------------------------------
+
+    def save_checkpoints(self, checkpoints) -> None:
+        """Persist several checkpoints in one transaction."""
+        with self.transaction():
+            self._conn.executemany(_INSERT_CHECKPOINT, [(cp.stream_id, cp.result_time, cp.count)
+                                                        for cp in checkpoints])
+
+    def load_checkpoints(self, stream_ids=None) -> dict[str, Checkpoint]:
+        sql = "SELECT stream_id, result_time, count FROM checkpoints"
+        if stream_ids is None:
+            rows = self._execute(sql).fetchall()
+        else:
+            stream_ids = list(stream_ids)
+            rows = []
+            for i in range(0, len(stream_ids), _MAX_IN_PARAMS):
+                chunk = stream_ids[i:i + _MAX_IN_PARAMS]
+                rows += self._execute(f"{sql} WHERE stream_id IN ({','.join('?' * len(chunk))})", tuple(chunk))
+        return {row["stream_id"]: Checkpoint(row["stream_id"], row["result_time"], row["count"]) for row in rows}
+
+    def delete_checkpoints(self, stream_ids) -> None:
+        with self.transaction():
+            self._conn.executemany("DELETE FROM checkpoints WHERE stream_id = ?", [(i,) for i in stream_ids])
+
+    @property
+    def embeds_children(self) -> bool:
+        # The default layout embeds systems in node rows and streams in system rows; the lazy one does not
+        return not self._from_child_tables
 
     def load_all(
         self, session_manager: Optional[SessionManager] = None
     ) -> list[Node]:
-        """Reconstruct the full resource graph from the nodes table.
-
-        ``Node.deserialize`` handles the embedded systems/datastreams/
-        controlstreams hierarchy, so only the *nodes* table is used here.
-        The individual resource tables (systems, datastreams, controlstreams)
-        exist for targeted single-resource lookups and are not consulted here
-        to avoid double-instantiation.
+        """Reconstruct the full resource graph.
+
+        In the default layout ``Node.deserialize`` handles the embedded
+        systems/datastreams/controlstreams hierarchy, so only the *nodes* table
+        is used and the individual resource tables are not consulted, to avoid
+        double-instantiation. In normalized mode the hierarchy is reassembled
+        from the child tables via the indexed ``node_id`` / ``system_uid``
+        columns instead.
         """
         return self.load_all_nodes(session_manager=session_manager)
 
     def clear(self) -> None:
         """Delete all persisted resources from every table."""
         self._conn.executescript("""
+            DELETE FROM checkpoints;
             DELETE FROM controlstreams;
             DELETE FROM datastreams;
             DELETE FROM systems;
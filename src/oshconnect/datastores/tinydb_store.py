@@ -0,0 +1,88 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   Date:  2024/5/28
+#   Author:  Ian Patterson
+#   Contact Email:  ian@botts-inc.com
+#   ==============================================================================
+
+from __future__ import annotations
+
+from functools import reduce
+from pathlib import Path
+from typing import Optional
+
+from .file_store import TABLES, JournaledDataStore
+
+try:
+    from tinydb import TinyDB, where
+    from tinydb.storages import MemoryStorage
+except ImportError:  # Optional dependency: pip install oshconnect[tinydb]
+    TinyDB = None
+
+
+class TinyDBDataStore(JournaledDataStore):
+    """DataStore using TinyDB tables, persisted through an append-only journal.
+
+    TinyDB's own ``JSONStorage`` rewrites the whole database file on every
+    insert or update. Here TinyDB runs on ``MemoryStorage`` and durability
+    comes from the ``ChangeJournal`` shared with ``JSONFileDataStore``: each
+    save appends only its delta and the journal is periodically compacted
+    into an atomically replaced snapshot. The TinyDB instance is exposed as
+    ``db`` for ad-hoc queries, e.g.
+    ``store.db.table("systems").search(where("node_id") == node_id)``.
+
+    Requires the ``tinydb`` extra.
+    """
+
+    _ROW_ID = "_rid"
+
+    def __init__(self, directory: str | Path, compact_every: int = 1000, fsync: bool = True) -> None:
+        if TinyDB is None:
+            raise ImportError("TinyDBDataStore requires the 'tinydb' extra: pip install oshconnect[tinydb]")
+        self._db = TinyDB(storage=MemoryStorage)
+        # Resource id -> TinyDB doc_id, per table
+        self._doc_ids: dict[str, dict[str, int]] = {}
+        super().__init__(directory, compact_every=compact_every, fsync=fsync)
+
+    @property
+    def db(self) -> TinyDB:
+        return self._db
+
+    def _load_tables(self, tables: dict[str, dict[str, dict]]) -> None:
+        self._db.drop_tables()
+        self._doc_ids = {}
+        for name in TABLES:
+            rows = tables.get(name, {})
+            doc_ids = self._db.table(name).insert_multiple(
+                dict(row, **{self._ROW_ID: resource_id}) for resource_id, row in rows.items())
+            self._doc_ids[name] = dict(zip(rows.keys(), doc_ids))
+
+    def _dump_tables(self) -> dict[str, dict[str, dict]]:
+        return {
+            name: {doc[self._ROW_ID]: {k: v for k, v in doc.items() if k != self._ROW_ID}
+                   for doc in self._db.table(name).all()}
+            for name in TABLES
+        }
+
+    def _get(self, table: str, resource_id: str) -> Optional[dict]:
+        doc_id = self._doc_ids[table].get(resource_id)
+        return self._db.table(table).get(doc_id=doc_id) if doc_id is not None else None
+
+    def _put(self, table: str, resource_id: str, row: dict) -> None:
+        doc = dict(row, **{self._ROW_ID: resource_id})
+        doc_id = self._doc_ids[table].get(resource_id)
+        if doc_id is None:
+            self._doc_ids[table][resource_id] = self._db.table(table).insert(doc)
+        else:
+            self._db.table(table).update(doc, doc_ids=[doc_id])
+
+    def _remove(self, table: str, resource_id: str) -> None:
+        doc_id = self._doc_ids[table].pop(resource_id, None)
+        if doc_id is not None:
+            self._db.table(table).remove(doc_ids=[doc_id])
+
+    def _rows(self, table: str, **equals) -> list[dict]:
+        if not equals:
+            return self._db.table(table).all()
+        condition = reduce(lambda a, b: a & b, (where(k) == v for k, v in equals.items()))
+        return self._db.table(table).search(condition)
@@ -0,0 +1,372 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   Date:  2024/5/28
+#   Author:  Ian Patterson
+#   Contact Email:  ian@botts-inc.com
+#   ==============================================================================
+
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import pickle
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from typing import Callable, Optional
+
+from .schema_validation import compile_record_validator
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Registers the block again with the parent's resource tracker (see DecodePool.start()), which is a no-op
+    return shared_memory.SharedMemory(name=name)
+
+
+def _worker_main(tasks, results, transform):
+    """Decodes, validates and transforms batches of payloads read from shared memory until it receives None."""
+    validators = {}
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        if task[0] == 'schema':
+            _, key, schema = task
+            validators[key] = compile_record_validator(schema) if schema is not None else None
+            continue
+        _, seq, block_name, spans = task
+        block = _attach(block_name)
+        decoded = []
+        try:
+            buf = block.buf
+            for key, start, end in spans:
+                try:
+                    obs = json.loads(buf[start:end].tobytes())
+                    validator = validators.get(key)
+                    if validator is not None:
+                        validator.validate(obs.get('result') if isinstance(obs, dict) else obs)
+                    if transform is not None:
+                        obs = transform(obs)
+                    decoded.append((True, obs))
+                except Exception as e:
+                    decoded.append((False, f'{type(e).__name__}: {e}'))
+            del buf
+        finally:
+            block.close()
+        results.put((seq, _pickle_results(decoded)))
+
+
+def _pickle_results(decoded: list) -> bytes:
+    """
+    Pickles the results of a batch here rather than in the queue's feeder thread, which drops what it cannot pickle
+    without a word; results that cannot be pickled become errors.
+    """
+    try:
+        return pickle.dumps(decoded, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        checked = []
+        for ok, value in decoded:
+            try:
+                pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+                checked.append((ok, value))
+            except Exception as e:
+                checked.append((False, f'Result cannot be sent back from the worker: {type(e).__name__}: {e}'))
+        return pickle.dumps(checked, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class _Batch:
+    __slots__ = ('seq', 'worker', 'block', 'dedicated', 'items', 'spans', 'used')
+
+    def __init__(self, block: shared_memory.SharedMemory, dedicated: bool = False):
+        self.seq = None
+        self.worker = None
+        self.block = block
+        self.dedicated = dedicated
+        # (datastream, topic, payload) and (stream key, start, end) of each message
+        self.items = []
+        self.spans = []
+        self.used = 0
+
+
+class DecodePool:
+    """Decodes inbound observation payloads of Datastreams in worker processes.
+
+    A Datastream handed to ``attach()`` no longer processes its MQTT messages
+    on the paho network thread. Their payloads are copied into shared memory
+    blocks of *buffer_size* bytes, and a block is handed to one of the worker
+    processes once it holds *batch_size* messages, is full, or has been
+    waiting for *flush_interval* seconds; only the block's name and the
+    message offsets are pickled. The worker parses each payload as JSON,
+    validates the ``result`` against the datastream's record schema and
+    applies *transform*, which must be picklable (a module-level function),
+    and returns the results of the whole batch at once.
+
+    Results are delivered on the pool's result thread in the order the
+    messages arrived: the raw payload is appended to the datastream's inbound
+    deque and the decoded observation, instead of the raw payload, becomes the
+    data of the NEW_OBSERVATION event. Messages that fail to decode or
+    validate are logged and dropped, as are those of a worker that dies; the
+    worker is restarted. At most ``2 * processes`` blocks are in flight;
+    beyond that the network thread waits, which pushes back on the broker
+    instead of buffering without bound. ``submit()`` gives up after
+    *submit_timeout* seconds and the Datastream then processes the message
+    on the network thread itself.
+    """
+
+    def __init__(self, processes: int = None, batch_size: int = 256, flush_interval: float = 0.05,
+                 buffer_size: int = 4 * 1024 * 1024, transform: Callable = None, mp_context: str = None,
+                 submit_timeout: float = 10.0):
+        """
+        :param processes: number of worker processes, defaults to the number of CPUs
+        :param batch_size: messages per batch
+        :param flush_interval: seconds after which a partial batch is sent to a worker
+        :param buffer_size: size of the shared memory block of a batch; larger payloads get a block of their own
+        :param transform: ``transform(observation: dict) -> object`` applied in the workers after validation
+        :param mp_context: multiprocessing start method ('fork', 'spawn', 'forkserver'), defaults to the platform's
+        :param submit_timeout: seconds ``submit()`` waits for a free shared memory block
+        """
+        self.processes = processes or multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.submit_timeout = submit_timeout
+        self._transform = transform
+        self._context = multiprocessing.get_context(mp_context)
+        self._workers = []
+        self._task_queues = []
+        self._results = None
+        self._free_blocks: list[shared_memory.SharedMemory] = []
+        self._block_count = 0
+        self._max_blocks = 2 * self.processes
+        self._current: Optional[_Batch] = None
+        self._in_flight: dict[int, _Batch] = {}
+        self._completed: dict[int, list] = {}
+        self._next_seq = 0
+        self._next_delivery = 0
+        self._next_worker = 0
+        self._schemas: dict[str, object] = {}
+        self._lock = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Starts the worker processes. Called by ``attach()`` if needed."""
+        with self._lock:
+            if self._workers:
+                return
+            self._stop.clear()
+            # Started before the workers so that they share it, instead of each starting one that would unlink the
+            # parent's blocks when the worker exits
+            resource_tracker.ensure_running()
+            self._results = self._context.Queue()
+            self._workers = [None] * self.processes
+            self._task_queues = [None] * self.processes
+            for i in range(self.processes):
+                self._start_worker(i)
+            self._threads = [threading.Thread(target=self._collect, name='decode-pool-results', daemon=True),
+                             threading.Thread(target=self._flush_periodically, name='decode-pool-flush', daemon=True)]
+            for thread in self._threads:
+                thread.start()
+
+    def _start_worker(self, index: int):
+        # A fresh task queue, since a worker that died may have left the old one locked
+        tasks = self._context.Queue()
+        worker = self._context.Process(target=_worker_main, args=(tasks, self._results, self._transform),
+                                       name=f'oshconnect-decode-{index}', daemon=True)
+        worker.start()
+        self._workers[index] = worker
+        self._task_queues[index] = tasks
+        for key, schema in self._schemas.items():
+            tasks.put(('schema', key, schema))
+
+    def _replace_dead_workers(self):
+        """Restarts the workers that died and fails the batches they were given, so that delivery does not stall."""
+        with self._lock:
+            if self._stop.is_set():
+                return
+            for index, worker in enumerate(self._workers):
+                if worker.is_alive():
+                    continue
+                logging.error("Decode worker %s exited with code %s, restarting it", worker.name, worker.exitcode)
+                self._start_worker(index)
+                error = f'Decode worker {worker.name} exited with code {worker.exitcode}'
+                for batch in self._in_flight.values():
+                    if batch.worker == index and batch.seq not in self._completed:
+                        # Through the result thread, which delivers in order
+                        self._results.put((batch.seq, pickle.dumps([(False, error)] * len(batch.items))))
+
+    def close(self, timeout: float = 10.0):
+        """Decodes what was submitted, then stops the workers and frees the shared memory."""
+        self.flush()
+        with self._lock:
+            self._lock.wait_for(lambda: not self._in_flight, timeout=timeout)
+            self._stop.set()
+            for tasks in self._task_queues:
+                tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+            if worker.is_alive():
+                worker.terminate()
+        if self._results is not None:
+            self._results.put(None)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        with self._lock:
+            blocks = self._free_blocks + [batch.block for batch in self._in_flight.values()]
+            if self._current is not None:
+                blocks.append(self._current.block)
+            for block in blocks:
+                block.close()
+                block.unlink()
+            self._free_blocks, self._in_flight, self._current = [], {}, None
+            self._workers, self._task_queues, self._threads = [], [], []
+            self._block_count = 0
+
+    # ------------------------------------------------------------------
+    # Datastreams
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _key(datastream) -> str:
+        return str(datastream.get_internal_id())
+
+    def attach(self, datastream, validate: bool = True):
+        """
+        Decodes the inbound MQTT messages of *datastream* in this pool from now on.
+        :param validate: validate observation results against the datastream's record schema
+        """
+        resource = datastream.get_underlying_resource()
+        schema = getattr(resource, 'record_schema', None) if validate else None
+        key = self._key(datastream)
+        with self._lock:
+            self._schemas[key] = schema
+            for tasks in self._task_queues:
+                tasks.put(('schema', key, schema))
+        self.start()
+        datastream._decode_pool = self
+
+    def detach(self, datastream):
+        """Processes the messages of *datastream* on the network thread again; submitted messages are still delivered."""
+        datastream._decode_pool = None
+        with self._lock:
+            self._schemas.pop(self._key(datastream), None)
+
+    # ------------------------------------------------------------------
+    # Batching
+    # ------------------------------------------------------------------
+
+    def submit(self, datastream, topic: str, payload: bytes):
+        """
+        Queues a payload of *datastream* for decoding. Blocks while all shared memory blocks are in flight.
+        :raises TimeoutError: if no block became free within ``submit_timeout`` seconds
+        """
+        payload = payload.encode('utf-8') if isinstance(payload, str) else payload
+        size = len(payload)
+        with self._lock:
+            batch = self._current
+            if batch is not None and (batch.used + size > len(batch.block.buf) or batch.dedicated):
+                self._dispatch()
+                batch = None
+            if batch is None:
+                batch = self._current = self._new_batch(size)
+            batch.block.buf[batch.used:batch.used + size] = payload
+            batch.items.append((datastream, topic, payload))
+            batch.spans.append((self._key(datastream), batch.used, batch.used + size))
+            batch.used += size
+            if len(batch.items) >= self.batch_size:
+                self._dispatch()
+
+    def _new_batch(self, size: int) -> _Batch:
+        if size > self.buffer_size:
+            return _Batch(shared_memory.SharedMemory(create=True, size=size), dedicated=True)
+        if not self._lock.wait_for(lambda: self._free_blocks or self._block_count < self._max_blocks
+                                   or self._stop.is_set(), timeout=self.submit_timeout):
+            raise TimeoutError(f"No shared memory block of the decode pool became free in {self.submit_timeout} s")
+        if self._free_blocks:
+            return _Batch(self._free_blocks.pop())
+        self._block_count += 1
+        return _Batch(shared_memory.SharedMemory(create=True, size=self.buffer_size))
+
+    def _dispatch(self):
+        batch, self._current = self._current, None
+        if batch is None or not batch.items:
+            if batch is not None:
+                self._release(batch)
+            return
+        batch.seq = self._next_seq
+        self._next_seq += 1
+        self._in_flight[batch.seq] = batch
+        batch.worker = self._next_worker % len(self._task_queues)
+        self._next_worker += 1
+        self._task_queues[batch.worker].put(('decode', batch.seq, batch.block.name, batch.spans))
+
+    def flush(self):
+        """Sends the current partial batch to a worker."""
+        with self._lock:
+            if self._task_queues:
+                self._dispatch()
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            self._replace_dead_workers()
+
+    def _release(self, batch: _Batch):
+        if batch.dedicated:
+            batch.block.close()
+            batch.block.unlink()
+        else:
+            self._free_blocks.append(batch.block)
+        self._lock.notify_all()
+
+    # ------------------------------------------------------------------
+    # Results
+    # ------------------------------------------------------------------
+
+    def _collect(self):
+        while True:
+            result = self._results.get()
+            if result is None:
+                return
+            seq, data = result
+            try:
+                decoded = pickle.loads(data)
+            except Exception as e:
+                decoded = e
+            with self._lock:
+                if seq not in self._in_flight or seq in self._completed:
+                    # The batch of a dead worker was already failed, or its result came after all
+                    continue
+                if isinstance(decoded, Exception):
+                    decoded = [(False, f'{type(decoded).__name__}: {decoded}')] * len(self._in_flight[seq].items)
+                self._completed[seq] = decoded
+                ready = []
+                # Workers finish out of order; deliver in submission order to keep each stream's order
+                while self._next_delivery in self._completed:
+                    batch = self._in_flight.pop(self._next_delivery)
+                    ready.append((batch.items, self._completed.pop(self._next_delivery)))
+                    self._release(batch)
+                    self._next_delivery += 1
+            for items, decoded in ready:
+                for (datastream, topic, payload), (ok, value) in zip(items, decoded):
+                    if not ok:
+                        logging.warning("Dropped observation of datastream %s: %s", datastream.get_id(), value)
+                        continue
+                    try:
+                        datastream._deliver_decoded(topic, payload, value)
+                    except Exception as e:
+                        logging.error("Delivering a decoded observation of datastream %s failed: %s",
+                                      datastream.get_id(), e)
+
+    def get_pending_count(self) -> int:
+        """Number of messages submitted and not delivered yet."""
+        with self._lock:
+            pending = sum(len(batch.items) for batch in self._in_flight.values())
+            return pending + (len(self._current.items) if self._current is not None else 0)
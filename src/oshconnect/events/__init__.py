@@ -7,7 +7,7 @@
 
 from .core import Event, DefaultEventTypes, AtomicEventTypes
 from .handler import EventHandler
-from .listeners import IEventListener, CallbackListener
+from .listeners import IEventListener, CallbackListener, ConflatingListener
 from .builder import EventBuilder
 
 __all__ = [
@@ -17,5 +17,6 @@ __all__ = [
     "EventHandler",
     "IEventListener",
     "CallbackListener",
+    "ConflatingListener",
     "EventBuilder",
 ]
@@ -12,7 +12,7 @@ from collections import deque
 from typing import Callable
 
 from .core import DefaultEventTypes, Event
-from .listeners import CallbackListener, IEventListener
+from .listeners import CallbackListener, ConflatingListener, IEventListener
 
 
 class EventHandler(object):
@@ -65,6 +65,8 @@ class EventHandler(object):
                 self.to_add.append(listener)
 
     def unregister_listener(self, listener: IEventListener):
+        if isinstance(listener, ConflatingListener):
+            listener.close()
         if not self.publish_lock:
             if listener in self.listeners:
                 self.listeners.remove(listener)
@@ -76,6 +78,9 @@ class EventHandler(object):
         callback: Callable[[Event], None],
         types: list[DefaultEventTypes] = None,
         topics: list[str] = None,
+        max_rate: float = None,
+        conflate: bool = False,
+        batch: bool = False,
     ) -> CallbackListener:
         """
         Register a plain callable as a listener.
@@ -83,13 +88,29 @@ class EventHandler(object):
         :param callback: Function to call when a matching event is published.
         :param types: Event types to filter on. ``None`` / empty = all types.
         :param topics: MQTT/event topics to filter on. ``None`` / empty = all topics.
+        :param max_rate: Deliver at most this many times per second, from a timer thread; see ``ConflatingListener``.
+            ``None`` = deliver each event as it is published.
+        :param conflate: With ``max_rate``, deliver only the newest event per topic of each interval.
+        :param batch: With ``max_rate``, call ``callback`` once per interval with the list of events.
         :returns: The ``CallbackListener`` — keep a reference to unregister later.
         """
-        listener = CallbackListener(
-            topics=topics or [],
-            types=types or [],
-            callback=callback,
-        )
+        if max_rate is not None:
+            listener = ConflatingListener(
+                topics=topics or [],
+                types=types or [],
+                callback=callback,
+                max_rate=max_rate,
+                conflate=conflate,
+                batch=batch,
+            )
+        elif conflate or batch:
+            raise ValueError("conflate and batch require max_rate")
+        else:
+            listener = CallbackListener(
+                topics=topics or [],
+                types=types or [],
+                callback=callback,
+            )
         self.register_listener(listener)
         return listener
 
@@ -7,9 +7,11 @@
 
 from __future__ import annotations
 
+import logging
+import threading
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
-from typing import Callable
+from typing import Callable, Optional
 
 from .core import DefaultEventTypes, Event
 
@@ -50,3 +52,79 @@ class CallbackListener(IEventListener):
     def handle_events(self, event: Event):
         if self.callback is not None:
             self.callback(event)
+
+
+@dataclass(eq=False)
+class ConflatingListener(CallbackListener):
+    """
+    CallbackListener that delivers events at most ``max_rate`` times per second, from its own timer thread.
+
+    Events received between two ticks are held back and delivered together on the next tick. With ``conflate``,
+    only the newest event per topic is kept, so the number of deliveries per tick is bounded by the number of
+    topics however fast events arrive. With ``batch``, the callback is called once per tick with the list of
+    events, in arrival order of their topics' first event, instead of once per event.
+
+    Example::
+
+        def render(events: list[Event]):
+            for event in events:
+                update_widget(event.topic, event.data)
+
+        EventHandler().subscribe(render, types=[DefaultEventTypes.NEW_OBSERVATION],
+                                 max_rate=10, conflate=True, batch=True)
+    """
+    max_rate: float = 10.0
+    conflate: bool = False
+    batch: bool = False
+    _pending: dict = field(default_factory=dict, init=False, repr=False)
+    _next_key: int = field(default=0, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _stop: threading.Event = field(default_factory=threading.Event, init=False, repr=False)
+    _thread: Optional[threading.Thread] = field(default=None, init=False, repr=False)
+
+    # Each instance owns a thread: never equal to another listener with the same callback and filters
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    def __post_init__(self):
+        if not self.max_rate or self.max_rate <= 0:
+            raise ValueError(f"max_rate must be positive, got {self.max_rate}")
+        self._thread = threading.Thread(target=self._run, name='conflating-listener', daemon=True)
+        self._thread.start()
+
+    def handle_events(self, event: Event):
+        with self._lock:
+            if self.conflate:
+                # Replacing a value keeps the topic's place in the dict
+                self._pending[event.topic] = event
+            else:
+                self._pending[self._next_key] = event
+                self._next_key += 1
+
+    def flush(self) -> int:
+        """Delivers the held-back events now. Returns the number of events delivered."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            events, self._pending = list(self._pending.values()), {}
+        if self.callback is None:
+            return len(events)
+        if self.batch:
+            self.callback(events)
+        else:
+            for event in events:
+                self.callback(event)
+        return len(events)
+
+    def _run(self):
+        while not self._stop.wait(1.0 / self.max_rate):
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error("Error in rate-limited event listener %s: %s", self, e)
+
+    def close(self):
+        """Stops the timer thread; events still held back are dropped."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
@@ -0,0 +1,177 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   Date:  2024/5/28
+#   Author:  Ian Patterson
+#   Contact Email:  ian@botts-inc.com
+#   ==============================================================================
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+from .csapi4py.constants import APIResourceTypes
+from .events import CallbackListener, DefaultEventTypes, Event, EventHandler
+from .polling import fetch_pages, parse_result_time
+
+_UNDECODED = object()
+
+
+@dataclass(frozen=True)
+class LatestValue:
+    """The newest message of a datastream or control stream status channel."""
+    stream_id: str
+    # The observation's result, or the whole record for messages without one (command status)
+    value: Any
+    # resultTime (reportTime for a status) as sent by the server, if the record has one
+    timestamp: Optional[str]
+    # time.time() when the message was received
+    received_at: float
+    # The whole decoded record, or the raw payload if it is not JSON
+    record: Any
+
+
+def _result_timestamp(obs: dict) -> float:
+    result_time = parse_result_time(obs.get('resultTime'))
+    return result_time.timestamp() if result_time is not None else float('-inf')
+
+
+class _Entry:
+    __slots__ = ('payload', 'received_at', 'latest')
+
+    def __init__(self, payload, received_at: float):
+        self.payload = payload
+        self.received_at = received_at
+        self.latest = _UNDECODED
+
+    def to_latest(self, stream_id: str) -> LatestValue:
+        # Decoded on first access only, so keeping the cache current costs no parsing on the network thread
+        if self.latest is _UNDECODED:
+            record = self.payload
+            if isinstance(record, (bytes, bytearray, str)):
+                try:
+                    record = json.loads(record)
+                except ValueError:
+                    pass
+            if isinstance(record, dict):
+                value = record.get('result', record)
+                timestamp = record.get('resultTime') or record.get('reportTime') or record.get('phenomenonTime')
+            else:
+                value, timestamp = record, None
+            self.latest = LatestValue(stream_id, value, timestamp, self.received_at, record)
+        return self.latest
+
+
+class LatestValueCache:
+    """The newest observation of every Datastream and the newest status of every ControlStream, by resource id.
+
+    Once ``attach()``-ed, the cache follows the NEW_OBSERVATION and
+    NEW_COMMAND_STATUS events of the event bus, so it covers every subscribed
+    or started stream, whatever its transport. Receiving a message only
+    replaces one dict entry; the payload is decoded on the first ``get()``
+    and the result kept until the next message. ``snapshot()`` copies the
+    entries of any number of streams in one call, for periodic UI refreshes.
+
+    ``seed()`` fills in the streams that have not received anything yet with
+    the latest observation archived on the server.
+    """
+
+    def __init__(self, event_bus: EventHandler = None):
+        self._event_bus = event_bus if event_bus is not None else EventHandler()
+        self._observations: dict[str, _Entry] = {}
+        self._statuses: dict[str, _Entry] = {}
+        self._listener: Optional[CallbackListener] = None
+
+    def attach(self):
+        """Starts following the event bus."""
+        if self._listener is None:
+            self._listener = self._event_bus.subscribe(
+                self.handle_event, types=[DefaultEventTypes.NEW_OBSERVATION, DefaultEventTypes.NEW_COMMAND_STATUS])
+
+    def detach(self):
+        if self._listener is not None:
+            self._event_bus.unregister_listener(self._listener)
+            self._listener = None
+
+    @staticmethod
+    def _key(stream) -> str:
+        return stream if isinstance(stream, str) else stream._resource_id
+
+    def handle_event(self, event: Event):
+        stream_id = getattr(event.producer, '_resource_id', None) or event.topic
+        entries = self._statuses if event.type == DefaultEventTypes.NEW_COMMAND_STATUS else self._observations
+        entries[stream_id] = _Entry(event.data, time.time())
+
+    def get(self, datastream) -> Optional[LatestValue]:
+        """
+        The newest observation of a datastream.
+        :param datastream: the Datastream or its server resource id
+        """
+        key = self._key(datastream)
+        entry = self._observations.get(key)
+        return entry.to_latest(key) if entry is not None else None
+
+    def get_status(self, controlstream) -> Optional[LatestValue]:
+        """
+        The newest command status of a control stream.
+        :param controlstream: the ControlStream or its server resource id
+        """
+        key = self._key(controlstream)
+        entry = self._statuses.get(key)
+        return entry.to_latest(key) if entry is not None else None
+
+    def snapshot(self, datastreams: Iterable = None) -> dict[str, LatestValue]:
+        """
+        The newest observations of the given datastreams, or of all, by resource id. Datastreams without one are left
+        out.
+        """
+        return self._snapshot(self._observations, datastreams)
+
+    def snapshot_statuses(self, controlstreams: Iterable = None) -> dict[str, LatestValue]:
+        return self._snapshot(self._statuses, controlstreams)
+
+    def _snapshot(self, entries: dict[str, _Entry], streams: Iterable = None) -> dict[str, LatestValue]:
+        if streams is None:
+            items = list(entries.items())
+        else:
+            items = [(key, entries.get(key)) for key in map(self._key, streams)]
+        return {key: entry.to_latest(key) for key, entry in items if entry is not None}
+
+    def __len__(self) -> int:
+        return len(self._observations)
+
+    def clear(self):
+        self._observations.clear()
+        self._statuses.clear()
+
+    async def seed(self, datastreams: Iterable, concurrency: int = 8) -> int:
+        """
+        Requests the latest archived observation of the given datastreams that have not received one yet, at most
+        *concurrency* at a time. Observations received live meanwhile are kept.
+        :return: the number of datastreams seeded
+        """
+        datastreams = [ds for ds in datastreams if ds._resource_id not in self._observations]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(ds) -> list[dict]:
+            node = ds.get_parent_node()
+            url = node.get_api_helper().resource_url_resolver(APIResourceTypes.OBSERVATION, None, ds._resource_id)
+            async with semaphore:
+                return await fetch_pages(node.get_session(), url, {'resultTime': 'latest'}, node.get_auth_headers())
+
+        results = await asyncio.gather(*(fetch(ds) for ds in datastreams), return_exceptions=True)
+        seeded = 0
+        for ds, items in zip(datastreams, results):
+            if isinstance(items, BaseException):
+                logging.warning("Could not seed the latest value of datastream %s: %s", ds._resource_id, items)
+                continue
+            if not items:
+                continue
+            newest = max(items, key=_result_timestamp)
+            if self._observations.setdefault(ds._resource_id, _Entry(newest, time.time())).payload is newest:
+                seeded += 1
+        return seeded
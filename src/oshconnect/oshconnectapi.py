@@ -9,14 +9,20 @@ import json
 from typing import Callable
 from uuid import UUID
 
+from .checkpoints import CheckpointManager
 from .events import EventHandler, DefaultEventTypes, CallbackListener
 from .events.builder import EventBuilder
 from .csapi4py.default_api_helpers import APIHelper
+from .csapi4py.querymodel import QueryModel
 from .datastore import DataStore
+from .datastores.lazy import LazyResourceList
+from .latestvalues import LatestValueCache
+from .registry import ResourceRegistry
+from .spatial import SpatialIndex
 from .resource_datamodels import DatastreamResource
 from .streamableresource import Node, System, SessionManager, Datastream, ControlStream
 from .styling import Styling
-from .timemanagement import TemporalModes, TimeManagement, TimePeriod
+from .timemanagement import Synchronizer, TemporalModes, TimeController, TimeManagement, TimePeriod
 
 
 class OSHConnect:
@@ -34,11 +40,16 @@ class OSHConnect:
     _playback_mode: TemporalModes
     _session_manager: SessionManager
     _event_bus: EventHandler
+    _registry: ResourceRegistry
+    _sampling_features: SpatialIndex
+    _checkpoints: CheckpointManager
+    _latest_values: LatestValueCache
 
-    def __init__(self, name: str, datastore: DataStore = None, **kwargs):
+    def __init__(self, name: str, datastore: DataStore = None, spatial_index: bool = False, **kwargs):
         """
         :param name: name of the OSHConnect instance
         :param datastore: optional DataStore backend for persisting the resource graph
+        :param spatial_index: index the locations of systems for local bbox/within/nearest queries
         :param kwargs:
         """
         self._name = name
@@ -56,6 +67,10 @@ class OSHConnect:
         logging.info(f"OSHConnect instance {name} created")
         self._session_manager = SessionManager()
         self._event_bus = EventHandler()
+        self._registry = ResourceRegistry(spatial_index=spatial_index)
+        self._sampling_features = SpatialIndex()
+        self._checkpoints = None
+        self._latest_values = None
 
     def get_name(self):
         """
@@ -84,10 +99,16 @@ class OSHConnect:
         :param node_id:
         :return:
         """
-        # TODO: should disconnect datastreams and delete them and all systems at the same time.
+        # TODO: should disconnect datastreams at the same time.
         # list of nodes in our node list that do not have the id of the node we want to remove
+        removed = [node for node in self._nodes if node.get_id() == node_id]
         self._nodes = [node for node in self._nodes if
                        node.get_id() != node_id]
+        systems = []
+        for node in removed:
+            # Entries, so that systems a lazily loaded node never loaded are not loaded just to be dropped
+            systems.extend(node.systems().entries() if hasattr(node.systems(), 'entries') else node.systems())
+        self._unregister_systems(systems)
         self._event_bus.publish(
             EventBuilder().with_type(DefaultEventTypes.REMOVE_NODE)
             .with_topic(EventBuilder.create_topic(DefaultEventTypes.REMOVE_NODE, node_id))
@@ -127,12 +148,29 @@ class OSHConnect:
             )
         self.datastore.save_all(self._nodes)
 
+    def save_changes(self) -> int:
+        """Persist only the resources modified since they were last saved or loaded.
+
+        Cheap enough to call periodically: unchanged resources are neither
+        serialized nor written. See ``DataStore.save_changes``.
+
+        :return: the number of resources written
+        :raises RuntimeError: if no datastore has been configured.
+        """
+        if self.datastore is None:
+            raise RuntimeError(
+                "No datastore configured. Pass a DataStore instance to OSHConnect()."
+            )
+        return self.datastore.save_changes(self._nodes)
+
     def load_from_store(self) -> None:
         """Restore the node graph from the configured datastore into this instance.
 
         Reconstructed Nodes are registered with this instance's SessionManager so
         their child resources (Systems, Datastreams, ControlStreams) can initialise
         correctly. Calling this method appends to any already-loaded nodes.
+        Systems loaded lazily (e.g. ``SQLiteDataStore(lazy=True)``) stay
+        unmaterialized until first accessed.
 
         :raises RuntimeError: if no datastore has been configured.
         """
@@ -143,7 +181,17 @@ class OSHConnect:
         nodes = self.datastore.load_all(session_manager=self._session_manager)
         for node in nodes:
             self._nodes.append(node)
-            self._systems.extend(node.systems())
+            systems = node.systems()
+            if isinstance(systems, LazyResourceList):
+                if not isinstance(self._systems, LazyResourceList):
+                    self._systems = LazyResourceList(self._systems)
+                # The streams of a lazy system are registered once the system itself is loaded
+                self._registry.add_all(systems)
+                self._systems.extend(systems)
+                continue
+            self._systems.extend(systems)
+            for system in systems:
+                self._register_system(system)
 
     def share_config(self, config: dict):
         pass
@@ -178,33 +226,122 @@ class OSHConnect:
     def get_visualization_recommendations(self, streams: list):
         pass
 
-    def discover_systems(self, nodes: list[str] = None):
+    def _search_nodes(self, nodes: list[str] = None) -> list[Node]:
+        if nodes is None:
+            return self._nodes
+        return [node for node in self._nodes if node.get_id() in nodes]
+
+    def discover_systems(self, nodes: list[str] = None, bbox=None, location=None,
+                         query: QueryModel = None) -> list[System]:
         """
         Discover systems from the nodes that have been added to the OSHConnect instance. They are associated with the
-        nodes that they are discovered from so access to them flows through there.
-        :param nodes:
-        :return:
-        """
-        search_nodes = self._nodes
-        if nodes is not None:
-            search_nodes = [node for node in search_nodes if
-                            node.get_id() in nodes]
-
-        for node in search_nodes:
-            res_systems = node.discover_systems()
-            self._systems.extend(res_systems)
-            for system in res_systems:
+        nodes that they are discovered from so access to them flows through there. Systems discovered before are
+        updated rather than added again.
+        :param nodes: ids of the nodes to search, defaults to all nodes
+        :param bbox: only discover systems in this bounding box ``[min_x, min_y, max_x, max_y]`` (filtered by the server)
+        :param location: only discover systems intersecting this geometry (filtered by the server)
+        :param query: further filters, paging and ``select`` projection, evaluated by the server
+        :return: the systems returned by the servers
+        """
+        found = []
+        for node in self._search_nodes(nodes):
+            res_systems = node.discover_systems(bbox=bbox, location=location, query=query) or []
+            found.extend(res_systems)
+            new_systems = [system for system in res_systems if system not in self._registry]
+            self._systems.extend(new_systems)
+            self._registry.add_all(new_systems)
+            for system in new_systems:
                 self._event_bus.publish(
                     EventBuilder().with_type(DefaultEventTypes.ADD_SYSTEM)
                     .with_topic(EventBuilder.create_topic(DefaultEventTypes.ADD_SYSTEM,
                                                           getattr(system, '_resource_id', None)))
                     .with_data(system).with_producer(self).build()
                 )
+        return found
+
+    def discover_sampling_features(self, nodes: list[str] = None, bbox=None, location=None,
+                                   query: QueryModel = None) -> list[dict]:
+        """
+        Discover sampling features from the nodes and index their geometry for ``find_sampling_features()``.
+        :param nodes: ids of the nodes to search, defaults to all nodes
+        :param bbox: only discover features in this bounding box (filtered by the server)
+        :param location: only discover features intersecting this geometry (filtered by the server)
+        :param query: further filters, paging and ``select`` projection, evaluated by the server
+        :return: the GeoJSON features returned by the servers
+        """
+        found = []
+        for node in self._search_nodes(nodes):
+            features = node.discover_sampling_features(bbox=bbox, location=location, query=query) or []
+            for feature in features:
+                self._sampling_features.add((node.get_id(), feature.get('id')), feature, feature)
+            found.extend(features)
+        return found
+
+    # Spatial queries
+    def enable_spatial_index(self):
+        """Index the locations of all known systems, now and as they are discovered or move."""
+        self._registry.enable_spatial_index()
+
+    def _query_remotely(self, remote: bool | None) -> bool:
+        return not self._registry.has_spatial_index() if remote is None else remote
 
-    def discover_datastreams(self):
+    def find_systems_in_bbox(self, bbox, remote: bool = None) -> list[System]:
+        """
+        Find the systems located in a bounding box.
+        :param bbox: ``[min_x, min_y, max_x, max_y]``
+        :param remote: ask the servers (``bbox`` query parameter, discovering the systems it returns) instead of the
+            local spatial index; by default the servers are asked only when the spatial index is not enabled
+        :return: list of systems
+        """
+        if self._query_remotely(remote):
+            return self.discover_systems(bbox=bbox)
+        return self._registry.systems_in_bbox(bbox)
+
+    def find_systems_within(self, geometry, remote: bool = None) -> list[System]:
+        """
+        Find the systems located inside a geometry, e.g. a polygon.
+        :param geometry: shapely geometry, GeoJSON dict or Geometry model
+        :param remote: ask the servers (``location`` query parameter) instead of the local spatial index, see
+            find_systems_in_bbox(). Servers match systems that intersect the geometry.
+        :return: list of systems
+        """
+        if self._query_remotely(remote):
+            return self.discover_systems(location=geometry)
+        return self._registry.systems_within(geometry)
+
+    def find_nearest_systems(self, geometry, k: int = 1, max_distance: float = None) -> list[System]:
+        """
+        Find the systems closest to a location using the spatial index.
+        :param geometry: a position ``[x, y]`` or any geometry
+        :param k: number of systems to return
+        :param max_distance: ignore systems farther away than this, in the units of the coordinates
+        :return: list of systems, nearest first
+        :raises RuntimeError: if the spatial index is not enabled.
+        """
+        return self._registry.nearest_systems(geometry, k, max_distance)
+
+    def find_sampling_features(self, geometry, remote: bool = False) -> list[dict]:
+        """
+        Find the discovered sampling features intersecting a geometry or bounding box.
+        :param geometry: ``[min_x, min_y, max_x, max_y]`` or any geometry
+        :param remote: discover the matching features from the servers first
+        :return: list of GeoJSON features
+        """
+        if remote:
+            if isinstance(geometry, (list, tuple)) and len(geometry) == 4:
+                return self.discover_sampling_features(bbox=geometry)
+            return self.discover_sampling_features(location=geometry)
+        return self._sampling_features.intersects(geometry)
+
+    def discover_datastreams(self, query: QueryModel = None):
+        """
+        Discover the datastreams of all known systems.
+        :param query: filters (e.g. observed_property), paging and ``select`` projection, evaluated by the server
+        """
         for system in self._systems:
-            datastreams = system.discover_datastreams()
+            datastreams = system.discover_datastreams(query)
             self._datastreams.extend(datastreams)
+            self._registry.add_all(datastreams)
             for ds in datastreams:
                 self._event_bus.publish(
                     EventBuilder().with_type(DefaultEventTypes.ADD_DATASTREAM)
@@ -213,10 +350,16 @@ class OSHConnect:
                     .with_data(ds).with_producer(self).build()
                 )
 
-    def discover_controlstreams(self, streams: list):
+    def discover_controlstreams(self, streams: list = None, query: QueryModel = None):
+        """
+        Discover the control streams of all known systems.
+        :param streams: unused
+        :param query: filters (e.g. controlled_property), paging and ``select`` projection, evaluated by the server
+        """
         for system in self._systems:
-            controlstreams = system.discover_controlstreams()
+            controlstreams = system.discover_controlstreams(query)
             self._controlstreams.extend(controlstreams)
+            self._registry.add_all(controlstreams)
             for cs in controlstreams:
                 self._event_bus.publish(
                     EventBuilder().with_type(DefaultEventTypes.ADD_CONTROLSTREAM)
@@ -228,11 +371,23 @@ class OSHConnect:
     def authenticate_user(self, user: dict):
         pass
 
-    def synchronize_streams(self, systems: list):
-        pass
+    def synchronize_streams(self, systems: list, lateness: float = 1.0) -> Synchronizer:
+        """
+        Merges the live observations of the given systems' datastreams into a single time-ordered stream.
+        :param systems: list of System and/or Datastream objects
+        :param lateness: seconds an observation may arrive out of order before it is dropped
+        :return: Synchronizer to consume the merged stream from (``merge()``, ``poll()`` or ``async for``)
+        """
+        return Synchronizer(lateness=lateness).synchronize(systems)
 
     def set_playback_mode(self, mode: TemporalModes):
-        self._datasource_handler.set_playback_mode(mode)
+        """
+        Sets the temporal mode used for playback. ARCHIVE and ARCHIVE_SYNC replay archived observations through the
+        TimeController over the time period given to set_timeperiod().
+        :param mode: TemporalModes value
+        """
+        self._playback_mode = mode
+        TimeController().set_temporal_mode(mode)
 
     def set_timeperiod(self, start_time: str, end_time: str):
         """
@@ -244,6 +399,7 @@ class OSHConnect:
         """
         tp = TimePeriod(start=start_time, end=end_time)
         self.timestream = TimeManagement(time_range=tp)
+        self.timestream.time_controller.set_time_period(tp)
 
     # def get_message_list(self) -> list[MessageWrapper]:
     #     """
@@ -263,12 +419,12 @@ class OSHConnect:
             self.add_system_to_node(system, target_node, insert_resource=True)
             return system
 
-    def add_datastream(self, datastream: DatastreamResource, system: str | System) -> str:
+    def add_datastream(self, datastream: DatastreamResource, system: str | System) -> Datastream:
         """
         Adds a datastream into the OSHConnect instance.
         :param datastream: DataSource object
-        :param system: System object or system id
-        :return:
+        :param system: System object or system id (see find_system())
+        :return: the created Datastream
         """
         sys_obj: System
         if isinstance(system, str):
@@ -278,20 +434,77 @@ class OSHConnect:
         else:
             sys_obj = system
 
-        sys_obj.add_insert_datastream(datastream)
+        new_ds = sys_obj.add_insert_datastream(datastream)
 
-        self._datastreams.append(datastream)
+        self._datastreams.append(new_ds)
+        self._registry.add(new_ds)
+        return new_ds
 
-    def find_system(self, system_id: str) -> System | None:
+    def find_system(self, system_id: str | UUID) -> System | None:
         """
-        Find a system in the OSHConnect instance.
-        :param system_id:
+        Find a system in the OSHConnect instance. O(1) via the resource registry.
+        :param system_id: internal UUID, server resource id or URN of the system
         :return: the found system or None if not found
         """
-        for system in self._systems:
-            if system.uid == system_id:
-                return system
-        return None
+        system = self._registry.get(system_id)
+        if isinstance(system, System):
+            return system
+        return (self._registry.get_by_resource_id(system_id, System)
+                or self._registry.get_system_by_urn(system_id))
+
+    def find_datastream(self, datastream_id: str | UUID) -> Datastream | None:
+        """
+        Find a datastream in the OSHConnect instance.
+        :param datastream_id: internal UUID or server resource id of the datastream
+        :return: the found datastream or None if not found
+        """
+        ds = self._registry.get(datastream_id)
+        if isinstance(ds, Datastream):
+            return ds
+        return self._registry.get_by_resource_id(datastream_id, Datastream)
+
+    def find_controlstream(self, controlstream_id: str | UUID) -> ControlStream | None:
+        """
+        Find a control stream in the OSHConnect instance.
+        :param controlstream_id: internal UUID or server resource id of the control stream
+        :return: the found control stream or None if not found
+        """
+        cs = self._registry.get(controlstream_id)
+        if isinstance(cs, ControlStream):
+            return cs
+        return self._registry.get_by_resource_id(controlstream_id, ControlStream)
+
+    def find_resource_by_topic(self, topic: str) -> Datastream | ControlStream | None:
+        """
+        Find the datastream or control stream publishing on an MQTT topic (data or command status topic).
+        :param topic: MQTT topic
+        :return: the found resource or None if not found
+        """
+        return self._registry.get_by_topic(topic)
+
+    def get_registry(self) -> ResourceRegistry:
+        """The id/URN/topic indexes over every resource known to this instance."""
+        return self._registry
+
+    def _register_system(self, system: System):
+        """Registers a system and its streams, adding streams not seen before to the flat stream lists."""
+        self._datastreams.extend(ds for ds in system.datastreams if ds not in self._registry)
+        self._controlstreams.extend(cs for cs in system.control_channels if cs not in self._registry)
+        self._registry.add(system)
+
+    def _unregister_systems(self, systems: list[System]):
+        """
+        Unregisters systems and their streams and drops them from the flat resource lists, filtering each list once
+        whatever the number of systems.
+        """
+        for system in systems:
+            self._registry.remove(system)
+        if isinstance(self._systems, LazyResourceList):
+            self._systems = LazyResourceList(s for s in self._systems.entries() if s in self._registry)
+        else:
+            self._systems = [s for s in self._systems if s in self._registry]
+        self._datastreams = [ds for ds in self._datastreams if ds in self._registry]
+        self._controlstreams = [cs for cs in self._controlstreams if cs in self._registry]
 
     # System Management
     def add_system_to_node(self, system: System, target_node: Node, insert_resource: bool = False):
@@ -307,6 +520,7 @@ class OSHConnect:
             if insert_resource:
                 system.insert_self()
             self._systems.append(system)
+            self._register_system(system)
             return
 
     def create_and_insert_system(self, system_opts: dict, target_node: Node):
@@ -321,8 +535,21 @@ class OSHConnect:
             self.add_system_to_node(new_system, target_node, insert_resource=True)
             return new_system
 
-    def remove_system(self, system_id: str):
-        pass
+    def remove_system(self, system_id: str | UUID) -> System | None:
+        """
+        Remove a system, along with its datastreams and control streams, from the OSHConnect instance and its node.
+        Nothing is deleted on the server.
+        :param system_id: internal UUID, server resource id or URN of the system
+        :return: the removed system or None if not found
+        """
+        system = self.find_system(system_id)
+        if system is None:
+            return None
+        node = system.get_parent_node()
+        if node is not None:
+            node.remove_system(system)
+        self._unregister_systems([system])
+        return system
 
     # DataStream Helpers
     def get_datastreams(self) -> list[Datastream]:
@@ -344,8 +571,10 @@ class OSHConnect:
         Get a group of resources by their IDs. Can be any mix of systems, datastreams, and controlstreams.
         :param resource_ids: list of resource IDs (internal UUID)
         """
-        systems = [system for system in self._systems if system.get_internal_id() in resource_ids]
-        datastreams = [ds for ds in self._datastreams if ds.get_internal_id() in resource_ids]
+        resources = self._registry.get_many(resource_ids) if resource_ids is not None else \
+            self._registry.systems() + self._registry.datastreams()
+        systems = [res for res in resources if isinstance(res, System)]
+        datastreams = [res for res in resources if isinstance(res, Datastream)]
         return systems, datastreams
 
     def initialize_resource_groups(self, resource_ids: list = None):
@@ -369,6 +598,48 @@ class OSHConnect:
         for ds in datastreams:
             ds.start()
 
+    def get_checkpoints(self) -> CheckpointManager:
+        """Consumer checkpoints of the datastreams, committed to the configured datastore.
+
+        :raises RuntimeError: if no datastore has been configured.
+        """
+        if self.datastore is None:
+            raise RuntimeError(
+                "No datastore configured. Pass a DataStore instance to OSHConnect()."
+            )
+        if self._checkpoints is None:
+            self._checkpoints = CheckpointManager(self.datastore)
+        return self._checkpoints
+
+    def resume_datastreams(self, dsid_list: list = None) -> list:
+        """
+        Starts the datastreams that are specified from their consumer checkpoints, catching up on what they missed
+        from the server's archive. See ``CheckpointManager.resume``.
+        :return: the archive catch-up tasks, one per Node
+        """
+        datastreams = self.get_resource_group(dsid_list)[1]
+        return self.get_checkpoints().resume(datastreams)
+
+    def get_latest_values(self) -> LatestValueCache:
+        """The newest observation of each datastream and status of each control stream, kept up to date from the
+        event bus once this is first called."""
+        if self._latest_values is None:
+            self._latest_values = LatestValueCache(self._event_bus)
+            self._latest_values.attach()
+        return self._latest_values
+
+    def seed_latest_values(self, dsid_list: list = None):
+        """
+        Fills the latest-value cache with the newest archived observation of the specified datastreams that have not
+        received one yet. See ``LatestValueCache.seed``.
+        :return: the asyncio Task or concurrent.futures.Future of the requests, None if there are no datastreams
+        """
+        datastreams = self.get_resource_group(dsid_list)[1]
+        if not datastreams:
+            return None
+        session = datastreams[0].get_parent_node().get_session()
+        return session.run_stream(self.get_latest_values().seed(datastreams))
+
     def start_systems(self, sysid_list: list = None):
         """
         Starts the systems that are specified.
@@ -381,23 +652,28 @@ class OSHConnect:
     # Event subscription convenience methods
     # ------------------------------------------------------------------
 
-    def on_observation(self, callback: Callable, datastream_id: str = None) -> CallbackListener:
+    def on_observation(self, callback: Callable, datastream_id: str = None, max_rate: float = None,
+                       conflate: bool = False, batch: bool = False) -> CallbackListener:
         """
         Subscribe to incoming observation events.
 
-        :param callback: ``fn(event: Event)`` called for each matching event.
+        :param callback: ``fn(event: Event)`` called for each matching event, or ``fn(events: list[Event])``
+            with ``batch``.
         :param datastream_id: When provided, only events from that datastream are
             delivered (matched via the datastream's MQTT data topic). When omitted,
             all observation events are delivered.
+        :param max_rate: Deliver at most this many times per second, for UI consumers; see ``ConflatingListener``.
+        :param conflate: With ``max_rate``, deliver only the newest observation per datastream of each interval.
+        :param batch: With ``max_rate``, deliver the observations of each interval in one call.
         :returns: ``CallbackListener`` — pass to ``event_bus.unregister_listener()`` to cancel.
         """
         topic_filter = []
         if datastream_id is not None:
-            ds = next((ds for ds in self._datastreams if ds.get_id() == datastream_id), None)
+            ds = self.find_datastream(datastream_id)
             if ds is not None and getattr(ds, '_topic', None):
                 topic_filter = [ds._topic]
         return self._event_bus.subscribe(callback, types=[DefaultEventTypes.NEW_OBSERVATION],
-                                         topics=topic_filter)
+                                         topics=topic_filter, max_rate=max_rate, conflate=conflate, batch=batch)
 
     def on_system_added(self, callback: Callable) -> CallbackListener:
         """
@@ -419,8 +695,7 @@ class OSHConnect:
         """
         topic_filter = []
         if controlstream_id is not None:
-            cs = next((cs for cs in self._controlstreams
-                       if getattr(cs, '_resource_id', None) == controlstream_id), None)
+            cs = self.find_controlstream(controlstream_id)
             if cs is not None and getattr(cs, '_topic', None):
                 topic_filter = [cs._topic]
         return self._event_bus.subscribe(callback, types=[DefaultEventTypes.NEW_COMMAND],
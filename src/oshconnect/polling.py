@@ -0,0 +1,229 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   Date:  2024/5/28
+#   Author:  Ian Patterson
+#   Contact Email:  ian@botts-inc.com
+#   ==============================================================================
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import threading
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+
+def parse_result_time(value: str) -> Optional[datetime]:
+    """Parses an ISO 8601 resultTime as returned by the server; None if it is missing or malformed."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        return None
+
+
+async def fetch_pages(session, url: str, params: dict = None, headers: dict = None) -> list[dict]:
+    """
+    Requests a resource listing and the pages its rel="next" links lead to.
+    :param session: the OSHClientSession to request through, from a coroutine on one of its loops
+    :return: the items of all pages, in server order
+    """
+    items = []
+    while url is not None:
+        async with session.request('GET', url, params=params, headers=headers) as resp:
+            if resp.status >= 400:
+                raise ConnectionError(f'HTTP {resp.status}: {await resp.text()}')
+            body = await resp.json(content_type=None)
+        items.extend(body.get('items', []))
+        url = next((link.get('href') for link in body.get('links', []) or [] if link.get('rel') == 'next'), None)
+        params = None
+    return items
+
+
+class _PollEntry:
+    __slots__ = ('datastream', 'interval', 'rate', 'last_poll', 'due')
+
+    def __init__(self, datastream, interval: float):
+        self.datastream = datastream
+        self.interval = interval
+        # Observations per second, exponentially averaged over the polls that returned data
+        self.rate: Optional[float] = None
+        self.last_poll: Optional[float] = None
+        self.due: Optional[float] = None
+
+
+class PollScheduler:
+    """Polls the observations of many Datastreams over HTTP from a single event loop.
+
+    Used in place of MQTT for datastreams with ``should_poll`` on nodes
+    without an MQTT broker. Each poll asks only for observations newer than
+    the last resultTime the datastream has seen and repeats the previous
+    ETag/Last-Modified validators, so an idle stream costs a 304. The poll
+    interval of each stream follows its observed data rate, aiming at
+    ``target_batch`` observations per poll between ``min_interval`` and
+    ``max_interval``, and backs off on empty or failed polls. Every delay is
+    jittered and at most ``max_concurrent`` requests run at once, so streams
+    with the same interval do not hit the node in bursts.
+    """
+
+    def __init__(self, session, min_interval: float = 1.0, max_interval: float = 60.0, target_batch: int = 10,
+                 jitter: float = 0.2, max_concurrent: int = 4, page_size: int = 1000):
+        """
+        :param session: the OSHClientSession whose event loop and HTTP connection pool the polls use
+        :param jitter: relative spread of each delay, e.g. 0.2 for +/-20%
+        """
+        self._session = session
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_batch = target_batch
+        self.jitter = jitter
+        self.max_concurrent = max_concurrent
+        self.page_size = page_size
+        self._entries: dict[UUID, _PollEntry] = {}
+        self._heap: list[tuple[float, int, UUID]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task = None
+        self._lock = threading.Lock()
+
+    def __contains__(self, datastream) -> bool:
+        return datastream.get_internal_id() in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, datastream, interval: float = None):
+        """
+        Starts polling *datastream*; its first poll is spread randomly over the first interval.
+        :param interval: initial poll interval in seconds, defaults to ``min_interval``
+        """
+        entry = _PollEntry(datastream, interval if interval is not None else self.min_interval)
+        with self._lock:
+            self._entries[datastream.get_internal_id()] = entry
+        self.start()
+        self._call(self._schedule, entry, random.uniform(0, entry.interval))
+
+    def remove(self, datastream):
+        with self._lock:
+            self._entries.pop(datastream.get_internal_id(), None)
+
+    def start(self):
+        """Starts the scheduler on the running event loop, or on the session's streaming loop outside of one."""
+        if self._task is not None:
+            return
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = self._session.get_stream_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self._session.run_stream(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._loop = None
+        self._heap.clear()
+
+    def _call(self, fn, *args):
+        # The heap belongs to the scheduler's loop; hand over calls made from other threads
+        loop = self._loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if loop is not None and loop is not running and loop.is_running():
+            loop.call_soon_threadsafe(fn, *args)
+        else:
+            fn(*args)
+
+    def _schedule(self, entry: _PollEntry, delay: float):
+        if self._entries.get(entry.datastream.get_internal_id()) is not entry:
+            return
+        if self._loop is None:
+            return
+        entry.due = self._loop.time() + delay
+        heapq.heappush(self._heap, (entry.due, next(self._counter), entry.datastream.get_internal_id()))
+        self._wakeup.set()
+
+    def _next_delay(self, entry: _PollEntry) -> float:
+        return entry.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _adapt(self, entry: _PollEntry, count: Optional[int], now: float):
+        """Derives the next interval from the number of new observations (None after a failed poll)."""
+        span = now - entry.last_poll if entry.last_poll is not None else entry.interval
+        entry.last_poll = now
+        if not count:
+            # Nothing new, or an error: back off towards the maximum interval
+            entry.interval = min(entry.interval * 1.5, self.max_interval)
+            return
+        rate = count / max(span, 1e-3)
+        entry.rate = rate if entry.rate is None else 0.5 * entry.rate + 0.5 * rate
+        entry.interval = min(max(self.target_batch / entry.rate, self.min_interval), self.max_interval)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        in_flight: set[asyncio.Task] = set()
+        try:
+            while True:
+                now = loop.time()
+                while self._heap and self._heap[0][0] <= now:
+                    due, _, key = heapq.heappop(self._heap)
+                    entry = self._entries.get(key)
+                    if entry is None or entry.due != due:
+                        # Removed or rescheduled since
+                        continue
+                    entry.due = None
+                    task = loop.create_task(self._poll(entry, semaphore))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                self._wakeup.clear()
+                timeout = self._heap[0][0] - now if self._heap else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def _poll(self, entry: _PollEntry, semaphore: asyncio.Semaphore):
+        count = None
+        async with semaphore:
+            try:
+                count = len(await self.poll_datastream(entry.datastream))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning("Polling datastream %s failed: %s", entry.datastream.get_id(), e)
+        self._adapt(entry, count, asyncio.get_running_loop().time())
+        self._schedule(entry, self._next_delay(entry))
+
+    async def poll_datastream(self, datastream) -> list[dict]:
+        """
+        Requests the observations of *datastream* newer than its last resultTime, following paging links.
+        :return: the new observations, also delivered through the datastream's inbound deque and events
+        """
+        url, params, headers = datastream._poll_request(self.page_size)
+        headers.update(datastream.get_parent_node().get_auth_headers())
+        new = []
+        while url is not None:
+            async with self._session.request('GET', url, params=params, headers=headers) as resp:
+                if resp.status == 304:
+                    return new
+                if resp.status >= 400:
+                    raise ConnectionError(f'HTTP {resp.status}: {await resp.text()}')
+                body = await resp.json(content_type=None)
+                new.extend(datastream._accept_polled(body, resp.headers, params))
+            url = next((link.get('href') for link in body.get('links', []) or [] if link.get('rel') == 'next'), None)
+            params = None
+            headers = datastream.get_parent_node().get_auth_headers()
+        return new
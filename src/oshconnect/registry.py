@@ -0,0 +1,321 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   Date:  2024/5/28
+#   Author:  Ian Patterson
+#   Contact Email:  ian@botts-inc.com
+#   ==============================================================================
+
+from __future__ import annotations
+
+from typing import Iterable, Optional, Union
+from uuid import UUID
+
+from .datastores.lazy import LazySlot
+from .spatial import SpatialIndex
+from .streamableresource import ControlStream, Datastream, StreamableResource, System
+
+KINDS = (System, Datastream, ControlStream)
+
+# Tracked attributes the indexes are keyed on; assigning one of them re-indexes the resource
+_INDEXED_ATTRIBUTES = frozenset({'_resource_id', 'urn', '_topic', '_status_topic'})
+
+
+class _MultiIndex:
+    """Maps a key to the resources carrying it, in registration order.
+
+    Server resource ids, URNs and topics are only unique per Node, so one key
+    can belong to several resources when an OSHConnect talks to several
+    servers; ``first()`` returns the earliest registered one.
+    """
+    __slots__ = ('_entries',)
+
+    def __init__(self):
+        self._entries: dict[object, dict[UUID, StreamableResource]] = {}
+
+    def add(self, key, resource: StreamableResource):
+        if key is not None:
+            self._entries.setdefault(key, {})[resource.get_internal_id()] = resource
+
+    def discard(self, key, resource: StreamableResource):
+        bucket = self._entries.get(key)
+        if bucket is not None:
+            bucket.pop(resource.get_internal_id(), None)
+            if not bucket:
+                del self._entries[key]
+
+    def first(self, key) -> Optional[StreamableResource]:
+        bucket = self._entries.get(key)
+        return next(iter(bucket.values())) if bucket else None
+
+    def all(self, key) -> list[StreamableResource]:
+        return list(self._entries.get(key, {}).values())
+
+    def clear(self):
+        self._entries.clear()
+
+
+class ResourceRegistry:
+    """Dict indexes over the Systems, Datastreams and ControlStreams known to an OSHConnect instance.
+
+    Resources are indexed by internal UUID, by server resource id (per kind),
+    Systems additionally by URN and streams by their MQTT data (and, for
+    ControlStreams, status) topic, so every lookup is O(1) regardless of fleet
+    size.
+
+    The indexed attributes are tracked attributes (see ``ChangeTracked``):
+    the registry installs itself as the resource's change listener, so when
+    e.g. ``initialize()`` sets a stream's ``_topic`` or a System gets its
+    server id after ``insert_self()``, the indexes follow without any
+    explicit call.
+
+    Registering or removing a System does the same for its datastreams and
+    control channels.
+
+    Entries of a LazyResourceList that have not been loaded yet are registered
+    by internal id only. ``get()`` loads just the requested one; the first
+    lookup by resource id, URN or topic that misses loads and indexes all
+    pending entries once.
+
+    With ``spatial_index=True`` (or after ``enable_spatial_index()``) the
+    locations of Systems are kept in a SpatialIndex as well; assigning a new
+    SystemResource re-indexes the system's location. A location edited in
+    place needs ``refresh_location()``.
+    """
+
+    def __init__(self, spatial_index: bool = False):
+        self._by_id: dict[UUID, Union[StreamableResource, LazySlot]] = {}
+        self._members: dict[type, dict[UUID, StreamableResource]] = {kind: {} for kind in KINDS}
+        self._by_resource_id: dict[type, _MultiIndex] = {kind: _MultiIndex() for kind in KINDS}
+        self._by_urn = _MultiIndex()
+        self._by_topic = _MultiIndex()
+        self._pending: dict[UUID, LazySlot] = {}
+        self._spatial: Optional[SpatialIndex] = None
+        if spatial_index:
+            self.enable_spatial_index()
+
+    @staticmethod
+    def _kind(resource: StreamableResource) -> type:
+        for kind in KINDS:
+            if isinstance(resource, kind):
+                return kind
+        raise TypeError(f"Cannot register {type(resource).__name__}, expected a System, Datastream or ControlStream")
+
+    @staticmethod
+    def _uuid(internal_id: Union[UUID, str]) -> Optional[UUID]:
+        if isinstance(internal_id, LazySlot):
+            internal_id = internal_id.resource_id
+        elif isinstance(internal_id, StreamableResource):
+            return internal_id.get_internal_id()
+        if isinstance(internal_id, UUID):
+            return internal_id
+        try:
+            return UUID(str(internal_id))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _topics(resource: StreamableResource) -> tuple:
+        return getattr(resource, '_topic', None), getattr(resource, '_status_topic', None)
+
+    # ------------------------------------------------------------------
+    # Registration
+    # ------------------------------------------------------------------
+
+    def add(self, resource: Union[StreamableResource, LazySlot]) -> bool:
+        """
+        Registers a resource, or a LazySlot that stands for one. Returns False if it was already registered.
+        """
+        if isinstance(resource, LazySlot):
+            if resource.loaded:
+                return self.add(resource.get())
+            key = self._uuid(resource.resource_id)
+            if key in self._by_id:
+                return False
+            self._by_id[key] = resource
+            self._pending[key] = resource
+            return True
+
+        kind = self._kind(resource)
+        key = resource.get_internal_id()
+        if self._by_id.get(key) is resource:
+            return False
+        self._pending.pop(key, None)
+        self._by_id[key] = resource
+        self._members[kind][key] = resource
+        self._by_resource_id[kind].add(getattr(resource, '_resource_id', None), resource)
+        resource._change_listener = self._on_change
+        if kind is System:
+            self._by_urn.add(getattr(resource, 'urn', None), resource)
+            if self._spatial is not None:
+                self._spatial.add(key, resource.get_geometry(), resource)
+            self.add_all(resource.datastreams)
+            self.add_all(resource.control_channels)
+        else:
+            for topic in self._topics(resource):
+                self._by_topic.add(topic, resource)
+        return True
+
+    @staticmethod
+    def _entries(resources: Iterable) -> list:
+        entries = getattr(resources, 'entries', None)
+        return entries() if callable(entries) else list(resources or ())
+
+    def add_all(self, resources: Iterable) -> int:
+        """Registers several resources; a LazyResourceList is registered without loading its pending entries."""
+        return sum(1 for resource in self._entries(resources) if self.add(resource))
+
+    def remove(self, resource: Union[StreamableResource, LazySlot, UUID, str]) -> Optional[StreamableResource]:
+        """Unregisters a resource, given itself or its internal id. Returns the removed resource, if any."""
+        key = self._uuid(resource)
+        entry = self._by_id.pop(key, None)
+        if entry is None:
+            return None
+        if isinstance(entry, LazySlot):
+            del self._pending[key]
+            return None
+
+        kind = self._kind(entry)
+        del self._members[kind][key]
+        self._by_resource_id[kind].discard(getattr(entry, '_resource_id', None), entry)
+        if kind is System:
+            self._by_urn.discard(getattr(entry, 'urn', None), entry)
+            if self._spatial is not None:
+                self._spatial.remove(key)
+            for child in self._entries(entry.datastreams) + self._entries(entry.control_channels):
+                self.remove(child)
+        else:
+            for topic in self._topics(entry):
+                self._by_topic.discard(topic, entry)
+        if entry.__dict__.get('_change_listener') == self._on_change:
+            del entry._change_listener
+        return entry
+
+    def clear(self):
+        for resource in list(self._by_id):
+            self.remove(resource)
+
+    def _on_change(self, resource: StreamableResource, name: str, old, new):
+        if self._by_id.get(resource.get_internal_id()) is not resource:
+            return
+        if name == '_underlying_resource':
+            if isinstance(resource, System):
+                self.refresh_location(resource)
+            return
+        if name not in _INDEXED_ATTRIBUTES:
+            return
+        if name == '_resource_id':
+            index = self._by_resource_id[self._kind(resource)]
+        elif name == 'urn':
+            index = self._by_urn
+        else:
+            index = self._by_topic
+        index.discard(old, resource)
+        index.add(new, resource)
+
+    def _load_pending(self) -> bool:
+        if not self._pending:
+            return False
+        for slot in list(self._pending.values()):
+            self.add(slot.get())
+        return True
+
+    # ------------------------------------------------------------------
+    # Spatial index
+    # ------------------------------------------------------------------
+
+    def enable_spatial_index(self) -> SpatialIndex:
+        """Starts indexing the locations of the registered Systems. Returns the SpatialIndex."""
+        if self._spatial is None:
+            self._spatial = SpatialIndex()
+            for system in self._members[System].values():
+                self._spatial.add(system.get_internal_id(), system.get_geometry(), system)
+        return self._spatial
+
+    def has_spatial_index(self) -> bool:
+        return self._spatial is not None
+
+    def refresh_location(self, system: System):
+        """Re-indexes the location of a registered System, e.g. after its geometry was modified in place."""
+        if self._spatial is not None and system in self:
+            self._spatial.add(system.get_internal_id(), system.get_geometry(), system)
+
+    def _spatial_index(self) -> SpatialIndex:
+        if self._spatial is None:
+            raise RuntimeError("Spatial index not enabled. Call enable_spatial_index() first.")
+        # Unloaded lazy entries have no location yet
+        self._load_pending()
+        return self._spatial
+
+    def systems_in_bbox(self, bbox) -> list[System]:
+        """Systems whose location intersects the bounding box ``[min_x, min_y, max_x, max_y]``."""
+        return self._spatial_index().in_bbox(bbox)
+
+    def systems_intersecting(self, geometry) -> list[System]:
+        return self._spatial_index().intersects(geometry)
+
+    def systems_within(self, geometry) -> list[System]:
+        """Systems located inside *geometry*, e.g. a polygon, boundary included."""
+        return self._spatial_index().within(geometry)
+
+    def nearest_systems(self, geometry, k: int = 1, max_distance: float = None) -> list[System]:
+        """The *k* systems closest to *geometry*, nearest first."""
+        return self._spatial_index().nearest(geometry, k, max_distance)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def get(self, internal_id: Union[UUID, str]) -> Optional[StreamableResource]:
+        entry = self._by_id.get(self._uuid(internal_id))
+        if isinstance(entry, LazySlot):
+            entry = entry.get()
+            self.add(entry)
+        return entry
+
+    def get_many(self, internal_ids: Iterable[Union[UUID, str]]) -> list[StreamableResource]:
+        """The registered resources among *internal_ids*, in the given order; unknown ids are skipped."""
+        return [resource for resource in map(self.get, internal_ids) if resource is not None]
+
+    def _lookup(self, index: _MultiIndex, key) -> Optional[StreamableResource]:
+        resource = index.first(key)
+        if resource is None and self._load_pending():
+            resource = index.first(key)
+        return resource
+
+    def get_by_resource_id(self, resource_id: str, kind: type = None) -> Optional[StreamableResource]:
+        """
+        :param resource_id: the id the server assigned to the resource
+        :param kind: System, Datastream or ControlStream; when None, the first kind that has *resource_id* wins
+        """
+        kinds = (kind,) if kind is not None else KINDS
+        for k in kinds:
+            resource = self._by_resource_id[k].first(resource_id)
+            if resource is not None:
+                return resource
+        if self._load_pending():
+            return self.get_by_resource_id(resource_id, kind)
+        return None
+
+    def get_system_by_urn(self, urn: str) -> Optional[System]:
+        return self._lookup(self._by_urn, urn)
+
+    def get_by_topic(self, topic: str) -> Optional[StreamableResource]:
+        """The Datastream or ControlStream whose MQTT data or status topic is *topic*."""
+        return self._lookup(self._by_topic, topic)
+
+    def systems(self) -> list[System]:
+        """The registered Systems that are loaded; the same goes for ``datastreams()`` and ``controlstreams()``."""
+        return list(self._members[System].values())
+
+    def datastreams(self) -> list[Datastream]:
+        return list(self._members[Datastream].values())
+
+    def controlstreams(self) -> list[ControlStream]:
+        return list(self._members[ControlStream].values())
+
+    def __contains__(self, resource) -> bool:
+        """Accepts a resource, a LazySlot or an internal id."""
+        return self._uuid(resource) in self._by_id
+
+    def __len__(self) -> int:
+        return len(self._by_id)
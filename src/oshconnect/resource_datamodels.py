@@ -14,6 +14,7 @@ from shapely import Point
 from .api_utils import Link
 from .geometry import Geometry
 from .schema_datamodels import DatastreamRecordSchema, CommandSchema
+from .schema_validation import compile_record_validator
 from .timemanagement import TimeInstant, TimePeriod
 
 
@@ -187,6 +188,15 @@ class ObservationResource(BaseModel):
     result: dict = Field(...)
     result_link: Link = Field(None, alias="result@link")
 
+    def validate_against_schema(self, record_schema: DatastreamRecordSchema) -> None:
+        """
+        Checks this observation's result against a datastream record schema. The schema is compiled into a flat
+        validator on first use and cached, so repeated calls with the same schema are cheap.
+        :param record_schema: the datastream's record schema
+        :raises ValueError: if the result does not conform to the schema
+        """
+        compile_record_validator(record_schema).validate(self.result)
+
 
 class ControlStreamResource(BaseModel):
     model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True)
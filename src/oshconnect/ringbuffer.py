@@ -0,0 +1,254 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   Date:  2024/5/28
+#   Author:  Ian Patterson
+#   Contact Email:  ian@botts-inc.com
+#   ==============================================================================
+
+from __future__ import annotations
+
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional
+
+# Header of the block: magic, data capacity, fixed record size (0: variable), head, tail and next sequence number.
+# head and tail are absolute byte positions in the data area that only grow; position p is stored at p % capacity.
+_MAGIC = b'OSHRING1'
+_HEADER = struct.Struct('<8sQQQQQ')
+_CAPACITY_OFFSET, _RECORD_SIZE_OFFSET, _HEAD_OFFSET, _TAIL_OFFSET, _SEQ_OFFSET = 8, 16, 24, 32, 40
+_DATA_OFFSET = 64
+# Header of a record: its absolute position, sequence number and payload length
+_RECORD = struct.Struct('<QQI')
+_PADDING = 0xFFFFFFFF
+_U64 = struct.Struct('<Q')
+
+
+def _aligned(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def ring_name(resource_id: str) -> str:
+    """Default shared memory name of the ring buffer of the datastream with resource id *resource_id*."""
+    return 'osh_' + re.sub(r'[^A-Za-z0-9_]', '_', resource_id)[:26]
+
+
+class RingBufferWriter:
+    """Single producer of a ring buffer of observations in ``multiprocessing.shared_memory``.
+
+    Records are length-prefixed, or occupy fixed slots of *record_size*
+    bytes, and are written one after the other into *capacity* bytes; once
+    the buffer is full the oldest records are overwritten. The writer never
+    waits for readers: a reader that falls more than *capacity* bytes behind
+    loses the overwritten records and is told so, see ``RingBufferReader``.
+    Writes from several threads of the producing process are serialised. The
+    block is removed by ``close()``.
+    """
+
+    def __init__(self, name: str, capacity: int = 8 * 1024 * 1024, record_size: int = None):
+        """
+        :param name: shared memory name readers attach to
+        :param capacity: size of the data area in bytes, rounded up to a multiple of 8
+        :param record_size: fixed maximum payload size of every record; None for variable-size records
+        """
+        self.capacity = _aligned(capacity)
+        self.record_size = record_size or 0
+        if self.record_size and _aligned(_RECORD.size + self.record_size) > self.capacity:
+            raise ValueError(f"record_size {record_size} does not fit in a ring of {capacity} bytes")
+        self._block = shared_memory.SharedMemory(name=name, create=True, size=_DATA_OFFSET + self.capacity)
+        self._buf = self._block.buf
+        _HEADER.pack_into(self._buf, 0, _MAGIC, self.capacity, self.record_size, 0, 0, 0)
+        self._head = 0
+        self._tail = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self._block.name
+
+    def _record_length(self, payload_length: int) -> int:
+        return _aligned(_RECORD.size + (self.record_size or payload_length))
+
+    def write(self, payload) -> int:
+        """
+        Appends a record, overwriting the oldest ones if needed.
+        :param payload: bytes-like object
+        :return: the record's sequence number
+        """
+        length = len(payload)
+        total = self._record_length(length)
+        if self.record_size and length > self.record_size or total > self.capacity:
+            raise ValueError(f"Record of {length} bytes does not fit in ring buffer {self.name}")
+        with self._lock:
+            return self._write(payload, length, total)
+
+    def _write(self, payload, length: int, total: int) -> int:
+        buf, capacity = self._buf, self.capacity
+        offset = self._head % capacity
+        if offset + total > capacity:
+            # Not enough room before the end: skip to the start of the data area
+            wrap = self._head + capacity - offset
+            self._advance_tail(wrap)
+            if capacity - offset >= _RECORD.size:
+                _RECORD.pack_into(buf, _DATA_OFFSET + offset, self._head, self._seq, _PADDING)
+            self._head = wrap
+            offset = 0
+        self._advance_tail(self._head + total)
+        start = _DATA_OFFSET + offset
+        buf[start + _RECORD.size:start + _RECORD.size + length] = payload
+        _RECORD.pack_into(buf, start, self._head, self._seq, length)
+        self._head += total
+        self._seq += 1
+        # Published last, so that readers never see a head beyond complete records
+        _U64.pack_into(buf, _SEQ_OFFSET, self._seq)
+        _U64.pack_into(buf, _HEAD_OFFSET, self._head)
+        return self._seq - 1
+
+    def _advance_tail(self, end: int):
+        """Drops the records that start within *capacity* bytes before *end*, before they are overwritten."""
+        if self._tail >= end - self.capacity:
+            return
+        while self._tail < end - self.capacity:
+            offset = self._tail % self.capacity
+            if self.capacity - offset < _RECORD.size:
+                self._tail += self.capacity - offset
+                continue
+            _, _, length = _RECORD.unpack_from(self._buf, _DATA_OFFSET + offset)
+            self._tail += self.capacity - offset if length == _PADDING else self._record_length(length)
+        _U64.pack_into(self._buf, _TAIL_OFFSET, self._tail)
+
+    def get_sequence(self) -> int:
+        """Sequence number of the next record."""
+        return self._seq
+
+    def close(self, unlink: bool = True):
+        self._buf.release()
+        self._block.close()
+        if unlink:
+            self._block.unlink()
+
+
+class RingBufferReader:
+    """Reader of a ring buffer written by a ``RingBufferWriter``, in this or another local process.
+
+    Each reader has its own cursor and returns records as read-only
+    ``memoryview``s of the shared memory, without copying. A view shows the
+    record until the writer wraps around onto it again, *capacity* bytes
+    later; ``read()`` only returns records that were still intact when it
+    returned, and counts the ones it missed in ``get_lost_count()``. Copy a
+    record with ``bytes(view)`` to keep it longer, and release the views
+    before ``close()``.
+
+    Where the platform exposes shared memory as files (Linux), the block is
+    mapped read-only; elsewhere it is attached as a SharedMemory block that is
+    not unlinked when the reader exits.
+    """
+
+    def __init__(self, name: str, start: str = 'latest'):
+        """
+        :param name: shared memory name of the ring buffer
+        :param start: 'latest' to read the records written from now on, 'oldest' to begin with the oldest one kept
+        """
+        self.name = name
+        self._block: Optional[shared_memory.SharedMemory] = None
+        self._map: Optional[mmap.mmap] = None
+        path = f'/dev/shm/{name.lstrip("/")}'
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._buf = memoryview(self._map)
+        else:
+            if sys.version_info >= (3, 13):
+                self._block = shared_memory.SharedMemory(name=name, track=False)
+            else:
+                self._block = shared_memory.SharedMemory(name=name)
+                # Owned by the writer: keep this process's resource tracker from unlinking it at exit
+                resource_tracker.unregister(self._block._name, 'shared_memory')
+            self._buf = self._block.buf.toreadonly()
+        magic, self.capacity, self.record_size, head, tail, seq = _HEADER.unpack_from(self._buf, 0)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"Shared memory block {name} is not an OSHConnect ring buffer")
+        self._cursor = head if start == 'latest' else tail
+        self._next_seq = seq if start == 'latest' else None
+        self._lost = 0
+
+    def _load(self, offset: int) -> int:
+        return _U64.unpack_from(self._buf, offset)[0]
+
+    def read(self, max_records: int = None) -> list[memoryview]:
+        """
+        Returns the records written since the previous call, oldest first.
+        :param max_records: return at most this many
+        """
+        buf, capacity = self._buf, self.capacity
+        head = self._load(_HEAD_OFFSET)
+        if self._cursor < self._load(_TAIL_OFFSET):
+            self._resync()
+        records = []
+        first_seq = None
+        while self._cursor < head and (max_records is None or len(records) < max_records):
+            offset = self._cursor % capacity
+            if capacity - offset < _RECORD.size:
+                self._cursor += capacity - offset
+                continue
+            position, seq, length = _RECORD.unpack_from(buf, _DATA_OFFSET + offset)
+            if position != self._cursor:
+                # Overwritten since head was read
+                break
+            if length == _PADDING:
+                self._cursor += capacity - offset
+                continue
+            if self._next_seq is not None and seq > self._next_seq:
+                self._lost += seq - self._next_seq
+            if first_seq is None:
+                first_seq = seq
+            start = _DATA_OFFSET + offset + _RECORD.size
+            records.append((position, seq, buf[start:start + length]))
+            self._next_seq = seq + 1
+            self._cursor += _aligned(_RECORD.size + (self.record_size or length))
+        # Records the writer started to overwrite while they were being collected are lost
+        tail = self._load(_TAIL_OFFSET)
+        intact = [view for position, _, view in records if position >= tail]
+        self._lost += len(records) - len(intact)
+        for position, _, view in records:
+            if position < tail:
+                view.release()
+        if self._cursor < tail:
+            self._resync()
+        return intact
+
+    def _resync(self):
+        """Moves a cursor overtaken by the writer to the oldest record still kept."""
+        tail = self._load(_TAIL_OFFSET)
+        offset = tail % self.capacity
+        self._cursor = tail
+        if self.capacity - offset >= _RECORD.size:
+            _, seq, _ = _RECORD.unpack_from(self._buf, _DATA_OFFSET + offset)
+            if self._next_seq is not None and seq > self._next_seq:
+                self._lost += seq - self._next_seq
+                self._next_seq = seq
+
+    def __iter__(self):
+        return iter(self.read())
+
+    def get_lag(self) -> int:
+        """Bytes written and not read yet."""
+        return self._load(_HEAD_OFFSET) - self._cursor
+
+    def get_lost_count(self) -> int:
+        """Number of records overwritten before this reader got to them."""
+        return self._lost
+
+    def close(self):
+        """Detaches from the buffer. Views returned by ``read()`` must have been released."""
+        self._buf.release()
+        if self._map is not None:
+            self._map.close()
+        if self._block is not None:
+            self._block.close()
@@ -0,0 +1,283 @@
+#  =============================================================================
+#  Copyright (c) 2026 Botts Innovative Research Inc.
+#  Author: Ian Patterson
+#  Contact Email: ian@botts-inc.com
+#  =============================================================================
+"""
+Validation of observation results against a datastream's record schema.
+
+Walking the Pydantic schema tree for every observation is far too slow for
+outbound streams, so a schema is compiled once into a ``RecordValidator``: a
+flat list of field checks (path, required flag, accepted Python types and an
+optional constraint test). Validating a result is then a single loop over that
+list. Compiled validators are cached per schema object, so a Datastream pays the
+compilation cost once no matter how many observations it creates.
+"""
+from __future__ import annotations
+
+import math
+import re
+import weakref
+from typing import Any, Callable, NamedTuple
+
+from .schema_datamodels import DatastreamRecordSchema, JSONDatastreamRecordSchema, SWEDatastreamRecordSchema
+from .swe_components import check_named
+
+_MISSING = object()
+_QUANTITY_SPECIAL_VALUES = frozenset(('NaN', 'INFINITY', '+INFINITY', '-INFINITY'))
+
+# Accepted JSON-decoded Python types per SWE Common component type. Numeric
+# types exclude ``bool`` explicitly since bool subclasses int.
+_TYPES_BY_COMPONENT: dict[str, tuple[type, ...]] = {
+    'Boolean': (bool,),
+    'Count': (int,),
+    'Quantity': (int, float, str),
+    'Time': (int, float, str),
+    'Category': (str,),
+    'Text': (str,),
+    'CountRange': (list, tuple),
+    'QuantityRange': (list, tuple),
+    'TimeRange': (list, tuple),
+    'CategoryRange': (list, tuple),
+    'DataRecord': (dict,),
+    'Vector': (dict, list, tuple),
+    'DataArray': (list, tuple),
+    'Matrix': (list, tuple),
+    'DataChoice': (dict,),
+    'Geometry': (dict,),
+}
+_NUMERIC_COMPONENTS = frozenset(('Count', 'Quantity'))
+
+
+class FieldCheck(NamedTuple):
+    """A single compiled check: ``parents`` is the chain of record keys leading to the dict holding ``key``."""
+    parents: tuple[str, ...]
+    key: str
+    dotted_path: str
+    component_type: str
+    is_numeric: bool
+    required: bool
+    types: tuple[type, ...]
+    nil_values: frozenset | None
+    constraint: Callable[[Any], str | None] | None
+
+
+class RecordValidator:
+    """
+    Flat, precompiled validator for observation results.
+
+    Build one with ``compile_record_validator()`` rather than directly so the
+    cache is used.
+    """
+    __slots__ = ('_checks', '__weakref__')
+
+    def __init__(self, checks: list[FieldCheck]):
+        self._checks = tuple(checks)
+
+    @property
+    def checks(self) -> tuple[FieldCheck, ...]:
+        return self._checks
+
+    def validate(self, result: Any) -> None:
+        """
+        Validate an observation result.
+
+        :param result: decoded observation result, typically the ``result`` dict of an observation
+        :raises ValueError: on the first field that is missing, of the wrong type, or violates a constraint
+        """
+        if not isinstance(result, dict):
+            raise ValueError(f"Observation result must be an object, got {type(result).__name__}.")
+        for check in self._checks:
+            container = result
+            for key in check.parents:
+                container = container.get(key)
+                if not isinstance(container, dict):
+                    # Absent/null/nil parent: its own check has already accepted or rejected it
+                    break
+            else:
+                value = container.get(check.key, _MISSING)
+                if value is _MISSING or value is None:
+                    if check.required:
+                        raise ValueError(f"Observation result is missing required field '{check.dotted_path}'.")
+                    continue
+                if check.nil_values is not None and _is_hashable(value) and value in check.nil_values:
+                    continue
+                if not isinstance(value, check.types) or (check.is_numeric and isinstance(value, bool)):
+                    raise ValueError(
+                        f"Observation result field '{check.dotted_path}' expects a {check.component_type} value, "
+                        f"got {type(value).__name__}.")
+                if check.constraint is not None:
+                    problem = check.constraint(value)
+                    if problem is not None:
+                        raise ValueError(f"Observation result field '{check.dotted_path}' {problem}.")
+
+    def is_valid(self, result: Any) -> bool:
+        try:
+            self.validate(result)
+        except ValueError:
+            return False
+        return True
+
+
+def _is_hashable(value) -> bool:
+    return not isinstance(value, (dict, list))
+
+
+# ---------------------------------------------------------------------------
+# Compilation
+# ---------------------------------------------------------------------------
+
+def _allowed_values_constraint(constraint, component_type: str):
+    """Build a constraint test from a SWE AllowedValues / AllowedTokens dict."""
+    if not isinstance(constraint, dict):
+        return None
+
+    if component_type in _NUMERIC_COMPONENTS:
+        values = constraint.get('values')
+        intervals = constraint.get('intervals')
+        allowed = frozenset(values) if values else None
+        bounds = tuple((lo, hi) for lo, hi in intervals) if intervals else None
+        if allowed is None and bounds is None:
+            return None
+
+        def check_numeric(value):
+            if isinstance(value, str):
+                # Special values (NaN/INFINITY) are not subject to AllowedValues
+                return None
+            if math.isnan(value):
+                return None
+            if allowed is not None and value in allowed:
+                return None
+            if bounds is not None:
+                for lo, hi in bounds:
+                    if lo <= value <= hi:
+                        return None
+            return f"value {value!r} is outside the allowed values/intervals"
+
+        return check_numeric
+
+    if component_type in ('Category', 'Text'):
+        values = constraint.get('values')
+        pattern = constraint.get('pattern')
+        allowed = frozenset(values) if values else None
+        compiled = re.compile(pattern) if pattern else None
+        if allowed is None and compiled is None:
+            return None
+
+        def check_token(value):
+            if allowed is not None and value not in allowed:
+                return f"value {value!r} is not one of the allowed tokens"
+            if compiled is not None and not compiled.fullmatch(value):
+                return f"value {value!r} does not match pattern {pattern!r}"
+            return None
+
+        return check_token
+
+    return None
+
+
+def _quantity_constraint(base):
+    def check_quantity(value):
+        if isinstance(value, str) and value not in _QUANTITY_SPECIAL_VALUES:
+            return "must be a number or one of NaN, INFINITY, +INFINITY, -INFINITY"
+        return base(value) if base is not None else None
+
+    return check_quantity
+
+
+def _range_constraint(value):
+    if len(value) != 2:
+        return "must be a [min, max] pair"
+    return None
+
+
+def _nil_values(component) -> frozenset | None:
+    nil_values = getattr(component, 'nil_values', None)
+    if not nil_values:
+        return None
+    values = set()
+    for nil in nil_values:
+        value = nil.get('value') if isinstance(nil, dict) else nil
+        if _is_hashable(value):
+            values.add(value)
+    return frozenset(values) or None
+
+
+def _compile_component(component, path: tuple[str, ...], parent_optional: bool, checks: list[FieldCheck]):
+    component_type = component.type
+    optional = parent_optional or bool(getattr(component, 'optional', False))
+    constraint = _allowed_values_constraint(getattr(component, 'constraint', None), component_type)
+    if component_type == 'Quantity':
+        constraint = _quantity_constraint(constraint)
+    elif component_type.endswith('Range'):
+        constraint = _range_constraint
+
+    checks.append(FieldCheck(
+        parents=path[:-1],
+        key=path[-1],
+        dotted_path='.'.join(path),
+        component_type=component_type,
+        is_numeric=component_type in _NUMERIC_COMPONENTS,
+        required=not optional,
+        types=_TYPES_BY_COMPONENT.get(component_type, (object,)),
+        nil_values=_nil_values(component),
+        constraint=constraint,
+    ))
+
+    if component_type == 'DataRecord':
+        _compile_record_fields(component.fields, path, optional, checks, 'DataRecord.fields')
+
+
+def _compile_record_fields(fields, path: tuple[str, ...], optional: bool, checks: list[FieldCheck], location: str):
+    for i, field in enumerate(fields):
+        check_named(field, f"{location}[{i}]")
+        _compile_component(field, path + (field.name,), optional, checks)
+
+
+def _root_component(schema: DatastreamRecordSchema):
+    if isinstance(schema, SWEDatastreamRecordSchema):
+        return schema.record_schema
+    if isinstance(schema, JSONDatastreamRecordSchema):
+        return schema.result_schema
+    return getattr(schema, 'record_schema', None) or getattr(schema, 'result_schema', None)
+
+
+def _build_validator(schema: DatastreamRecordSchema) -> RecordValidator:
+    root = _root_component(schema)
+    checks: list[FieldCheck] = []
+    if root is None:
+        return RecordValidator(checks)
+    if root.type == 'DataRecord':
+        # The observation result *is* the root record, so its fields sit at the top level
+        _compile_record_fields(root.fields, (), False, checks, 'recordSchema.fields')
+    else:
+        check_named(root, 'recordSchema')
+        _compile_component(root, (root.name,), False, checks)
+    return RecordValidator(checks)
+
+
+# Keyed by id(schema); the weakref lets us detect (and evict on) id reuse after the schema is collected.
+_validator_cache: dict[int, tuple[weakref.ref, RecordValidator]] = {}
+
+
+def compile_record_validator(schema: DatastreamRecordSchema) -> RecordValidator:
+    """
+    Returns the compiled validator for *schema*, compiling it on first use.
+
+    Validators are cached per schema instance. Schemas are treated as immutable once a validator has been compiled;
+    call ``clear_validator_cache()`` after mutating one in place.
+    :param schema: the datastream's record schema
+    :return: RecordValidator
+    """
+    key = id(schema)
+    cached = _validator_cache.get(key)
+    if cached is not None and cached[0]() is schema:
+        return cached[1]
+
+    validator = _build_validator(schema)
+    _validator_cache[key] = (weakref.ref(schema, lambda _ref, k=key: _validator_cache.pop(k, None)), validator)
+    return validator
+
+
+def clear_validator_cache() -> None:
+    _validator_cache.clear()
@@ -0,0 +1,208 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   Date:  2024/5/28
+#   Author:  Ian Patterson
+#   Contact Email:  ian@botts-inc.com
+#   ==============================================================================
+
+from __future__ import annotations
+
+from typing import Any, Hashable, Optional
+
+import shapely
+from pydantic import BaseModel
+from shapely import STRtree
+from shapely.geometry import box, shape
+from shapely.geometry.base import BaseGeometry
+
+from .csapi4py.endpoints import SystemQueryParams
+
+
+def to_shape(geometry) -> Optional[BaseGeometry]:
+    """
+    Converts the geometry representations used across OSHConnect to a shapely geometry.
+
+    :param geometry: a shapely geometry, a ``Geometry`` model, a GeoJSON geometry or Feature dict, a bounding box
+        ``[min_x, min_y, max_x, max_y]`` or a position ``[x, y]``
+    :return: the shapely geometry, or None when *geometry* is None or a Feature without geometry
+    """
+    if geometry is None or isinstance(geometry, BaseGeometry):
+        return geometry
+    if isinstance(geometry, BaseModel):
+        geometry = geometry.model_dump(mode='json', exclude_none=True)
+    if isinstance(geometry, dict):
+        if geometry.get('type') == 'Feature':
+            return to_shape(geometry.get('geometry'))
+        return shape(geometry)
+    if isinstance(geometry, (list, tuple)):
+        if len(geometry) == 4:
+            return box(*geometry)
+        if len(geometry) in (2, 3):
+            return shapely.Point(*geometry)
+    raise TypeError(f"Cannot convert {type(geometry).__name__} to a geometry")
+
+
+def bbox_param(bbox) -> str:
+    """Formats a bounding box (or the bounds of any geometry) as the ``bbox`` query parameter of the CS API."""
+    if not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
+        bbox = to_shape(bbox).bounds
+    return ','.join(str(v) for v in bbox)
+
+
+def location_param(geometry) -> str:
+    """Formats a geometry as the WKT ``location`` query parameter of the CS API."""
+    return to_shape(geometry).wkt
+
+
+def spatial_query_params(bbox=None, location=None) -> dict:
+    """The ``bbox`` and ``location`` request parameters for a spatially filtered resource listing."""
+    params = {}
+    if bbox is not None:
+        params[SystemQueryParams.BBOX.value] = bbox_param(bbox)
+    if location is not None:
+        params[SystemQueryParams.LOCATION.value] = location_param(location)
+    return params
+
+
+class SpatialIndex:
+    """STRtree-backed index of keyed geometries answering bbox, intersects, within and nearest queries.
+
+    A shapely STRtree cannot be modified once built, so additions and
+    location changes go to a small pending set that is scanned directly,
+    while removed or replaced entries are skipped when the tree reports
+    them. The tree is rebuilt on the next query once the pending and stale
+    entries outgrow ``rebuild_threshold`` or an eighth of the index, which
+    keeps both updates and queries cheap while resources keep arriving.
+    """
+
+    def __init__(self, rebuild_threshold: int = 64):
+        self._rebuild_threshold = rebuild_threshold
+        self._shapes: dict[Hashable, BaseGeometry] = {}
+        self._items: dict[Hashable, Any] = {}
+        self._tree: Optional[STRtree] = None
+        self._tree_keys: list = []
+        self._tree_shapes: list = []
+        self._pending: set = set()
+        self._stale = 0
+
+    def add(self, key: Hashable, geometry, item: Any = None) -> bool:
+        """
+        Indexes *geometry* under *key*, replacing any previous geometry for it.
+
+        :param item: what queries return for this entry, defaults to *key*
+        :return: False if *geometry* is empty or None, in which case *key* is no longer indexed
+        """
+        self.remove(key)
+        geom = to_shape(geometry)
+        if geom is None or geom.is_empty:
+            return False
+        self._shapes[key] = geom
+        self._items[key] = key if item is None else item
+        self._pending.add(key)
+        return True
+
+    def remove(self, key: Hashable) -> bool:
+        if self._shapes.pop(key, None) is None:
+            return False
+        del self._items[key]
+        if key in self._pending:
+            self._pending.discard(key)
+        else:
+            self._stale += 1
+        return True
+
+    def clear(self):
+        self.__init__(self._rebuild_threshold)
+
+    def get(self, key: Hashable) -> Optional[BaseGeometry]:
+        return self._shapes.get(key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._shapes
+
+    def __len__(self) -> int:
+        return len(self._shapes)
+
+    def _refresh(self):
+        if len(self._pending) + self._stale <= max(self._rebuild_threshold, len(self._shapes) // 8):
+            return
+        self._tree_keys = list(self._shapes)
+        self._tree_shapes = [self._shapes[key] for key in self._tree_keys]
+        self._tree = STRtree(self._tree_shapes) if self._tree_shapes else None
+        self._pending.clear()
+        self._stale = 0
+
+    def _current(self, indices) -> list:
+        keys = self._tree_keys
+        shapes = self._tree_shapes
+        return [keys[i] for i in indices if self._shapes.get(keys[i]) is shapes[i]]
+
+    def _scan_pending(self, geom: BaseGeometry, predicate: str, **kwargs) -> list:
+        if not self._pending:
+            return []
+        pending = list(self._pending)
+        matches = getattr(shapely, predicate)(geom, [self._shapes[key] for key in pending], **kwargs)
+        return [key for key, match in zip(pending, matches) if match]
+
+    def query_keys(self, geometry, predicate: str = 'intersects') -> list:
+        """
+        Keys of the entries for which ``predicate(geometry, entry)`` holds.
+
+        :param predicate: a binary shapely predicate such as 'intersects', 'contains', 'covers' or 'touches'
+        """
+        geom = to_shape(geometry)
+        self._refresh()
+        keys = []
+        if self._tree is not None:
+            keys = self._current(self._tree.query(geom, predicate=predicate))
+        return keys + self._scan_pending(geom, predicate)
+
+    def query(self, geometry, predicate: str = 'intersects') -> list:
+        """Like ``query_keys()`` but returns the indexed items."""
+        return [self._items[key] for key in self.query_keys(geometry, predicate)]
+
+    def in_bbox(self, bbox) -> list:
+        """Items whose geometry intersects the bounding box ``[min_x, min_y, max_x, max_y]``."""
+        return self.query(bbox, 'intersects')
+
+    def intersects(self, geometry) -> list:
+        return self.query(geometry, 'intersects')
+
+    def within(self, geometry) -> list:
+        """Items whose geometry lies inside *geometry*, boundary included."""
+        return self.query(geometry, 'covers')
+
+    def nearest(self, geometry, k: int = 1, max_distance: float = None) -> list:
+        """
+        The *k* items closest to *geometry*, nearest first.
+
+        :param max_distance: ignore entries farther away than this
+        """
+        geom = to_shape(geometry)
+        self._refresh()
+        candidates = self._scan_pending(geom, 'dwithin', distance=max_distance) if max_distance is not None \
+            else list(self._pending)
+        if self._tree is not None:
+            candidates += self._nearest_in_tree(geom, k, max_distance)
+        if not candidates:
+            return []
+        distances = shapely.distance(geom, [self._shapes[key] for key in candidates])
+        ranked = sorted(zip(distances, range(len(candidates))))[:k]
+        return [self._items[candidates[i]] for _, i in ranked]
+
+    def _nearest_in_tree(self, geom: BaseGeometry, k: int, max_distance: Optional[float]) -> list:
+        # The STRtree only answers "the nearest"; widen a dwithin search from there until it holds k current entries.
+        # Any entry outside that radius is farther than all k inside it.
+        live = len(self._tree_keys) - self._stale
+        _, distances = self._tree.query_nearest(geom, max_distance=max_distance, return_distance=True)
+        if len(distances) == 0:
+            return []
+        minx, miny, maxx, maxy = shapely.total_bounds(self._tree.geometries)
+        radius = max(float(distances.max()), 1e-9 * max(maxx - minx, maxy - miny, 1.0))
+        while True:
+            if max_distance is not None:
+                radius = min(radius, max_distance)
+            keys = self._current(self._tree.query(geom, predicate='dwithin', distance=radius))
+            if len(keys) >= min(k, live) or radius == max_distance:
+                return keys
+            radius *= 2
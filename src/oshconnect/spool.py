@@ -0,0 +1,312 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   Date:  2024/5/28
+#   Author:  Ian Patterson
+#   Contact Email:  ian@botts-inc.com
+#   ==============================================================================
+
+from __future__ import annotations
+
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+
+# Payload length, CRC32 of topic + payload, flags (qos | retain << 2), topic length
+_HEADER = struct.Struct(">IIBH")
+_SEGMENT_SUFFIX = ".seg"
+_CURSOR_FILE = "cursor"
+
+
+class SpoolFullError(Exception):
+    """Raised when a message does not fit in the spool's disk budget."""
+
+
+class SpooledMessage(NamedTuple):
+    topic: str
+    payload: bytes
+    qos: int = 0
+    retain: bool = False
+
+
+class SpoolPosition(NamedTuple):
+    """Position of a record in the log: segment number, byte offset and record index within the segment."""
+    segment: int
+    offset: int
+    index: int
+
+
+class OutboundSpool:
+    """Disk-backed, append-only log of outbound MQTT messages for store-and-forward publishing.
+
+    Messages are appended to numbered segment files in *directory*; a new
+    segment starts once the current one exceeds *segment_size* bytes. Each
+    record carries a CRC, so a record torn by a crash is detected and cut off
+    when the spool is reopened. Appends are written through to the OS at once
+    but fsynced in batches, every *fsync_every* records or *fsync_interval*
+    seconds, so a crash of the process loses nothing and a power loss at most
+    the last unsynced batch.
+
+    The log has a single read position, kept in the ``cursor`` file: ``peek()``
+    reads messages from it in append order and ``ack()`` moves past those that
+    were published. Messages published but not yet acknowledged when the
+    process dies are sent again (at-least-once). Fully consumed segments are
+    deleted. Disk use is bounded by *max_bytes*: when it is reached the oldest
+    segments are dropped, or ``SpoolFullError`` raised if *drop_oldest* is
+    False. Since there is one log, messages keep their order per topic.
+    """
+
+    def __init__(self, directory: Union[str, Path], segment_size: int = 16 * 1024 * 1024,
+                 max_bytes: int = 256 * 1024 * 1024, fsync_every: int = 100, fsync_interval: float = 1.0,
+                 drop_oldest: bool = True):
+        """
+        :param directory: directory of the segment files, created if needed
+        :param segment_size: size in bytes after which a new segment is started
+        :param max_bytes: disk budget of all segments together
+        :param fsync_every: number of appended records after which the segment is fsynced
+        :param fsync_interval: seconds after which an append fsyncs the segment in any case
+        :param drop_oldest: drop the oldest messages when the budget is exhausted instead of refusing new ones
+        """
+        self._dir = Path(directory)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self.segment_size = segment_size
+        self.max_bytes = max_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.drop_oldest = drop_oldest
+        self._lock = threading.RLock()
+        # Segment number -> [size in bytes, number of records], in append order
+        self._segments: dict[int, list[int]] = {}
+        self._size = 0
+        self._pending = 0
+        self._dropped = 0
+        self._writer = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._acked_unsaved = 0
+        self._cursor = self._recover()
+
+    # ------------------------------------------------------------------
+    # Recovery
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, segment: int) -> Path:
+        return self._dir / f"{segment:020d}{_SEGMENT_SUFFIX}"
+
+    @staticmethod
+    def _scan(path: Path) -> tuple[int, int]:
+        """Length of the valid prefix of a segment file and the number of records in it."""
+        valid = count = 0
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                length, crc, _, topic_length = _HEADER.unpack(header)
+                body = f.read(topic_length + length)
+                if len(body) < topic_length + length or zlib.crc32(body) != crc:
+                    break
+                valid += _HEADER.size + len(body)
+                count += 1
+        return valid, count
+
+    def _recover(self) -> SpoolPosition:
+        for path in sorted(self._dir.glob(f"*{_SEGMENT_SUFFIX}")):
+            valid, count = self._scan(path)
+            if valid != path.stat().st_size:
+                logging.warning("Outbound spool %s: discarding %d torn bytes at the end of %s",
+                                self._dir, path.stat().st_size - valid, path.name)
+                os.truncate(path, valid)
+            self._segments[int(path.stem)] = [valid, count]
+            self._size += valid
+        cursor = self._load_cursor() or SpoolPosition(0, 0, 0)
+        if cursor.segment not in self._segments:
+            # The cursor's segment was fully sent (or dropped): continue with the next one that exists
+            later = [s for s in self._segments if s > cursor.segment]
+            cursor = SpoolPosition(min(later, default=cursor.segment), 0, 0)
+        self._pending = sum(count for segment, (_, count) in self._segments.items() if segment >= cursor.segment)
+        self._pending -= min(cursor.index, self._segments.get(cursor.segment, [0, 0])[1])
+        return cursor
+
+    def _load_cursor(self) -> Optional[SpoolPosition]:
+        try:
+            return SpoolPosition(*(int(v) for v in (self._dir / _CURSOR_FILE).read_text().split()))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _save_cursor(self):
+        tmp_path = self._dir / f"{_CURSOR_FILE}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(" ".join(str(v) for v in self._cursor))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._dir / _CURSOR_FILE)
+        self._acked_unsaved = 0
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def append(self, topic: str, payload: Union[bytes, str], qos: int = 0, retain: bool = False):
+        """
+        Appends a message to the log.
+        :raises SpoolFullError: if the message does not fit in ``max_bytes`` and ``drop_oldest`` is False
+        """
+        topic_bytes = topic.encode("utf-8")
+        payload = payload.encode("utf-8") if isinstance(payload, str) else bytes(payload or b"")
+        body = topic_bytes + payload
+        record = _HEADER.pack(len(payload), zlib.crc32(body), qos | (int(retain) << 2), len(topic_bytes)) + body
+        with self._lock:
+            self._make_room(len(record))
+            writer = self._current_writer(len(record))
+            writer.write(record)
+            writer.flush()
+            segment = self._segments[self._writer_segment]
+            segment[0] += len(record)
+            segment[1] += 1
+            self._size += len(record)
+            self._pending += 1
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self.sync()
+
+    def _current_writer(self, record_size: int):
+        if self._writer is not None and self._segments[self._writer_segment][0] + record_size > self.segment_size \
+                and self._segments[self._writer_segment][1] > 0:
+            self.sync()
+            self._writer.close()
+            self._writer = None
+        if self._writer is None:
+            if self._segments and self._segments[max(self._segments)][0] + record_size <= self.segment_size:
+                self._writer_segment = max(self._segments)
+            else:
+                self._writer_segment = max(self._segments, default=self._cursor.segment - 1) + 1
+                self._segments[self._writer_segment] = [0, 0]
+            self._writer = open(self._segment_path(self._writer_segment), "ab")
+        return self._writer
+
+    def _make_room(self, record_size: int):
+        while self._size + record_size > self.max_bytes:
+            if not self.drop_oldest or not self._segments or len(self._segments) == 1 and self._writer is not None \
+                    and self._segments[self._writer_segment][1] == 0:
+                raise SpoolFullError(f"Outbound spool {self._dir} is full ({self._size} bytes)")
+            oldest = min(self._segments)
+            if oldest == getattr(self, "_writer_segment", None) and self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            size, count = self._segments.pop(oldest)
+            unread = count - self._cursor.index if oldest == self._cursor.segment else \
+                (count if oldest > self._cursor.segment else 0)
+            self._pending -= unread
+            self._dropped += unread
+            self._size -= size
+            self._segment_path(oldest).unlink(missing_ok=True)
+            if oldest >= self._cursor.segment:
+                self._cursor = SpoolPosition(min(self._segments, default=oldest + 1), 0, 0)
+                self._save_cursor()
+            logging.warning("Outbound spool %s over its %d byte budget: dropped %d unsent messages",
+                            self._dir, self.max_bytes, unread)
+
+    def sync(self):
+        """fsyncs the appended records."""
+        with self._lock:
+            if self._writer is not None and self._unsynced:
+                os.fsync(self._writer.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def peek(self, max_messages: int = 100) -> list[tuple[SpooledMessage, SpoolPosition]]:
+        """
+        Reads up to *max_messages* messages from the read position on, without consuming them.
+        :return: (message, position after the message) pairs; pass the position to ``ack()`` once it was sent
+        """
+        with self._lock:
+            result = []
+            position = self._cursor
+            while len(result) < max_messages and position.segment in self._segments:
+                size, count = self._segments[position.segment]
+                if position.index >= count:
+                    later = [s for s in self._segments if s > position.segment]
+                    if not later:
+                        break
+                    position = SpoolPosition(min(later), 0, 0)
+                    continue
+                with open(self._segment_path(position.segment), "rb") as f:
+                    f.seek(position.offset)
+                    while len(result) < max_messages and position.index < count:
+                        length, _, flags, topic_length = _HEADER.unpack(f.read(_HEADER.size))
+                        body = f.read(topic_length + length)
+                        position = SpoolPosition(position.segment, position.offset + _HEADER.size + len(body),
+                                                 position.index + 1)
+                        message = SpooledMessage(body[:topic_length].decode("utf-8"), body[topic_length:],
+                                                 flags & 3, bool(flags & 4))
+                        result.append((message, position))
+            return result
+
+    def ack(self, position: SpoolPosition):
+        """Marks the messages up to *position* (from ``peek()``) as sent and deletes fully sent segments."""
+        with self._lock:
+            if (position.segment, position.index) <= (self._cursor.segment, self._cursor.index):
+                return
+            consumed = sum(count for segment, (_, count) in self._segments.items()
+                           if self._cursor.segment <= segment < position.segment)
+            self._pending -= consumed - self._cursor.index + position.index
+            self._acked_unsaved += consumed - self._cursor.index + position.index
+            self._cursor = position
+            for segment in [s for s in self._segments if s < position.segment]:
+                self._size -= self._segments.pop(segment)[0]
+                self._segment_path(segment).unlink(missing_ok=True)
+            if self._acked_unsaved >= self.fsync_every or self._pending == 0:
+                self._save_cursor()
+
+    def drain(self, publish, max_messages: int = None, batch_size: int = 100) -> int:
+        """
+        Publishes spooled messages in order until the spool is empty or *publish* fails.
+        :param publish: ``publish(message: SpooledMessage) -> bool``; returning False stops the drain and leaves the
+            message in the spool
+        :param max_messages: stop after this many messages
+        :return: the number of messages published
+        """
+        sent = 0
+        while max_messages is None or sent < max_messages:
+            batch = self.peek(batch_size if max_messages is None else min(batch_size, max_messages - sent))
+            if not batch:
+                break
+            for message, position in batch:
+                if not publish(message):
+                    return sent
+                self.ack(position)
+                sent += 1
+        return sent
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        """Number of messages not sent yet."""
+        return self._pending
+
+    def get_size(self) -> int:
+        """Bytes on disk, sent messages of the current segment included."""
+        return self._size
+
+    def get_dropped_count(self) -> int:
+        """Number of unsent messages dropped to stay within ``max_bytes`` since the spool was opened."""
+        return self._dropped
+
+    def close(self):
+        with self._lock:
+            self.sync()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self._save_cursor()
@@ -12,6 +12,9 @@ import base64
 import datetime
 import json
 import logging
+import random
+import re
+import threading
 import traceback
 import uuid
 from abc import ABC
@@ -22,7 +25,9 @@ from multiprocessing.queues import Queue
 from typing import TypeVar, Generic, Union
 from uuid import UUID, uuid4
 from collections import deque
+from typing import NamedTuple
 
+import aiohttp
 from pydantic.alias_generators import to_camel
 
 from .csapi4py.constants import ContentTypes
@@ -32,11 +37,17 @@ from .schema_datamodels import JSONCommandSchema
 from .csapi4py.mqtt import MQTTCommClient
 from .csapi4py.constants import APIResourceTypes, ObservationFormat
 from .csapi4py.default_api_helpers import APIHelper
+from .csapi4py.querymodel import QueryModel
+from .consumergroup import ConsumerGroup
+from .decodepool import DecodePool
+from .ringbuffer import RingBufferWriter, ring_name
 from .encoding import JSONEncoding
+from .polling import PollScheduler, fetch_pages, parse_result_time
 from .resource_datamodels import ControlStreamResource
 from .resource_datamodels import DatastreamResource, ObservationResource
 from .resource_datamodels import SystemResource
 from .schema_datamodels import SWEDatastreamRecordSchema
+from .spatial import spatial_query_params
 from .swe_components import DataRecordSchema
 from .timemanagement import TimeInstant, TimePeriod, TimeUtils
 
@@ -56,6 +67,13 @@ class Utilities:
 
 
 class OSHClientSession:
+    """
+    Per-Node client state: the registered streamables and the WebSocket transport they share.
+
+    All WebSocket streams of a session are multiplexed as tasks on one event loop: the loop that is running when a
+    stream is started or, if none is, a daemon thread the session starts on first use. Each loop gets a single
+    aiohttp ClientSession, so the streams share its connection pool.
+    """
     verify_ssl = True
     _streamables: dict[str, 'StreamableResource'] = None
 
@@ -63,6 +81,81 @@ class OSHClientSession:
         # super().__init__(base_url, *args, **kwargs)
         self.verify_ssl = verify_ssl
         self._streamables = {}
+        self._http_sessions: dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: threading.Thread | None = None
+        self._loop_lock = threading.Lock()
+        self._poll_scheduler: PollScheduler | None = None
+
+    def ws_connect(self, url: str, **kwargs):
+        """
+        Opens a WebSocket connection; use as ``async with session.ws_connect(url) as ws``. Must be called from the
+        event loop that will read the connection.
+        :param url: ws:// or wss:// URL
+        :param kwargs: passed to ``aiohttp.ClientSession.ws_connect`` (auth, heartbeat, ...)
+        """
+        return self._http_session().ws_connect(url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs):
+        """
+        Makes an HTTP request on the running loop's connection pool; use as ``async with session.request(...)``.
+        :param kwargs: passed to ``aiohttp.ClientSession.request`` (params, headers, ...)
+        """
+        return self._http_session().request(method, url, **kwargs)
+
+    def _http_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        http_session = self._http_sessions.get(loop)
+        if http_session is None or http_session.closed:
+            http_session = self._http_sessions[loop] = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(ssl=None if self.verify_ssl else False))
+        return http_session
+
+    def get_poll_scheduler(self) -> PollScheduler:
+        """The scheduler polling this session's datastreams over HTTP, created on first use."""
+        if self._poll_scheduler is None:
+            self._poll_scheduler = PollScheduler(self)
+        return self._poll_scheduler
+
+    def get_stream_loop(self) -> asyncio.AbstractEventLoop:
+        """The session's background event loop, started on first use."""
+        with self._loop_lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever, name='oshconnect-streams',
+                                                     daemon=True)
+                self._loop_thread.start()
+            return self._loop
+
+    def run_stream(self, coro):
+        """
+        Schedules a streaming coroutine on the running event loop, or on the session's background loop when called
+        outside of one.
+        :return: the asyncio Task, or a concurrent.futures.Future for the background loop; both support cancel()
+        """
+        try:
+            return asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            return asyncio.run_coroutine_threadsafe(coro, self.get_stream_loop())
+
+    def close(self):
+        """Stops the streamables and closes the HTTP sessions and the background loop."""
+        self.close_streamables()
+        if self._poll_scheduler is not None:
+            self._poll_scheduler.stop()
+        sessions, self._http_sessions = self._http_sessions, {}
+        for loop, http_session in sessions.items():
+            if loop.is_closed() or http_session.closed:
+                continue
+            if loop is self._loop:
+                asyncio.run_coroutine_threadsafe(http_session.close(), loop).result(timeout=5)
+            elif loop.is_running():
+                loop.call_soon_threadsafe(loop.create_task, http_session.close())
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(timeout=5)
+            self._loop.close()
+            self._loop = None
 
     def connect_streamables(self):
         for streamable in self._streamables.values():
@@ -77,6 +170,9 @@ class OSHClientSession:
             self._streamables = {}
         self._streamables[streamable.get_streamable_id_str()] = streamable
 
+    def get_streamables(self) -> list[StreamableResource]:
+        return list(self._streamables.values())
+
 
 class SessionManager:
     _session_tokens = None
@@ -108,8 +204,113 @@ class SessionManager:
             session.connect_streamables()
 
 
+# Properties the discovery methods read from each listed resource; a QueryModel ``select`` always keeps them
+_SYSTEM_FIELDS = ('id', 'name', 'uid')
+_DATASTREAM_FIELDS = ('id', 'name', 'validTime')
+_CONTROLSTREAM_FIELDS = ('id', 'name')
+
+
+def _listing_params(query: QueryModel = None, keep_fields: tuple = (), bbox=None, location=None) -> dict | None:
+    """Request parameters for a resource listing: the QueryModel's, plus the bbox/location shortcuts."""
+    params = query.to_params(keep_fields) if query is not None else {}
+    params.update(spatial_query_params(bbox, location))
+    return params or None
+
+
+def _resource_kinds(system: System) -> dict[str, str]:
+    """Internal id -> kind of *system* and its streams, without loading streams a LazyResourceList holds back."""
+    kinds = {str(system.get_internal_id()): 'system'}
+    for kind, streams in (('datastream', system.datastreams), ('controlstream', system.control_channels)):
+        for entry in streams.entries() if hasattr(streams, 'entries') else streams:
+            kinds[entry.resource_id if hasattr(entry, 'loaded') else str(entry.get_internal_id())] = kind
+    return kinds
+
+
+# resultTime of a JSON observation payload, found without decoding the whole message
+_RESULT_TIME_PATTERN = re.compile(rb'"resultTime"\s*:\s*"([^"]+)"')
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class InboundMessage(NamedTuple):
+    """A WebSocket frame or polled observation, shaped like the MQTT messages handed to ``_emit_inbound_event``."""
+    topic: str
+    payload: Union[bytes, str]
+
+
+_NO_DEFAULT = object()
+
+
+class TrackedAttribute:
+    """Data descriptor for an attribute of a ChangeTracked class; assigning it bumps the owner's version."""
+    __slots__ = ('name', 'default')
+
+    def __init__(self, name: str, default=_NO_DEFAULT):
+        self.name = name
+        self.default = default
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        try:
+            return obj.__dict__[self.name]
+        except KeyError:
+            if self.default is _NO_DEFAULT:
+                raise AttributeError(self.name) from None
+            return self.default
+
+    def __set__(self, obj, value):
+        attrs = obj.__dict__
+        old = attrs.get(self.name, self.default)
+        attrs[self.name] = value
+        attrs['_version'] = attrs.get('_version', 0) + 1
+        listener = attrs.get('_change_listener')
+        if listener is not None:
+            listener(obj, self.name, None if old is _NO_DEFAULT else old, value)
+
+
+class ChangeTracked:
+    """
+    Version counter for resources persisted through a DataStore. Every attribute named in ``_tracked_attributes``
+    (the ones that end up in ``serialize()``) is turned into a TrackedAttribute, so assigning it bumps the version;
+    all other attributes are plain instance attributes and cost nothing extra. Stores call ``mark_clean()`` after
+    writing or loading a resource, so ``is_dirty()`` tells ``DataStore.save_changes()`` what to write. Changes that
+    no assignment reveals, such as in-place edits of a pydantic resource model or of a child list, need an explicit
+    ``mark_dirty()``.
+
+    An object may set ``_change_listener`` to a callable ``fn(resource, name, old, new)``; it is called after each
+    tracked assignment. The ResourceRegistry uses this to keep its indexes in step with resource ids and topics.
+    """
+    _tracked_attributes: frozenset = frozenset()
+    _version = 0
+    _saved_version = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name in cls._tracked_attributes:
+            current = getattr(cls, name, _NO_DEFAULT)
+            if not isinstance(current, TrackedAttribute):
+                setattr(cls, name, TrackedAttribute(name, current))
+
+    def get_version(self) -> int:
+        return self._version
+
+    def is_dirty(self) -> bool:
+        """True if the resource changed since it was last saved to or loaded from a DataStore, or never was."""
+        return self._saved_version != self._version
+
+    def mark_dirty(self):
+        self._version += 1
+
+    def mark_clean(self, version: int = None):
+        """
+        :param version: the version that was written, when the resource may have changed again since it was
+            serialized; defaults to the current version
+        """
+        self._saved_version = self._version if version is None else version
+
+
 @dataclass(kw_only=True)
-class Node:
+class Node(ChangeTracked):
     _id: str
     protocol: str
     address: str
@@ -123,6 +324,12 @@ class Node:
     _client_session: OSHClientSession
     _mqtt_client: MQTTCommClient
     _mqtt_port: int = 1883
+    _datastreams_by_topic: dict[str, Datastream] = field(default_factory=dict)
+    # Topics that matched no datastream when the map was last rebuilt, until a datastream is added or gets its topic
+    _unrouted_topics: set[str] = field(default_factory=set)
+    # Internal ids of the systems and streams removed by remove_system(), by kind, until a DataStore deletes them
+    _removed_resources: dict[str, str] = field(default_factory=dict)
+    _tracked_attributes = frozenset({'protocol', 'address', 'port', 'server_root', 'is_secure'})
 
     def __init__(self, protocol: str, address: str, port: int,
                  username: str = None, password: str = None, server_root: str = 'sensorhub',
@@ -150,6 +357,9 @@ class Node:
         if self.is_secure:
             self._api_helper.user_auth = True
         self._systems = []
+        self._datastreams_by_topic = {}
+        self._unrouted_topics = set()
+        self._removed_resources = {}
         if session_manager is not None:
             session_task = self.register_with_session_manager(session_manager)
             asyncio.gather(session_task)
@@ -159,7 +369,11 @@ class Node:
                 self._mqtt_port = kwargs.get('mqtt_port')
             self._mqtt_client = MQTTCommClient(url=self.address, port=self._mqtt_port,
                                                username=username, password=password,
-                                               client_id_suffix=uuid.uuid4().hex, )
+                                               client_id_suffix=uuid.uuid4().hex,
+                                               spool=kwargs.get('outbound_spool'),
+                                               spool_rate=kwargs.get('spool_rate', 100.0),
+                                               use_v5=kwargs.get('mqtt_v5', False))
+            self._mqtt_client.add_reconnect_listener(self._on_mqtt_reconnect)
             self._mqtt_client.connect()
             self._mqtt_client.start()
 
@@ -184,25 +398,115 @@ class Node:
     def get_decoded_auth(self):
         return self._basic_auth.decode('utf-8')
 
-    # def get_basicauth(self):
-    #     return BasicAuth(self._api_helper.username, self._api_helper.password)
+    def get_auth_headers(self) -> dict:
+        """Authorization header for requests made outside the APIHelper, e.g. WebSocket connections."""
+        if not self.is_secure or getattr(self, '_basic_auth', None) is None:
+            return {}
+        return {'Authorization': f'Basic {self.get_decoded_auth()}'}
 
     def get_mqtt_client(self) -> MQTTCommClient:
         return getattr(self, '_mqtt_client', None)
 
-    def discover_systems(self):
+    def _on_mqtt_reconnect(self):
+        # Runs on the MQTT network thread, before the first message of the new connection is dispatched
+        session = self.get_session()
+        if session is None:
+            return
+        datastreams = [s for s in session.get_streamables() if isinstance(s, Datastream)
+                       and s._status == Status.STARTED.value and s._begin_gap_fill()]
+        if datastreams:
+            logging.info("MQTT reconnected: filling the gaps of %s datastreams", len(datastreams))
+            session.run_stream(self.fill_gaps(datastreams))
+
+    def get_observation_topic_filter(self) -> str:
+        """Wildcard MQTT topic filter matching the observation data topics of all datastreams of this node."""
+        return self._api_helper.get_mqtt_topic(APIResourceTypes.DATASTREAM, APIResourceTypes.OBSERVATION, '+')
+
+    def subscribe_observations(self, callback=None, qos: int = 0, group: ConsumerGroup = None) -> list[str]:
+        """
+        Subscribes to the observations of all datastreams of this node with one wildcard subscription. By default,
+        messages are delivered to the Datastream they belong to, as if it had subscribed itself.
+        :param callback: Optional message callback replacing the default routing, callback(client, userdata, msg)
+        :param qos: MQTT Quality of Service level, default 0
+        :param group: consume as a member of this ConsumerGroup: without affinity the wildcard subscription is shared
+            with the other members; with affinity, the datastreams of the node's systems owned by this member are
+            subscribed individually instead, so datastreams discovered later must be subscribed with
+            ``Datastream.subscribe(group=group)``
+        :return: the subscription filters
+        """
+        client = self.get_mqtt_client()
+        if client is None:
+            logging.warning(f"No MQTT client configured for node {self._id}.")
+            return []
+        if group is not None and group.affinity:
+            datastreams = [ds for system in self._systems for ds in system.datastreams]
+            return [t for ds in datastreams if (t := ds.subscribe(callback=callback, qos=qos, group=group))]
+        topic_filter = self.get_observation_topic_filter()
+        share_group = group.name if group is not None else None
+        client.subscribe(topic_filter, qos=qos, msg_callback=callback if callback is not None else self._route_observation,
+                         share_group=share_group)
+        return [client.shared_topic(topic_filter, share_group)]
+
+    def unsubscribe_observations(self, group: ConsumerGroup = None):
+        client = self.get_mqtt_client()
+        if client is None or group is not None and group.affinity:
+            return
+        client.unsubscribe(self.get_observation_topic_filter(), share_group=group.name if group is not None else None)
+
+    def _route_observation(self, client, userdata, msg):
+        datastream = self._datastreams_by_topic.get(msg.topic)
+        if datastream is None and msg.topic not in self._unrouted_topics:
+            session = self.get_session()
+            streamables = session.get_streamables() if session is not None else \
+                [ds for system in self._systems for ds in system.datastreams]
+            self._datastreams_by_topic = {s._topic: s for s in streamables
+                                          if isinstance(s, Datastream) and getattr(s, '_topic', None)}
+            datastream = self._datastreams_by_topic.get(msg.topic)
+            if datastream is None:
+                self._unrouted_topics.add(msg.topic)
+        if datastream is None:
+            logging.debug("Observation on %s does not belong to a known datastream", msg.topic)
+            return
+        datastream._mqtt_sub_callback(client, userdata, msg)
+
+    async def fill_gaps(self, datastreams: list[Datastream], concurrency: int = 8):
+        """
+        Fetches what the given datastreams missed while MQTT was disconnected, see ``Datastream.fill_gap()``.
+        :param concurrency: maximum number of observation requests in flight at once
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(ds.fill_gap(semaphore=semaphore) for ds in datastreams))
+
+    def discover_systems(self, bbox=None, location=None, query: QueryModel = None):
+        """
+        Retrieves the systems of this node's server. A system the node already holds (same resource id) is updated
+        with the returned resource, e.g. its new location, instead of being added twice.
+        :param bbox: only return systems located in this bounding box ``[min_x, min_y, max_x, max_y]``; for any other
+            geometry its bounds are used
+        :param location: only return systems whose location intersects this geometry (sent as WKT)
+        :param query: further filters, paging and ``select`` projection, evaluated by the server
+        :return: the systems returned by the server or None if the request failed
+        """
+        params = _listing_params(query, _SYSTEM_FIELDS, bbox, location)
         result = self._api_helper.retrieve_resource(APIResourceTypes.SYSTEM,
-                                                    req_headers={})
+                                                    req_headers={}, params=params)
         if result.ok:
             new_systems = []
             system_objs = result.json()['items']
-            print(system_objs)
+            # Only compare against materialized systems, a lazily loaded node keeps the rest unloaded
+            loaded = self._systems.loaded_items() if hasattr(self._systems, 'loaded_items') else self._systems
+            known = {getattr(system, '_resource_id', None): system for system in loaded}
             for system_json in system_objs:
-                print(system_json)
                 system = SystemResource.model_validate(system_json, by_alias=True)
+                sys_obj = known.get(system.system_id)
+                if sys_obj is not None:
+                    sys_obj.set_system_resource(system)
+                    new_systems.append(sys_obj)
+                    continue
                 sys_obj = System(label=system.properties['name'],
                                  name=to_camel(system.properties['name'].replace(" ", "_")),
                                  urn=system.properties['uid'], parent_node=self, resource_id=system.system_id)
+                sys_obj.set_system_resource(system)
 
                 self._systems.append(sys_obj)
                 new_systems.append(sys_obj)
@@ -210,9 +514,26 @@ class Node:
         else:
             return None
 
+    def discover_sampling_features(self, bbox=None, location=None, query: QueryModel = None) -> list[dict] | None:
+        """
+        Retrieves the sampling features of this node's server as GeoJSON Feature dicts.
+        :param bbox: only return features located in this bounding box ``[min_x, min_y, max_x, max_y]``
+        :param location: only return features whose geometry intersects this geometry (sent as WKT)
+        :param query: further filters, paging and ``select`` projection, evaluated by the server
+        :return: the features or None if the request failed
+        """
+        params = _listing_params(query, ('id', 'geometry'), bbox, location)
+        result = self._api_helper.retrieve_resource(APIResourceTypes.SAMPLING_FEATURE,
+                                                    req_headers={}, params=params)
+        if result.ok:
+            return result.json()['items']
+        return None
+
     def add_new_system(self, system: System):
         system.set_parent_node(self)
         self._systems.append(system)
+        for resource_id in _resource_kinds(system):
+            self._removed_resources.pop(resource_id, None)
 
     def get_api_helper(self) -> APIHelper:
         return self._api_helper
@@ -232,6 +553,23 @@ class Node:
         self._systems.append(system)
         return system
 
+    def remove_system(self, system: System) -> bool:
+        """
+        Remove a system from this node without deleting it on the server.
+        :param system: System object
+        :return: True if the system belonged to this node
+        """
+        # A lazily loaded node holds LazySlots; compare against the stored entries so nothing else gets loaded
+        entries = self._systems.entries() if hasattr(self._systems, 'entries') else self._systems
+        for i, entry in enumerate(entries):
+            if entry is system or (getattr(entry, 'loaded', False) and entry.get() is system):
+                del self._systems[i]
+                # DataStore.save_changes() deletes the system's rows and those of its streams
+                self._removed_resources.update(_resource_kinds(system))
+                self.mark_dirty()
+                return True
+        return False
+
     def systems(self) -> list[System]:
         return self._systems
 
@@ -247,11 +585,16 @@ class Node:
         if self._client_session is None:
             raise ValueError("Node is not registered with a SessionManager.")
         self._client_session.register_streamable(streamable)
+        self._unrouted_topics.clear()
 
     def get_session(self) -> OSHClientSession:
         return self._client_session
 
-    def serialize(self) -> dict:
+    def serialize(self, include_systems: bool = True) -> dict:
+        """
+        :param include_systems: embed the serialized Systems (and their streams) under ``_systems``. Stores that keep
+            child resources in their own tables pass False, leaving ``_systems`` as None.
+        """
         data = {
             "_id": self._id,
             "protocol": self.protocol,
@@ -263,7 +606,8 @@ class Node:
             "is_secure": self.is_secure,
             "username": getattr(self._api_helper, "username", None),
             "password": getattr(self._api_helper, "password", None),
-            "_systems": [system.serialize() for system in self._systems] if self._systems is not None else None,
+            "_systems": [system.serialize() for system in self._systems]
+            if include_systems and self._systems is not None else None,
         }
         data["name"] = getattr(self, "name", None)
         data["label"] = getattr(self, "label", None)
@@ -295,7 +639,11 @@ class Node:
         return data
 
     @classmethod
-    def deserialize(cls, data: dict, session_manager: 'SessionManager' = None) -> 'Node':
+    def deserialize(cls, data: dict, session_manager: 'SessionManager' = None, trusted: bool = False) -> 'Node':
+        """
+        :param trusted: *data* is unmodified ``serialize()`` output, e.g. read back from a DataStore. Child resources
+            are then rebuilt without revalidating their underlying resources, see ``StreamableResource._restore``.
+        """
         node = cls(
             protocol=data["protocol"],
             address=data["address"],
@@ -312,7 +660,7 @@ class Node:
         # because StreamableResource.__init__ calls node.register_streamable().
         if session_manager is not None:
             node.register_with_session_manager(session_manager)
-        node._systems = [System.deserialize(sys, node) for sys in data.get("_systems", [])] if data.get(
+        node._systems = [System.deserialize(sys, node, trusted=trusted) for sys in data.get("_systems", [])] if data.get(
             "_systems") is not None else []
         return node
 
@@ -335,7 +683,7 @@ class StreamableModes(Enum):
 T = TypeVar('T', SystemResource, DatastreamResource, ControlStreamResource)
 
 
-class StreamableResource(Generic[T], ABC):
+class StreamableResource(ChangeTracked, Generic[T], ABC):
     _id: UUID
     _resource_id: str
     # _canonical_link: str
@@ -343,8 +691,21 @@ class StreamableResource(Generic[T], ABC):
     _status: str = Status.STOPPED.value
     ws_url: str
     _message_handler = None
+    ws_url: str = None
+    _ws_task = None
+    _ws_loop: asyncio.AbstractEventLoop = None
+    # Reconnect backoff of the WebSocket transport, in seconds: doubles per failed attempt up to the maximum
+    _ws_reconnect_delay = 0.5
+    _ws_max_reconnect_delay = 30.0
+    _ws_heartbeat = 30.0
+    # Messages the reader queue holds before the oldest ones are dropped
+    _reader_queue_size = 10000
     _parent_node: Node
-    _underlying_resource: T
+    # Validated underlying resource, its cached JSON-mode dump, and (while validation is deferred) the model class
+    # that ``_resource_dump`` still has to be validated into. See the ``_underlying_resource`` property.
+    _resource: T = None
+    _resource_dump: dict = None
+    _resource_type: type = None
     _process: Process
     _msg_reader_queue: asyncio.Queue[Union[str, bytes, float, int]]
     _msg_writer_queue: asyncio.Queue[Union[str, bytes, float, int]]
@@ -353,9 +714,12 @@ class StreamableResource(Generic[T], ABC):
     _mqtt_client: MQTTCommClient
     _parent_resource_id: str
     _connection_mode: StreamableModes = StreamableModes.PUSH.value
+    _tracked_attributes = frozenset({'_resource_id', '_topic', '_status', '_parent_resource_id',
+                                     '_connection_mode'})
 
-    def __init__(self, node: Node, connection_mode: StreamableModes = StreamableModes.PUSH.value):
-        self._id = uuid4()
+    def __init__(self, node: Node, connection_mode: StreamableModes = StreamableModes.PUSH.value,
+                 internal_id: UUID = None):
+        self._id = internal_id if internal_id is not None else uuid4()
         self._parent_node = node
         self._parent_node.register_streamable(self)
         self._mqtt_client = self._parent_node.get_mqtt_client()
@@ -364,6 +728,58 @@ class StreamableResource(Generic[T], ABC):
         self._outbound_deque = deque()
         self._parent_resource_id = None
 
+    @property
+    def _underlying_resource(self) -> T:
+        if self._resource_type is not None:
+            # Deferred by a trusted deserialize(): validate on first use
+            self._resource = self._resource_type.model_validate(self._resource_dump)
+            self._resource_type = None
+        return self._resource
+
+    @_underlying_resource.setter
+    def _underlying_resource(self, resource: T):
+        self._resource = resource
+        self._resource_dump = None
+        self._resource_type = None
+        self._version += 1
+        listener = self.__dict__.get('_change_listener')
+        if listener is not None:
+            listener(self, '_underlying_resource', None, resource)
+
+    def _defer_underlying_resource(self, resource_type: type, dump: dict):
+        """Adopts *dump* (from a previous ``serialize()``) as the underlying resource without validating it yet."""
+        self._resource = None
+        self._resource_dump = dump or None
+        self._resource_type = resource_type if dump else None
+
+    def _dump_underlying_resource(self) -> Union[dict, str, None]:
+        """
+        JSON-mode dump of the underlying resource, cached until the resource is replaced. The cached dict is shared
+        between serializations and must not be mutated. In-place edits of the underlying pydantic model are not
+        detected, call ``mark_dirty()`` after making them.
+        """
+        if self._resource_dump is not None:
+            return self._resource_dump
+        underlying = self._resource
+        if underlying is None:
+            return None
+        if callable(getattr(underlying, 'model_dump', None)):
+            self._resource_dump = underlying.model_dump(by_alias=True, exclude_none=True, mode='json')
+            return self._resource_dump
+        if hasattr(underlying, 'to_dict'):
+            return underlying.to_dict()
+        return str(underlying)
+
+    def invalidate_serialization_cache(self):
+        """Drops the cached dump of the underlying resource so that the next ``serialize()`` dumps it again."""
+        if self._resource_type is None:
+            self._resource_dump = None
+
+    def mark_dirty(self):
+        """Flags the resource as modified, e.g. after editing the underlying resource model in place."""
+        self.invalidate_serialization_cache()
+        super().mark_dirty()
+
     def get_streamable_id(self) -> UUID:
         return self._id
 
@@ -383,11 +799,15 @@ class StreamableResource(Generic[T], ABC):
                 "Underlying resource must be set to either SystemResource or DatastreamResource before initialization.")
         # This needs to be implemented separately for each subclass
         res_id = getattr(self._underlying_resource, "ds_id", None) or getattr(self._underlying_resource, "cs_id", None)
-        self.ws_url = self._parent_node.get_api_helper().construct_url(resource_type=resource_type,
-                                                                       subresource_type=APIResourceTypes.OBSERVATION,
-                                                                       resource_id=res_id,
-                                                                       subresource_id=None)
-        self._msg_reader_queue = asyncio.Queue()
+        stream_type = {APIResourceTypes.DATASTREAM: APIResourceTypes.OBSERVATION,
+                       APIResourceTypes.CONTROL_CHANNEL: APIResourceTypes.COMMAND}.get(resource_type)
+        if stream_type is not None and res_id is not None:
+            self.ws_url = self._parent_node.get_api_helper().construct_url(resource_type=resource_type,
+                                                                           subresource_type=stream_type,
+                                                                           resource_id=res_id,
+                                                                           subresource_id=None,
+                                                                           for_socket=True)
+        self._msg_reader_queue = asyncio.Queue(maxsize=self._reader_queue_size)
         self._msg_writer_queue = asyncio.Queue()
         self.init_mqtt()
         self._status = Status.INITIALIZED.value
@@ -399,18 +819,48 @@ class StreamableResource(Generic[T], ABC):
         self._status = Status.STARTING.value
         self._status = Status.STARTED.value
 
-    async def stream(self):
+    async def stream(self, reconnect: bool = True):
+        """
+        Streams this resource over WebSocket until ``stop()``: received frames go to the inbound deque, the reader
+        queue and the EventHandler; messages put in the writer queue (``insert_data()``) are sent. A dropped
+        connection is reopened after an exponential backoff with jitter.
+        :param reconnect: reopen the connection when it closes or fails, default True
+        """
         session = self._parent_node.get_session()
-
-        try:
-            async with session.ws_connect(self.ws_url, auth=self._parent_node.get_basicauth()) as ws:
-                logging.info(f"Streamable resource {self._id} started.")
-                read_task = asyncio.create_task(self._read_from_ws(ws))
-                write_task = asyncio.create_task(self._write_to_ws(ws))
-                await asyncio.gather(read_task, write_task)
-        except Exception as e:
-            logging.error(f"Error in streamable resource {self._id}: {e}")
-            logging.error(traceback.format_exc())
+        self._ws_loop = asyncio.get_running_loop()
+        delay = self._ws_reconnect_delay
+        while self._status == Status.STARTED.value:
+            try:
+                async with session.ws_connect(self.ws_url, headers=self._parent_node.get_auth_headers(),
+                                              heartbeat=self._ws_heartbeat) as ws:
+                    logging.info("Streamable resource %s connected to %s", self._id, self.ws_url)
+                    delay = self._ws_reconnect_delay
+                    read_task = asyncio.create_task(self._read_from_ws(ws))
+                    write_task = asyncio.create_task(self._write_to_ws(ws))
+                    try:
+                        # The reader ends when the server closes the connection, the writer only on send errors
+                        await asyncio.wait({read_task, write_task}, return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        read_task.cancel()
+                        write_task.cancel()
+                    for task in (read_task, write_task):
+                        if not task.cancelled() and task.exception() is not None:
+                            raise task.exception()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning("WebSocket stream of %s failed: %s", self._id, e)
+            if not reconnect or self._status != Status.STARTED.value:
+                break
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, self._ws_max_reconnect_delay)
+
+    def _start_ws(self):
+        """Starts ``stream()`` on the parent session's streaming loop."""
+        if self.ws_url is None:
+            logging.warning("Streamable resource %s has no WebSocket URL; nothing to stream.", self._id)
+            return
+        self._ws_task = self._parent_node.get_session().run_stream(self.stream())
 
     def init_mqtt(self):
         if self._mqtt_client is None:
@@ -518,21 +968,57 @@ class StreamableResource(Generic[T], ABC):
 
     async def _read_from_ws(self, ws):
         async for msg in ws:
-            self._message_handler(ws, msg)
+            if msg.type in (aiohttp.WSMsgType.BINARY, aiohttp.WSMsgType.TEXT):
+                if self._message_handler is not None:
+                    self._message_handler(ws, msg)
+                else:
+                    self._deliver_inbound(msg.data)
+            elif msg.type is aiohttp.WSMsgType.ERROR:
+                raise ws.exception() or ConnectionError(f"WebSocket error on {self.ws_url}")
+
+    def _deliver_inbound(self, payload: Union[bytes, str]):
+        # Binary frames are handed on as the bytes object aiohttp received, without decoding or copying
+        self._inbound_deque.append(payload)
+        if getattr(self, '_msg_reader_queue', None) is not None:
+            loop = self._ws_loop
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if loop is not None and loop is not running and loop.is_running():
+                # asyncio queues are not thread-safe: hand the message to the loop streaming this resource
+                loop.call_soon_threadsafe(self._put_reader_queue, payload)
+            elif running is not None:
+                self._put_reader_queue(payload)
+            # Outside of any loop, e.g. a synchronous poll() of a resource that is not streamed, only the deque and
+            # the events get the message, as for MQTT
+        self._emit_inbound_event(InboundMessage(getattr(self, '_topic', None) or self.ws_url, payload))
+
+    def _put_reader_queue(self, payload: Union[bytes, str]):
+        queue = self._msg_reader_queue
+        if queue.full():
+            # Nobody keeps up with the queue: drop the oldest message rather than grow without bound
+            queue.get_nowait()
+        queue.put_nowait(payload)
 
     async def _write_to_ws(self, ws):
-        while self._status is Status.STARTED.value:
-            try:
-                msg = self._msg_writer_queue.get_nowait()
+        while True:
+            msg = await self._msg_writer_queue.get()
+            if isinstance(msg, str):
+                await ws.send_str(msg)
+            else:
                 await ws.send_bytes(msg)
-            except asyncio.QueueEmpty:
-                await asyncio.sleep(0.05)
 
     def stop(self):
         # It would be nicer to join() here once we have cleaner shutdown logic in place to avoid corrupting processes
         # that are writing to streams or that need to manage authentication state
         self._status = "stopping"
-        self._process.terminate()
+        if self._ws_task is not None:
+            self._ws_task.cancel()
+            self._ws_task = None
+        process = getattr(self, '_process', None)
+        if process is not None:
+            process.terminate()
         self._status = "stopped"
 
     def set_parent_node(self, node: Node):
@@ -582,9 +1068,17 @@ class StreamableResource(Generic[T], ABC):
             No Checks are performed to ensure the data is valid for the underlying resource.
             :param data: Data to be sent, typically bytes or str
         """
-        print(f"Inserting data into message writer queue: {data}")
         data_bytes = json.dumps(data).encode("utf-8") if isinstance(data, dict) else data
-        self._msg_writer_queue.put_nowait(data_bytes)
+        loop = self._ws_loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if loop is not None and loop is not running and loop.is_running():
+            # The stream runs on another thread's loop; asyncio queues are not thread-safe
+            loop.call_soon_threadsafe(self._msg_writer_queue.put_nowait, data_bytes)
+        else:
+            self._msg_writer_queue.put_nowait(data_bytes)
 
     def subscribe_mqtt(self, topic: str, qos: int = 0):
         if self._mqtt_client is None:
@@ -657,21 +1151,17 @@ class StreamableResource(Generic[T], ABC):
 
     def serialize(self) -> dict:
         """Serializes common attributes of StreamableResource, safely handling missing/None attributes."""
-        topic = getattr(self, "_topic", None)
-        status = getattr(self, "_status", None)
-        parent_resource_id = getattr(self, "_parent_resource_id", None)
-        connection_mode = getattr(self, "_connection_mode", None)
-        resource_id = getattr(self, "_resource_id", None)
+        connection_mode = self._connection_mode
         if isinstance(connection_mode, Enum):
             connection_mode = connection_mode.value
 
         return {
-            "id": str(getattr(self, "_id", None)),
-            "resource_id": resource_id,
+            "id": str(self._id),
+            "resource_id": getattr(self, "_resource_id", None),
             # "canonical_link": getattr(self, "_canonical_link", None),
-            "topic": topic,
-            "status": status,
-            "parent_resource_id": parent_resource_id,
+            "topic": getattr(self, "_topic", None),
+            "status": self._status,
+            "parent_resource_id": self._parent_resource_id,
             "connection_mode": connection_mode,
         }
 
@@ -685,7 +1175,19 @@ class StreamableResource(Generic[T], ABC):
         obj._topic = data.get("topic")
         obj._status = data.get("status")
         obj._parent_resource_id = data.get("parent_resource_id")
-        obj._connection_mode = StreamableModes(data.get("connection_mode", StreamableModes.PUSH.value)),
+        obj._connection_mode = StreamableModes(data.get("connection_mode", StreamableModes.PUSH.value))
+        return obj
+
+    @classmethod
+    def _restore(cls, data: dict, node: 'Node', resource_type: type) -> 'StreamableResource':
+        """
+        Rebuilds a resource from trusted ``serialize()`` output without running the subclass ``__init__``. The
+        underlying resource is validated lazily on first access and its stored dump doubles as the serialization
+        cache, so loading and re-saving an untouched resource never goes through pydantic.
+        """
+        obj = cls.__new__(cls)
+        StreamableResource.__init__(obj, node, internal_id=uuid.UUID(data["id"]))
+        obj._defer_underlying_resource(resource_type, data.get("underlying_resource"))
         return obj
 
 
@@ -697,6 +1199,8 @@ class System(StreamableResource[SystemResource]):
     description: str
     urn: str
     _parent_node: Node
+    _tracked_attributes = StreamableResource._tracked_attributes | {'name', 'label', 'urn', 'description',
+                                                                    'datastreams', 'control_channels'}
 
     def __init__(self, name: str, label: str, urn: str, parent_node: Node, **kwargs):
         """
@@ -719,9 +1223,24 @@ class System(StreamableResource[SystemResource]):
 
         self._underlying_resource = self.to_system_resource()
 
-    def discover_datastreams(self) -> list[Datastream]:
+    def get_geometry(self):
+        """
+        The system's location, as the ``Geometry`` of its SystemResource or, while a trusted load has not validated
+        the resource yet, as the stored GeoJSON dict. None if the system has no location.
+        """
+        if self._resource_type is not None:
+            return self._resource_dump.get('geometry')
+        return getattr(self._resource, 'geometry', None)
+
+    def discover_datastreams(self, query: QueryModel = None) -> list[Datastream]:
+        """
+        Retrieves the datastreams of this system.
+        :param query: filters, paging and ``select`` projection, evaluated by the server
+        :return: the datastreams returned by the server
+        """
         res = self._parent_node.get_api_helper().get_resource(APIResourceTypes.SYSTEM, self._resource_id,
-                                                              APIResourceTypes.DATASTREAM)
+                                                              APIResourceTypes.DATASTREAM,
+                                                              params=_listing_params(query, _DATASTREAM_FIELDS))
         datastream_json = res.json()['items']
         datastreams = []
 
@@ -735,9 +1254,15 @@ class System(StreamableResource[SystemResource]):
 
         return datastreams
 
-    def discover_controlstreams(self) -> list[ControlStream]:
+    def discover_controlstreams(self, query: QueryModel = None) -> list[ControlStream]:
+        """
+        Retrieves the control streams of this system.
+        :param query: filters, paging and ``select`` projection, evaluated by the server
+        :return: the control streams returned by the server
+        """
         res = self._parent_node.get_api_helper().get_resource(APIResourceTypes.SYSTEM, self._resource_id,
-                                                              APIResourceTypes.CONTROL_CHANNEL)
+                                                              APIResourceTypes.CONTROL_CHANNEL,
+                                                              params=_listing_params(query, _CONTROLSTREAM_FIELDS))
         controlstream_json = res.json()['items']
         controlstreams = []
 
@@ -901,39 +1426,48 @@ class System(StreamableResource[SystemResource]):
             self._underlying_resource = system_resource
             return None
 
-    def serialize(self) -> dict:
+    def serialize(self, include_streams: bool = True) -> dict:
+        """
+        :param include_streams: embed the serialized datastreams and control channels. When False both are None.
+        """
         data = super().serialize()
         data["name"] = getattr(self, "name", None)
         data["label"] = getattr(self, "label", None)
         data["urn"] = getattr(self, "urn", None)
         data["description"] = getattr(self, "description", None)
         datastreams = getattr(self, "datastreams", None)
-        if datastreams is not None:
+        if include_streams and datastreams is not None:
             data["datastreams"] = [ds.serialize() for ds in datastreams]
         else:
             data["datastreams"] = None
         control_channels = getattr(self, "control_channels", None)
-        if control_channels is not None:
+        if include_streams and control_channels is not None:
             data["control_channels"] = [cc.serialize() for cc in control_channels]
         else:
             data["control_channels"] = None
-        underlying = getattr(self, "_underlying_resource", None)
-        if underlying is not None:
-            dump = getattr(underlying, 'model_dump', None)
-            if callable(dump):
-                data["underlying_resource"] = underlying.model_dump(by_alias=True, exclude_none=True, mode='json')
-            elif hasattr(underlying, 'to_dict'):
-                data["underlying_resource"] = underlying.to_dict()
-            else:
-                data["underlying_resource"] = str(underlying)
-        else:
-            data["underlying_resource"] = None
+        data["underlying_resource"] = self._dump_underlying_resource()
         # Remove any 'resource' key if present
         data.pop("resource", None)
         return data
 
     @classmethod
-    def deserialize(cls, data: dict, node: 'Node') -> 'System':
+    def deserialize(cls, data: dict, node: 'Node', trusted: bool = False) -> 'System':
+        """
+        :param trusted: skip validation of trusted ``serialize()`` output, see ``StreamableResource._restore``
+        """
+        if trusted:
+            obj = cls._restore(data, node, SystemResource)
+            obj.name = data["name"]
+            obj.label = data["label"]
+            obj.urn = data["urn"]
+            if data.get("description"):
+                obj.description = data["description"]
+            if data.get("resource_id"):
+                obj._resource_id = data["resource_id"]
+            obj.datastreams = [Datastream._restore_datastream(ds, node) for ds in data.get("datastreams") or []]
+            obj.control_channels = [ControlStream._restore_controlstream(cc, node)
+                                    for cc in data.get("control_channels") or []]
+            return obj
         obj = cls(
             name=data["name"],
             label=data["label"],
@@ -943,8 +1477,8 @@ class System(StreamableResource[SystemResource]):
             resource_id=data.get("resource_id")
         )
         obj._id = uuid.UUID(data["id"])
-        obj.datastreams = [Datastream.deserialize(ds, node) for ds in data.get("datastreams", [])]
-        obj.control_channels = [ControlStream.deserialize(cc, node) for cc in data.get("control_channels", [])]
+        obj.datastreams = [Datastream.deserialize(ds, node) for ds in data.get("datastreams") or []]
+        obj.control_channels = [ControlStream.deserialize(cc, node) for cc in data.get("control_channels") or []]
         underlying = data.get("underlying_resource")
         obj._underlying_resource = SystemResource.model_validate(underlying) if underlying else None
         return obj
@@ -952,6 +1486,28 @@ class System(StreamableResource[SystemResource]):
 
 class Datastream(StreamableResource[DatastreamResource]):
     should_poll: bool
+    # Newest resultTime received by poll() and the observations carrying it, which the next poll skips
+    _last_result_time: str = None
+    _last_result_keys: frozenset = frozenset()
+    # (resultTime parameter, conditional request headers) of the last poll that returned nothing new
+    _poll_validators: tuple = None
+    # Live MQTT payloads carrying _last_result_time, to recognise them among archived observations
+    _last_live_payloads: list = None
+    # Live messages held back while the gap left by an MQTT reconnect is filled; None when no fill is running
+    _gap_buffer: list = None
+    _gap_since: str = None
+    # Resuming from a checkpoint: everything at _gap_since has been processed already
+    _gap_skip_since: bool = False
+    # A fill that failed leaves the gap open and _last_result_time at _gap_since. The live messages delivered
+    # meanwhile are tracked here instead: resultTime of the first one, payloads carrying the newest resultTime
+    _gap_until: str = None
+    _gap_released: list = None
+    _gap_fill_running: bool = False
+    # Worker processes decoding the live messages, see DecodePool.attach()
+    _decode_pool: DecodePool = None
+    # Shared memory ring buffer the inbound payloads are copied to for local readers, see publish_ring_buffer()
+    _ring_writer: RingBufferWriter = None
+    _tracked_attributes = StreamableResource._tracked_attributes | {'should_poll'}
 
     def __init__(self, parent_node: Node = None, datastream_resource: DatastreamResource = None):
         super().__init__(node=parent_node)
@@ -990,6 +1546,33 @@ class Datastream(StreamableResource[DatastreamResource]):
         else:
             raise Exception(f'Failed to insert observation: {res.text}')
 
+    def fetch(self, time_period: TimePeriod = None, limit: int = 1000, query: QueryModel = None) -> list[dict]:
+        """
+        Retrieves archived observations whose resultTime falls within the given period, following the server's
+        paging links (rel="next") until the period is exhausted.
+        :param time_period: TimePeriod to retrieve; overrides the query's result_time
+        :param limit: page size requested from the server, unless the query sets one
+        :param query: further filters (e.g. foi, phenomenon_time) and ``select`` projection, evaluated by the server
+        :return: list of observation dicts as returned by the server, in server order
+        """
+        params = {'limit': limit}
+        params.update(_listing_params(query) or {})
+        if time_period is not None:
+            params['resultTime'] = f'{time_period.start}/{time_period.end}'
+        api = self._parent_node.get_api_helper()
+        res = api.retrieve_resource(APIResourceTypes.OBSERVATION, parent_res_id=self._resource_id,
+                                    params=params)
+        observations = []
+        while res is not None:
+            if not res.ok:
+                raise Exception(f'Failed to fetch observations for datastream {self._resource_id}: {res.text}')
+            body = res.json()
+            observations.extend(body.get('items', []))
+            next_link = next((link.get('href') for link in body.get('links', []) or []
+                              if link.get('rel') == 'next'), None)
+            res = api.retrieve_url(next_link) if next_link else None
+        return observations
+
     def start(self):
         super().start()
         if self._mqtt_client is not None:
@@ -1005,12 +1588,335 @@ class Datastream(StreamableResource[DatastreamResource]):
                 except Exception as e:
                     logging.error("Error starting MQTT write task for %s: %s\n%s",
                                   self._id, e, traceback.format_exc())
+        elif self._status == Status.STARTED.value:
+            # No MQTT on this node: poll over HTTP or stream over WebSocket instead
+            if getattr(self, 'should_poll', False):
+                self._parent_node.get_session().get_poll_scheduler().add(self)
+            else:
+                self._start_ws()
+
+    def stop(self):
+        session = self._parent_node.get_session()
+        if session is not None:
+            session.get_poll_scheduler().remove(self)
+        super().stop()
+
+    def poll(self, limit: int = 1000) -> list[dict]:
+        """
+        Retrieves the observations that arrived since the last poll, i.e. those with a resultTime newer than the last
+        one seen (or than the first poll), and delivers them like streamed ones: to the inbound deque, the reader
+        queue and as NEW_OBSERVATION events. The validators of a previous empty response are sent along, so that the
+        server can answer 304 Not Modified. Use the session's PollScheduler to poll many datastreams periodically.
+        :param limit: page size requested from the server
+        :return: the new observations as dicts, in server order
+        """
+        url, params, headers = self._poll_request(limit)
+        api = self._parent_node.get_api_helper()
+        new = []
+        while url is not None:
+            res = api.retrieve_url(url, params=params, req_headers=headers)
+            if res.status_code == 304:
+                break
+            if not res.ok:
+                raise Exception(f'Failed to poll observations for datastream {self._resource_id}: {res.text}')
+            body = res.json()
+            new.extend(self._accept_polled(body, res.headers, params))
+            url = next((link.get('href') for link in body.get('links', []) or []
+                        if link.get('rel') == 'next'), None)
+            # The next link carries the query of the following page itself
+            params, headers = {}, {}
+        return new
+
+    def _poll_request(self, limit: int) -> tuple[str, dict, dict]:
+        """URL, query parameters and conditional headers of the next poll."""
+        if self._last_result_time is None:
+            self._last_result_time = TimeInstant.now_as_time_instant().get_iso_time()
+        params = {'resultTime': f'{self._last_result_time}/..', 'limit': limit}
+        headers = {}
+        if self._poll_validators is not None and self._poll_validators[0] == params['resultTime']:
+            headers = dict(self._poll_validators[1])
+        api = self._parent_node.get_api_helper()
+        url = api.resource_url_resolver(APIResourceTypes.OBSERVATION, None, self._resource_id)
+        return url, params, headers
+
+    def _accept_polled(self, body: dict, headers, params: dict = None) -> list[dict]:
+        """
+        Delivers the observations of a poll response that were not seen before and advances the last resultTime.
+        :param params: query parameters of the request for the first page, empty for later pages
+        """
+        since = parse_result_time(self._last_result_time)
+        newest, newest_str, newest_keys = since, self._last_result_time, set(self._last_result_keys)
+        new = []
+        for obs in body.get('items', []):
+            result_time = parse_result_time(obs.get('resultTime'))
+            # The resultTime filter includes its start, where observations of the previous poll can sit
+            key = obs.get('id') or json.dumps(obs, sort_keys=True)
+            if result_time is not None and since is not None and (
+                    result_time < since or (result_time == since and key in self._last_result_keys)):
+                continue
+            new.append(obs)
+            if result_time is not None and (newest is None or result_time > newest):
+                newest, newest_str, newest_keys = result_time, obs['resultTime'], set()
+            if result_time == newest:
+                newest_keys.add(key)
+        if new:
+            self._last_result_time = newest_str
+            self._last_result_keys = frozenset(newest_keys)
+            self._last_live_payloads = None
+            self._poll_validators = None
+        elif params:
+            validators = {'If-None-Match': headers.get('ETag'), 'If-Modified-Since': headers.get('Last-Modified')}
+            validators = {name: value for name, value in validators.items() if value}
+            self._poll_validators = (params['resultTime'], validators) if validators else None
+        for obs in new:
+            self._deliver_inbound(json.dumps(obs).encode('utf-8'))
+        return new
+
+    def _mqtt_sub_callback(self, client, userdata, msg):
+        if self._gap_buffer is not None:
+            with self._gap_lock:
+                if self._gap_buffer is not None:
+                    self._gap_buffer.append(msg)
+                    return
+        self._note_live_result(msg.payload)
+        self._dispatch_live(client, userdata, msg)
+
+    def _dispatch_live(self, client, userdata, msg):
+        pool = self._decode_pool
+        if pool is not None:
+            try:
+                pool.submit(self, msg.topic, msg.payload)
+                return
+            except TimeoutError as e:
+                logging.warning("Decoding observation of datastream %s on the network thread: %s", self._id, e)
+        StreamableResource._mqtt_sub_callback(self, client, userdata, msg)
+
+    def _deliver_decoded(self, topic: str, payload: bytes, observation):
+        """Receives a message decoded by the DecodePool, on the pool's result thread."""
+        self._inbound_deque.append(payload)
+        self._write_ring(payload)
+        evt = (EventBuilder().with_type(DefaultEventTypes.NEW_OBSERVATION)
+               .with_topic(topic)
+               .with_data(observation)
+               .with_producer(self)
+               .build())
+        EventHandler().publish(evt)
+
+    def _note_live_result(self, payload):
+        result_time = self._payload_result_time(payload)
+        if result_time is None:
+            return
+        if self._gap_since is not None:
+            # The gap before this message is still open: the resume point stays before it until the gap is filled
+            if self._gap_until is None:
+                self._gap_until = result_time
+            released = self._gap_released
+            if released and self._payload_result_time(released[-1]) == result_time:
+                released.append(payload)
+            else:
+                self._gap_released = [payload]
+            return
+        if result_time == self._last_result_time and self._last_live_payloads is not None:
+            self._last_live_payloads.append(payload)
+        else:
+            self._last_result_time = result_time
+            self._last_result_keys = frozenset()
+            self._last_live_payloads = [payload]
+
+    @staticmethod
+    def _payload_result_time(payload) -> str | None:
+        match = _RESULT_TIME_PATTERN.search(payload) if isinstance(payload, (bytes, bytearray)) else None
+        return match.group(1).decode('utf-8') if match is not None else None
+
+    def _begin_gap_fill(self, skip_since: bool = False) -> bool:
+        """
+        Starts holding back live messages until ``fill_gap()`` completes.
+        :param skip_since: leave out every archived observation at the last resultTime, not just those received live
+        :return: False if a fill is already running or no observation was received yet to resume from
+        """
+        if self._last_result_time is None or self._gap_buffer is not None:
+            return False
+        if self._gap_fill_running:
+            # A failed fill is being retried: hold the live messages back again, it delivers them
+            self._gap_buffer = []
+            return False
+        if self._gap_since != self._last_result_time:
+            self._gap_until = self._gap_released = None
+        self._gap_lock = threading.Lock()
+        self._gap_since = self._last_result_time
+        self._gap_skip_since = skip_since
+        self._gap_buffer = []
+        return True
+
+    async def fill_gap(self, slices: int = 4, semaphore: asyncio.Semaphore = None, limit: int = 1000,
+                       retries: int = 5, retry_delay: float = 1.0) -> list[dict]:
+        """
+        Fetches the observations archived since the last resultTime received, e.g. those published while MQTT was
+        disconnected, and delivers them in time order ahead of the live messages that arrived in the meantime. Live
+        messages are held back from the moment the fill begins, so consumers see one ordered sequence without gaps.
+
+        If the archive cannot be fetched, the held messages are delivered and the fetch is retried with exponential
+        backoff; the archived observations then arrive after them. Until the gap is filled the last resultTime, from
+        which checkpoints and later fills resume, stays at its start. When all retries fail, the next fill (e.g. on
+        the next MQTT reconnect) fetches the gap again.
+        :param slices: the missing interval is split into this many sub-intervals, requested concurrently
+        :param semaphore: limits the concurrent requests, shared between datastreams by ``Node.fill_gaps()``
+        :param limit: page size requested from the server
+        :param retries: number of times a failed fetch is retried
+        :param retry_delay: seconds before the first retry, doubled for each further one
+        :return: the archived observations delivered
+        """
+        if self._gap_buffer is None and not self._begin_gap_fill():
+            return []
+        self._gap_fill_running = True
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    observations = await self._fetch_gap(slices, semaphore, limit)
+                except Exception as e:
+                    self._release_gap_buffer()
+                    if attempt == retries:
+                        logging.error("Filling the gap of datastream %s since %s failed, leaving it open: %s",
+                                      self._resource_id, self._gap_since, e)
+                        return []
+                    delay = retry_delay * 2 ** attempt
+                    logging.warning("Filling the gap of datastream %s since %s failed, retrying in %s s: %s",
+                                    self._resource_id, self._gap_since, delay, e)
+                    await asyncio.sleep(delay)
+                    continue
+                return self._end_gap_fill(observations)
+        finally:
+            self._gap_fill_running = False
+
+    def _release_gap_buffer(self):
+        """Delivers the live messages held back by a fill whose fetch failed, without moving the resume point."""
+        with self._gap_lock:
+            for msg in self._gap_buffer or ():
+                self._note_live_result(msg.payload)
+                self._dispatch_live(None, None, msg)
+            self._gap_buffer = None
+
+    async def _fetch_gap(self, slices: int, semaphore: asyncio.Semaphore | None, limit: int) -> list[dict]:
+        session = self._parent_node.get_session()
+        api = self._parent_node.get_api_helper()
+        url = api.resource_url_resolver(APIResourceTypes.OBSERVATION, None, self._resource_id)
+        headers = self._parent_node.get_auth_headers()
+        start = parse_result_time(self._gap_since)
+        bounds = [self._gap_since]
+        if start is not None and slices > 1:
+            step = (datetime.datetime.now(datetime.timezone.utc) - start) / slices
+            if step.total_seconds() > 0:
+                bounds += [(start + step * i).isoformat() for i in range(1, slices)]
+        # Consecutive sub-intervals share their bounds, the open-ended last one also covers what arrives meanwhile
+        intervals = [f'{lo}/{hi}' for lo, hi in zip(bounds, bounds[1:] + ['..'])]
+
+        async def fetch(result_time: str) -> list[dict]:
+            params = {'resultTime': result_time, 'limit': limit}
+            if semaphore is None:
+                return await fetch_pages(session, url, params, headers)
+            async with semaphore:
+                return await fetch_pages(session, url, params, headers)
+
+        pages = await asyncio.gather(*(fetch(interval) for interval in intervals))
+        return [obs for page in pages for obs in page]
+
+    def _end_gap_fill(self, observations: list[dict]) -> list[dict]:
+        since = parse_result_time(self._gap_since)
+        live_results = set()
+        for payload in self._last_live_payloads or ():
+            try:
+                live_results.add(json.dumps(json.loads(payload).get('result'), sort_keys=True))
+            except (ValueError, AttributeError):
+                pass
+        released = self._gap_released or []
+        released_time = parse_result_time(self._payload_result_time(released[-1])) if released else None
+        released_results = set()
+        for payload in released:
+            try:
+                released_results.add(json.dumps(json.loads(payload).get('result'), sort_keys=True))
+            except (ValueError, AttributeError):
+                pass
+        gap_until = parse_result_time(self._gap_until)
+        with self._gap_lock:
+            held = self._gap_buffer or []
+            live_times = [parse_result_time(self._payload_result_time(msg.payload)) for msg in held]
+            first_live = min((t for t in live_times if t is not None), default=None)
+            keys = set()
+            delivered = []
+            for obs in sorted(observations, key=lambda o: parse_result_time(o.get('resultTime')) or _EPOCH):
+                result_time = parse_result_time(obs.get('resultTime'))
+                key = obs.get('id') or json.dumps(obs, sort_keys=True)
+                if key in keys:
+                    # Returned by two sub-intervals sharing a bound
+                    continue
+                keys.add(key)
+                if result_time is not None and since is not None and result_time <= since:
+                    # Older than the resume point, or received already at it
+                    if result_time < since or self._gap_skip_since or key in self._last_result_keys or \
+                            json.dumps(obs.get('result'), sort_keys=True) in live_results:
+                        continue
+                if result_time is not None and first_live is not None and result_time >= first_live:
+                    # Received live as well
+                    continue
+                if result_time is not None and gap_until is not None and gap_until <= result_time and (
+                        result_time < released_time or (result_time == released_time and json.dumps(
+                            obs.get('result'), sort_keys=True) in released_results)):
+                    # Delivered live while a failed fetch was retried
+                    continue
+                delivered.append((obs, result_time))
+            # The gap is closed: the resume point follows the messages delivered from here on
+            self._gap_since = self._gap_until = self._gap_released = None
+            for payload in released:
+                self._note_live_result(payload)
+            for obs, result_time in delivered:
+                payload = json.dumps(obs).encode('utf-8')
+                if released_time is None or result_time is None or result_time > released_time:
+                    self._note_live_result(payload)
+                self._deliver_inbound(payload)
+            for msg in held:
+                self._note_live_result(msg.payload)
+                self._dispatch_live(None, None, msg)
+            self._gap_buffer = None
+        return [obs for obs, _ in delivered]
 
     def init_mqtt(self):
         super().init_mqtt()
         self._topic = self.get_mqtt_topic(subresource=APIResourceTypes.OBSERVATION, data_topic=True)
+        self._parent_node._unrouted_topics.clear()
+
+    def publish_ring_buffer(self, capacity: int = 8 * 1024 * 1024, record_size: int = None, name: str = None) -> str:
+        """
+        Copies every inbound observation payload of this datastream into a ``multiprocessing.shared_memory`` ring
+        buffer, from which other local processes read with a ``RingBufferReader`` instead of subscribing themselves.
+        :param capacity: size of the ring in bytes; readers falling further behind lose the oldest records
+        :param record_size: fixed maximum payload size, None for length-prefixed records of any size
+        :param name: shared memory name, defaults to ``ring_name(resource id)``
+        :return: the name readers attach to
+        """
+        self.close_ring_buffer()
+        self._ring_writer = RingBufferWriter(name or ring_name(self._resource_id), capacity, record_size)
+        return self._ring_writer.name
+
+    def get_ring_buffer_name(self) -> str | None:
+        return self._ring_writer.name if self._ring_writer is not None else None
+
+    def close_ring_buffer(self):
+        """Stops publishing to the ring buffer and removes it."""
+        writer, self._ring_writer = self._ring_writer, None
+        if writer is not None:
+            writer.close()
+
+    def _write_ring(self, payload):
+        writer = self._ring_writer
+        if writer is None:
+            return
+        try:
+            writer.write(payload.encode('utf-8') if isinstance(payload, str) else payload)
+        except ValueError as e:
+            logging.warning("Observation of datastream %s not published to the ring buffer: %s", self.get_id(), e)
 
     def _emit_inbound_event(self, msg):
+        self._write_ring(msg.payload)
         evt = (EventBuilder().with_type(DefaultEventTypes.NEW_OBSERVATION)
                .with_topic(msg.topic)
                .with_data(msg.payload)
@@ -1029,34 +1935,48 @@ class Datastream(StreamableResource[DatastreamResource]):
     def insert(self, data: dict):
         # self._queue_push(data)
         encoded = json.dumps(data).encode('utf-8')
+        if self._mqtt_client is None and self._ws_task is not None:
+            self.insert_data(encoded)
+            return
         self._publish_mqtt(self._topic, encoded)
 
     def serialize(self) -> dict:
         data = super().serialize()
         data["should_poll"] = getattr(self, "should_poll", None)
-        underlying = getattr(self, "_underlying_resource", None)
-        if underlying is not None:
-            dump = getattr(underlying, 'model_dump', None)
-            if callable(dump):
-                data["underlying_resource"] = underlying.model_dump(by_alias=True, exclude_none=True, mode='json')
-            elif hasattr(underlying, 'to_dict'):
-                data["underlying_resource"] = underlying.to_dict()
-            else:
-                data["underlying_resource"] = str(underlying)
-        else:
-            data["underlying_resource"] = None
+        data["underlying_resource"] = self._dump_underlying_resource()
 
         return data
 
     @classmethod
-    def deserialize(cls, data: dict, node: 'Node') -> 'Datastream':
+    def deserialize(cls, data: dict, node: 'Node', trusted: bool = False) -> 'Datastream':
+        """
+        :param trusted: skip validation of trusted ``serialize()`` output, see ``StreamableResource._restore``
+        """
+        if trusted:
+            return cls._restore_datastream(data, node)
         ds_resource = DatastreamResource.model_validate(data["underlying_resource"]) if data.get("underlying_resource") else None
         obj = cls(parent_node=node, datastream_resource=ds_resource)
         obj._id = uuid.UUID(data["id"])
         obj.should_poll = data.get("should_poll", False)
         return obj
 
-    def subscribe(self, topic=None, callback=None, qos=0):
+    @classmethod
+    def _restore_datastream(cls, data: dict, node: 'Node') -> 'Datastream':
+        obj = cls._restore(data, node, DatastreamResource)
+        obj._resource_id = data.get("resource_id")
+        obj.should_poll = data.get("should_poll", False)
+        return obj
+
+    def subscribe(self, topic=None, callback=None, qos=0, group: ConsumerGroup = None):
+        """
+        Subscribes to the observations of this datastream.
+        :param topic: None or 'observation'
+        :param callback: Optional callback function to handle incoming messages, if None the default handler is used
+        :param qos: Quality of Service level for the subscription, default is 0
+        :param group: consume as a member of this ConsumerGroup: a shared subscription, or with affinity a plain one
+            made only by the member owning this datastream
+        :return: the subscription filter, None if the datastream is owned by another member of *group*
+        """
         t = None
 
         if topic is None or topic == APIResourceTypes.OBSERVATION.value:
@@ -1066,16 +1986,27 @@ class Datastream(StreamableResource[DatastreamResource]):
         else:
             raise ValueError(f"Invalid topic provided {topic}, must be None or 'observation'.")
 
+        share_group = None
+        if group is not None and group.affinity:
+            if not group.owns(self._resource_id):
+                logging.debug("Datastream %s is owned by member %s of consumer group %s", self._resource_id,
+                              group.owner_of(self._resource_id), group.name)
+                return None
+        elif group is not None:
+            share_group = group.name
+
         if callback is None:
-            self._mqtt_client.subscribe(t, qos=qos, msg_callback=self._mqtt_sub_callback)
+            self._mqtt_client.subscribe(t, qos=qos, msg_callback=self._mqtt_sub_callback, share_group=share_group)
         else:
-            self._mqtt_client.subscribe(t, qos=qos, msg_callback=callback)
+            self._mqtt_client.subscribe(t, qos=qos, msg_callback=callback, share_group=share_group)
+        return self._mqtt_client.shared_topic(t, share_group)
 
 
 class ControlStream(StreamableResource[ControlStreamResource]):
     _status_topic: str
     _inbound_status_deque: deque
     _outbound_status_deque: deque
+    _tracked_attributes = StreamableResource._tracked_attributes | {'_status_topic'}
 
     def __init__(self, node: Node = None, controlstream_resource: ControlStreamResource = None):
         super().__init__(node=node)
@@ -1123,6 +2054,9 @@ class ControlStream(StreamableResource[ControlStreamResource]):
                 except Exception as e:
                     logging.error("Error starting MQTT write task for %s: %s\n%s",
                                   self._id, e, traceback.format_exc())
+        elif self._status == Status.STARTED.value:
+            # No MQTT on this node: stream over WebSocket instead
+            self._start_ws()
 
     def get_inbound_deque(self):
         return self._inbound_deque
@@ -1181,24 +2115,28 @@ class ControlStream(StreamableResource[ControlStreamResource]):
     def serialize(self) -> dict:
         data = super().serialize()
         data["status_topic"] = getattr(self, "_status_topic", None)
-        underlying = getattr(self, "_underlying_resource", None)
-        if underlying is not None:
-            dump = getattr(underlying, 'model_dump', None)
-            if callable(dump):
-                data["underlying_resource"] = underlying.model_dump(by_alias=True, exclude_none=True, mode='json')
-            elif hasattr(underlying, 'to_dict'):
-                data["underlying_resource"] = underlying.to_dict()
-            else:
-                data["underlying_resource"] = str(underlying)
-        else:
-            data["underlying_resource"] = None
+        data["underlying_resource"] = self._dump_underlying_resource()
 
         return data
 
     @classmethod
-    def deserialize(cls, data: dict, node: 'Node') -> 'ControlStream':
+    def deserialize(cls, data: dict, node: 'Node', trusted: bool = False) -> 'ControlStream':
+        """
+        :param trusted: skip validation of trusted ``serialize()`` output, see ``StreamableResource._restore``
+        """
+        if trusted:
+            return cls._restore_controlstream(data, node)
         cs_resource = ControlStreamResource.model_validate(data["underlying_resource"]) if data.get("underlying_resource") else None
         obj = cls(node=node, controlstream_resource=cs_resource)
         obj._id = uuid.UUID(data["id"])
         obj._status_topic = data.get("status_topic")
         return obj
+
+    @classmethod
+    def _restore_controlstream(cls, data: dict, node: 'Node') -> 'ControlStream':
+        obj = cls._restore(data, node, ControlStreamResource)
+        obj._resource_id = data.get("resource_id")
+        obj._inbound_status_deque = deque()
+        obj._outbound_status_deque = deque()
+        obj._status_topic = data.get("status_topic")
+        return obj
@@ -7,22 +7,34 @@
 
 from __future__ import annotations
 
+import asyncio
 import calendar
-import re
+import heapq
+import itertools
+import json
+import logging
+import math
+import threading
 import time
+import traceback
+import warnings
 from datetime import datetime, timezone
 from enum import Enum
-from typing import Any
+from typing import Any, Callable, Iterable, Iterator, NamedTuple
+from uuid import uuid4
 
 from pydantic import BaseModel, ConfigDict, Field, model_serializer, model_validator
 
+from .events import DefaultEventTypes, EventHandler, IEventListener
+from .events.builder import EventBuilder
+
 
 class TemporalModes(Enum):
     REAL_TIME = "realtime"
     ARCHIVE = "archive"
     BATCH = "batch"
     RT_SYNC = "realtimesync"
-    ARCHIVE_SYNC = "archivesync",
+    ARCHIVE_SYNC = "archivesync"
 
 
 class State(Enum):
@@ -33,11 +45,56 @@ class State(Enum):
     PLAYING = 4
     FAST_FORWARDING = 5
     REWINDING = 6
+    PAUSED = 7
 
 
 class TimeUtils:
     iso_format = '%Y-%m-%dT%H:%M:%S.%fZ'
 
+    @staticmethod
+    def parse_iso_epoch(a_time: str) -> float:
+        """
+        Parse an ISO 8601 string to epoch seconds. This is the hot path used when decoding observation timestamps.
+
+        The common ``YYYY-MM-DDTHH:MM:SS(.fff)Z`` shape goes straight through the C-level
+        ``datetime.fromisoformat`` (which accepts the ``Z`` suffix natively); strings without an offset are taken
+        to be UTC.
+        :param a_time: ISO 8601 formatted string
+        :return: epoch time in seconds
+        """
+        dt = datetime.fromisoformat(a_time)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+
+    @staticmethod
+    def parse_iso_array(times, as_datetime64: bool = False):
+        """
+        Parse a sequence of ISO 8601 UTC timestamps in a single vectorized pass.
+
+        :param times: iterable or numpy array of ISO 8601 strings, either ``Z`` suffixed or without an offset
+        :param as_datetime64: if True, return ``datetime64[us]`` values instead of float64 epoch seconds
+        :return: numpy array of float64 epoch seconds (default) or datetime64[us]
+        """
+        import numpy as np
+
+        arr = np.asarray(times, dtype=np.str_)
+        try:
+            with warnings.catch_warnings():
+                # numpy only warns on explicit offsets (e.g. +02:00), escalate so they take the fallback path
+                warnings.simplefilter('error', UserWarning)
+                warnings.simplefilter('error', DeprecationWarning)
+                parsed = np.char.rstrip(arr, 'Z').astype('datetime64[us]')
+        except (ValueError, UserWarning, DeprecationWarning):
+            epochs = np.fromiter((TimeUtils.parse_iso_epoch(t) for t in arr.ravel()), dtype=np.float64,
+                                 count=arr.size).reshape(arr.shape)
+            if as_datetime64:
+                return (epochs * 1_000_000).round().astype('datetime64[us]')
+            return epochs
+        if as_datetime64:
+            return parsed
+        return parsed.astype(np.int64) / 1_000_000
+
     @staticmethod
     def to_epoch_time(a_time: datetime | str) -> float:
         """
@@ -46,8 +103,7 @@ class TimeUtils:
         :return:
         """
         if isinstance(a_time, str):
-            return time.mktime(
-                datetime.strptime(a_time, "%Y-%m-%d %H:%M:%S.%fZ").timetuple())
+            return TimeUtils.parse_iso_epoch(a_time)
         elif isinstance(a_time, datetime):
             if a_time.tzinfo is not None:
                 return a_time.timestamp()
@@ -62,11 +118,11 @@ class TimeUtils:
         :return:
         """
         if isinstance(a_time, str):
-            if re.match(r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.)(\d+)(Z)', a_time):
-                return datetime.strptime(a_time, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
-            else:
-                return datetime.strptime(a_time, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
-        elif isinstance(a_time, float):
+            dt = datetime.fromisoformat(a_time)
+            if dt.tzinfo is None:
+                return dt.replace(tzinfo=timezone.utc)
+            return dt.astimezone(timezone.utc)
+        elif isinstance(a_time, (float, int)):
             return datetime.fromtimestamp(a_time, tz=timezone.utc)
 
     @staticmethod
@@ -92,10 +148,14 @@ class TimeUtils:
         :param a_time: datetime object in UTC timezone or epoch time (float)
         :return:
         """
-        if isinstance(a_time, float):
-            return datetime.fromtimestamp(a_time).strftime(TimeUtils.iso_format)
-        elif isinstance(a_time, datetime):
-            return a_time.strftime(TimeUtils.iso_format)
+        if isinstance(a_time, (float, int)):
+            a_time = datetime.fromtimestamp(a_time, tz=timezone.utc)
+        elif not isinstance(a_time, datetime):
+            return None
+        elif a_time.tzinfo is not None:
+            a_time = a_time.astimezone(timezone.utc)
+        # isoformat() is considerably cheaper than strftime(); strip the offset and use the 'Z' designator
+        return f'{a_time.replace(tzinfo=None).isoformat(timespec="microseconds")}Z'
 
     @staticmethod
     def compare_time_instants_or_indeterminate(time1: TimeInstant | str, time2: TimeInstant | str) -> int:
@@ -143,6 +203,7 @@ class TimeUtils:
 
 
 class TimeInstant:
+    __slots__ = ('_epoch_time',)
     _epoch_time: float | None
 
     def __init__(self, epoch_time: float = None, utc_time: datetime = None):
@@ -150,6 +211,8 @@ class TimeInstant:
             self._epoch_time = epoch_time
         elif utc_time is not None:
             self._epoch_time = TimeUtils.to_epoch_time(utc_time)
+        else:
+            self._epoch_time = None
 
     @property
     def epoch_time(self):
@@ -171,32 +234,37 @@ class TimeInstant:
 
     @staticmethod
     def from_string(utc_time: str):
-        # Normalize 'Z' suffix to '+00:00' for fromisoformat(), which handles all
-        # ISO 8601 timezone offsets (Z, +HH:MM, -HH:MM) in Python 3.12+.
-        dt = datetime.fromisoformat(utc_time.replace("Z", "+00:00"))
-        return TimeInstant(utc_time=dt)
+        # fromisoformat() handles all ISO 8601 timezone offsets (Z, +HH:MM, -HH:MM) in Python 3.11+
+        return TimeInstant(epoch_time=TimeUtils.parse_iso_epoch(utc_time))
 
     @staticmethod
     def now_as_time_instant():
         return TimeInstant(epoch_time=TimeUtils.current_epoch_time())
 
     def __lt__(self, other: TimeInstant) -> bool:
-        return self.epoch_time < other.epoch_time
+        return self._epoch_time < other.epoch_time
 
     def __gt__(self, other: TimeInstant) -> bool:
-        return self.epoch_time > other.epoch_time
+        return self._epoch_time > other.epoch_time
 
     def __eq__(self, other: TimeInstant) -> bool:
-        return self.epoch_time == other.epoch_time
+        if not isinstance(other, TimeInstant):
+            return NotImplemented
+        return self._epoch_time == other._epoch_time
 
     def __le__(self, other: TimeInstant) -> bool:
-        return self.epoch_time <= other.epoch_time
+        return self._epoch_time <= other.epoch_time
 
     def __ge__(self, other: TimeInstant) -> bool:
-        return self.epoch_time >= other.epoch_time
+        return self._epoch_time >= other.epoch_time
 
     def __ne__(self, other: TimeInstant) -> bool:
-        return self.epoch_time != other.epoch_time
+        if not isinstance(other, TimeInstant):
+            return NotImplemented
+        return self._epoch_time != other._epoch_time
+
+    def __hash__(self):
+        return hash(self._epoch_time)
 
     def __repr__(self):
         return f'{self.get_iso_time()}'
@@ -319,60 +387,204 @@ class TemporalMode:
     pass
 
 
+class _PlaybackStream:
+    """A datastream registered with the TimeController for archive playback."""
+    __slots__ = ('stream_id', 'datastream', 'listener', 'fetcher', 'topic')
+
+    def __init__(self, stream_id: str, datastream, listener, fetcher: Callable[[float, float], Iterable], topic: str):
+        self.stream_id = stream_id
+        self.datastream = datastream
+        self.listener = listener
+        self.fetcher = fetcher
+        self.topic = topic
+
+
+def datastream_fetcher(datastream) -> Callable[[float, float], list[tuple[float, Any]]]:
+    """
+    Default archive source for playback: wraps ``Datastream.fetch`` so it returns ``(epoch, observation)`` pairs
+    keyed by each observation's resultTime.
+    """
+
+    def fetch(start: float, end: float) -> list[tuple[float, Any]]:
+        period = TimePeriod(start=TimeInstant(epoch_time=start), end=TimeInstant(epoch_time=end))
+        parse = TimeUtils.parse_iso_epoch
+        return [(parse(obs['resultTime']), obs) for obs in datastream.fetch(period)]
+
+    return fetch
+
+
 class TimeController:
+    """
+    Singleton playback clock for archive replay (``TemporalModes.ARCHIVE`` / ``ARCHIVE_SYNC``).
+
+    Registered datastreams are replayed against a shared playhead. A prefetch thread requests archived observations
+    in windows of ``buffer_window`` seconds (archive time), staying at most ``buffer_time`` seconds ahead of the
+    playhead, and pushes them into a single time-ordered heap. A scheduler thread releases observations from that
+    heap as the playhead passes them, at the configured playback speed. Memory is therefore bounded by the buffer
+    time rather than by the size of the archive.
+
+    Observations are delivered as ``NEW_OBSERVATION`` events to the listener given to ``add_listener()``, or
+    published on the ``EventHandler`` when no listener is given.
+    """
     _instance = None
-    _temporal_mode: TemporalMode
-    _status: str
-    _playback_speed: int
+    _temporal_mode: TemporalModes
+    _status: State
+    _playback_speed: float
     _timeline_begin: TimeInstant
     _timeline_end: TimeInstant
     _current_time: TimeInstant
     _synchronizer: Synchronizer
+    _buffer_time: float
+    _buffer_window: float
+    _tick: float = 0.1
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super(TimeController, cls).__new__(cls)
+            cls._instance._init_playback()
         return cls._instance
 
-    def set_temporal_mode(self, mode: TemporalMode):
+    def _init_playback(self):
+        self._temporal_mode = TemporalModes.REAL_TIME
+        self._status = State.INITIALIZED
+        self._playback_speed = 1.0
+        self._timeline_begin = None
+        self._timeline_end = None
+        self._current_time = None
+        self._synchronizer = None
+        self._buffer_time = 10.0
+        self._buffer_window = 5.0
+        self._streams: dict[str, _PlaybackStream] = {}
+        # heap entries: (epoch * direction, seq, stream_id, epoch, observation)
+        self._buffer: list[tuple] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._fetched_edge: float | None = None
+        self._anchor_epoch: float | None = None
+        self._anchor_wall: float | None = None
+        self._running = False
+        self._threads: list[threading.Thread] = []
+        self._clock = time.monotonic
+
+    def set_temporal_mode(self, mode: TemporalModes):
         self._temporal_mode = mode
 
     def get_temporal_mode(self):
         return self._temporal_mode
 
+    # ------------------------------------------------------------------
+    # Playback controls
+    # ------------------------------------------------------------------
+
     def start(self):
-        pass
+        """
+        Starts (or resumes) playback from the current time at the current playback speed.
+        :raises ValueError: if the temporal mode is not ARCHIVE or ARCHIVE_SYNC, or no time range is available
+        """
+        if self._temporal_mode not in (TemporalModes.ARCHIVE, TemporalModes.ARCHIVE_SYNC):
+            raise ValueError(f"Playback requires an archive temporal mode, current mode is {self._temporal_mode}.")
+        with self._cond:
+            if self._timeline_begin is None or self._timeline_end is None:
+                self._compute_time_range()
+            if self._timeline_begin is None or self._timeline_end is None:
+                raise ValueError("No time range set for playback. Set the timeline start and end first.")
+            if self._anchor_epoch is None:
+                origin = self._current_time if self._current_time is not None else self._timeline_begin
+                self._reposition(origin.epoch_time)
+            self._anchor(self._anchor_epoch)
+            self._status = self._active_state()
+            self._ensure_threads()
+            self._cond.notify_all()
 
     def pause(self):
-        pass
+        with self._cond:
+            if self._is_playing():
+                self._anchor(self._playhead())
+                self._status = State.PAUSED
+                self._cond.notify_all()
 
     def stop(self):
-        pass
+        """Stops playback, releases the prefetch and scheduler threads and empties the buffer."""
+        with self._cond:
+            if self._anchor_epoch is not None:
+                self._current_time = TimeInstant(epoch_time=self._playhead())
+            self._running = False
+            self._status = State.STOPPED
+            self._buffer.clear()
+            self._generation += 1
+            self._anchor_epoch = None
+            self._fetched_edge = None
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def fast_forward(self, speed: float):
+        self._set_speed(abs(speed))
+
+    def rewind(self, speed: float):
+        self._set_speed(-abs(speed))
 
-    def fast_forward(self, speed: int):
-        self._playback_speed = speed
+    def skip(self, a_time: TimeInstant):
+        with self._cond:
+            self._reposition(a_time.epoch_time)
+            self._cond.notify_all()
 
-    def rewind(self, speed: int):
-        self._playback_speed = speed
+    def play_from_start(self):
+        self.skip(self._timeline_begin)
+        if self._playback_speed < 0:
+            self._set_speed(abs(self._playback_speed))
+        self.start()
 
-    def skip(self, a_time: TimeInstant):
-        self._current_time = a_time
+    def skip_to_end(self):
+        self.skip(self._timeline_end)
 
     def get_status(self):
         return self._status
 
+    def is_buffering(self) -> bool:
+        return self._status is State.BUFFERING
+
+    def _set_speed(self, speed: float):
+        if speed == 0:
+            raise ValueError("Playback speed must be non-zero, use pause() to halt playback.")
+        with self._cond:
+            playhead = self._playhead() if self._anchor_epoch is not None else None
+            reversed_direction = (speed < 0) != (self._playback_speed < 0)
+            self._playback_speed = speed
+            if playhead is not None:
+                if reversed_direction:
+                    self._reposition(playhead)
+                else:
+                    self._anchor(playhead)
+            if self._is_playing():
+                self._status = self._active_state()
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # Timeline
+    # ------------------------------------------------------------------
+
     def set_timeline_start(self, a_time: TimeInstant):
         self._timeline_begin = a_time
 
     def set_timeline_end(self, a_time: TimeInstant):
         self._timeline_end = a_time
 
+    def set_time_period(self, time_period: TimePeriod):
+        """Sets the timeline from a TimePeriod, resolving 'now' to the current time."""
+        now = TimeInstant.now_as_time_instant()
+        self._timeline_begin = now if time_period.start == "now" else time_period.start
+        self._timeline_end = now if time_period.end == "now" else time_period.end
+
     def set_current_time(self, a_time: TimeInstant):
-        if a_time < self._timeline_begin:
-            self._current_time = self._timeline_begin
-        elif a_time > self._timeline_end:
-            self._timeline_end = a_time
-        self._current_time = a_time
+        if self._timeline_begin is not None and a_time < self._timeline_begin:
+            a_time = self._timeline_begin
+        elif self._timeline_end is not None and a_time > self._timeline_end:
+            a_time = self._timeline_end
+        self.skip(a_time)
 
     def get_timeline_start(self):
         return self._timeline_begin
@@ -381,48 +593,625 @@ class TimeController:
         return self._timeline_end
 
     def get_current_time(self):
-        return self._current_time
-
-    def play_from_start(self):
-        pass
+        with self._cond:
+            if self._anchor_epoch is not None:
+                return TimeInstant(epoch_time=self._playhead())
+            return self._current_time
 
-    def skip_to_end(self):
-        pass
+    # ------------------------------------------------------------------
+    # Streams
+    # ------------------------------------------------------------------
 
-    def add_listener(self, datastream, event_listener) -> str:
-        pass
+    def add_listener(self, datastream, event_listener=None,
+                     fetcher: Callable[[float, float], Iterable[tuple[float, Any]]] = None) -> str:
+        """
+        Registers a datastream for playback.
+        :param datastream: Datastream to replay
+        :param event_listener: IEventListener or callable receiving each replayed observation as an Event. If None,
+            events are published on the EventHandler.
+        :param fetcher: Optional archive source ``fetcher(start_epoch, end_epoch) -> iterable of (epoch, obs)``.
+            Defaults to the datastream's own ``fetch()``.
+        :return: stream id to pass to remove_listener()
+        """
+        stream_id = uuid4().hex
+        stream = _PlaybackStream(stream_id, datastream, event_listener,
+                                 fetcher if fetcher is not None else datastream_fetcher(datastream),
+                                 getattr(datastream, '_topic', None) or '')
+        with self._cond:
+            self._streams[stream_id] = stream
+            if self._anchor_epoch is not None:
+                # Refill from the playhead so the new stream's data is merged in order
+                self._reposition(self._playhead())
+            self._cond.notify_all()
+        return stream_id
 
     def remove_listener(self, stream_id):
-        pass
+        with self._cond:
+            if self._streams.pop(stream_id, None) is not None:
+                self._buffer = [entry for entry in self._buffer if entry[2] != stream_id]
+                heapq.heapify(self._buffer)
 
     def clear_streams(self):
-        pass
+        with self._cond:
+            self._streams.clear()
+            self._buffer.clear()
+            self._generation += 1
 
     def reset(self):
+        self.stop()
         self.clear_streams()
-        self._temporal_mode = None
-        self._status = None
-        self._playback_speed = None
-        self._timeline_begin = None
-        self._timeline_end = None
-        self._current_time = None
+        self._init_playback()
 
-    def set_buffer_time(self, time: int):
-        pass
+    def set_buffer_time(self, time: float):
+        """
+        :param time: how far ahead of the playhead, in seconds of archive time, observations are prefetched
+        """
+        if time <= 0:
+            raise ValueError("Buffer time must be positive")
+        with self._cond:
+            self._buffer_time = time
+            self._cond.notify_all()
 
     def get_buffer_time(self):
-        pass
+        return self._buffer_time
+
+    def set_buffer_window(self, window: float):
+        """
+        :param window: size, in seconds of archive time, of each prefetch request
+        """
+        if window <= 0:
+            raise ValueError("Buffer window must be positive")
+        self._buffer_window = window
+
+    def get_buffer_window(self):
+        return self._buffer_window
+
+    def get_buffer_size(self) -> int:
+        """Number of observations currently prefetched but not yet released."""
+        return len(self._buffer)
 
     def _compute_time_range(self):
-        pass
+        """Derives the timeline from the registered datastreams' result time (or valid time) intervals."""
+        starts, ends = [], []
+        now = TimeInstant.now_as_time_instant()
+        for stream in self._streams.values():
+            resource = getattr(stream.datastream, '_underlying_resource', None)
+            period = getattr(resource, 'result_time', None) or getattr(resource, 'valid_time', None)
+            if period is None:
+                continue
+            starts.append(now if period.start == "now" else period.start)
+            ends.append(now if period.end == "now" else period.end)
+        if self._timeline_begin is None and starts:
+            self._timeline_begin = min(starts)
+        if self._timeline_end is None and ends:
+            self._timeline_end = max(ends)
+
+    # ------------------------------------------------------------------
+    # Engine internals (callers hold self._cond)
+    # ------------------------------------------------------------------
+
+    def _direction(self) -> int:
+        return -1 if self._playback_speed < 0 else 1
+
+    def _is_playing(self) -> bool:
+        return self._status in (State.PLAYING, State.FAST_FORWARDING, State.REWINDING, State.BUFFERING)
+
+    def _active_state(self) -> State:
+        if self._playback_speed < 0:
+            return State.REWINDING
+        return State.PLAYING if self._playback_speed == 1 else State.FAST_FORWARDING
+
+    def _anchor(self, epoch: float, now: float = None):
+        self._anchor_epoch = epoch
+        self._anchor_wall = self._clock() if now is None else now
+
+    def _playhead(self, now: float = None) -> float:
+        if not self._is_playing() or self._status is State.BUFFERING:
+            return self._anchor_epoch
+        now = self._clock() if now is None else now
+        return self._anchor_epoch + (now - self._anchor_wall) * self._playback_speed
+
+    def _stop_epoch(self) -> float:
+        """Timeline boundary in the current direction of play."""
+        return self._timeline_begin.epoch_time if self._direction() < 0 else self._timeline_end.epoch_time
+
+    def _reposition(self, epoch: float):
+        """Moves the playhead, discarding the buffer and any in-flight prefetch."""
+        if self._timeline_begin is not None:
+            epoch = max(epoch, self._timeline_begin.epoch_time)
+        if self._timeline_end is not None:
+            epoch = min(epoch, self._timeline_end.epoch_time)
+        self._buffer.clear()
+        self._generation += 1
+        self._fetched_edge = epoch
+        self._current_time = TimeInstant(epoch_time=epoch)
+        self._anchor(epoch)
+        if self._status is State.BUFFERING:
+            self._status = self._active_state()
+
+    def _ensure_threads(self):
+        if self._running:
+            return
+        self._running = True
+        self._threads = [threading.Thread(target=self._run_prefetch, name='oshconnect-playback-prefetch', daemon=True),
+                         threading.Thread(target=self._run_scheduler, name='oshconnect-playback', daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def _needs_fetch(self) -> bool:
+        if self._fetched_edge is None or self._status in (State.STOPPED, State.INITIALIZED):
+            return False
+        direction = self._direction()
+        if (self._fetched_edge - self._stop_epoch()) * direction >= 0:
+            return False
+        return (self._fetched_edge - self._playhead()) * direction < self._buffer_time
+
+    def _run_prefetch(self):
+        while True:
+            with self._cond:
+                while self._running and not self._needs_fetch():
+                    self._cond.wait()
+                if not self._running:
+                    return
+                generation = self._generation
+                direction = self._direction()
+                edge = self._fetched_edge
+                stop = self._stop_epoch()
+                next_edge = edge + direction * self._buffer_window
+                next_edge = min(next_edge, stop) if direction > 0 else max(next_edge, stop)
+                streams = list(self._streams.values())
+
+            lo, hi = (edge, next_edge) if direction > 0 else (next_edge, edge)
+            fetched = []
+            for stream in streams:
+                try:
+                    for epoch, obs in stream.fetcher(lo, hi):
+                        # Windows are half-open on the far side so neighbouring windows never overlap,
+                        # except at the end of the timeline where the boundary itself belongs to the last window
+                        if direction > 0:
+                            in_window = lo <= epoch < hi or epoch == hi == stop
+                        else:
+                            in_window = lo < epoch <= hi or epoch == lo == stop
+                        if in_window:
+                            fetched.append((epoch * direction, stream.stream_id, epoch, obs))
+                except Exception as e:
+                    logging.error("Error prefetching archive data for stream %s: %s\n%s", stream.stream_id, e,
+                                  traceback.format_exc())
+
+            with self._cond:
+                if generation != self._generation:
+                    continue
+                for key, stream_id, epoch, obs in fetched:
+                    heapq.heappush(self._buffer, (key, next(self._seq), stream_id, epoch, obs))
+                self._fetched_edge = next_edge
+                self._cond.notify_all()
+
+    def _run_scheduler(self):
+        while True:
+            released = []
+            with self._cond:
+                if not self._running:
+                    return
+                if not self._is_playing():
+                    self._cond.wait()
+                    continue
+                now = self._clock()
+                direction = self._direction()
+                stop = self._stop_epoch()
+                fetched_to_stop = (self._fetched_edge - stop) * direction >= 0
+                if self._status is State.BUFFERING:
+                    if fetched_to_stop or (self._fetched_edge - self._anchor_epoch) * direction > 0:
+                        self._anchor(self._anchor_epoch, now)
+                        self._status = self._active_state()
+                    else:
+                        self._cond.wait(self._tick)
+                        continue
+                playhead = self._playhead(now)
+                if not fetched_to_stop and (playhead - self._fetched_edge) * direction > 0:
+                    # Playhead caught up with the prefetcher: hold the clock at the buffered edge
+                    playhead = self._fetched_edge
+                    self._anchor(playhead, now)
+                    self._status = State.BUFFERING
+                limit = playhead * direction
+                while self._buffer and self._buffer[0][0] <= limit:
+                    released.append(heapq.heappop(self._buffer))
+                self._current_time = TimeInstant(epoch_time=playhead)
+                if fetched_to_stop and not self._buffer and (playhead - stop) * direction >= 0:
+                    self._anchor(stop, now)
+                    self._current_time = TimeInstant(epoch_time=stop)
+                    self._status = State.STOPPED
+                delay = self._tick
+                if self._buffer and self._status is not State.BUFFERING:
+                    delay = min(delay, (self._buffer[0][0] - limit) / abs(self._playback_speed))
+                self._cond.notify_all()
+
+            for entry in released:
+                self._deliver(entry)
+
+            if not released:
+                with self._cond:
+                    if self._running and self._is_playing():
+                        self._cond.wait(max(delay, 0.0))
+
+    def _deliver(self, entry: tuple):
+        _, _, stream_id, epoch, obs = entry
+        stream = self._streams.get(stream_id)
+        if stream is None:
+            return
+        evt = (EventBuilder().with_type(DefaultEventTypes.NEW_OBSERVATION)
+               .with_topic(stream.topic)
+               .with_data(obs)
+               .with_producer(stream.datastream)
+               .with_timestamp(datetime.fromtimestamp(epoch, tz=timezone.utc))
+               .build())
+        try:
+            if stream.listener is None:
+                EventHandler().publish(evt)
+            elif isinstance(stream.listener, IEventListener):
+                stream.listener.handle_events(evt)
+            else:
+                stream.listener(evt)
+        except Exception as e:
+            logging.error("Error delivering playback observation for stream %s: %s", stream_id, e)
+
+
+class MergedItem(NamedTuple):
+    """An item emitted by the Synchronizer's time-ordered merge."""
+    epoch: float
+    source_id: str
+    data: Any
+
+
+def observation_epoch(payload) -> float:
+    """
+    Default timestamp extractor for live observation payloads: the resultTime (or phenomenonTime) of a JSON
+    observation, falling back to the arrival time when neither is present.
+    """
+    if isinstance(payload, (bytes, bytearray, str)):
+        payload = json.loads(payload)
+    stamp = None
+    if isinstance(payload, dict):
+        stamp = payload.get('resultTime') or payload.get('phenomenonTime')
+    if stamp is None:
+        return TimeUtils.current_epoch_time()
+    if isinstance(stamp, str):
+        return TimeUtils.parse_iso_epoch(stamp)
+    return float(stamp)
+
+
+class _MergeSource:
+    __slots__ = ('source_id', 'iterator', 'live', 'high', 'late_drops', 'listener', 'last_epoch')
+
+    def __init__(self, source_id: str, iterator: Iterator | None, live: bool):
+        self.source_id = source_id
+        self.iterator = iterator
+        self.live = live
+        self.high = -math.inf
+        self.late_drops = 0
+        self.listener = None
+        self.last_epoch = -math.inf
 
 
 class Synchronizer:
-    _buffer: any
-    _buffering_time: int
+    """
+    Merges observations from many sources into a single timestamp-ordered stream.
+
+    Two kinds of sources are supported:
+
+    * **archived** sources (``add_source()`` / ``add_archive()``) are iterables already ordered by time. They take part
+      in a classic k-way heap merge: only the head of each source is held in the heap and the next item is pulled
+      lazily when the head is emitted.
+    * **live** sources (``add_datastream()`` / ``push()``) deliver items in arrival order, e.g. from MQTT. Items are
+      held in the same heap until the watermark passes them, so arrivals that are out of order by less than the
+      lateness window are re-ordered. Items older than something already emitted are dropped and counted.
+
+    The watermark is the newest live timestamp seen (or the optional ``clock``, whichever is later) minus the
+    lateness window. With no live sources, or once ``close()`` is called, everything is released in order.
+
+    The merged stream is consumed lazily with ``merge()`` (blocking generator), ``poll()`` (non-blocking) or
+    ``async for item in synchronizer``. Each push or pop costs O(log n) in the number of buffered items.
+    """
+    _buffer: list
+    _buffering_time: float
+
+    def __init__(self, lateness: float = 1.0, clock: Callable[[], float] = None):
+        """
+        :param lateness: watermark window in seconds; live items may arrive up to this much out of order
+        :param clock: optional epoch-seconds clock (e.g. ``time.time``) that advances the watermark while live
+            sources are quiet. When None the watermark only advances as newer data arrives.
+        """
+        if lateness < 0:
+            raise ValueError("Lateness must be non-negative")
+        self._buffering_time = lateness
+        self._clock = clock
+        # heap entries: (epoch, seq, source_id, data)
+        self._buffer = []
+        self._seq = itertools.count()
+        self._sources: dict[str, _MergeSource] = {}
+        self._live_count = 0
+        self._cond = threading.Condition()
+        self._max_seen = -math.inf
+        self._last_emitted = -math.inf
+        self._late_drops = 0
+        self._closed = False
+        self._async_waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    # ------------------------------------------------------------------
+    # Sources
+    # ------------------------------------------------------------------
+
+    def add_source(self, source: Iterable[tuple[float, Any]], source_id: str = None) -> str:
+        """
+        Adds an archived source.
+        :param source: iterable of ``(epoch, data)`` pairs in ascending time order; its items are pulled while the
+            merge is locked, so they should be at hand rather than fetched over the network
+        :param source_id: optional id, one is generated if omitted
+        :return: the source id
+        """
+        merge_source = self._register(_MergeSource(source_id or uuid4().hex, iter(source), live=False))
+        with self._cond:
+            self._advance(merge_source)
+            self._notify()
+        return merge_source.source_id
 
-    def synchronize(self, systems: list):
-        pass
+    def add_archive(self, datastream, time_period: TimePeriod, source_id: str = None) -> str:
+        """
+        Adds a datastream's archived observations for *time_period* as an archived source. They are fetched before
+        the source is added, as the merge must not wait for the request while the other sources push or read.
+        """
+        start = TimeInstant.now_as_time_instant() if time_period.start == "now" else time_period.start
+        end = TimeInstant.now_as_time_instant() if time_period.end == "now" else time_period.end
+        observations = sorted(datastream_fetcher(datastream)(start.epoch_time, end.epoch_time), key=lambda pair: pair[0])
+        return self.add_source(observations, source_id=source_id or self._default_source_id(datastream))
+
+    def add_live_source(self, source_id: str = None) -> str:
+        """Adds a live source fed manually through ``push()``."""
+        return self._register(_MergeSource(source_id or uuid4().hex, None, live=True)).source_id
+
+    def add_datastream(self, datastream, timestamp_fn: Callable[[Any], float] = None, source_id: str = None) -> str:
+        """
+        Adds a live Datastream. Its inbound ``NEW_OBSERVATION`` events are pushed into the merge as they arrive.
+        :param datastream: Datastream whose observations should be merged
+        :param timestamp_fn: extracts the epoch timestamp from a raw payload, defaults to ``observation_epoch``
+        :param source_id: optional id, defaults to the datastream's resource id
+        :return: the source id
+        """
+        merge_source = self._register(
+            _MergeSource(source_id or self._default_source_id(datastream), None, live=True))
+        extract = timestamp_fn or observation_epoch
+        topic = getattr(datastream, '_topic', None)
+        if topic is None:
+            from .csapi4py.constants import APIResourceTypes
+            topic = datastream.get_mqtt_topic(subresource=APIResourceTypes.OBSERVATION)
+
+        def on_observation(evt):
+            try:
+                epoch = extract(evt.data)
+            except Exception as e:
+                logging.error("Could not extract a timestamp from observation on %s: %s", evt.topic, e)
+                return
+            self.push(merge_source.source_id, epoch, evt.data)
+
+        merge_source.listener = EventHandler().subscribe(on_observation, types=[DefaultEventTypes.NEW_OBSERVATION],
+                                                         topics=[topic])
+        return merge_source.source_id
+
+    def remove_source(self, source_id: str):
+        with self._cond:
+            merge_source = self._sources.pop(source_id, None)
+            if merge_source is None:
+                return
+            if merge_source.live:
+                self._live_count -= 1
+            self._buffer = [entry for entry in self._buffer if entry[2] != source_id]
+            heapq.heapify(self._buffer)
+            self._notify()
+        if merge_source.listener is not None:
+            EventHandler().unregister_listener(merge_source.listener)
+
+    def synchronize(self, systems: list) -> Synchronizer:
+        """
+        Adds every datastream of the given systems (or the given datastreams themselves) as live sources.
+        :param systems: list of System and/or Datastream objects
+        :return: this Synchronizer
+        """
+        for system in systems:
+            datastreams = getattr(system, 'datastreams', None)
+            for ds in (datastreams if isinstance(datastreams, list) else [system]):
+                self.add_datastream(ds)
+        return self
+
+    def check_in_sync(self) -> bool:
+        """True when every live source has delivered data and none lags the newest by more than the lateness window."""
+        with self._cond:
+            live = [src for src in self._sources.values() if src.live]
+            if not live:
+                return True
+            highs = [src.high for src in live]
+            if -math.inf in highs:
+                return False
+            return max(highs) - min(highs) <= self._buffering_time
+
+    # ------------------------------------------------------------------
+    # Input
+    # ------------------------------------------------------------------
+
+    def push(self, source_id: str, epoch: float, data: Any) -> bool:
+        """
+        Adds an item from a live source. Safe to call from any thread (e.g. the MQTT network thread).
+        :return: False if the item was dropped for arriving after newer data had already been emitted
+        """
+        with self._cond:
+            merge_source = self._sources.get(source_id)
+            if merge_source is None:
+                raise ValueError(f"Unknown source {source_id}")
+            if epoch < self._last_emitted:
+                merge_source.late_drops += 1
+                self._late_drops += 1
+                return False
+            heapq.heappush(self._buffer, (epoch, next(self._seq), source_id, data))
+            if epoch > merge_source.high:
+                merge_source.high = epoch
+            if epoch > self._max_seen:
+                self._max_seen = epoch
+            self._notify()
+        return True
+
+    def close(self):
+        """Marks the input as finished: the watermark is lifted and remaining items are released in order."""
+        with self._cond:
+            self._closed = True
+            listeners = [src.listener for src in self._sources.values() if src.listener is not None]
+            self._notify()
+        for listener in listeners:
+            EventHandler().unregister_listener(listener)
+
+    # ------------------------------------------------------------------
+    # Output
+    # ------------------------------------------------------------------
+
+    def poll(self) -> list[MergedItem]:
+        """Returns, without blocking, every item that is currently past the watermark, in time order."""
+        items = []
+        with self._cond:
+            item = self._pop_ready()
+            while item is not None:
+                items.append(item)
+                item = self._pop_ready()
+        return items
+
+    def merge(self, timeout: float = None) -> Iterator[MergedItem]:
+        """
+        Lazily yields merged items in time order, blocking while waiting for the watermark to advance.
+        Ends when all sources are exhausted (archived only) or after close(), or if nothing becomes ready within
+        *timeout* seconds.
+        """
+        while True:
+            with self._cond:
+                item = self._pop_ready()
+                waited = 0.0
+                while item is None:
+                    if self._is_drained():
+                        return
+                    wait = self._time_until_ready()
+                    if timeout is not None:
+                        if waited >= timeout:
+                            return
+                        wait = timeout - waited if wait is None else min(wait, timeout - waited)
+                    started = time.monotonic()
+                    self._cond.wait(wait)
+                    waited += time.monotonic() - started
+                    item = self._pop_ready()
+            yield item
+
+    def __iter__(self) -> Iterator[MergedItem]:
+        return self.merge()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> MergedItem:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                item = self._pop_ready()
+                if item is not None:
+                    return item
+                if self._is_drained():
+                    raise StopAsyncIteration
+                event = asyncio.Event()
+                self._async_waiters.append((loop, event))
+                wait = self._time_until_ready()
+            try:
+                await asyncio.wait_for(event.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    # ------------------------------------------------------------------
+    # Statistics
+    # ------------------------------------------------------------------
+
+    def get_watermark(self) -> float:
+        with self._cond:
+            return self._watermark()
+
+    def get_late_drops(self, source_id: str = None) -> int:
+        """Number of items dropped for arriving too late, for one source or in total."""
+        with self._cond:
+            if source_id is None:
+                return self._late_drops
+            return self._sources[source_id].late_drops
+
+    def get_buffer_size(self) -> int:
+        return len(self._buffer)
+
+    def get_lateness(self) -> float:
+        return self._buffering_time
+
+    # ------------------------------------------------------------------
+    # Internals (callers hold self._cond)
+    # ------------------------------------------------------------------
 
-    def check_in_sync(self):
-        pass
+    @staticmethod
+    def _default_source_id(datastream) -> str:
+        resource_id = getattr(datastream, '_resource_id', None)
+        return resource_id if resource_id is not None else uuid4().hex
+
+    def _register(self, merge_source: _MergeSource) -> _MergeSource:
+        with self._cond:
+            if merge_source.source_id in self._sources:
+                raise ValueError(f"Source {merge_source.source_id} is already registered")
+            self._sources[merge_source.source_id] = merge_source
+            if merge_source.live:
+                self._live_count += 1
+        return merge_source
+
+    def _advance(self, merge_source: _MergeSource):
+        """Pulls the next item of an archived source into the heap."""
+        for epoch, data in merge_source.iterator:
+            if epoch < merge_source.last_epoch or epoch < self._last_emitted:
+                merge_source.late_drops += 1
+                self._late_drops += 1
+                continue
+            merge_source.last_epoch = epoch
+            heapq.heappush(self._buffer, (epoch, next(self._seq), merge_source.source_id, data))
+            return
+        merge_source.iterator = None
+
+    def _watermark(self) -> float:
+        if self._closed or self._live_count == 0:
+            return math.inf
+        high = self._max_seen
+        if self._clock is not None:
+            high = max(high, self._clock())
+        return high - self._buffering_time
+
+    def _pop_ready(self) -> MergedItem | None:
+        if not self._buffer or self._buffer[0][0] > self._watermark():
+            return None
+        epoch, _, source_id, data = heapq.heappop(self._buffer)
+        merge_source = self._sources.get(source_id)
+        if merge_source is not None and merge_source.iterator is not None:
+            self._advance(merge_source)
+        if epoch > self._last_emitted:
+            self._last_emitted = epoch
+        return MergedItem(epoch, source_id, data)
+
+    def _is_drained(self) -> bool:
+        if self._buffer:
+            return False
+        if self._closed:
+            return True
+        return self._live_count == 0 and all(src.iterator is None for src in self._sources.values())
+
+    def _time_until_ready(self) -> float | None:
+        """Seconds until the clock alone releases the heap head, or None to wait for new input."""
+        if self._clock is None or not self._buffer:
+            return None
+        return max(self._buffer[0][0] + self._buffering_time - self._clock(), 0.0) + 1e-3
+
+    def _notify(self):
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
@@ -0,0 +1,143 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for consumer checkpoints: DataStore persistence, batched commits and resume with archive catch-up."""
+
+import asyncio
+import time
+
+import pytest
+
+from src.oshconnect.checkpoints import CheckpointManager
+from src.oshconnect.datastore import Checkpoint
+from src.oshconnect.datastores import BackgroundDataStore, JSONFileDataStore, SQLiteDataStore, TinyDBDataStore
+from src.oshconnect.resource_datamodels import DatastreamResource
+from src.oshconnect.streamableresource import Datastream, SessionManager
+from tests.test_datastore import make_datastream, make_node
+from tests.test_gap_fill import archive_handler, received
+from tests.test_websocket_stream import make_ws_datastream, start_server
+
+
+def open_store(kind: str, tmp_path):
+    if kind == "sqlite":
+        return SQLiteDataStore(tmp_path / "store.db")
+    if kind == "json":
+        return JSONFileDataStore(tmp_path)
+    if kind == "tinydb":
+        pytest.importorskip("tinydb")
+        return TinyDBDataStore(tmp_path)
+    return BackgroundDataStore(SQLiteDataStore(tmp_path / "store.db"), flush_interval=0.01)
+
+
+def datastream_with_id(node, resource_id: str) -> Datastream:
+    resource = DatastreamResource.model_validate({
+        "id": resource_id, "name": "Test Datastream",
+        "validTime": ["2024-01-01T00:00:00Z", "2025-01-01T00:00:00Z"],
+    })
+    return Datastream(parent_node=node, datastream_resource=resource)
+
+
+class CountingStore(SQLiteDataStore):
+    def __init__(self):
+        super().__init__(":memory:")
+        self.batches = []
+
+    def save_checkpoints(self, checkpoints):
+        checkpoints = list(checkpoints)
+        self.batches.append(checkpoints)
+        super().save_checkpoints(checkpoints)
+
+
+class TestCheckpointStorage:
+    @pytest.mark.parametrize("kind", ["sqlite", "json", "tinydb", "background"])
+    def test_round_trip(self, kind, tmp_path):
+        store = open_store(kind, tmp_path)
+        store.save_checkpoints([Checkpoint("a", "2024-01-01T00:00:01Z", 3), Checkpoint("b", None, 0)])
+        store.save_checkpoints([Checkpoint("a", "2024-01-01T00:00:05Z", 7)])
+        store.delete_checkpoints(["b"])
+        store.close()
+
+        reopened = open_store(kind, tmp_path)
+        assert reopened.load_checkpoints(["a", "b", "c"]) == {"a": Checkpoint("a", "2024-01-01T00:00:05Z", 7)}
+        assert list(reopened.load_checkpoints()) == ["a"]
+        reopened.close()
+
+
+class TestCheckpointManager:
+    def test_commits_in_batches(self):
+        store = CountingStore()
+        node = make_node(SessionManager())
+        first, second = make_datastream(node), datastream_with_id(node, "ds002")
+        manager = CheckpointManager(store, commit_interval=3600, max_pending=2)
+
+        manager.record(first, "2024-01-01T00:00:01Z")
+        manager.record(first, "2024-01-01T00:00:02Z", count=4)
+        assert store.batches == [] and manager.get_pending_count() == 1
+        manager.record(second, "2024-01-01T00:00:03Z")
+        assert [len(batch) for batch in store.batches] == [2]
+
+        manager.record(first, "2024-01-01T00:00:04Z")
+        manager.close()
+        assert store.batches[-1] == [Checkpoint("ds001", "2024-01-01T00:00:04Z", 6)]
+        # A new process sees the committed state
+        assert CheckpointManager(store).get(first) == store.batches[-1][0]
+
+    def test_background_commit(self):
+        store = CountingStore()
+        ds = make_datastream(make_node(SessionManager()))
+        ds._last_result_time = "2024-01-01T00:00:09Z"
+        manager = CheckpointManager(store, commit_interval=0.01)
+        manager.start()
+        try:
+            manager.record(ds)
+            for _ in range(500):
+                if store.batches:
+                    break
+                time.sleep(0.01)
+        finally:
+            manager.close()
+        assert store.load_checkpoints()["ds001"].result_time == "2024-01-01T00:00:09Z"
+
+    def test_checkpoints_survive_rediscovery(self):
+        store = SQLiteDataStore(":memory:")
+        before_restart = CheckpointManager(store)
+        before_restart.record(make_datastream(make_node(SessionManager())), "2024-01-01T00:00:02Z", count=2)
+        before_restart.close()
+
+        # After a restart the same datastream is a new object with a new internal id
+        rediscovered = make_datastream(make_node(SessionManager()))
+        assert CheckpointManager(store).get(rediscovered) == Checkpoint("ds001", "2024-01-01T00:00:02Z", 2)
+
+        rediscovered._resource_id = None
+        with pytest.raises(ValueError, match="no server resource id"):
+            CheckpointManager(store).record(rediscovered, "2024-01-01T00:00:02Z")
+
+    def test_resume_catches_up_from_archive(self):
+        requests = []
+        store = SQLiteDataStore(":memory:")
+
+        async def scenario():
+            runner, port = await start_server(archive_handler(requests))
+            ds = make_ws_datastream(port)
+            ds.initialize()
+            try:
+                before_restart = CheckpointManager(store)
+                before_restart.record(ds, "2024-01-01T00:00:02Z", count=2)
+                before_restart.close()
+                # After a restart: nothing received yet, resume from the stored checkpoint
+                restarted = CheckpointManager(store)
+                catch_ups = restarted.resume([ds], start=False)
+                assert len(catch_ups) == 1
+                await asyncio.gather(*catch_ups)
+            finally:
+                ds.get_parent_node().get_session().close()
+                await asyncio.sleep(0.05)
+                await runner.cleanup()
+            return ds, restarted
+
+        ds, restarted = asyncio.run(scenario())
+
+        assert received(ds) == [3, 4, 5]
+        assert requests[0].startswith("2024-01-01T00:00:02Z/")
+        assert restarted.get(ds).count == 2
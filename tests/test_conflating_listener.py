@@ -0,0 +1,63 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for rate-limited, conflating event subscriptions."""
+
+import threading
+import time
+
+import pytest
+
+from src.oshconnect.events import ConflatingListener, DefaultEventTypes, EventBuilder, EventHandler
+
+
+def publish_observation(topic: str, value):
+    EventHandler().publish(EventBuilder().with_type(DefaultEventTypes.NEW_OBSERVATION).with_topic(topic)
+                           .with_data(value).with_producer(None).build())
+
+
+class TestConflatingListener:
+    def test_conflates_latest_value_per_topic_into_batches(self):
+        batches = []
+        # Slow enough that the test triggers the flushes itself
+        listener = EventHandler().subscribe(batches.append, types=[DefaultEventTypes.NEW_OBSERVATION],
+                                            max_rate=0.01, conflate=True, batch=True)
+        try:
+            assert isinstance(listener, ConflatingListener)
+            for i in range(1000):
+                publish_observation(f"ds{i % 3}", i)
+            assert batches == []
+            assert listener.flush() == 3
+            publish_observation("ds1", "again")
+            listener.flush()
+            assert listener.flush() == 0
+        finally:
+            EventHandler().unregister_listener(listener)
+
+        assert [(evt.topic, evt.data) for evt in batches[0]] == [("ds0", 999), ("ds1", 997), ("ds2", 998)]
+        assert [(evt.topic, evt.data) for evt in batches[1]] == [("ds1", "again")]
+        assert not listener._thread.is_alive()
+
+    def test_timer_delivers_every_event_at_bounded_rate(self):
+        received = []
+        listener = EventHandler().subscribe(lambda evt: received.append((threading.current_thread().name, evt.data)),
+                                            topics=["ds"], max_rate=20)
+        try:
+            for i in range(50):
+                publish_observation("ds", i)
+            deadline = time.monotonic() + 5
+            while len(received) < 50 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            EventHandler().unregister_listener(listener)
+
+        assert [data for _, data in received] == list(range(50))
+        # Delivered by the timer, not by the publishing thread
+        assert {name for name, _ in received} == {"conflating-listener"}
+
+    def test_options_require_max_rate(self):
+        with pytest.raises(ValueError):
+            EventHandler().subscribe(print, conflate=True)
+        with pytest.raises(ValueError):
+            ConflatingListener(callback=print, max_rate=0)
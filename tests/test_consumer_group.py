@@ -0,0 +1,92 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for consumer groups: shared subscriptions and per-datastream affinity — no broker required."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from src.oshconnect.consumergroup import ConsumerGroup
+from src.oshconnect.csapi4py.mqtt import MQTTCommClient
+from src.oshconnect.resource_datamodels import DatastreamResource
+from src.oshconnect.streamableresource import Datastream, SessionManager, System
+from tests.test_datastore import make_node
+
+
+def make_mqtt_node(num_datastreams: int = 0):
+    node = make_node(SessionManager())
+    node._mqtt_client = MQTTCommClient(url="localhost", client_id_suffix="test", use_v5=True)
+    subscribed = []
+    node._mqtt_client._MQTTCommClient__client.subscribe = lambda topic, qos: subscribed.append(topic)
+    system = System(name="sys", label="System", urn="urn:test:sys", parent_node=node, resource_id="sys001")
+    for i in range(num_datastreams):
+        resource = DatastreamResource.model_validate({
+            "id": f"ds{i:03d}", "name": f"Datastream {i}",
+            "validTime": ["2024-01-01T00:00:00Z", "2025-01-01T00:00:00Z"],
+        })
+        ds = Datastream(parent_node=node, datastream_resource=resource)
+        ds.init_mqtt()
+        system.datastreams.append(ds)
+    node.add_new_system(system)
+    return node, system.datastreams, subscribed
+
+
+class TestConsumerGroup:
+    def test_affinity_assigns_each_datastream_to_one_member(self):
+        keys = [f"ds{i}" for i in range(200)]
+        members = [ConsumerGroup("workers", i, 4, affinity=True) for i in range(4)]
+        owners = {key: [m.member_index for m in members if m.owns(key)] for key in keys}
+        assert all(len(owner) == 1 for owner in owners.values())
+        assert all(20 < sum(owner == [i] for owner in owners.values()) < 80 for i in range(4))
+        # Growing the group only moves datastreams to the new member
+        grown = ConsumerGroup("workers", 0, 5, affinity=True)
+        moved = [key for key in keys if grown.owner_of(key) != owners[key][0]]
+        assert all(grown.owner_of(key) == 4 for key in moved) and len(moved) < 80
+
+        with pytest.raises(ValueError):
+            ConsumerGroup("a/b")
+        with pytest.raises(ValueError):
+            ConsumerGroup("workers", member_index=2, member_count=2)
+
+    def test_shared_wildcard_subscription_routes_to_datastreams(self):
+        node, datastreams, subscribed = make_mqtt_node(2)
+        topics = node.subscribe_observations(group=ConsumerGroup("workers"))
+        assert topics == subscribed == ["$share/workers/api/datastreams/+/observations:data"]
+
+        node._route_observation(None, None, SimpleNamespace(topic=datastreams[1]._topic, payload=b'{"v": 1}'))
+        assert list(datastreams[1].get_inbound_deque()) == [b'{"v": 1}']
+        assert list(datastreams[0].get_inbound_deque()) == []
+
+    def test_unknown_topics_do_not_rebuild_the_routes(self, monkeypatch):
+        node, datastreams, _ = make_mqtt_node(2)
+        session = node.get_session()
+        rebuilds = []
+        get_streamables = session.get_streamables
+        monkeypatch.setattr(session, "get_streamables", lambda: rebuilds.append(1) or get_streamables())
+        unknown = datastreams[0]._topic.replace("ds000", "ds999")
+        for _ in range(5):
+            node._route_observation(None, None, SimpleNamespace(topic=unknown, payload=b'{}'))
+        assert len(rebuilds) == 1
+
+        # Until a datastream with that topic shows up
+        resource = DatastreamResource.model_validate({
+            "id": "ds999", "name": "Datastream 999",
+            "validTime": ["2024-01-01T00:00:00Z", "2025-01-01T00:00:00Z"],
+        })
+        late = Datastream(parent_node=node, datastream_resource=resource)
+        late.init_mqtt()
+        node._route_observation(None, None, SimpleNamespace(topic=unknown, payload=b'{"v": 2}'))
+        assert list(late.get_inbound_deque()) == [b'{"v": 2}']
+
+    def test_affinity_subscribes_owned_datastreams_only(self):
+        subscriptions = []
+        for member in range(3):
+            node, datastreams, subscribed = make_mqtt_node(12)
+            group = ConsumerGroup("workers", member, 3, affinity=True)
+            assert node.subscribe_observations(group=group) == subscribed
+            assert not any(topic.startswith("$share/") for topic in subscribed)
+            subscriptions.extend(subscribed)
+        # Every datastream is consumed by exactly one member
+        assert sorted(subscriptions) == sorted(ds._topic for ds in datastreams)
@@ -7,10 +7,13 @@
 All tests use SQLiteDataStore(":memory:") so there is no file I/O.
 """
 
+import json
+
 import pytest
 
 from src.oshconnect import OSHConnect
-from src.oshconnect.datastores import SQLiteDataStore
+from src.oshconnect.datastores import BackgroundDataStore, SQLiteDataStore
+from src.oshconnect.datastores.lazy import LazyResourceList
 from src.oshconnect.resource_datamodels import (
     ControlStreamResource,
     DatastreamResource,
@@ -276,6 +279,622 @@ class TestBulkOperations:
         assert store.load_all() == []
 
 
+# ---------------------------------------------------------------------------
+# Transactions, bulk writes and pragmas
+# ---------------------------------------------------------------------------
+
+def make_graph(sm: SessionManager, num_systems: int = 5) -> Node:
+    node = make_node(sm)
+    for i in range(num_systems):
+        system = System(
+            name=f"system_{i}",
+            label=f"System {i}",
+            urn=f"urn:test:sensors:sys{i}",
+            parent_node=node,
+            resource_id=f"sys{i:03d}",
+        )
+        system.datastreams.append(make_datastream(node))
+        system.control_channels.append(make_controlstream(node))
+        node.add_new_system(system)
+    return node
+
+
+def trace_statements(store: SQLiteDataStore) -> list[str]:
+    statements = []
+    store._conn.set_trace_callback(statements.append)
+    return statements
+
+
+class TestTransactions:
+    def test_save_all_commits_once(self):
+        store = SQLiteDataStore(":memory:")
+        sm = SessionManager()
+        node = make_graph(sm)
+        statements = trace_statements(store)
+
+        store.save_all([node])
+
+        assert statements.count("COMMIT") == 1
+        assert len(store.load_systems_for_node(node.get_id(), node)) == 5
+
+    def test_transaction_groups_single_saves(self):
+        store = SQLiteDataStore(":memory:")
+        sm = SessionManager()
+        node = make_node(sm)
+        statements = trace_statements(store)
+
+        with store.transaction():
+            store.save_node(node)
+            store.save_system(make_system(node), node)
+            store.save_datastream(make_datastream(node), node)
+
+        assert statements.count("COMMIT") == 1
+
+    def test_transaction_rolls_back_on_error(self):
+        store = SQLiteDataStore(":memory:")
+        sm = SessionManager()
+        node = make_node(sm)
+
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                store.save_node(node)
+                with store.transaction():
+                    store.save_system(make_system(node), node)
+                raise RuntimeError("boom")
+
+        assert store.load_node(node.get_id()) is None
+        assert store.load_systems_for_node(node.get_id(), node) == []
+
+    def test_bulk_save_methods(self):
+        store = SQLiteDataStore(":memory:")
+        sm = SessionManager()
+        node = make_graph(sm, num_systems=3)
+        systems = node.systems()
+
+        store.save_nodes([node])
+        store.save_systems(systems, node)
+        store.save_datastreams([s.datastreams[0] for s in systems], node)
+        store.save_controlstreams([s.control_channels[0] for s in systems], node)
+
+        assert store.load_node(node.get_id(), session_manager=sm) is not None
+        assert len(store.load_systems_for_node(node.get_id(), node)) == 3
+        ds_id = str(systems[1].datastreams[0].get_internal_id())
+        assert store.load_datastream(ds_id, node) is not None
+
+    def test_pragmas(self, tmp_path):
+        store = SQLiteDataStore(tmp_path / "store.db", synchronous="full")
+        assert store.get_pragma("journal_mode") == "wal"
+        assert store.get_pragma("synchronous") == 2
+        store.close()
+
+    def test_invalid_synchronous_rejected(self):
+        with pytest.raises(ValueError):
+            SQLiteDataStore(":memory:", synchronous="sometimes")
+
+
+# ---------------------------------------------------------------------------
+# Normalized layout
+# ---------------------------------------------------------------------------
+
+class TestNormalizedLayout:
+    def test_rows_are_not_duplicated(self):
+        store = SQLiteDataStore(":memory:", normalized=True)
+        sm = SessionManager()
+        node = make_graph(sm, num_systems=2)
+        store.save_all([node])
+
+        node_data = json.loads(store._execute("SELECT data FROM nodes").fetchone()["data"])
+        assert node_data["_systems"] is None
+        for row in store._execute("SELECT data FROM systems"):
+            system_data = json.loads(row["data"])
+            assert system_data["datastreams"] is None
+            assert system_data["control_channels"] is None
+
+    def test_load_all_reassembles_graph(self):
+        store = SQLiteDataStore(":memory:", normalized=True)
+        sm = SessionManager()
+        node = make_graph(sm, num_systems=3)
+        store.save_all([node])
+
+        nodes = store.load_all(session_manager=sm)
+        assert len(nodes) == 1
+        systems = nodes[0].systems()
+        assert [s.name for s in systems] == ["system_0", "system_1", "system_2"]
+        for loaded, original in zip(systems, node.systems()):
+            assert loaded.get_internal_id() == original.get_internal_id()
+            assert [ds.get_internal_id() for ds in loaded.datastreams] == \
+                   [ds.get_internal_id() for ds in original.datastreams]
+            assert len(loaded.control_channels) == 1
+
+    def test_single_datastream_save_updates_only_its_row(self):
+        store = SQLiteDataStore(":memory:", normalized=True)
+        sm = SessionManager()
+        node = make_graph(sm, num_systems=1)
+        store.save_all([node])
+        system = node.systems()[0]
+        new_ds = make_datastream(node)
+        system.datastreams.append(new_ds)
+        statements = trace_statements(store)
+
+        store.save_datastream(new_ds, node)
+
+        assert not any("nodes" in stmt or "INTO systems" in stmt for stmt in statements)
+        loaded = store.load_system(str(system.get_internal_id()), node)
+        assert len(loaded.datastreams) == 2
+
+    def test_reads_default_layout(self, tmp_path):
+        path = tmp_path / "store.db"
+        sm = SessionManager()
+        node = make_graph(sm, num_systems=2)
+        legacy = SQLiteDataStore(path)
+        legacy.save_all([node])
+        legacy.close()
+
+        store = SQLiteDataStore(path, normalized=True)
+        systems = store.load_all(session_manager=sm)[0].systems()
+        assert len(systems) == 2
+        assert all(len(s.datastreams) == 1 for s in systems)
+        store.close()
+
+    def test_child_lookups_use_indexes(self):
+        store = SQLiteDataStore(":memory:", normalized=True)
+        plan = store._execute(
+            "EXPLAIN QUERY PLAN SELECT data FROM datastreams WHERE system_uid = ?", ("x",)
+        ).fetchall()
+        assert any("idx_datastreams_system_uid" in row["detail"] for row in plan)
+
+
+# ---------------------------------------------------------------------------
+# Lazy loading
+# ---------------------------------------------------------------------------
+
+class TestLazyLoading:
+    def make_store(self, sm: SessionManager, num_systems: int = 3) -> tuple[SQLiteDataStore, Node]:
+        store = SQLiteDataStore(":memory:", lazy=True)
+        node = make_graph(sm, num_systems=num_systems)
+        store.save_all([node])
+        return store, node
+
+    def test_systems_load_on_first_access(self):
+        sm = SessionManager()
+        store, node = self.make_store(sm)
+        loaded_node = store.load_all(session_manager=sm)[0]
+        systems = loaded_node.systems()
+
+        assert isinstance(systems, LazyResourceList)
+        assert len(systems) == 3
+        assert systems.loaded_count() == 0
+
+        target = node.systems()[1]
+        system = systems.get_by_id(str(target.get_internal_id()))
+        assert system.name == "system_1"
+        assert systems.loaded_count() == 1
+        assert systems.get_by_id(str(target.get_internal_id())) is system
+
+    def test_streams_load_on_iteration(self):
+        sm = SessionManager()
+        store, node = self.make_store(sm)
+        system = store.load_all(session_manager=sm)[0].systems()[0]
+
+        assert system.datastreams.loaded_count() == 0
+        assert [ds.get_internal_id() for ds in system.datastreams] == \
+               [ds.get_internal_id() for ds in node.systems()[0].datastreams]
+        assert system.datastreams.loaded_count() == 1
+        assert len(system.control_channels) == 1
+
+    def test_iteration_materializes_all(self):
+        sm = SessionManager()
+        store, _ = self.make_store(sm)
+        systems = store.load_all(session_manager=sm)[0].systems()
+        assert [s.name for s in systems] == ["system_0", "system_1", "system_2"]
+        assert systems.loaded_count() == 3
+
+    def test_oshconnect_keeps_systems_lazy(self):
+        sm = SessionManager()
+        store, _ = self.make_store(sm, num_systems=2)
+        app = OSHConnect(name="lazy-app", datastore=store)
+        app.load_from_store()
+
+        assert len(app._systems) == 2
+        assert app._systems.loaded_count() == 0
+        # Shared slots: materializing through OSHConnect also materializes the Node's entry
+        system = app._systems[0]
+        assert app._nodes[0].systems().get_by_id(str(system.get_internal_id())) is system
+
+
+# ---------------------------------------------------------------------------
+# Trusted fast path
+# ---------------------------------------------------------------------------
+
+class TestTrustedDeserialization:
+    def test_round_trip_matches_validated_path(self):
+        sm = SessionManager()
+        data = json.loads(json.dumps(make_graph(sm, num_systems=2).serialize()))
+
+        trusted = Node.deserialize(data, session_manager=sm, trusted=True)
+        validated = Node.deserialize(data, session_manager=sm)
+
+        assert trusted.serialize() == validated.serialize() == data
+
+    def test_underlying_resource_validated_on_first_access(self):
+        sm = SessionManager()
+        node = make_node(sm)
+        ds = Datastream.deserialize(json.loads(json.dumps(make_datastream(node).serialize())), node, trusted=True)
+
+        assert ds._resource is None
+        assert ds.get_id() == "ds001"
+        assert isinstance(ds.get_underlying_resource(), DatastreamResource)
+        assert ds._resource is not None
+
+    def test_restored_resource_registered_under_its_id(self):
+        sm = SessionManager()
+        node = make_node(sm)
+        original = make_controlstream(node)
+        cs = ControlStream.deserialize(original.serialize(), node, trusted=True)
+
+        assert cs.get_internal_id() == original.get_internal_id()
+        assert node.get_session()._streamables[cs.get_streamable_id_str()] is cs
+
+    def test_dump_is_cached_until_resource_changes(self):
+        sm = SessionManager()
+        ds = make_datastream(make_node(sm))
+        first = ds.serialize()["underlying_resource"]
+        assert ds.serialize()["underlying_resource"] is first
+
+        ds.get_underlying_resource().name = "Renamed"
+        ds.invalidate_serialization_cache()
+        assert ds.serialize()["underlying_resource"]["name"] == "Renamed"
+
+        ds.set_resource(DatastreamResource.model_validate({"id": "ds002", "name": "Other",
+                                                          "validTime": ["2024-01-01T00:00:00Z", "now"]}))
+        assert ds.serialize()["underlying_resource"]["id"] == "ds002"
+
+    @pytest.mark.parametrize("kwargs", [{}, {"normalized": True}])
+    def test_store_load_and_resave_skip_validation(self, kwargs):
+        sm = SessionManager()
+        store = SQLiteDataStore(":memory:", **kwargs)
+        store.save_all([make_graph(sm, num_systems=2)])
+
+        nodes = store.load_all(session_manager=sm)
+        store.save_all(nodes)
+        streams = [s for system in nodes[0].systems() for s in system.datastreams + system.control_channels]
+        assert all(s._resource is None for s in streams + nodes[0].systems())
+        assert [s.name for s in store.load_all(session_manager=sm)[0].systems()] == ["system_0", "system_1"]
+
+
+# ---------------------------------------------------------------------------
+# Dirty tracking
+# ---------------------------------------------------------------------------
+
+def inserts(statements: list[str]) -> list[str]:
+    return [stmt.split(" (")[0] for stmt in statements if stmt.startswith("INSERT")]
+
+
+class TestChangeTracking:
+    def test_tracked_assignments_bump_version(self):
+        sm = SessionManager()
+        node = make_node(sm)
+        ds = make_datastream(node)
+        version = ds.get_version()
+
+        ds._inbound_deque = None
+        assert ds.get_version() == version
+        ds._status = "started"
+        assert ds.get_version() == version + 1
+        ds.mark_clean()
+        assert not ds.is_dirty()
+        ds.set_resource(ds.get_resource())
+        assert ds.is_dirty()
+
+        node.port = 8181
+        assert node.is_dirty()
+
+    def test_mark_dirty_after_in_place_edit(self):
+        ds = make_datastream(make_node(SessionManager()))
+        ds.serialize()
+        ds.mark_clean()
+
+        ds.get_underlying_resource().name = "Renamed"
+        ds.mark_dirty()
+        assert ds.is_dirty()
+        assert ds.serialize()["underlying_resource"]["name"] == "Renamed"
+
+    def test_save_changes_writes_nothing_when_clean(self):
+        sm = SessionManager()
+        store = SQLiteDataStore(":memory:", normalized=True)
+        node = make_graph(sm, num_systems=2)
+        assert store.save_changes([node]) == 7
+
+        statements = trace_statements(store)
+        assert store.save_changes([node]) == 0
+        assert inserts(statements) == []
+
+    def test_normalized_writes_only_the_changed_row(self):
+        sm = SessionManager()
+        store = SQLiteDataStore(":memory:", normalized=True)
+        node = make_graph(sm, num_systems=3)
+        store.save_all([node])
+        ds = node.systems()[1].datastreams[0]
+        ds.should_poll = True
+
+        statements = trace_statements(store)
+        assert store.save_changes([node]) == 1
+        assert inserts(statements) == ["INSERT INTO datastreams"]
+        assert statements.count("COMMIT") == 1
+        assert store.load_datastream(str(ds.get_internal_id()), node).should_poll is True
+
+    def test_default_layout_rewrites_embedding_parents(self):
+        sm = SessionManager()
+        store = SQLiteDataStore(":memory:")
+        node = make_graph(sm, num_systems=3)
+        store.save_all([node])
+        node.systems()[2].datastreams[0].should_poll = True
+
+        assert store.save_changes([node]) == 3
+        reloaded = store.load_all(session_manager=sm)[0]
+        assert reloaded.systems()[2].datastreams[0].should_poll is True
+
+    def test_loaded_graph_is_clean(self):
+        sm = SessionManager()
+        for store in (SQLiteDataStore(":memory:"), SQLiteDataStore(":memory:", lazy=True)):
+            store.save_all([make_graph(sm, num_systems=2)])
+            nodes = store.load_all(session_manager=sm)
+            assert store.save_changes(nodes) == 0
+
+    def test_lazy_entries_are_not_loaded(self):
+        sm = SessionManager()
+        store = SQLiteDataStore(":memory:", normalized=True, lazy=True)
+        store.save_all([make_graph(sm, num_systems=3)])
+        node = store.load_all(session_manager=sm)[0]
+        system = node.systems()[0]
+        system.label = "Changed"
+
+        assert store.save_changes([node]) == 1
+        assert node.systems().loaded_count() == 1
+        assert system.datastreams.loaded_count() == 0
+
+    def test_lazy_default_layout_keeps_entries_unloaded(self):
+        sm = SessionManager()
+        store = SQLiteDataStore(":memory:", lazy=True)
+        store.save_all([make_graph(sm, num_systems=3)])
+        node = store.load_all(session_manager=sm)[0]
+        system = node.systems()[0]
+        system.label = "Changed"
+
+        assert store.save_changes([node]) == 1
+        assert node.systems().loaded_count() == 1
+        reloaded = store.load_all(session_manager=sm)[0]
+        assert len(reloaded.systems()) == 3
+        assert store.load_system(str(system.get_internal_id()), reloaded).label == "Changed"
+
+    def test_loading_a_system_reads_only_its_streams(self):
+        sm = SessionManager()
+        for store in (SQLiteDataStore(":memory:", lazy=True), SQLiteDataStore(":memory:", normalized=True)):
+            node = make_graph(sm, num_systems=3)
+            store.save_all([node])
+            system_id = str(node.systems()[1].get_internal_id())
+
+            statements = trace_statements(store)
+            system = store.load_system(system_id, node)
+            stream_queries = [s for s in statements if "FROM datastreams" in s or "FROM controlstreams" in s]
+            assert stream_queries and all("WHERE system_uid = " in s for s in stream_queries)
+            assert [ds.get_internal_id() for ds in system.datastreams] == [
+                ds.get_internal_id() for ds in node.systems()[1].datastreams]
+
+    @pytest.mark.parametrize("layout", [{"normalized": True}, {"lazy": True}, {"normalized": True, "lazy": True}])
+    def test_removed_system_is_deleted(self, layout):
+        sm = SessionManager()
+        for save in ("save_changes", "save_all"):
+            store = SQLiteDataStore(":memory:", **layout)
+            store.save_all([make_graph(sm, num_systems=3)])
+            node = store.load_all(session_manager=sm)[0]
+            removed = node.systems()[1]
+            ds_id = str(removed.datastreams[0].get_internal_id())
+            cs_id = str(removed.control_channels[0].get_internal_id())
+            node.remove_system(removed)
+            node.systems()[0].label = "Changed"
+
+            getattr(store, save)([node])
+            reloaded = store.load_all(session_manager=sm)[0]
+            assert [system.label for system in reloaded.systems()] == ["Changed", "System 2"]
+            assert store.load_datastream(ds_id, reloaded) is None
+            assert store.load_controlstream(cs_id, reloaded) is None
+            assert node._removed_resources == {}
+
+    def test_background_store(self):
+        sm = SessionManager()
+        store = BackgroundDataStore(SQLiteDataStore(":memory:", normalized=True), flush_interval=0.01)
+        node = make_graph(sm, num_systems=2)
+        store.save_all([node])
+        # Marked clean once the writer committed them
+        store.flush()
+        node.systems()[0].datastreams[0].should_poll = True
+
+        assert store.save_changes([node]) == 1
+        store.flush()
+        ds_id = str(node.systems()[0].datastreams[0].get_internal_id())
+        assert store.load_datastream(ds_id, node).should_poll is True
+        store.close()
+
+    def test_background_store_marks_clean_once_committed(self, monkeypatch):
+        sm = SessionManager()
+        backing = SQLiteDataStore(":memory:", normalized=True)
+        store = BackgroundDataStore(backing, flush_interval=5.0, max_retries=0)
+        node = make_graph(sm, num_systems=1)
+        ds = node.systems()[0].datastreams[0]
+        store.save_all([node])
+        assert ds.is_dirty()
+        store.flush()
+        assert not ds.is_dirty()
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(backing, "save_datastreams", fail)
+        ds.should_poll = True
+        assert store.save_changes([node]) == 1
+        with pytest.raises(RuntimeError):
+            store.flush()
+        # The failed write is not forgotten: the next save_changes() writes it again
+        assert ds.is_dirty()
+
+        monkeypatch.undo()
+        assert store.save_changes([node]) == 1
+        store.flush()
+        assert not ds.is_dirty()
+        assert store.load_datastream(str(ds.get_internal_id()), node).should_poll is True
+        store.close()
+
+
+# ---------------------------------------------------------------------------
+# Background writer
+# ---------------------------------------------------------------------------
+
+class TestBackgroundDataStore:
+    def test_repeated_saves_are_coalesced(self):
+        backing = SQLiteDataStore(":memory:")
+        store = BackgroundDataStore(backing, flush_interval=5.0)
+        sm = SessionManager()
+        node = make_node(sm)
+        system = make_system(node)
+        statements = trace_statements(backing)
+
+        for i in range(50):
+            system.label = f"label {i}"
+            store.save_system(system, node)
+        assert store.get_pending_count() == 1
+        store.flush()
+
+        assert sum("INTO systems" in stmt for stmt in statements) == 1
+        assert statements.count("COMMIT") == 1
+        assert store.load_system(str(system.get_internal_id()), node).label == "label 49"
+        store.close()
+
+    def test_save_all_is_written_in_one_batch(self):
+        backing = SQLiteDataStore(":memory:")
+        store = BackgroundDataStore(backing)
+        sm = SessionManager()
+        node = make_graph(sm, num_systems=4)
+        statements = trace_statements(backing)
+
+        store.save_all([node])
+        nodes = store.load_all(session_manager=sm)
+
+        assert statements.count("COMMIT") == 1
+        assert len(nodes[0].systems()) == 4
+        store.close()
+
+    def test_delete_supersedes_pending_save(self):
+        store = BackgroundDataStore(SQLiteDataStore(":memory:"), flush_interval=5.0)
+        sm = SessionManager()
+        node = make_node(sm)
+        ds = make_datastream(node)
+        ds_id = str(ds.get_internal_id())
+
+        store.save_datastream(ds, node)
+        store.delete_datastream(ds_id)
+        assert store.get_pending_count() == 1
+        assert store.load_datastream(ds_id, node) is None
+        store.close()
+
+    def test_close_flushes_to_disk(self, tmp_path):
+        path = tmp_path / "store.db"
+        sm = SessionManager()
+        node = make_node(sm)
+        store = BackgroundDataStore(SQLiteDataStore(path), flush_interval=5.0)
+        store.save_node(node)
+        store.close()
+
+        reopened = SQLiteDataStore(path)
+        assert reopened.load_node(node.get_id(), session_manager=sm) is not None
+        reopened.close()
+
+    def test_flush_reraises_writer_errors(self):
+        backing = SQLiteDataStore(":memory:")
+        store = BackgroundDataStore(backing)
+        sm = SessionManager()
+        node = make_node(sm)
+        backing.close()
+
+        store.save_node(node)
+        with pytest.raises(Exception):
+            store.flush()
+
+    def test_saves_are_serialized_when_requested(self):
+        store = BackgroundDataStore(SQLiteDataStore(":memory:"), flush_interval=5.0)
+        sm = SessionManager()
+        node = make_node(sm)
+        system = make_system(node)
+
+        system.label = "requested"
+        store.save_system(system, node)
+        system.label = "changed later"
+
+        assert store.load_system(str(system.get_internal_id()), node).label == "requested"
+        store.close()
+
+    def test_failed_batch_is_retried(self, monkeypatch):
+        backing = SQLiteDataStore(":memory:")
+        store = BackgroundDataStore(backing, flush_interval=0.01)
+        sm = SessionManager()
+        node = make_node(sm)
+        system = make_system(node)
+        save_systems = backing.save_systems
+        calls = []
+
+        def fail_once(systems, node):
+            calls.append(len(systems))
+            if len(calls) == 1:
+                raise RuntimeError("database is locked")
+            save_systems(systems, node)
+
+        monkeypatch.setattr(backing, "save_systems", fail_once)
+        store.save_system(system, node)
+        with pytest.raises(RuntimeError):
+            store.flush()
+        store.flush()
+
+        assert calls == [1, 1]
+        assert store.load_system(str(system.get_internal_id()), node) is not None
+        store.close()
+
+    def test_failed_batch_is_given_up_after_retries(self, monkeypatch):
+        backing = SQLiteDataStore(":memory:")
+        store = BackgroundDataStore(backing, flush_interval=0.01, max_retries=2)
+        sm = SessionManager()
+        node = make_node(sm)
+        calls = []
+
+        def fail(nodes):
+            calls.append(len(nodes))
+            raise RuntimeError("disk full")
+
+        store.save_all([node])
+        store.flush()
+        assert not node.is_dirty()
+        monkeypatch.setattr(backing, "save_nodes", fail)
+        store.save_all([node])
+        with pytest.raises(RuntimeError):
+            store.flush()
+        # A flush() waits for the retries requested before it
+        for _ in range(3):
+            try:
+                store.flush()
+                break
+            except RuntimeError:
+                pass
+
+        assert len(calls) == 3 and store.get_pending_count() == 0
+        assert node.is_dirty()
+        store.close()
+
+    def test_closed_store_rejects_writes(self):
+        store = BackgroundDataStore(SQLiteDataStore(":memory:"))
+        store.close()
+        with pytest.raises(RuntimeError):
+            store.save_node(make_node())
+
+
 # ---------------------------------------------------------------------------
 # OSHConnect integration
 # ---------------------------------------------------------------------------
@@ -306,6 +925,16 @@ class TestOSHConnectIntegration:
         assert len(app2._systems) == 1
         assert app2._systems[0].name == system.name
 
+    def test_save_changes(self):
+        store = SQLiteDataStore(":memory:", normalized=True)
+        app = OSHConnect(name="test-app", datastore=store)
+        node = make_node(app._session_manager)
+        app.add_node(node)
+        app.add_system_to_node(make_system(node), node)
+
+        assert app.save_changes() == 2
+        assert app.save_changes() == 0
+
     def test_save_to_store_no_datastore_raises(self):
         app = OSHConnect(name="no-store-app")
         with pytest.raises(RuntimeError):
@@ -0,0 +1,134 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for decoding inbound observations in worker processes through shared memory."""
+
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+from src.oshconnect.decodepool import DecodePool
+from src.oshconnect.events import DefaultEventTypes, EventHandler
+from src.oshconnect.resource_datamodels import DatastreamResource
+from src.oshconnect.streamableresource import Datastream, SessionManager
+from tests.test_datastore import make_node
+from tests.test_observation_validation import make_record_schema, valid_result
+
+
+def fahrenheit(obs: dict) -> dict:
+    # Runs in the worker processes
+    obs["result"]["temperature"] = obs["result"]["temperature"] * 9 / 5 + 32
+    return obs
+
+
+def unpicklable_or_exit(obs: dict):
+    # Runs in the worker processes
+    temperature = obs["result"]["temperature"]
+    if temperature == 3:
+        return {"lock": threading.Lock()}
+    if temperature == 7:
+        os._exit(3)
+    return obs
+
+
+def make_schema_datastream(node, ds_id: str) -> Datastream:
+    resource = DatastreamResource.model_validate({
+        "id": ds_id, "name": ds_id, "validTime": ["2024-01-01T00:00:00Z", "2025-01-01T00:00:00Z"],
+    })
+    resource.record_schema = make_record_schema()
+    return Datastream(parent_node=node, datastream_resource=resource)
+
+
+def message(ds_id: str, i: int, result: dict = None) -> SimpleNamespace:
+    result = dict(valid_result(), temperature=float(i)) if result is None else result
+    return SimpleNamespace(topic=f"api/datastreams/{ds_id}/observations:data",
+                           payload=json.dumps({"resultTime": f"2024-01-01T00:00:{i:02d}Z", "result": result}).encode())
+
+
+def wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class TestDecodePool:
+    def test_decodes_validates_and_transforms_in_order(self):
+        node = make_node(SessionManager())
+        first, second = make_schema_datastream(node, "ds1"), make_schema_datastream(node, "ds2")
+        pool = DecodePool(processes=2, batch_size=4, buffer_size=512, transform=fahrenheit)
+        events = []
+        listener = EventHandler().subscribe(events.append, types=[DefaultEventTypes.NEW_OBSERVATION])
+        try:
+            pool.attach(first)
+            pool.attach(second)
+            for i in range(30):
+                first._mqtt_sub_callback(None, None, message("ds1", i))
+                second._mqtt_sub_callback(None, None, message("ds2", i))
+            # Fails validation in the worker: dropped
+            first._mqtt_sub_callback(None, None, message("ds1", 59, {"temperature": "hot"}))
+            # Larger than a shared memory block
+            first._mqtt_sub_callback(None, None, message("ds1", 30, dict(valid_result(), temperature=30.0,
+                                                                         note="x" * 2000)))
+            wait_for(lambda: len(events) == 61)
+        finally:
+            EventHandler().unregister_listener(listener)
+            pool.close()
+
+        for ds in (first, second):
+            temperatures = [evt.data["result"]["temperature"] for evt in events if evt.producer is ds]
+            assert temperatures == [i * 9 / 5 + 32 for i in range(31 if ds is first else 30)]
+        assert len(first.get_inbound_deque()) == 31 and len(second.get_inbound_deque()) == 30
+        assert pool.get_pending_count() == 0
+
+    def test_detached_datastream_decodes_on_network_thread(self):
+        node = make_node(SessionManager())
+        ds = make_schema_datastream(node, "ds1")
+        pool = DecodePool(processes=1, flush_interval=0.01)
+        try:
+            pool.attach(ds)
+            ds._mqtt_sub_callback(None, None, message("ds1", 1))
+            wait_for(lambda: len(ds.get_inbound_deque()) == 1)
+            pool.detach(ds)
+            ds._mqtt_sub_callback(None, None, message("ds1", 2))
+            assert len(ds.get_inbound_deque()) == 2
+        finally:
+            pool.close()
+
+    def test_unpicklable_result_and_dead_worker_do_not_stall(self):
+        node = make_node(SessionManager())
+        ds = make_schema_datastream(node, "ds1")
+        pool = DecodePool(processes=1, batch_size=1, flush_interval=0.01, transform=unpicklable_or_exit)
+        try:
+            pool.attach(ds)
+            for i in range(10):
+                ds._mqtt_sub_callback(None, None, message("ds1", i))
+            wait_for(lambda: pool.get_pending_count() == 0)
+            assert pool.get_pending_count() == 0
+            delivered = [json.loads(p)["result"]["temperature"] for p in ds.get_inbound_deque()]
+            # Message 3 could not be sent back and the worker died on message 7, taking its queued batches along
+            assert 3 not in delivered and 7 not in delivered
+            assert delivered[:3] == [0, 1, 2] and delivered == sorted(delivered)
+            ds._mqtt_sub_callback(None, None, message("ds1", 11))
+            wait_for(lambda: pool.get_pending_count() == 0 and len(ds.get_inbound_deque()) == len(delivered) + 1)
+            assert json.loads(ds.get_inbound_deque()[-1])["result"]["temperature"] == 11
+        finally:
+            pool.close()
+
+    def test_submit_timeout_falls_back_to_network_thread(self):
+        node = make_node(SessionManager())
+        ds = make_schema_datastream(node, "ds1")
+        pool = DecodePool(processes=1, submit_timeout=0.05)
+        try:
+            pool.attach(ds)
+            # All blocks in flight and none coming back
+            with pool._lock:
+                pool._block_count = pool._max_blocks
+            ds._mqtt_sub_callback(None, None, message("ds1", 1))
+            assert len(ds.get_inbound_deque()) == 1
+        finally:
+            with pool._lock:
+                pool._block_count = 0
+            pool.close()
@@ -0,0 +1,158 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for the journaled file-based DataStores (JSONFileDataStore, TinyDBDataStore)."""
+
+import json
+
+import pytest
+
+from src.oshconnect.datastores import JSONFileDataStore, TinyDBDataStore
+from src.oshconnect.streamableresource import SessionManager
+from tests.test_datastore import make_datastream, make_graph, make_node, make_system
+
+BACKENDS = [JSONFileDataStore, TinyDBDataStore]
+
+
+@pytest.fixture(params=BACKENDS, ids=lambda cls: cls.__name__)
+def backend(request):
+    if request.param is TinyDBDataStore:
+        pytest.importorskip("tinydb")
+    return request.param
+
+
+def journal_lines(path) -> list[list]:
+    return [json.loads(line) for line in (path / "journal.jsonl").read_text().splitlines()]
+
+
+class TestJournaledDataStore:
+    def test_save_all_round_trip(self, backend, tmp_path):
+        sm = SessionManager()
+        node = make_graph(sm, num_systems=3)
+        store = backend(tmp_path)
+        store.save_all([node])
+        store.close()
+
+        reopened = backend(tmp_path)
+        nodes = reopened.load_all(session_manager=sm)
+        assert len(nodes) == 1
+        systems = nodes[0].systems()
+        assert [s.name for s in systems] == ["system_0", "system_1", "system_2"]
+        assert all(len(s.datastreams) == 1 and len(s.control_channels) == 1 for s in systems)
+        reopened.close()
+
+    def test_save_all_is_one_journal_entry(self, backend, tmp_path):
+        sm = SessionManager()
+        store = backend(tmp_path)
+        store.save_all([make_graph(sm, num_systems=2)])
+        lines = journal_lines(tmp_path)
+        assert len(lines) == 1
+        # node + 2 systems + 2 datastreams + 2 controlstreams
+        assert len(lines[0]) == 7
+
+    def test_single_save_journals_only_the_delta(self, backend, tmp_path):
+        sm = SessionManager()
+        node = make_graph(sm, num_systems=2)
+        store = backend(tmp_path)
+        store.save_all([node])
+        ds = node.systems()[0].datastreams[0]
+
+        store.save_datastream(ds, node)
+
+        last = journal_lines(tmp_path)[-1]
+        assert len(last) == 1
+        assert last[0][:3] == ["put", "datastreams", str(ds.get_internal_id())]
+        assert "_systems" not in json.dumps(last)
+
+    def test_save_changes_journals_only_modified_resources(self, backend, tmp_path):
+        sm = SessionManager()
+        node = make_graph(sm, num_systems=3)
+        store = backend(tmp_path)
+        store.save_all([node])
+        assert store.save_changes([node]) == 0
+        system = node.systems()[1]
+        system.label = "Relabelled"
+
+        assert store.save_changes([node]) == 1
+        last = journal_lines(tmp_path)[-1]
+        assert [op[:3] for op in last] == [["put", "systems", str(system.get_internal_id())]]
+
+    def test_journal_replayed_without_close(self, backend, tmp_path):
+        sm = SessionManager()
+        node = make_node(sm)
+        system = make_system(node)
+        store = backend(tmp_path)
+        store.save_node(node)
+        store.save_system(system, node)
+        store.delete_system(str(system.get_internal_id()))
+        # Simulate a crash: no close(), so no compaction
+
+        reopened = backend(tmp_path)
+        assert reopened.load_node(node.get_id(), session_manager=sm) is not None
+        assert reopened.load_system(str(system.get_internal_id()), node) is None
+
+    def test_torn_journal_tail_is_discarded(self, backend, tmp_path):
+        sm = SessionManager()
+        node = make_node(sm)
+        store = backend(tmp_path)
+        store.save_node(node)
+        with open(tmp_path / "journal.jsonl", "ab") as f:
+            f.write(b'[["put","nodes","x",{"da')
+
+        reopened = backend(tmp_path)
+        assert [n.get_id() for n in reopened.load_all_nodes(session_manager=sm)] == [node.get_id()]
+        assert (tmp_path / "journal.jsonl").read_bytes().endswith(b"\n")
+
+    def test_compaction(self, backend, tmp_path):
+        sm = SessionManager()
+        node = make_node(sm)
+        store = backend(tmp_path, compact_every=3)
+        for i in range(3):
+            system = make_system(node)
+            system.name = f"system_{i}"
+            store.save_system(system, node)
+
+        assert store.get_journal_size() == 0
+        assert (tmp_path / "journal.jsonl").read_bytes() == b""
+        snapshot = json.loads((tmp_path / "snapshot.json").read_text())
+        assert len(snapshot["systems"]) == 3
+        assert not (tmp_path / "snapshot.json.tmp").exists()
+
+        store.save_node(node)
+        reopened = backend(tmp_path)
+        assert len(reopened.load_systems_for_node(node.get_id(), node)) == 3
+        assert reopened.load_node(node.get_id(), session_manager=sm) is not None
+
+    def test_transaction_rolls_back(self, backend, tmp_path):
+        sm = SessionManager()
+        node = make_node(sm)
+        store = backend(tmp_path)
+        store.save_node(node)
+
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                store.save_system(make_system(node), node)
+                store.save_datastream(make_datastream(node), node)
+                raise RuntimeError("boom")
+
+        assert store.load_systems_for_node(node.get_id(), node) == []
+        assert len(journal_lines(tmp_path)) == 1
+
+    def test_clear(self, backend, tmp_path):
+        sm = SessionManager()
+        store = backend(tmp_path)
+        store.save_all([make_graph(sm, num_systems=2)])
+        store.clear()
+        assert store.load_all(session_manager=sm) == []
+
+
+class TestTinyDBQueries:
+    def test_db_is_queryable(self, tmp_path):
+        tinydb = pytest.importorskip("tinydb")
+        sm = SessionManager()
+        node = make_graph(sm, num_systems=2)
+        store = TinyDBDataStore(tmp_path)
+        store.save_all([node])
+        rows = store.db.table("systems").search(tinydb.where("node_id") == node.get_id())
+        assert len(rows) == 2
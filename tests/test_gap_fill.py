@@ -0,0 +1,159 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for filling the gap left by an MQTT reconnect from the observation archive — no OSH server required."""
+
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from aiohttp import web
+
+from src.oshconnect.csapi4py.mqtt import MQTTCommClient
+from src.oshconnect.polling import parse_result_time
+from src.oshconnect.streamableresource import Datastream, Status
+from tests.test_websocket_stream import make_ws_datastream, start_server
+
+ARCHIVE = [{"id": f"o{i}", "resultTime": f"2024-01-01T00:00:0{i}Z", "result": {"v": i}} for i in range(1, 6)]
+
+
+def live(i: int):
+    obs = ARCHIVE[i - 1]
+    return SimpleNamespace(topic="obs/topic", payload=json.dumps({"resultTime": obs["resultTime"],
+                                                                  "result": obs["result"]}).encode())
+
+
+def archive_handler(requests: list):
+    async def handler(request):
+        requests.append(request.query["resultTime"])
+        start, end = request.query["resultTime"].split("/")
+        start, end = parse_result_time(start), parse_result_time(end) if end != ".." else None
+        items = [o for o in ARCHIVE if parse_result_time(o["resultTime"]) >= start
+                 and (end is None or parse_result_time(o["resultTime"]) <= end)]
+        return web.json_response({"items": items})
+    return handler
+
+
+def received(ds) -> list:
+    return [json.loads(payload)["result"]["v"] for payload in ds.get_inbound_deque()]
+
+
+class TestGapFill:
+    def test_archive_is_merged_ahead_of_live_messages(self):
+        requests = []
+
+        async def scenario():
+            runner, port = await start_server(archive_handler(requests))
+            ds = make_ws_datastream(port)
+            ds.initialize()
+            try:
+                ds._mqtt_sub_callback(None, None, live(1))
+                assert ds._begin_gap_fill()
+                # Arrives after the reconnect, before the archive was fetched: held back
+                ds._mqtt_sub_callback(None, None, live(5))
+                assert received(ds) == [1]
+                delivered = await ds.fill_gap(slices=3)
+            finally:
+                ds.get_parent_node().get_session().close()
+                await asyncio.sleep(0.05)
+                await runner.cleanup()
+            return ds, delivered
+
+        ds, delivered = asyncio.run(scenario())
+
+        assert [o["id"] for o in delivered] == ["o2", "o3", "o4"]
+        assert received(ds) == [1, 2, 3, 4, 5]
+        assert len(requests) == 3 and requests[0].startswith("2024-01-01T00:00:01Z/")
+        assert ds._last_result_time == "2024-01-01T00:00:05Z"
+        assert ds._gap_buffer is None
+
+    def test_failed_fetch_is_retried_without_losing_the_gap(self):
+        requests = []
+        archive = archive_handler(requests)
+
+        async def flaky(request):
+            if not requests:
+                requests.append(None)
+                return web.Response(status=503, text="archive unavailable")
+            return await archive(request)
+
+        async def scenario():
+            runner, port = await start_server(flaky)
+            ds = make_ws_datastream(port)
+            ds.initialize()
+            try:
+                ds._mqtt_sub_callback(None, None, live(1))
+                assert ds._begin_gap_fill()
+                ds._mqtt_sub_callback(None, None, live(4))
+                fill = asyncio.ensure_future(ds.fill_gap(slices=1, retry_delay=0.2))
+                while ds._gap_buffer is not None:
+                    await asyncio.sleep(0.01)
+                # The first fetch failed: live messages flow again, but the resume point stays at the gap
+                ds._mqtt_sub_callback(None, None, live(5))
+                during_retry = (received(ds), ds._last_result_time)
+                delivered = await fill
+            finally:
+                ds.get_parent_node().get_session().close()
+                await asyncio.sleep(0.05)
+                await runner.cleanup()
+            return ds, delivered, during_retry
+
+        ds, delivered, during_retry = asyncio.run(scenario())
+
+        assert during_retry == ([1, 4, 5], "2024-01-01T00:00:01Z")
+        assert [o["id"] for o in delivered] == ["o2", "o3"]
+        assert received(ds) == [1, 4, 5, 2, 3]
+        assert len(requests) == 2
+        assert ds._last_result_time == "2024-01-01T00:00:05Z" and ds._gap_since is None
+
+    def test_node_fills_gaps_of_started_datastreams_on_reconnect(self):
+        requests = []
+        loop = asyncio.new_event_loop()
+        runner, port = loop.run_until_complete(start_server(archive_handler(requests)))
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            ds = make_ws_datastream(port)
+            idle = Datastream(parent_node=ds.get_parent_node(), datastream_resource=ds.get_resource())
+            for stream in (ds, idle):
+                stream.initialize()
+                stream._status = Status.STARTED.value
+            ds._mqtt_sub_callback(None, None, live(3))
+            ds.get_parent_node()._on_mqtt_reconnect()
+            deadline = time.monotonic() + 5
+            while ds._gap_buffer is not None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            ds.get_parent_node().get_session().close()
+        finally:
+            asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(timeout=5)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.close()
+
+        assert received(ds) == [3, 4, 5]
+        # Nothing was received by the other stream yet, so it has no gap to fill
+        assert len(requests) == 4 and received(idle) == []
+
+
+class TestMQTTReconnect:
+    def test_resubscribes_and_notifies_listeners(self):
+        client = MQTTCommClient(url="localhost", client_id_suffix="test")
+        paho = client._MQTTCommClient__client
+        subscribed = []
+        paho.subscribe = lambda topic, qos: subscribed.append((topic, qos))
+        reconnects = []
+        client.add_reconnect_listener(lambda: reconnects.append(True))
+
+        client._on_connect(paho, None, None, 0, None)
+        client.subscribe("a/topic", qos=1)
+        client.subscribe("b/topic")
+        client.unsubscribe("b/topic")
+        assert reconnects == []
+
+        client._on_disconnect(paho, None, None, 7, None)
+        client._on_connect(paho, None, None, 0, None)
+        assert reconnects == [True]
+        assert subscribed[-1] == ("a/topic", 1) and len(subscribed) == 3
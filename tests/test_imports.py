@@ -140,6 +140,11 @@ def test_csapi4py_api_helper_importable():
     assert APIHelper is not None
 
 
+def test_csapi4py_query_model_importable():
+    from oshconnect.csapi4py import QueryModel
+    assert QueryModel is not None
+
+
 def test_csapi4py_all_list_present_and_complete():
     import oshconnect.csapi4py as csapi4py
     assert hasattr(csapi4py, "__all__")
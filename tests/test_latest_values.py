@@ -0,0 +1,87 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for the latest-value cache of datastreams and control stream status channels."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from aiohttp import web
+
+from src.oshconnect.events import DefaultEventTypes, EventBuilder, EventHandler
+from src.oshconnect.latestvalues import LatestValueCache
+from src.oshconnect.resource_datamodels import DatastreamResource
+from src.oshconnect.streamableresource import Datastream, SessionManager
+from tests.test_datastore import make_controlstream, make_node
+from tests.test_websocket_stream import make_ws_datastream, start_server
+
+
+def observation(result_time: str, value) -> SimpleNamespace:
+    return SimpleNamespace(topic="obs", payload=json.dumps({"resultTime": result_time, "result": {"v": value}}).encode())
+
+
+def make_datastreams(count: int) -> list[Datastream]:
+    node = make_node(SessionManager())
+    return [Datastream(parent_node=node, datastream_resource=DatastreamResource.model_validate({
+        "id": f"ds{i:04d}", "name": f"Datastream {i}",
+        "validTime": ["2024-01-01T00:00:00Z", "2025-01-01T00:00:00Z"],
+    })) for i in range(count)]
+
+
+class TestLatestValueCache:
+    def test_follows_observations_and_statuses(self):
+        cache = LatestValueCache()
+        cache.attach()
+        try:
+            datastreams = make_datastreams(1000)
+            for i, ds in enumerate(datastreams):
+                ds._mqtt_sub_callback(None, None, observation("2024-01-01T00:00:01Z", i))
+            datastreams[7]._mqtt_sub_callback(None, None, observation("2024-01-01T00:00:02Z", "new"))
+            cs = make_controlstream(datastreams[0].get_parent_node())
+            EventHandler().publish(EventBuilder().with_type(DefaultEventTypes.NEW_COMMAND_STATUS).with_topic("status")
+                                   .with_data(b'{"reportTime": "2024-01-01T00:00:03Z", "statusCode": "COMPLETED"}')
+                                   .with_producer(cs).build())
+        finally:
+            cache.detach()
+
+        latest = cache.get("ds0007")
+        assert latest.value == {"v": "new"} and latest.timestamp == "2024-01-01T00:00:02Z"
+        assert cache.get(datastreams[7]) is latest
+        assert cache.get("unknown") is None
+        assert cache.get_status(cs).record["statusCode"] == "COMPLETED"
+
+        snapshot = cache.snapshot()
+        assert len(snapshot) == len(cache) == 1000
+        assert snapshot["ds0999"].value == {"v": 999}
+        assert list(cache.snapshot([datastreams[1], "ds0002", "missing"])) == ["ds0001", "ds0002"]
+
+    def test_seeds_streams_without_live_values(self):
+        requests = []
+
+        async def handler(request):
+            requests.append(request.query["resultTime"])
+            return web.json_response({"items": [
+                {"resultTime": "2024-01-01T00:00:05Z", "result": {"v": 5}},
+                {"resultTime": "2024-01-01T00:00:04Z", "result": {"v": 4}},
+            ]})
+
+        async def scenario():
+            runner, port = await start_server(handler)
+            ds = make_ws_datastream(port)
+            cache = LatestValueCache()
+            try:
+                seeded = await cache.seed([ds])
+                # Already has a value: not requested again
+                assert await cache.seed([ds]) == 0
+            finally:
+                ds.get_parent_node().get_session().close()
+                await asyncio.sleep(0.05)
+                await runner.cleanup()
+            return cache, seeded
+
+        cache, seeded = asyncio.run(scenario())
+
+        assert seeded == 1 and requests == ["latest"]
+        assert cache.get("ds001").value == {"v": 5}
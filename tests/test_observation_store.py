@@ -0,0 +1,165 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for the local observation time-series store (SQLiteObservationStore)."""
+
+import json
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.oshconnect.datastore import RetentionPolicy
+from src.oshconnect.datastores import SQLiteObservationStore
+from src.oshconnect.events import DefaultEventTypes, EventHandler
+from src.oshconnect.events.builder import EventBuilder
+
+
+@pytest.fixture
+def store():
+    obs_store = SQLiteObservationStore(":memory:", flush_interval=0.01)
+    yield obs_store
+    obs_store.close()
+
+
+def fill(obs_store: SQLiteObservationStore, datastream_id: str, times):
+    obs_store.append_many((datastream_id, t, {"t": t}) for t in times)
+    obs_store.flush()
+
+
+class TestWritesAndQueries:
+    def test_time_range_query(self, store):
+        fill(store, "ds1", range(10))
+        fill(store, "ds2", range(5))
+
+        rows = store.query("ds1", start=3, end=6)
+        assert [t for t, _ in rows] == [3.0, 4.0, 5.0, 6.0]
+        assert rows[0][1] == {"t": 3}
+        assert store.count("ds1") == 10 and store.count() == 15
+
+    def test_descending_limit_and_latest(self, store):
+        fill(store, "ds1", [5, 1, 3])
+        assert [t for t, _ in store.query("ds1", descending=True, limit=2)] == [5.0, 3.0]
+        assert store.latest("ds1") == (5.0, {"t": 5})
+        assert store.latest("missing") is None
+
+    def test_duplicate_timestamps_are_kept(self, store):
+        store.append("ds1", 1.0, b'{"a": 1}')
+        store.append("ds1", 1.0, '{"a": 2}')
+        store.flush()
+        assert [obs for _, obs in store.query("ds1")] == [{"a": 1}, {"a": 2}]
+
+    def test_writes_are_batched(self):
+        obs_store = SQLiteObservationStore(":memory:", batch_size=100, flush_interval=5.0)
+        statements = []
+        obs_store._conn.set_trace_callback(statements.append)
+        obs_store.append_many(("ds1", float(t), {}) for t in range(250))
+        obs_store.flush()
+        assert statements.count("COMMIT") == 3
+        assert obs_store.count("ds1") == 250
+        obs_store.close()
+
+    def test_range_query_uses_primary_key(self, store):
+        plan = store._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT result_time, data FROM observations "
+            "WHERE datastream_id = ? AND result_time >= ? ORDER BY result_time", ("ds1", 0.0)
+        ).fetchall()
+        assert any("PRIMARY KEY" in row[3] for row in plan)
+        assert not any("TEMP B-TREE" in row[3] for row in plan)
+
+    def test_delete_range(self, store):
+        fill(store, "ds1", range(10))
+        assert store.delete_range("ds1", start=2, end=4) == 3
+        assert store.count("ds1") == 7
+
+    def test_persists_across_instances(self, tmp_path):
+        path = tmp_path / "obs.db"
+        first = SQLiteObservationStore(path)
+        first.append("ds1", 1.0, {"v": 1})
+        first.close()
+        second = SQLiteObservationStore(path)
+        second.append("ds1", 1.0, {"v": 2})
+        second.flush()
+        assert [obs["v"] for _, obs in second.query("ds1")] == [1, 2]
+        second.close()
+
+    def test_append_after_close_raises(self):
+        obs_store = SQLiteObservationStore(":memory:")
+        obs_store.close()
+        with pytest.raises(RuntimeError):
+            obs_store.append("ds1", 1.0, {})
+
+
+class TestRetention:
+    def test_max_age(self, store):
+        fill(store, "ds1", range(100))
+        store.set_retention(RetentionPolicy(max_age=10))
+        assert store.apply_retention(now=100.0) == 90
+        assert store.query("ds1")[0][0] == 90.0
+
+    def test_max_count_per_datastream(self, store):
+        fill(store, "ds1", range(20))
+        fill(store, "ds2", range(20))
+        store.set_retention(RetentionPolicy(max_count=5), datastream_id="ds1")
+        store.apply_retention()
+        assert [t for t, _ in store.query("ds1")] == [15.0, 16.0, 17.0, 18.0, 19.0]
+        assert store.count("ds2") == 20
+
+    def test_downsampling(self, store):
+        fill(store, "ds1", [t / 2 for t in range(40)])  # 0.0 .. 19.5 every 0.5 s
+        store.set_retention(RetentionPolicy(downsample_after=10, downsample_interval=5))
+        store.apply_retention(now=20.0)
+        times = [t for t, _ in store.query("ds1")]
+        # Before the 10 s cutoff only the first observation of each 5 s bucket survives
+        assert times[:2] == [0.0, 5.0]
+        assert times[2:] == [t / 2 for t in range(20, 40)]
+        # Idempotent
+        assert store.apply_retention(now=20.0) == 0
+
+    def test_retention_runs_while_idle(self):
+        store = SQLiteObservationStore(":memory:", flush_interval=0.01, retention_interval=0.05)
+        try:
+            fill(store, "ds1", range(20))
+            store.set_retention(RetentionPolicy(max_count=5))
+            # Nothing else is appended: the writer still wakes up for retention
+            deadline = time.monotonic() + 5.0
+            while store.count("ds1") > 5 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert store.count("ds1") == 5
+        finally:
+            store.close()
+
+    def test_policies_change_under_the_lock(self, store):
+        fill(store, "ds1", range(20))
+        # Set from another thread than the writer's, which applies the policies
+        setter = threading.Thread(target=store.set_retention, args=(RetentionPolicy(max_count=5), "ds1"))
+        with store._lock:
+            setter.start()
+            setter.join(timeout=0.1)
+            assert setter.is_alive()
+        setter.join(timeout=5)
+        assert store.apply_retention() == 15
+
+
+class TestDatastreamFeed:
+    def test_attach_records_inbound_observations(self, store):
+        ds = MagicMock()
+        ds.get_id.return_value = "ds1"
+        ds._topic = "/api/datastreams/ds1/observations:data"
+        store.attach(ds)
+
+        for stamp in ("2024-06-18T15:46:32Z", "2024-06-18T15:46:33Z"):
+            EventHandler().publish(
+                EventBuilder().with_type(DefaultEventTypes.NEW_OBSERVATION).with_topic(ds._topic)
+                .with_data(json.dumps({"resultTime": stamp, "result": {"x": 1}}).encode()).build())
+        store.detach(ds)
+        EventHandler().publish(
+            EventBuilder().with_type(DefaultEventTypes.NEW_OBSERVATION).with_topic(ds._topic)
+            .with_data(json.dumps({"resultTime": "2024-06-18T15:46:34Z"}).encode()).build())
+        store.flush()
+
+        rows = store.query("ds1")
+        assert len(rows) == 2
+        assert rows[1][1]["resultTime"] == "2024-06-18T15:46:33Z"
@@ -0,0 +1,174 @@
+#  =============================================================================
+#  Copyright (c) 2026 Botts Innovative Research Inc.
+#  Author: Ian Patterson
+#  Contact Email: ian@botts-inc.com
+#  =============================================================================
+"""
+Tests for validating observation results against a datastream record schema
+via the compiled, cached RecordValidator.
+"""
+from __future__ import annotations
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.oshconnect.csapi4py.default_api_helpers import APIHelper
+from src.oshconnect.resource_datamodels import DatastreamResource, ObservationResource
+from src.oshconnect.schema_datamodels import JSONDatastreamRecordSchema, SWEDatastreamRecordSchema
+from src.oshconnect.schema_validation import clear_validator_cache, compile_record_validator
+from src.oshconnect.streamableresource import Datastream
+from src.oshconnect.timemanagement import TimeInstant
+
+
+def make_record_schema(**quantity_overrides) -> SWEDatastreamRecordSchema:
+    quantity = {
+        "type": "Quantity",
+        "name": "temperature",
+        "label": "Temperature",
+        "definition": "http://example.org/Temperature",
+        "uom": {"code": "Cel"},
+    }
+    quantity.update(quantity_overrides)
+    return SWEDatastreamRecordSchema.model_validate({
+        "obsFormat": "application/swe+json",
+        "recordSchema": {
+            "type": "DataRecord",
+            "name": "weather",
+            "fields": [
+                {
+                    "type": "Time",
+                    "name": "timestamp",
+                    "label": "Timestamp",
+                    "definition": "http://www.opengis.net/def/property/OGC/0/SamplingTime",
+                    "uom": {"href": "http://www.opengis.net/def/uom/ISO-8601/0/Gregorian"},
+                },
+                quantity,
+                {
+                    "type": "Text",
+                    "name": "note",
+                    "label": "Note",
+                    "definition": "http://example.org/Note",
+                    "optional": True,
+                },
+                {
+                    "type": "DataRecord",
+                    "name": "location",
+                    "fields": [
+                        {"type": "Quantity", "name": "lat", "label": "Lat", "definition": "http://example.org/lat",
+                         "uom": {"code": "deg"}},
+                        {"type": "Quantity", "name": "lon", "label": "Lon", "definition": "http://example.org/lon",
+                         "uom": {"code": "deg"}},
+                    ],
+                },
+            ],
+        },
+    })
+
+
+def valid_result() -> dict:
+    return {
+        "timestamp": "2026-01-01T00:00:00Z",
+        "temperature": 21.5,
+        "location": {"lat": 34.7, "lon": -86.6},
+    }
+
+
+def observation(result: dict) -> ObservationResource:
+    return ObservationResource(result=result, result_time=TimeInstant.now_as_time_instant())
+
+
+class TestRecordValidator:
+    def test_valid_result_passes(self):
+        observation(valid_result()).validate_against_schema(make_record_schema())
+
+    def test_missing_required_field(self):
+        result = valid_result()
+        del result["temperature"]
+        with pytest.raises(ValueError, match="temperature"):
+            observation(result).validate_against_schema(make_record_schema())
+
+    def test_optional_field_may_be_omitted_but_is_type_checked(self):
+        schema = make_record_schema()
+        result = valid_result()
+        observation(result).validate_against_schema(schema)
+        result["note"] = 5
+        with pytest.raises(ValueError, match="note"):
+            observation(result).validate_against_schema(schema)
+
+    def test_wrong_type(self):
+        result = valid_result()
+        result["temperature"] = True
+        with pytest.raises(ValueError, match="Quantity"):
+            observation(result).validate_against_schema(make_record_schema())
+
+    def test_quantity_special_values(self):
+        schema = make_record_schema()
+        result = valid_result()
+        result["temperature"] = "NaN"
+        observation(result).validate_against_schema(schema)
+        result["temperature"] = "hot"
+        with pytest.raises(ValueError, match="temperature"):
+            observation(result).validate_against_schema(schema)
+
+    def test_nested_record_fields(self):
+        result = valid_result()
+        result["location"] = {"lat": 34.7}
+        with pytest.raises(ValueError, match="location.lon"):
+            observation(result).validate_against_schema(make_record_schema())
+
+    def test_quantity_interval_constraint(self):
+        schema = make_record_schema(constraint={"intervals": [[-40, 60]]})
+        observation(valid_result()).validate_against_schema(schema)
+        result = valid_result()
+        result["temperature"] = 100.0
+        with pytest.raises(ValueError, match="allowed"):
+            observation(result).validate_against_schema(schema)
+
+    def test_nil_values_bypass_checks(self):
+        schema = make_record_schema(constraint={"intervals": [[-40, 60]]},
+                                    nilValues=[{"reason": "http://example.org/missing", "value": -9999}])
+        result = valid_result()
+        result["temperature"] = -9999
+        observation(result).validate_against_schema(schema)
+
+    def test_json_schema_without_result_schema_accepts_anything(self):
+        schema = JSONDatastreamRecordSchema()
+        observation({"anything": [1, 2, 3]}).validate_against_schema(schema)
+
+    def test_validator_is_cached_per_schema(self):
+        clear_validator_cache()
+        schema = make_record_schema()
+        assert compile_record_validator(schema) is compile_record_validator(schema)
+        assert compile_record_validator(make_record_schema()) is not compile_record_validator(schema)
+
+    def test_validator_is_flat(self):
+        validator = compile_record_validator(make_record_schema())
+        paths = [c.dotted_path for c in validator.checks]
+        assert paths == ["timestamp", "temperature", "note", "location", "location.lat", "location.lon"]
+
+
+class TestDatastreamCreateObservation:
+    def make_datastream(self, record_schema=None) -> Datastream:
+        node = MagicMock()
+        node.get_api_helper.return_value = APIHelper(server_url="localhost", port=8282, protocol="http")
+        node.get_mqtt_client.return_value = None
+        ds_resource = DatastreamResource.model_validate({
+            "id": "ds001",
+            "name": "Test Datastream",
+            "validTime": ["2024-01-01T00:00:00Z", "2025-01-01T00:00:00Z"],
+        })
+        ds_resource.record_schema = record_schema
+        return Datastream(parent_node=node, datastream_resource=ds_resource)
+
+    def test_create_observation_validates(self):
+        ds = self.make_datastream(make_record_schema())
+        obs = ds.create_observation(valid_result())
+        assert obs.result["temperature"] == 21.5
+        with pytest.raises(ValueError):
+            ds.create_observation({"timestamp": "2026-01-01T00:00:00Z"})
+
+    def test_create_observation_without_schema(self):
+        ds = self.make_datastream()
+        obs = ds.create_observation({"x": 1})
+        assert obs.result == {"x": 1}
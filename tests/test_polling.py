@@ -0,0 +1,151 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for incremental HTTP polling of datastreams and the PollScheduler — no OSH server required."""
+
+import asyncio
+import json
+
+from aiohttp import web
+
+from src.oshconnect.csapi4py import request_wrappers
+from src.oshconnect.polling import PollScheduler, _PollEntry
+from src.oshconnect.streamableresource import SessionManager
+from tests.test_datastore import make_datastream, make_node
+from tests.test_websocket_stream import make_ws_datastream, start_server, wait_for
+
+
+class FakeResponse:
+    def __init__(self, items=(), status_code=200, headers=None, next_url=None):
+        self._items = list(items)
+        self._next_url = next_url
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = headers or {}
+        self.text = ""
+
+    def json(self):
+        body = {"items": self._items}
+        if self._next_url is not None:
+            body["links"] = [{"rel": "next", "href": self._next_url}]
+        return body
+
+
+def obs(obs_id, result_time):
+    return {"id": obs_id, "resultTime": result_time, "result": {"v": obs_id}}
+
+
+class TestDatastreamPoll:
+    def test_requests_only_newer_observations(self, monkeypatch):
+        node = make_node(SessionManager())
+        ds = make_datastream(node)
+        ds._last_result_time = "2024-01-01T00:00:00Z"
+        responses = [
+            FakeResponse([obs("o1", "2024-01-01T00:00:01Z"), obs("o2", "2024-01-01T00:00:02Z")]),
+            # The interval includes its start: o2 comes back and is skipped
+            FakeResponse([obs("o2", "2024-01-01T00:00:02Z"), obs("o3", "2024-01-01T00:00:02Z")]),
+            FakeResponse([obs("o3", "2024-01-01T00:00:02Z")], headers={"ETag": '"v7"'}),
+            FakeResponse(status_code=304),
+        ]
+        calls = []
+
+        def retrieve_url(url, params=None, req_headers=None):
+            calls.append((params, req_headers))
+            return responses.pop(0)
+
+        monkeypatch.setattr(node.get_api_helper(), "retrieve_url", retrieve_url)
+
+        assert [o["id"] for o in ds.poll()] == ["o1", "o2"]
+        assert [o["id"] for o in ds.poll()] == ["o3"]
+        assert ds.poll() == []
+        assert ds.poll() == []
+
+        assert [params["resultTime"] for params, _ in calls] == [
+            "2024-01-01T00:00:00Z/..", "2024-01-01T00:00:02Z/..",
+            "2024-01-01T00:00:02Z/..", "2024-01-01T00:00:02Z/.."]
+        assert [headers for _, headers in calls] == [{}, {}, {}, {"If-None-Match": '"v7"'}]
+        assert [json.loads(p)["id"] for p in ds.get_inbound_deque()] == ["o1", "o2", "o3"]
+
+    def test_follows_next_links(self, monkeypatch):
+        node = make_node(SessionManager())
+        ds = make_datastream(node)
+        ds._last_result_time = "2024-01-01T00:00:00Z"
+        next_url = "http://localhost:8282/sensorhub/api/datastreams/ds001/observations?offset=1"
+        responses = [
+            FakeResponse([obs("o1", "2024-01-01T00:00:01Z")], next_url=next_url),
+            FakeResponse([obs("o2", "2024-01-01T00:00:02Z")]),
+        ]
+        calls = []
+
+        def get(url, params=None, headers=None, auth=None):
+            calls.append((str(url), params, headers))
+            return responses.pop(0)
+
+        monkeypatch.setattr(request_wrappers.requests, "get", get)
+
+        assert [o["id"] for o in ds.poll(limit=1)] == ["o1", "o2"]
+        assert calls[0][1] == {"resultTime": "2024-01-01T00:00:00Z/..", "limit": 1}
+        assert calls[1] == (next_url, {}, {})
+        assert ds._last_result_time == "2024-01-01T00:00:02Z"
+
+
+class TestPollScheduler:
+    def test_interval_follows_data_rate(self):
+        scheduler = PollScheduler(session=None, min_interval=1.0, max_interval=60.0, target_batch=10)
+        entry = _PollEntry(datastream=None, interval=5.0)
+        scheduler._adapt(entry, 0, now=100.0)
+        assert entry.interval == 7.5
+        # 50 observations in 10 s: 5/s, so 10 per poll takes 2 s
+        scheduler._adapt(entry, 50, now=110.0)
+        assert entry.interval == 2.0
+        # Faster than target_batch per min_interval: clamped
+        scheduler._adapt(entry, 1000, now=112.0)
+        assert entry.interval == 1.0
+        for i in range(20):
+            scheduler._adapt(entry, None, now=120.0 + i)
+        assert entry.interval == 60.0
+
+    def test_polls_local_server(self):
+        requests = []
+        observations = [obs("o1", "2024-01-01T00:00:01Z"), obs("o2", "2024-01-01T00:00:02Z")]
+
+        async def handler(request):
+            requests.append((request.query.get("resultTime"), request.headers.get("If-None-Match"),
+                             request.headers.get("Authorization")))
+            if request.headers.get("If-None-Match") == '"idle"':
+                return web.Response(status=304)
+            since = request.query["resultTime"].split("/")[0]
+            items = [o for o in observations if o["resultTime"] >= since]
+            return web.json_response({"items": items}, headers={"ETag": '"idle"'})
+
+        async def scenario():
+            runner, port = await start_server(handler)
+            ds = make_ws_datastream(port)
+            ds.should_poll = True
+            ds._last_result_time = "2024-01-01T00:00:00Z"
+            scheduler = ds.get_parent_node().get_session().get_poll_scheduler()
+            scheduler.min_interval = scheduler.max_interval = 0.01
+            try:
+                ds.initialize()
+                ds.start()
+                assert ds in scheduler
+                await wait_for(lambda: len(requests) >= 4)
+                assert len(ds.get_inbound_deque()) == 2
+                await ds.get_msg_reader_queue().get()
+            finally:
+                ds.stop()
+                assert ds not in scheduler
+                ds.get_parent_node().get_session().close()
+                await asyncio.sleep(0.05)
+                await runner.cleanup()
+            return ds
+
+        ds = asyncio.run(scenario())
+
+        assert requests[0][0] == "2024-01-01T00:00:00Z/.."
+        assert requests[1][:2] == ("2024-01-01T00:00:02Z/..", None)
+        # Once the stream is idle, the server's ETag is repeated and answered with 304
+        assert requests[2][:2] == ("2024-01-01T00:00:02Z/..", '"idle"')
+        assert all(auth == "Basic YWRtaW46c2VjcmV0" for _, _, auth in requests)
+        assert ds._last_result_time == "2024-01-01T00:00:02Z"
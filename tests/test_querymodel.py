@@ -0,0 +1,119 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for QueryModel translation and its pushdown into discovery and fetch requests."""
+
+from shapely import Point
+
+from src.oshconnect.csapi4py import request_wrappers
+from src.oshconnect.csapi4py.querymodel import QueryModel
+from src.oshconnect.streamableresource import SessionManager
+from src.oshconnect.timemanagement import TimePeriod
+from tests.test_datastore import make_datastream, make_node, make_system
+
+
+class FakeResponse:
+    ok = True
+
+    def __init__(self, items):
+        self._items = items
+
+    def json(self):
+        return {"items": self._items}
+
+
+class TestQueryModel:
+    def test_only_set_fields_are_sent(self):
+        assert QueryModel().to_params() == {}
+        query = QueryModel(q="weather,wind", observed_property=["temp"], limit=50, recursive=True)
+        assert query.to_params() == {
+            "q": "weather,wind",
+            "observedProperty": "temp",
+            "recursive": "true",
+            "limit": "50",
+        }
+
+    def test_times_and_geometries(self):
+        query = QueryModel(valid_time=TimePeriod(start="2024-01-01T00:00:00Z", end="2024-02-01T00:00:00Z"),
+                           location=Point(1, 2), bbox=[0, 0, 5, 5])
+        params = query.to_params()
+        assert params["validTime"].startswith("2024-01-01T00:00:00") and "/2024-02-01" in params["validTime"]
+        assert params["location"] == "POINT (1 2)"
+        assert params["bbox"] == "0,0,5,5"
+        geojson = QueryModel(geom={"type": "Point", "coordinates": [3, 4]})
+        assert geojson.to_params() == {"geom": "POINT (3 4)"}
+
+    def test_select_keeps_required_fields(self):
+        assert QueryModel(select="label").to_params(keep_fields=("id", "name")) == {"select": "label,id,name"}
+        assert QueryModel(select=["!name", "!description"]).to_params(keep_fields=("name",)) == \
+            {"select": "!description"}
+        assert QueryModel(select=["!name"]).to_params(keep_fields=("name",)) == {}
+
+
+class TestPushdown:
+    def test_discover_systems_sends_query(self, monkeypatch):
+        node = make_node(SessionManager())
+        calls = []
+
+        def retrieve_resource(res_type, req_headers=None, params=None, **kwargs):
+            calls.append(params)
+            return FakeResponse([{"type": "Feature", "id": "sys001",
+                                  "properties": {"name": "Weather Station", "uid": "urn:test:ws"}}])
+
+        monkeypatch.setattr(node.get_api_helper(), "retrieve_resource", retrieve_resource)
+        systems = node.discover_systems(bbox=[0, 0, 1, 1], query=QueryModel(q="weather", select=["name"]))
+
+        assert calls == [{"q": "weather", "select": "name,id,uid", "bbox": "0,0,1,1"}]
+        assert [s.urn for s in systems] == ["urn:test:ws"]
+
+    def test_discover_datastreams_sends_query(self, monkeypatch):
+        node = make_node(SessionManager())
+        system = make_system(node)
+        calls = []
+
+        def get_resource(resource_type, resource_id=None, subresource_type=None, req_headers=None, params=None):
+            calls.append((resource_id, params))
+            return FakeResponse([{"id": "ds1", "name": "Temperature",
+                                  "validTime": ["2024-01-01T00:00:00Z", "2025-01-01T00:00:00Z"]}])
+
+        monkeypatch.setattr(node.get_api_helper(), "get_resource", get_resource)
+        datastreams = system.discover_datastreams(QueryModel(observed_property=["temp"], limit=5))
+
+        assert calls == [("sys001", {"observedProperty": "temp", "limit": "5"})]
+        assert [ds.get_id() for ds in datastreams] == ["ds1"]
+
+    def test_fetch_merges_query(self, monkeypatch):
+        node = make_node(SessionManager())
+        ds = make_datastream(node)
+        calls = []
+
+        def retrieve_resource(res_type, parent_res_id=None, params=None, **kwargs):
+            calls.append(params)
+            return FakeResponse([{"resultTime": "2024-01-01T00:00:00Z", "result": {}}])
+
+        monkeypatch.setattr(node.get_api_helper(), "retrieve_resource", retrieve_resource)
+        ds.fetch(query=QueryModel(foi=["f1"], select=["result"]))
+
+        assert calls == [{"limit": 1000, "foi": "f1", "select": "result"}]
+
+    def test_discovery_without_query(self, monkeypatch):
+        node = make_node(SessionManager())
+        system = make_system(node)
+        calls = []
+        bodies = [
+            [{"type": "Feature", "id": "sys002", "properties": {"name": "Buoy", "uid": "urn:test:buoy"}}],
+            [{"id": "ds1", "name": "Temperature", "validTime": ["2024-01-01T00:00:00Z", "2025-01-01T00:00:00Z"]}],
+            [{"id": "cs1", "name": "Pan"}],
+        ]
+
+        def get(url, params=None, headers=None, auth=None):
+            calls.append((str(url).rsplit("/api/", 1)[1], params))
+            return FakeResponse(bodies.pop(0))
+
+        monkeypatch.setattr(request_wrappers.requests, "get", get)
+
+        assert [s.urn for s in node.discover_systems()] == ["urn:test:buoy"]
+        assert [ds.get_id() for ds in system.discover_datastreams()] == ["ds1"]
+        assert [cs._resource_id for cs in system.discover_controlstreams()] == ["cs1"]
+        assert calls == [("systems", {}), ("systems/sys001/datastreams", {}), ("systems/sys001/controlstreams", {})]
@@ -0,0 +1,140 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for the ResourceRegistry and the OSHConnect lookups built on it — no live OSH server required."""
+
+from src.oshconnect import OSHConnect
+from src.oshconnect.datastores import SQLiteDataStore
+from src.oshconnect.registry import ResourceRegistry
+from src.oshconnect.streamableresource import ControlStream, Datastream, SessionManager, System
+from tests.test_datastore import make_graph
+
+
+class TestResourceRegistry:
+    def test_indexes(self):
+        node = make_graph(SessionManager(), num_systems=3)
+        registry = ResourceRegistry()
+        assert registry.add_all(node.systems()) == 3
+        system = node.systems()[1]
+        ds = system.datastreams[0]
+
+        # Registering a System registers its streams too
+        assert len(registry) == 9
+        assert registry.get(system.get_internal_id()) is system
+        assert registry.get(str(ds.get_internal_id())) is ds
+        assert registry.get_by_resource_id("sys001", System) is system
+        assert registry.get_system_by_urn("urn:test:sensors:sys1") is system
+        assert isinstance(registry.get_by_resource_id("cs001"), ControlStream)
+        assert registry.get("not-a-uuid") is None
+
+    def test_tracked_assignments_reindex(self):
+        node = make_graph(SessionManager(), num_systems=1)
+        registry = ResourceRegistry()
+        registry.add_all(node.systems())
+        system = node.systems()[0]
+        ds = system.datastreams[0]
+
+        ds._topic = "api/datastreams/ds001/observations"
+        assert registry.get_by_topic("api/datastreams/ds001/observations") is ds
+        ds._topic = "api/datastreams/ds002/observations"
+        assert registry.get_by_topic("api/datastreams/ds001/observations") is None
+        assert registry.get_by_topic("api/datastreams/ds002/observations") is ds
+
+        system._resource_id = "renamed"
+        assert registry.get_by_resource_id("sys000", System) is None
+        assert registry.get_by_resource_id("renamed", System) is system
+
+    def test_remove_cascades_and_detaches(self):
+        node = make_graph(SessionManager(), num_systems=2)
+        registry = ResourceRegistry()
+        registry.add_all(node.systems())
+        system = node.systems()[0]
+        ds = system.datastreams[0]
+
+        assert registry.remove(system) is system
+        assert system not in registry and ds not in registry
+        assert len(registry) == 3
+        assert registry.get_system_by_urn("urn:test:sensors:sys0") is None
+        # A removed resource no longer updates the indexes
+        ds._topic = "stale"
+        assert registry.get_by_topic("stale") is None
+
+    def test_lazy_entries_load_on_demand(self):
+        sm = SessionManager()
+        store = SQLiteDataStore(":memory:", lazy=True)
+        store.save_all([make_graph(sm, num_systems=3)])
+        systems = store.load_all(session_manager=sm)[0].systems()
+        registry = ResourceRegistry()
+        registry.add_all(systems)
+        assert systems.loaded_count() == 0
+
+        first = registry.get(systems.entries()[0].resource_id)
+        assert first.name == "system_0"
+        assert systems.loaded_count() == 1
+        ds = first.datastreams[0]
+        assert ds in registry
+        assert registry.get(ds.get_internal_id()) is ds
+
+        # A miss on a secondary index loads the remaining entries once
+        assert registry.get_system_by_urn("urn:test:sensors:sys2").name == "system_2"
+        assert systems.loaded_count() == 3
+        assert len(registry.systems()) == 3
+
+
+class TestOSHConnectLookups:
+    def test_find_after_load_from_store(self):
+        sm = SessionManager()
+        store = SQLiteDataStore(":memory:")
+        node = make_graph(sm, num_systems=3)
+        store.save_all([node])
+        app = OSHConnect(name="registry-app", datastore=store)
+        app.load_from_store()
+
+        system = app.find_system("sys002")
+        assert system.name == "system_2"
+        assert app.find_system("urn:test:sensors:sys2") is system
+        assert app.find_system(system.get_internal_id()) is system
+        assert app.find_system("missing") is None
+        assert len(app.get_datastreams()) == 3
+
+        ds = system.datastreams[0]
+        assert app.find_datastream(ds.get_internal_id()) is ds
+        assert isinstance(app.find_datastream("ds001"), Datastream)
+        assert app.find_controlstream(str(system.control_channels[0].get_internal_id())) is not None
+
+        systems, datastreams = app.get_resource_group([system.get_internal_id(), ds.get_internal_id()])
+        assert systems == [system] and datastreams == [ds]
+
+    def test_remove_system(self):
+        sm = SessionManager()
+        store = SQLiteDataStore(":memory:")
+        store.save_all([make_graph(sm, num_systems=2)])
+        app = OSHConnect(name="registry-app", datastore=store)
+        app.load_from_store()
+        system = app.find_system("sys000")
+
+        assert app.remove_system("sys000") is system
+        assert app.find_system("sys000") is None
+        assert [s.name for s in app._nodes[0].systems()] == ["system_1"]
+        assert [s.name for s in app._systems] == ["system_1"]
+        assert len(app.get_datastreams()) == 1
+        assert app.remove_system("sys000") is None
+
+    def test_remove_node_filters_the_flat_lists_once(self, monkeypatch):
+        sm = SessionManager()
+        store = SQLiteDataStore(":memory:")
+        store.save_all([make_graph(sm, num_systems=20), make_graph(sm, num_systems=5)])
+        app = OSHConnect(name="registry-app", datastore=store)
+        app.load_from_store()
+        removed, kept = app._nodes
+        registry = app.get_registry()
+        lookups = []
+        contains = ResourceRegistry.__contains__
+        monkeypatch.setattr(ResourceRegistry, "__contains__", lambda self, r: lookups.append(r) or contains(self, r))
+
+        app.remove_node(removed.get_id())
+        # One pass over the 25 systems, 25 datastreams and 25 control streams
+        assert len(lookups) == 75
+        assert [s.name for s in app._systems] == [s.name for s in kept.systems()]
+        assert len(app.get_datastreams()) == 5 and len(registry) == 15
@@ -0,0 +1,102 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for fanning observations out to local processes through a shared memory ring buffer."""
+
+import multiprocessing
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from src.oshconnect.ringbuffer import RingBufferReader, RingBufferWriter
+from src.oshconnect.streamableresource import SessionManager
+from tests.test_datastore import make_datastream, make_node
+
+
+def unique_name() -> str:
+    return f"osh_test_{uuid.uuid4().hex[:12]}"
+
+
+def read_bytes(reader, max_records=None) -> list[bytes]:
+    views = reader.read(max_records)
+    records = [bytes(view) for view in views]
+    for view in views:
+        view.release()
+    return records
+
+
+def read_in_child(name, results):
+    reader = RingBufferReader(name, start="oldest")
+    results.put(read_bytes(reader))
+    reader.close()
+
+
+class TestRingBuffer:
+    def test_independent_readers_and_wrap_around(self):
+        writer = RingBufferWriter(unique_name(), capacity=256)
+        fast, slow = RingBufferReader(writer.name), RingBufferReader(writer.name)
+        try:
+            received = []
+            for i in range(40):
+                writer.write(f"record-{i:02d}".encode())
+                if i % 3 == 2:
+                    received.extend(read_bytes(fast))
+            received.extend(read_bytes(fast))
+            assert received == [f"record-{i:02d}".encode() for i in range(40)]
+            assert fast.get_lost_count() == 0 and fast.get_lag() == 0
+
+            # Never read while the writer wrapped around several times: only the newest records are left
+            kept = read_bytes(slow)
+            assert kept == [f"record-{i:02d}".encode() for i in range(40 - len(kept), 40)]
+            assert slow.get_lost_count() == 40 - len(kept) > 0
+        finally:
+            fast.close()
+            slow.close()
+            writer.close()
+
+    def test_fixed_size_records_and_read_only_views(self):
+        writer = RingBufferWriter(unique_name(), capacity=1024, record_size=16)
+        reader = RingBufferReader(writer.name, start="oldest")
+        try:
+            writer.write(b"abc")
+            writer.write(b"0123456789abcdef")
+            with pytest.raises(ValueError):
+                writer.write(b"x" * 17)
+            views = reader.read(max_records=1)
+            assert bytes(views[0]) == b"abc" and views[0].readonly
+            with pytest.raises(TypeError):
+                views[0][0] = 0
+            views[0].release()
+            assert read_bytes(reader) == [b"0123456789abcdef"]
+        finally:
+            reader.close()
+            writer.close()
+
+    def test_reader_in_another_process(self):
+        writer = RingBufferWriter(unique_name())
+        try:
+            for i in range(3):
+                writer.write(f"obs {i}".encode())
+            results = multiprocessing.Queue()
+            child = multiprocessing.Process(target=read_in_child, args=(writer.name, results))
+            child.start()
+            assert results.get(timeout=10) == [b"obs 0", b"obs 1", b"obs 2"]
+            child.join(timeout=10)
+            assert child.exitcode == 0
+        finally:
+            writer.close()
+
+    def test_datastream_publishes_inbound_payloads(self):
+        ds = make_datastream(make_node(SessionManager()))
+        name = ds.publish_ring_buffer(capacity=4096, name=unique_name())
+        reader = RingBufferReader(name)
+        try:
+            ds._mqtt_sub_callback(None, None, SimpleNamespace(topic="t", payload=b'{"result": {"v": 1}}'))
+            ds._deliver_inbound('{"result": {"v": 2}}')
+            assert read_bytes(reader) == [b'{"result": {"v": 1}}', b'{"result": {"v": 2}}']
+        finally:
+            reader.close()
+            ds.close_ring_buffer()
+        assert ds.get_ring_buffer_name() is None
@@ -0,0 +1,126 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for the SpatialIndex and spatial system queries — no live OSH server required."""
+
+import pytest
+from shapely import Polygon
+
+from src.oshconnect import OSHConnect
+from src.oshconnect.datastores import SQLiteDataStore
+from src.oshconnect.resource_datamodels import SystemResource
+from src.oshconnect.spatial import SpatialIndex, spatial_query_params
+from src.oshconnect.streamableresource import SessionManager
+from tests.test_datastore import make_graph
+
+
+def locate(system, x: float, y: float):
+    system.set_system_resource(SystemResource.model_validate({
+        "type": "Feature",
+        "id": system._resource_id,
+        "properties": {"name": system.name, "uid": system.urn},
+        "geometry": {"type": "Point", "coordinates": [x, y]},
+    }))
+
+
+class FakeResponse:
+    ok = True
+
+    def __init__(self, items):
+        self._items = items
+
+    def json(self):
+        return {"items": self._items}
+
+
+class TestSpatialIndex:
+    def test_queries_before_and_after_rebuild(self):
+        index = SpatialIndex(rebuild_threshold=4)
+        for i in range(10):
+            index.add(i, [float(i), float(i)])
+
+        assert sorted(index.in_bbox([2.5, 2.5, 5, 5])) == [3, 4, 5]
+        assert index.nearest([7.2, 7.2], k=3) == [7, 8, 6]
+        # Updates land in the pending set until the next rebuild
+        index.add(3, [100.0, 100.0])
+        index.remove(4)
+        assert sorted(index.in_bbox([2.5, 2.5, 5, 5])) == [5]
+        assert index.nearest([99.0, 99.0]) == [3]
+        assert sorted(index.within(Polygon([(0, 0), (2, 0), (2, 2), (0, 2)]))) == [0, 1, 2]
+
+    def test_nearest_honours_max_distance(self):
+        index = SpatialIndex(rebuild_threshold=0)
+        index.add("a", [0.0, 0.0])
+        index.add("b", [10.0, 0.0])
+        assert index.nearest([1.0, 0.0], k=2, max_distance=5) == ["a"]
+        assert index.nearest([1.0, 0.0], k=5) == ["a", "b"]
+
+    def test_geojson_and_empty_geometries(self):
+        index = SpatialIndex()
+        feature = {"type": "Feature", "id": "f1", "geometry": {"type": "Point", "coordinates": [1, 2]}}
+        assert index.add("f1", feature, feature)
+        assert not index.add("f2", {"type": "Feature", "id": "f2", "geometry": None})
+        assert index.intersects([0, 0, 5, 5]) == [feature]
+        assert len(index) == 1
+
+    def test_query_params(self):
+        square = Polygon([(0, 0), (1, 0), (1, 1), (0, 1)])
+        assert spatial_query_params(bbox=[-1, -2, 3, 4]) == {"bbox": "-1,-2,3,4"}
+        assert spatial_query_params(bbox=square) == {"bbox": "0.0,0.0,1.0,1.0"}
+        assert spatial_query_params(location=square)["location"].startswith("POLYGON")
+
+
+class TestSystemSpatialQueries:
+    def make_app(self, num_systems: int = 4, spatial_index: bool = True) -> OSHConnect:
+        sm = SessionManager()
+        store = SQLiteDataStore(":memory:")
+        node = make_graph(sm, num_systems=num_systems)
+        for i, system in enumerate(node.systems()):
+            locate(system, float(i), 0.0)
+        store.save_all([node])
+        app = OSHConnect(name="spatial-app", datastore=store, spatial_index=spatial_index)
+        app.load_from_store()
+        return app
+
+    def test_index_follows_location_changes(self):
+        app = self.make_app()
+        assert sorted(s.name for s in app.find_systems_in_bbox([0.5, -1, 2.5, 1])) == ["system_1", "system_2"]
+        assert [s.name for s in app.find_nearest_systems([3.2, 0], k=2)] == ["system_3", "system_2"]
+
+        moved = app.find_system("sys001")
+        locate(moved, 50.0, 50.0)
+        assert [s.name for s in app.find_systems_in_bbox([0.5, -1, 2.5, 1])] == ["system_2"]
+        assert app.find_nearest_systems([49, 49]) == [moved]
+
+        app.remove_system("sys002")
+        assert app.find_systems_in_bbox([0.5, -1, 2.5, 1]) == []
+
+    def test_enabling_later_indexes_known_systems(self):
+        app = self.make_app(spatial_index=False)
+        with pytest.raises(RuntimeError):
+            app.find_nearest_systems([0, 0])
+        app.enable_spatial_index()
+        assert len(app.find_systems_within(Polygon([(-1, -1), (5, -1), (5, 1), (-1, 1)]))) == 4
+
+    def test_remote_query_pushes_bbox_down(self, monkeypatch):
+        app = self.make_app(num_systems=2)
+        node = app._nodes[0]
+        calls = []
+
+        def retrieve_resource(res_type, req_headers=None, params=None, **kwargs):
+            calls.append(params)
+            return FakeResponse([{
+                "type": "Feature", "id": "sys001",
+                "properties": {"name": "system_1", "uid": "urn:test:sensors:sys1"},
+                "geometry": {"type": "Point", "coordinates": [7.0, 7.0]},
+            }])
+
+        monkeypatch.setattr(node.get_api_helper(), "retrieve_resource", retrieve_resource)
+        found = app.find_systems_in_bbox([5, 5, 10, 10], remote=True)
+
+        assert calls == [{"bbox": "5,5,10,10"}]
+        # The returned system is already known: it is updated, not duplicated
+        assert found == [app.find_system("sys001")]
+        assert len(node.systems()) == 2
+        assert app.find_systems_in_bbox([5, 5, 10, 10]) == found
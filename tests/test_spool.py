@@ -0,0 +1,93 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for the store-and-forward outbound spool and its use by MQTTCommClient — no broker required."""
+
+import time
+from types import SimpleNamespace
+
+import paho.mqtt.client as mqtt
+import pytest
+
+from src.oshconnect.csapi4py.mqtt import MQTTCommClient
+from src.oshconnect.spool import OutboundSpool, SpoolFullError
+
+
+def drain_all(spool) -> list:
+    sent = []
+    spool.drain(lambda message: sent.append((message.topic, message.payload)) or True)
+    return sent
+
+
+class TestOutboundSpool:
+    def test_survives_reopen_and_torn_tail(self, tmp_path):
+        spool = OutboundSpool(tmp_path, segment_size=64)
+        for i in range(6):
+            spool.append(f"topic/{i % 2}", f"msg{i}")
+        assert len(spool) == 6 and len(list(tmp_path.glob("*.seg"))) > 1
+        # Publish two, then "crash" with half a record written
+        batch = spool.peek(2)
+        spool.ack(batch[-1][1])
+        spool.close()
+        last = sorted(tmp_path.glob("*.seg"))[-1]
+        with open(last, "ab") as f:
+            f.write(b"\x00\x00\x00\x10garbage")
+
+        reopened = OutboundSpool(tmp_path, segment_size=64)
+        assert len(reopened) == 4
+        assert drain_all(reopened) == [("topic/0", b"msg2"), ("topic/1", b"msg3"),
+                                       ("topic/0", b"msg4"), ("topic/1", b"msg5")]
+        assert len(reopened) == 0
+        # Fully sent segments are deleted
+        assert len(list(tmp_path.glob("*.seg"))) <= 1
+        reopened.close()
+        assert len(OutboundSpool(tmp_path)) == 0
+
+    def test_bounded_disk_usage(self, tmp_path):
+        spool = OutboundSpool(tmp_path, segment_size=100, max_bytes=300)
+        for i in range(20):
+            spool.append("t", b"x" * 40 + str(i).encode())
+        assert spool.get_size() <= 300
+        assert spool.get_dropped_count() > 0
+        assert len(spool) + spool.get_dropped_count() == 20
+        payloads = [payload for _, payload in drain_all(spool)]
+        # The newest messages are kept, still in order
+        assert payloads == [b"x" * 40 + str(i).encode() for i in range(20 - len(payloads), 20)]
+
+        strict = OutboundSpool(tmp_path / "strict", max_bytes=100, drop_oldest=False)
+        strict.append("t", b"x" * 60)
+        with pytest.raises(SpoolFullError):
+            strict.append("t", b"x" * 60)
+
+    def test_drain_stops_at_failed_publish(self, tmp_path):
+        spool = OutboundSpool(tmp_path)
+        for i in range(3):
+            spool.append("t", str(i))
+        assert spool.drain(lambda message: message.payload != b"1") == 1
+        assert [m.payload for m, _ in spool.peek()] == [b"1", b"2"]
+
+
+class TestMQTTSpooling:
+    def test_spools_while_disconnected_and_drains_in_order(self, tmp_path):
+        client = MQTTCommClient(url="localhost", client_id_suffix="test", spool=OutboundSpool(tmp_path),
+                                spool_rate=0)
+        paho = client._MQTTCommClient__client
+        published = []
+
+        def fake_publish(topic, payload, qos=0, retain=False):
+            published.append((topic, payload))
+            return SimpleNamespace(rc=mqtt.MQTT_ERR_SUCCESS if client.is_connected() else mqtt.MQTT_ERR_NO_CONN)
+        paho.publish = fake_publish
+
+        client.publish("a", b"1")
+        client.publish("b", b"2")
+        assert published == [] and len(client.get_spool()) == 2
+
+        client._on_connect(paho, None, None, 0, None)
+        client.publish("a", b"3")
+        deadline = time.monotonic() + 5
+        while len(published) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert published == [("a", b"1"), ("b", b"2"), ("a", b"3")]
+        assert len(client.get_spool()) == 0
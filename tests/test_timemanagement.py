@@ -0,0 +1,351 @@
+#  =============================================================================
+#  Copyright (c) 2026 Botts Innovative Research Inc.
+#  Author: Ian Patterson
+#  Contact Email: ian@botts-inc.com
+#  =============================================================================
+"""Tests for TimeInstant / TimeUtils timestamp handling, TimeController archive playback and the Synchronizer."""
+import asyncio
+import json
+import threading
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from src.oshconnect.events import DefaultEventTypes, EventHandler
+from src.oshconnect.csapi4py import request_wrappers
+from src.oshconnect.events.builder import EventBuilder
+from src.oshconnect.streamableresource import SessionManager
+from src.oshconnect.timemanagement import (State, Synchronizer, TemporalModes, TimeController, TimeInstant,
+                                           TimePeriod, TimeUtils, datastream_fetcher)
+from tests.test_datastore import make_datastream, make_node
+
+
+class TestISOParsing:
+    @pytest.mark.parametrize("iso", [
+        "2024-06-18T15:46:32Z",
+        "2024-06-18T15:46:32.123Z",
+        "2024-06-18T15:46:32.123456Z",
+        "1969-12-31T23:59:59Z",
+        "2024-02-29T00:00:00Z",
+    ])
+    def test_parse_matches_datetime(self, iso):
+        expected = datetime.fromisoformat(iso.replace("Z", "+00:00")).timestamp()
+        assert TimeUtils.parse_iso_epoch(iso) == pytest.approx(expected, abs=1e-6)
+        assert TimeInstant.from_string(iso).epoch_time == pytest.approx(expected, abs=1e-6)
+
+    def test_offsets_and_naive_strings(self):
+        assert TimeUtils.parse_iso_epoch("2024-06-18T17:46:32+02:00") == TimeUtils.parse_iso_epoch(
+            "2024-06-18T15:46:32Z")
+        # No offset is interpreted as UTC
+        assert TimeUtils.parse_iso_epoch("2024-06-18T15:46:32") == TimeUtils.parse_iso_epoch("2024-06-18T15:46:32Z")
+
+    def test_to_utc_time(self):
+        dt = TimeUtils.to_utc_time("2024-06-18T15:46:32.5Z")
+        assert dt == datetime(2024, 6, 18, 15, 46, 32, 500000, tzinfo=timezone.utc)
+        assert TimeUtils.to_utc_time("2024-06-18T15:46:32Z").tzinfo == timezone.utc
+
+    def test_time_to_iso_round_trip(self):
+        iso = "2024-06-18T15:46:32.123000Z"
+        epoch = TimeUtils.parse_iso_epoch(iso)
+        assert TimeUtils.time_to_iso(epoch) == iso
+        assert TimeInstant(epoch_time=epoch).get_iso_time() == iso
+        assert TimeUtils.time_to_iso(datetime(2024, 6, 18, 15, 46, 32, 123000, tzinfo=timezone.utc)) == iso
+
+
+class TestBulkParsing:
+    def test_parse_iso_array_epoch(self):
+        times = ["2024-06-18T15:46:32.123Z", "2024-06-18T15:46:33Z", "2024-06-18T15:46:34.5Z"]
+        epochs = TimeUtils.parse_iso_array(times)
+        assert epochs.dtype == np.float64
+        expected = [TimeUtils.parse_iso_epoch(t) for t in times]
+        assert np.allclose(epochs, expected)
+
+    def test_parse_iso_array_datetime64(self):
+        parsed = TimeUtils.parse_iso_array(["2024-06-18T15:46:32.123Z"], as_datetime64=True)
+        assert parsed.dtype == np.dtype("datetime64[us]")
+        assert parsed[0] == np.datetime64("2024-06-18T15:46:32.123")
+
+    def test_parse_iso_array_with_offsets_falls_back(self):
+        epochs = TimeUtils.parse_iso_array(["2024-06-18T17:46:32+02:00", "2024-06-18T15:46:33Z"])
+        assert np.allclose(epochs, [TimeUtils.parse_iso_epoch("2024-06-18T15:46:32Z"),
+                                    TimeUtils.parse_iso_epoch("2024-06-18T15:46:33Z")])
+
+
+class TestTimeInstant:
+    def test_slots(self):
+        ti = TimeInstant(epoch_time=1.0)
+        assert not hasattr(ti, "__dict__")
+
+    def test_comparison_and_hash(self):
+        a = TimeInstant(epoch_time=1.0)
+        b = TimeInstant(epoch_time=2.0)
+        assert a < b and b > a and a != b
+        assert a == TimeInstant(epoch_time=1.0)
+        assert len({a, TimeInstant(epoch_time=1.0), b}) == 2
+        assert a != "now"
+
+
+class FakeArchive:
+    """Archive source yielding one observation every *period* seconds and recording each requested window."""
+
+    def __init__(self, name: str, begin: float, end: float, period: float, offset: float = 0.0):
+        self.name = name
+        self.times = []
+        t = begin + offset
+        while t <= end:
+            self.times.append(t)
+            t += period
+        self.windows = []
+
+    def __call__(self, start: float, end: float):
+        self.windows.append((start, end))
+        return [(t, {"stream": self.name, "t": t}) for t in self.times if start <= t <= end]
+
+
+@pytest.fixture
+def controller():
+    tc = TimeController()
+    tc.reset()
+    tc.set_temporal_mode(TemporalModes.ARCHIVE)
+    tc.set_timeline_start(TimeInstant(epoch_time=1000.0))
+    tc.set_timeline_end(TimeInstant(epoch_time=1020.0))
+    yield tc
+    tc.reset()
+
+
+def wait_for_stop(tc: TimeController, timeout: float = 5.0):
+    waiter = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if tc.get_status() is State.STOPPED:
+            return
+        waiter.wait(0.01)
+    raise AssertionError(f"playback did not finish, status {tc.get_status()}")
+
+
+class TestTimeControllerPlayback:
+    def test_is_singleton(self):
+        assert TimeController() is TimeController()
+
+    def test_start_requires_archive_mode(self, controller):
+        controller.set_temporal_mode(TemporalModes.REAL_TIME)
+        with pytest.raises(ValueError):
+            controller.start()
+
+    def test_merged_playback_in_time_order(self, controller):
+        a = FakeArchive("a", 1000.0, 1020.0, 1.0)
+        b = FakeArchive("b", 1000.0, 1020.0, 1.5, offset=0.25)
+        received = []
+        controller.add_listener(object(), received.append, fetcher=a)
+        controller.add_listener(object(), received.append, fetcher=b)
+        controller.set_buffer_time(4.0)
+        controller.set_buffer_window(2.0)
+        controller.fast_forward(500)
+        controller.start()
+        wait_for_stop(controller)
+
+        times = [evt.data["t"] for evt in received]
+        assert times == sorted(times)
+        assert len(times) == len(a.times) + len(b.times)
+        assert controller.get_current_time().epoch_time == 1020.0
+
+    def test_prefetch_is_windowed(self, controller):
+        archive = FakeArchive("a", 1000.0, 1020.0, 0.5)
+        received = []
+        controller.add_listener(object(), received.append, fetcher=archive)
+        controller.set_buffer_time(3.0)
+        controller.set_buffer_window(2.0)
+        controller.fast_forward(200)
+        controller.start()
+        wait_for_stop(controller)
+
+        assert len(archive.windows) == 10
+        assert all(end - start <= 2.0 for start, end in archive.windows)
+        assert len(received) == len(archive.times)
+
+    def test_rewind_plays_backwards(self, controller):
+        archive = FakeArchive("a", 1000.0, 1020.0, 1.0)
+        received = []
+        controller.add_listener(object(), received.append, fetcher=archive)
+        controller.skip(TimeInstant(epoch_time=1010.0))
+        controller.rewind(500)
+        controller.start()
+        wait_for_stop(controller)
+
+        times = [evt.data["t"] for evt in received]
+        assert times == [float(t) for t in range(1010, 999, -1)]
+        assert controller.get_current_time().epoch_time == 1000.0
+
+    def test_pause_holds_playhead(self, controller):
+        archive = FakeArchive("a", 1000.0, 1020.0, 1.0)
+        controller.add_listener(object(), lambda evt: None, fetcher=archive)
+        controller.start()
+        controller.pause()
+        paused_at = controller.get_current_time().epoch_time
+        threading.Event().wait(0.05)
+        assert controller.get_status() is State.PAUSED
+        assert controller.get_current_time().epoch_time == paused_at
+
+    def test_skip_discards_buffer(self, controller):
+        archive = FakeArchive("a", 1000.0, 1020.0, 1.0)
+        received = []
+        controller.add_listener(object(), received.append, fetcher=archive)
+        controller.skip(TimeInstant(epoch_time=1015.0))
+        controller.fast_forward(500)
+        controller.start()
+        wait_for_stop(controller)
+        assert [evt.data["t"] for evt in received] == [float(t) for t in range(1015, 1021)]
+
+    def test_default_fetcher_uses_datastream_fetch(self):
+        ds = MagicMock()
+        ds.fetch.return_value = [{"resultTime": "2024-06-18T15:46:32Z", "result": {}}]
+        pairs = datastream_fetcher(ds)(1718725500.0, 1718725600.0)
+        period = ds.fetch.call_args.args[0]
+        assert period.start.epoch_time == 1718725500.0 and period.end.epoch_time == 1718725600.0
+        assert pairs[0][0] == TimeUtils.parse_iso_epoch("2024-06-18T15:46:32Z")
+
+    def test_fetch_follows_next_links(self, monkeypatch):
+        node = make_node(SessionManager())
+        ds = make_datastream(node)
+        next_url = "http://localhost:8282/sensorhub/api/datastreams/ds001/observations?offset=1"
+        pages = [
+            {"items": [{"resultTime": "2024-06-18T15:46:32Z", "result": {"v": 1}}],
+             "links": [{"rel": "next", "href": next_url}]},
+            {"items": [{"resultTime": "2024-06-18T15:46:33Z", "result": {"v": 2}}]},
+        ]
+        calls = []
+
+        def get(url, params=None, headers=None, auth=None):
+            calls.append((str(url), params, headers))
+            return MagicMock(ok=True, json=MagicMock(return_value=pages.pop(0)))
+
+        monkeypatch.setattr(request_wrappers.requests, "get", get)
+        observations = ds.fetch(TimePeriod(start="2024-06-18T15:46:00Z", end="2024-06-18T15:47:00Z"), limit=1)
+
+        assert [o["result"]["v"] for o in observations] == [1, 2]
+        assert calls[0][1]["limit"] == 1 and calls[0][1]["resultTime"].startswith("2024-06-18T15:46:00")
+        assert calls[1] == (next_url, {}, {})
+
+
+class TestSynchronizer:
+    def test_k_way_merge_of_archived_sources(self):
+        sync = Synchronizer()
+        a = FakeArchive("a", 0.0, 10.0, 1.0)
+        b = FakeArchive("b", 0.0, 10.0, 0.7, offset=0.1)
+        sync.add_source(a(0.0, 10.0), source_id="a")
+        sync.add_source(b(0.0, 10.0), source_id="b")
+        merged = list(sync.merge())
+        epochs = [item.epoch for item in merged]
+        assert epochs == sorted(epochs)
+        assert len(merged) == len(a.times) + len(b.times)
+        assert sync.get_buffer_size() == 0
+
+    def test_archived_sources_are_pulled_lazily(self):
+        pulled = []
+
+        def source(name):
+            for t in range(5):
+                pulled.append(name)
+                yield float(t), name
+
+        sync = Synchronizer()
+        for name in ("a", "b", "c"):
+            sync.add_source(source(name), source_id=name)
+        merged = sync.merge()
+        next(merged)
+        # Only the head of each source plus the replacement for the emitted item
+        assert len(pulled) == 4
+
+    def test_live_reordering_within_lateness(self):
+        sync = Synchronizer(lateness=2.0)
+        a = sync.add_live_source("a")
+        b = sync.add_live_source("b")
+        sync.push(a, 10.0, "a10")
+        sync.push(b, 9.0, "b9")
+        sync.push(a, 11.5, "a11.5")
+        assert [item.data for item in sync.poll()] == ["b9"]
+        sync.push(b, 10.5, "b10.5")
+        sync.push(a, 13.0, "a13")
+        assert [item.data for item in sync.poll()] == ["a10", "b10.5"]
+        assert not sync.check_in_sync()
+        sync.close()
+        assert [item.data for item in sync.merge()] == ["a11.5", "a13"]
+
+    def test_late_items_are_dropped_and_counted(self):
+        sync = Synchronizer(lateness=1.0)
+        a = sync.add_live_source("a")
+        b = sync.add_live_source("b")
+        sync.push(a, 10.0, None)
+        sync.push(a, 12.0, None)
+        assert [item.epoch for item in sync.poll()] == [10.0]
+        assert sync.push(b, 9.0, None) is False
+        assert sync.get_late_drops("b") == 1 and sync.get_late_drops("a") == 0
+        assert sync.get_late_drops() == 1
+
+    def test_clock_advances_watermark(self):
+        now = [100.0]
+        sync = Synchronizer(lateness=1.0, clock=lambda: now[0])
+        source = sync.add_live_source()
+        sync.push(source, 99.5, "x")
+        assert sync.poll() == []
+        now[0] = 101.0
+        assert [item.data for item in sync.poll()] == ["x"]
+
+    def test_merge_blocks_for_pushes_from_other_threads(self):
+        sync = Synchronizer(lateness=0.0)
+        source = sync.add_live_source()
+
+        def producer():
+            for t in range(5):
+                sync.push(source, float(t), t)
+            sync.close()
+
+        threading.Thread(target=producer).start()
+        assert [item.data for item in sync.merge(timeout=5.0)] == [0, 1, 2, 3, 4]
+
+    def test_async_iteration(self):
+        sync = Synchronizer()
+        sync.add_source([(1.0, "a"), (3.0, "c")])
+        sync.add_source([(2.0, "b")])
+
+        async def collect():
+            return [item.data async for item in sync]
+
+        assert asyncio.run(collect()) == ["a", "b", "c"]
+
+    def test_datastream_observations_from_event_bus(self):
+        ds = MagicMock()
+        ds._resource_id = "ds1"
+        ds._topic = "/api/datastreams/ds1/observations"
+        sync = Synchronizer(lateness=5.0)
+        sync.synchronize([ds])
+        for stamp in ("2024-06-18T15:46:33Z", "2024-06-18T15:46:32Z"):
+            EventHandler().publish(
+                EventBuilder().with_type(DefaultEventTypes.NEW_OBSERVATION).with_topic(ds._topic)
+                .with_data(json.dumps({"resultTime": stamp, "result": {}}).encode()).build())
+        sync.close()
+        merged = list(sync.merge())
+        assert [item.source_id for item in merged] == ["ds1", "ds1"]
+        assert [item.epoch for item in merged] == [TimeUtils.parse_iso_epoch("2024-06-18T15:46:32Z"),
+                                                   TimeUtils.parse_iso_epoch("2024-06-18T15:46:33Z")]
+
+    def test_archive_is_fetched_outside_the_lock(self):
+        sync = Synchronizer()
+        live = sync.add_live_source()
+        pushed = []
+
+        def fetch(period):
+            # The network thread keeps pushing while the archive request is in flight
+            pusher = threading.Thread(target=lambda: pushed.append(sync.push(live, 5.0, "live") or True))
+            pusher.start()
+            pusher.join(timeout=1.0)
+            return [{"resultTime": "1970-01-01T00:00:02Z"}, {"resultTime": "1970-01-01T00:00:01Z"}]
+
+        ds = MagicMock()
+        ds._resource_id = "ds1"
+        ds.fetch = fetch
+        sync.add_archive(ds, TimePeriod(start=TimeInstant(epoch_time=0.0), end=TimeInstant(epoch_time=10.0)))
+        assert pushed == [True]
+        sync.close()
+        assert [item.epoch for item in sync.merge()] == [1.0, 2.0, 5.0]
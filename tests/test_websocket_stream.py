@@ -0,0 +1,160 @@
+#   ==============================================================================
+#   Copyright (c) 2024 Botts Innovative Research, Inc.
+#   ==============================================================================
+
+"""Tests for the WebSocket streaming transport against a local aiohttp server — no OSH server required."""
+
+import asyncio
+import threading
+
+from aiohttp import WSMsgType, web
+
+from src.oshconnect.events import DefaultEventTypes, EventHandler
+from src.oshconnect.resource_datamodels import DatastreamResource
+from src.oshconnect.streamableresource import Datastream, Node, SessionManager, Status
+
+
+def make_ws_datastream(port: int) -> Datastream:
+    sm = SessionManager()
+    node = Node(protocol="http", address="127.0.0.1", port=port, username="admin", password="secret")
+    node.register_with_session_manager(sm)
+    ds_resource = DatastreamResource.model_validate({
+        "id": "ds001",
+        "name": "Test Datastream",
+        "validTime": ["2024-01-01T00:00:00Z", "2025-01-01T00:00:00Z"],
+    })
+    ds = Datastream(parent_node=node, datastream_resource=ds_resource)
+    ds._ws_reconnect_delay = 0.01
+    return ds
+
+
+async def start_server(handler) -> tuple[web.AppRunner, int]:
+    app = web.Application()
+    app.router.add_get("/sensorhub/api/datastreams/ds001/observations", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
+
+
+async def wait_for(predicate, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+class TestWebSocketTransport:
+    def test_ws_url_and_auth(self):
+        ds = make_ws_datastream(8282)
+        ds.initialize()
+        assert ds.ws_url == "ws://127.0.0.1:8282/sensorhub/api/datastreams/ds001/observations"
+        assert ds.get_parent_node().get_auth_headers() == {"Authorization": "Basic YWRtaW46c2VjcmV0"}
+
+    def test_streams_binary_frames_and_reconnects(self):
+        received_by_server = []
+        auth_headers = []
+        connections = []
+
+        async def handler(request):
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            connections.append(ws)
+            auth_headers.append(request.headers.get("Authorization"))
+            if len(connections) == 1:
+                await ws.send_bytes(b"\x00\x01binary")
+                await ws.send_str('{"result": 1}')
+                await ws.close()
+                return ws
+            async for msg in ws:
+                if msg.type is WSMsgType.BINARY:
+                    received_by_server.append(msg.data)
+                    await ws.send_bytes(msg.data)
+            return ws
+
+        async def scenario():
+            runner, port = await start_server(handler)
+            ds = make_ws_datastream(port)
+            events = []
+            listener = EventHandler().subscribe(events.append, types=[DefaultEventTypes.NEW_OBSERVATION])
+            try:
+                ds.initialize()
+                ds.start()
+                await wait_for(lambda: len(connections) == 2)
+                ds.insert({"result": 2})
+                await wait_for(lambda: len(ds.get_inbound_deque()) == 3)
+            finally:
+                ds.stop()
+                EventHandler().unregister_listener(listener)
+                ds.get_parent_node().get_session().close()
+                await asyncio.sleep(0.05)
+                await runner.cleanup()
+            return ds, events
+
+        ds, events = asyncio.run(scenario())
+
+        inbound = list(ds.get_inbound_deque())
+        assert inbound[0] == b"\x00\x01binary" and isinstance(inbound[0], bytes)
+        assert inbound[1] == '{"result": 1}'
+        assert inbound[2] == b'{"result": 2}'
+        assert received_by_server == [b'{"result": 2}']
+        assert auth_headers == ["Basic YWRtaW46c2VjcmV0"] * 2
+        assert [e.data for e in events if e.producer is ds][:2] == inbound[:2]
+        assert ds._status == "stopped"
+
+    def test_background_loop_without_running_loop(self):
+        async def handler(request):
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            await ws.send_bytes(b"hello")
+            await asyncio.sleep(5)
+            return ws
+
+        loop = asyncio.new_event_loop()
+        runner, port = loop.run_until_complete(start_server(handler))
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            ds = make_ws_datastream(port)
+            ds.initialize()
+            ds.start()
+            session = ds.get_parent_node().get_session()
+            asyncio.run_coroutine_threadsafe(
+                wait_for(lambda: len(ds.get_inbound_deque()) == 1), session.get_stream_loop()).result(timeout=5)
+            assert ds._status == Status.STARTED.value
+            session.close()
+            assert ds._status == "stopped"
+        finally:
+            asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(timeout=5)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.close()
+        assert list(ds.get_inbound_deque()) == [b"hello"]
+
+    def test_reader_queue_is_fed_on_the_stream_loop(self):
+        ds = make_ws_datastream(8282)
+        ds._reader_queue_size = 2
+        ds.initialize()
+        # Neither streamed nor on a loop: only the deque gets the message
+        ds._deliver_inbound(b"0")
+        assert ds.get_msg_reader_queue().empty()
+
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            ds._ws_loop = loop
+            for payload in (b"1", b"2", b"3"):
+                ds._deliver_inbound(payload)
+
+            async def drain():
+                queue = ds.get_msg_reader_queue()
+                return [await queue.get() for _ in range(queue.qsize())]
+
+            assert asyncio.run_coroutine_threadsafe(drain(), loop).result(timeout=5) == [b"2", b"3"]
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.close()
+        assert list(ds.get_inbound_deque()) == [b"0", b"1", b"2", b"3"]